@@ -0,0 +1,100 @@
+"""
+Change-detecting push of wallet data into GHL contact custom fields
+(sync_contact_wallet_custom_fields).
+
+Each account's contact in the main location carries two custom fields: the
+wallet balance (GHL_CF_CREDITS_REMAINING_NEW_ID) and the account's location id
+(GHL_CF_SMS_RECHARGE_LOCATION_ID). A hash of what was last pushed is stored on
+the account (``contact_fields_fingerprint``); an account is dirty when the hash
+of its current contact id and values differs. Balance changes come from many
+paths (ledger writes, reservation settlement, queryset updates), so comparing
+against what GHL was last sent catches all of them without hooking each one.
+
+Only dirty accounts are pushed, one PUT per contact with both fields, from a
+small thread pool (GHL_CONTACT_SYNC_CONCURRENCY). Every PUT first takes a token
+from the shared GHL rate limiter (core.rate_limit) for the main location. A
+failed or rate-limited push leaves the old hash, so the next run retries it.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from core.models import GHLAuthCredentials
+from core.rate_limit import acquire, ghl_buckets
+
+logger = logging.getLogger(__name__)
+
+# Longest a worker waits for the rate limiter before leaving the push to the next run.
+RATE_WAIT_MS = 30000
+
+
+def _concurrency():
+    return max(1, getattr(settings, "GHL_CONTACT_SYNC_CONCURRENCY", 4))
+
+
+def fingerprint(contact_id, fields):
+    return hashlib.sha256(json.dumps([contact_id, fields], sort_keys=True).encode()).hexdigest()
+
+
+def dirty_accounts(credits_field_id, location_field_id):
+    """[(account pk, location_id, contact_id, {field id: value}, fingerprint)] for accounts that changed."""
+    dirty = []
+    rows = (
+        GHLAuthCredentials.objects
+        .filter(wallet__isnull=False)
+        .exclude(ghl_contact_id__isnull=True).exclude(ghl_contact_id="")
+        .exclude(location_id__isnull=True).exclude(location_id="")
+        .values_list("pk", "location_id", "ghl_contact_id", "wallet__balance", "contact_fields_fingerprint")
+    )
+    for pk, location_id, contact_id, balance, stored in rows:
+        fields = {credits_field_id: str(balance), location_field_id: location_id}
+        current = fingerprint(contact_id, fields)
+        if current != stored:
+            dirty.append((pk, location_id, contact_id, fields, current))
+    return dirty
+
+
+def _push(service, contact_id, fields):
+    """Worker: one rate-limited PUT. Returns None on success, else the error text."""
+    try:
+        acquired, wait_ms = acquire(ghl_buckets(settings.GHL_MAIN_LOCATION_ID), max_wait_ms=RATE_WAIT_MS)
+        if not acquired:
+            return f"rate limited ({wait_ms} ms)"
+        service.update_contact_custom_fields(contact_id, fields)
+        return None
+    except Exception as e:
+        return str(e)
+    finally:
+        # A 401 refresh inside ghl_request may have opened a connection in this thread.
+        connection.close()
+
+
+def sync(service, credits_field_id, location_field_id):
+    """Push every dirty account. Returns the summary dict."""
+    started = time.perf_counter()
+    total = GHLAuthCredentials.objects.count()
+    dirty = dirty_accounts(credits_field_id, location_field_id)
+    summary = {"accounts": total, "dirty": len(dirty), "pushed": 0, "failed": 0}
+
+    pushed = []
+    with ThreadPoolExecutor(max_workers=_concurrency(), thread_name_prefix="contact-sync") as pool:
+        results = pool.map(lambda entry: _push(service, entry[2], entry[3]), dirty)
+        for (pk, location_id, contact_id, _, current), error in zip(dirty, results):
+            if error:
+                summary["failed"] += 1
+                logger.error("Failed syncing contact custom fields for location %s: %s", location_id, error)
+                continue
+            pushed.append(GHLAuthCredentials(pk=pk, contact_fields_fingerprint=current))
+            logger.info("Synced contact custom fields for location %s contact %s", location_id, contact_id)
+
+    if pushed:
+        GHLAuthCredentials.objects.bulk_update(pushed, ["contact_fields_fingerprint"], batch_size=500)
+    summary["pushed"] = len(pushed)
+    summary["elapsed_ms"] = round((time.perf_counter() - started) * 1000)
+    return summary
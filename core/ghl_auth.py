@@ -1,5 +1,7 @@
 import json
 import logging
+from datetime import timedelta
+from functools import lru_cache
 from urllib.parse import urlencode
 
 import requests
@@ -8,6 +10,7 @@ from django.conf import settings
 from django.core.cache import cache
 from django.utils import timezone
 
+from core import http_client, token_refresh
 from core.models import AgencyToken, CompanyToken, GHLAuthCredentials
 
 logger = logging.getLogger(__name__)
@@ -129,7 +132,7 @@ def _post_token(payload: dict) -> tuple[dict | None, str | None]:
         "Content-Type": "application/x-www-form-urlencoded",
     }
     try:
-        response = requests.post(TOKEN_URL, headers=headers, data=payload, timeout=60)
+        response = http_client.post(TOKEN_URL, headers=headers, data=payload, timeout=60)
     except requests.RequestException as exc:
         logger.exception("GHL oauth/token request failed")
         return None, str(exc)
@@ -221,7 +224,7 @@ def _list_installed_locations(company_access_token: str, company_id: str) -> lis
     skip = 0
     page_limit = 100
     while True:
-        response = requests.get(
+        response = http_client.get(
             url,
             headers=headers,
             params={
@@ -294,7 +297,7 @@ def _mint_location_token(company_access_token: str, company_id: str, location_id
         "Accept": "application/json",
         "Content-Type": "application/json",
     }
-    response = requests.post(
+    response = http_client.post(
         url,
         headers=headers,
         json={"companyId": company_id, "locationId": location_id},
@@ -338,6 +341,35 @@ def _clip(value, max_length: int):
     return text
 
 
+def _token_expires_at(response_data: dict):
+    """Absolute expiry of a token response (``expires_in`` is seconds from now)."""
+    try:
+        seconds = int(response_data.get("expires_in") or 0)
+    except (TypeError, ValueError):
+        return None
+    return timezone.now() + timedelta(seconds=seconds) if seconds else None
+
+
+@lru_cache(maxsize=None)
+def _location_oauth_client() -> dict:
+    """Location app client credentials for refresh calls (read once per process)."""
+    return {
+        "client_id": config("GHL_CLIENT_ID"),
+        "client_secret": config("GHL_CLIENT_SECRET"),
+        "redirect_uri": config("GHL_REDIRECTED_URI"),
+    }
+
+
+@lru_cache(maxsize=None)
+def _agency_oauth_client() -> dict:
+    """Agency app client credentials for refresh calls (read once per process)."""
+    return {
+        "client_id": config("AGENCY_CLIENT_ID"),
+        "client_secret": config("AGENCY_CLIENT_SECRET"),
+        "redirect_uri": config("AGENCY_REDIRECT_URI"),
+    }
+
+
 def _save_company_token_from_location_app(response_data: dict) -> CompanyToken:
     company_id = response_data["companyId"]
     obj, _created = CompanyToken.objects.update_or_create(
@@ -346,6 +378,7 @@ def _save_company_token_from_location_app(response_data: dict) -> CompanyToken:
             "access_token": response_data.get("access_token"),
             "refresh_token": response_data.get("refresh_token"),
             "expires_in": response_data.get("expires_in"),
+            "token_expires_at": _token_expires_at(response_data),
             "scope": response_data.get("scope"),
             "user_type": _clip(response_data.get("userType"), 50),
             "user_id": _clip(response_data.get("userId"), 128),
@@ -380,6 +413,7 @@ def _upsert_location_credentials(location_token_data: dict):
             "access_token": location_token_data.get("access_token"),
             "refresh_token": location_token_data.get("refresh_token"),
             "expires_in": location_token_data.get("expires_in"),
+            "token_expires_at": _token_expires_at(location_token_data),
             "scope": location_token_data.get("scope"),
             "user_type": _clip(location_token_data.get("userType"), 50),
             "company_id": _clip(location_token_data.get("companyId"), 255),
@@ -464,6 +498,7 @@ def remint_installed_location_tokens_for_company(
                 "access_token": refreshed.get("access_token"),
                 "refresh_token": refreshed.get("refresh_token"),
                 "expires_in": refreshed.get("expires_in"),
+                "token_expires_at": _token_expires_at(refreshed),
                 "scope": refreshed.get("scope"),
                 "user_type": _clip(refreshed.get("userType"), 50),
                 "user_id": _clip(refreshed.get("userId"), 128),
@@ -664,6 +699,7 @@ def exchange_agency_oauth_code(authorization_code):
             "access_token": response_data.get("access_token"),
             "refresh_token": response_data.get("refresh_token"),
             "expires_in": response_data.get("expires_in"),
+            "token_expires_at": _token_expires_at(response_data),
             "scope": response_data.get("scope"),
             "user_type": response_data.get("userType"),
             "user_id": response_data.get("userId"),
@@ -699,14 +735,15 @@ def refresh_location_token(credentials):
         return False
 
     try:
+        client = _location_oauth_client()
         response_data, error = _post_token(
             {
                 "grant_type": "refresh_token",
-                "client_id": config("GHL_CLIENT_ID"),
-                "client_secret": config("GHL_CLIENT_SECRET"),
+                "client_id": client["client_id"],
+                "client_secret": client["client_secret"],
                 "refresh_token": refresh_token,
                 "user_type": "Location",
-                "redirect_uri": config("GHL_REDIRECTED_URI"),
+                "redirect_uri": client["redirect_uri"],
             }
         )
         if error:
@@ -725,21 +762,60 @@ def refresh_location_token(credentials):
             )
             return False
 
+        _save_location_token(credentials, response_data)
+        return True
+    except Exception:
+        logger.exception("Unexpected error refreshing location token for %s", credentials.pk)
+        return False
+
+
+def _save_location_token(credentials, response_data: dict) -> None:
+    fields = {
+        "access_token": response_data.get("access_token"),
+        "refresh_token": response_data.get("refresh_token"),
+        "expires_in": response_data.get("expires_in"),
+        "token_expires_at": _token_expires_at(response_data),
+        "scope": response_data.get("scope"),
+        "user_type": response_data.get("userType"),
+        "company_id": response_data.get("companyId"),
+        "user_id": response_data.get("userId"),
+    }
+    if response_data.get("locationId") == credentials.location_id:
+        # Same row: one UPDATE instead of update_or_create's SELECT + UPDATE.
+        for name, value in fields.items():
+            setattr(credentials, name, value)
+        credentials.save(update_fields=[*fields, "updated_at"])
+    else:
         GHLAuthCredentials.objects.update_or_create(
             location_id=response_data.get("locationId"),
-            defaults={
-                "access_token": response_data.get("access_token"),
-                "refresh_token": response_data.get("refresh_token"),
-                "expires_in": response_data.get("expires_in"),
-                "scope": response_data.get("scope"),
-                "user_type": response_data.get("userType"),
-                "company_id": response_data.get("companyId"),
-                "user_id": response_data.get("userId"),
-            },
+            defaults=fields,
         )
+
+
+def refresh_managed_location_token(credentials, company_token):
+    """
+    Re-mint one company-managed location token. The company token is refreshed
+    first only when GHL rejects the stored one. Returns True on success.
+    """
+    try:
+        try:
+            token_data = _mint_location_token(
+                company_token.access_token, company_token.company_id, credentials.location_id
+            )
+        except ValueError as exc:
+            logger.warning("locationToken failed for %s, refreshing company token: %s", credentials.pk, exc)
+            refreshed = _refresh_company_token_with_client(company_token.refresh_token, **_location_oauth_client())
+            if not refreshed:
+                logger.error("Company token refresh failed for %s", company_token.pk)
+                return False
+            _save_company_token_from_location_app(refreshed)
+            token_data = _mint_location_token(
+                refreshed["access_token"], company_token.company_id, credentials.location_id
+            )
+        _save_location_token(credentials, token_data)
         return True
     except Exception:
-        logger.exception("Unexpected error refreshing location token for %s", credentials.pk)
+        logger.exception("Unexpected error re-minting location token for %s", credentials.pk)
         return False
 
 
@@ -796,9 +872,7 @@ def refresh_company_token(credentials):
     try:
         response_data = _refresh_company_token_with_client(
             credentials.refresh_token,
-            client_id=config("GHL_CLIENT_ID"),
-            client_secret=config("GHL_CLIENT_SECRET"),
-            redirect_uri=config("GHL_REDIRECTED_URI"),
+            **_location_oauth_client(),
         )
         if not response_data:
             logger.error("Company token refresh failed for %s", credentials.pk)
@@ -811,6 +885,7 @@ def refresh_company_token(credentials):
                 "access_token": response_data.get("access_token"),
                 "refresh_token": response_data.get("refresh_token"),
                 "expires_in": response_data.get("expires_in"),
+                "token_expires_at": _token_expires_at(response_data),
                 "scope": response_data.get("scope"),
                 "user_type": _clip(response_data.get("userType"), 50),
                 "user_id": _clip(response_data.get("userId"), 128),
@@ -833,14 +908,15 @@ def refresh_agency_token(credentials):
         return False
 
     try:
+        client = _agency_oauth_client()
         response_data, error = _post_token(
             {
                 "grant_type": "refresh_token",
-                "client_id": config("AGENCY_CLIENT_ID"),
-                "client_secret": config("AGENCY_CLIENT_SECRET"),
+                "client_id": client["client_id"],
+                "client_secret": client["client_secret"],
                 "refresh_token": credentials.refresh_token,
                 "user_type": "Company",
-                "redirect_uri": config("AGENCY_REDIRECT_URI"),
+                "redirect_uri": client["redirect_uri"],
             }
         )
         if error:
@@ -865,6 +941,7 @@ def refresh_agency_token(credentials):
                 "access_token": response_data.get("access_token"),
                 "refresh_token": response_data.get("refresh_token"),
                 "expires_in": response_data.get("expires_in"),
+                "token_expires_at": _token_expires_at(response_data),
                 "scope": response_data.get("scope"),
                 "user_type": response_data.get("userType"),
                 "user_id": response_data.get("userId"),
@@ -910,8 +987,8 @@ def _build_auth_failure_payload(auth_credentials, *, method, url, response, init
     payload = {
         "alert_type": "ghl_token_auth_failure",
         "reason": (
-            "GHL API returned an authentication error after inline token refresh "
-            "and one retry. The location likely needs to re-authorize the app."
+            "GHL API returned an authentication error that an inline token refresh "
+            "did not fix. The location likely needs to re-authorize the app."
         ),
         "http_method": method,
         "api_url": url,
@@ -920,7 +997,7 @@ def _build_auth_failure_payload(auth_credentials, *, method, url, response, init
         "error_detail": _extract_auth_error_detail(response),
         "occurred_at": timezone.now().isoformat(),
     }
-    if auth_credentials is not None:
+    if isinstance(auth_credentials, GHLAuthCredentials):
         payload.update(
             {
                 "ghl_account_id": str(auth_credentials.pk),
@@ -933,6 +1010,14 @@ def _build_auth_failure_payload(auth_credentials, *, method, url, response, init
                 "ghl_contact_email": auth_credentials.ghl_contact_email,
             }
         )
+    elif auth_credentials is not None:
+        payload.update(
+            {
+                "token_kind": token_refresh.kind_of(auth_credentials),
+                "token_id": str(auth_credentials.pk),
+                "company_id": getattr(auth_credentials, "company_id", None),
+            }
+        )
     return payload
 
 
@@ -941,11 +1026,12 @@ def _queue_auth_failure_alert(auth_credentials, *, method, url, response, initia
     if not webhook_url:
         return
 
-    dedupe_id = (
-        getattr(auth_credentials, "location_id", None)
-        or getattr(auth_credentials, "pk", None)
-        or "unknown"
-    )
+    if auth_credentials is None:
+        dedupe_id = "unknown"
+    elif isinstance(auth_credentials, GHLAuthCredentials):
+        dedupe_id = auth_credentials.location_id or auth_credentials.pk
+    else:
+        dedupe_id = f"{token_refresh.kind_of(auth_credentials)}:{auth_credentials.pk}"
     cooldown = getattr(settings, "GHL_AUTH_FAILURE_ALERT_COOLDOWN_SECONDS", 3600)
     dedupe_key = f"ghl_auth_alert:{dedupe_id}"
     if not cache.add(dedupe_key, True, timeout=cooldown):
@@ -971,31 +1057,49 @@ def _queue_auth_failure_alert(auth_credentials, *, method, url, response, initia
 
 def ghl_request(method, url, *, headers=None, auth_credentials=None, retry_on_auth=True, timeout=60, **kwargs):
     """
-    Make a GHL API request. On 401 / Invalid JWT, refresh all tokens and retry once.
+    Make a GHL API request. On 401 / Invalid JWT, refresh the token behind the
+    request (single-flight, see core.token_refresh) and retry once.
 
-    auth_credentials: GHLAuthCredentials instance tied to the Bearer token (used to
-                      reload access_token after refresh).
+    auth_credentials: the row that owns the Bearer token -- GHLAuthCredentials,
+                      CompanyToken or AgencyToken. It is refreshed and reloaded on
+                      a 401; without it the 401 is returned as is.
     """
     headers = dict(headers or {})
-    response = requests.request(method, url, headers=headers, timeout=timeout, **kwargs)
+    response = http_client.request(method, url, headers=headers, timeout=timeout, **kwargs)
 
     if not retry_on_auth or not is_ghl_auth_error(response):
         return response
 
     initial_status = response.status_code
-    logger.warning(
-        "GHL auth error on %s %s (status=%s) — refreshing all tokens and retrying once",
-        method,
-        url,
-        initial_status,
-    )
-    refresh_all_ghl_tokens()
-
-    if auth_credentials is not None:
-        auth_credentials.refresh_from_db()
-        headers["Authorization"] = f"Bearer {auth_credentials.access_token}"
+    stale_token = (headers.get("Authorization") or "").removeprefix("Bearer ").strip()
+    if auth_credentials is None:
+        logger.warning(
+            "GHL auth error on %s %s (status=%s) with no token owner passed; not refreshing",
+            method,
+            url,
+            initial_status,
+        )
+    else:
+        logger.warning(
+            "GHL auth error on %s %s (status=%s) — refreshing %s %s and retrying once",
+            method,
+            url,
+            initial_status,
+            token_refresh.kind_of(auth_credentials),
+            getattr(auth_credentials, "location_id", None) or auth_credentials.pk,
+        )
+    if auth_credentials is None or not token_refresh.refresh_after_auth_error(auth_credentials, stale_token):
+        _queue_auth_failure_alert(
+            auth_credentials,
+            method=method,
+            url=url,
+            response=response,
+            initial_status=initial_status,
+        )
+        return response
 
-    retry_response = requests.request(method, url, headers=headers, timeout=timeout, **kwargs)
+    headers["Authorization"] = f"Bearer {auth_credentials.access_token}"
+    retry_response = http_client.request(method, url, headers=headers, timeout=timeout, **kwargs)
     if is_ghl_auth_error(retry_response):
         _queue_auth_failure_alert(
             auth_credentials,
@@ -0,0 +1,163 @@
+"""
+Shared HTTP client for outbound calls to TransmitSMS and GoHighLevel.
+
+One requests.Session per host per process, so sends reuse keep-alive TCP/TLS
+connections instead of handshaking on every message. Every call gets a
+(connect, read) timeout and bounded urllib3 retries:
+
+    - connect errors are retried for every method (nothing reached the server)
+    - read errors / 502-504 are retried only for idempotent methods, so a POST
+      that may already have sent an SMS is never replayed
+
+Tuning lives in settings (HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE,
+HTTP_MAX_RETRIES, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT). Per-host call
+counts and latency are kept in-process; see get_stats().
+
+HTTP_HOST_OVERRIDES ({"api.transmitsms.com": "http://127.0.0.1:9101", ...})
+re-points provider hosts, e.g. at the fakes in sms_management_app.fake_providers
+for load tests. Empty in production.
+"""
+
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = (502, 503, 504)
+
+_lock = threading.Lock()
+_sessions = {}
+_sessions_pid = None
+_stats = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _build_session():
+    max_retries = _setting("HTTP_MAX_RETRIES", 2)
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=IDEMPOTENT_METHODS,
+        backoff_factor=0.2,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=_setting("HTTP_POOL_CONNECTIONS", 10),
+        pool_maxsize=_setting("HTTP_POOL_MAXSIZE", 20),
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(url):
+    """Keep-alive session for the URL's host (rebuilt after fork — pools must not be shared)."""
+    global _sessions_pid
+    host = urlsplit(url).netloc.lower()
+    pid = os.getpid()
+    with _lock:
+        if _sessions_pid != pid:
+            _sessions.clear()
+            _stats.clear()
+            _sessions_pid = pid
+        session = _sessions.get(host)
+        if session is None:
+            session = _sessions[host] = _build_session()
+        return session
+
+
+def _resolve_timeout(timeout):
+    """Scalar timeouts from callers are treated as the read timeout."""
+    connect_timeout = _setting("HTTP_CONNECT_TIMEOUT", 5)
+    if timeout is None:
+        return (connect_timeout, _setting("HTTP_READ_TIMEOUT", 30))
+    if isinstance(timeout, (tuple, list)):
+        return tuple(timeout)
+    return (min(connect_timeout, timeout), timeout)
+
+
+def _record(host, elapsed_ms, failed):
+    with _lock:
+        bucket = _stats.setdefault(host, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+        bucket["calls"] += 1
+        bucket["total_ms"] += elapsed_ms
+        bucket["max_ms"] = max(bucket["max_ms"], elapsed_ms)
+        if failed:
+            bucket["errors"] += 1
+
+
+def _apply_host_override(url):
+    overrides = _setting("HTTP_HOST_OVERRIDES", None)
+    if not overrides:
+        return url
+    parts = urlsplit(url)
+    base = overrides.get(parts.netloc.lower())
+    if not base:
+        return url
+    target = urlsplit(base)
+    return urlunsplit((target.scheme, target.netloc, parts.path, parts.query, parts.fragment))
+
+
+def request(method, url, *, timeout=None, **kwargs):
+    """Drop-in for requests.request using the pooled per-host session."""
+    url = _apply_host_override(url)
+    session = get_session(url)
+    host = urlsplit(url).netloc.lower()
+    started = time.perf_counter()
+    failed = True
+    try:
+        response = session.request(method, url, timeout=_resolve_timeout(timeout), **kwargs)
+        failed = response.status_code >= 500
+        return response
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _record(host, elapsed_ms, failed)
+        logger.debug("%s %s took %.1f ms", method.upper(), url, elapsed_ms)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
+
+
+def get_stats():
+    """Per-host {calls, errors, avg_ms, max_ms} for this process."""
+    with _lock:
+        return {
+            host: {
+                "calls": s["calls"],
+                "errors": s["errors"],
+                "avg_ms": round(s["total_ms"] / s["calls"], 2) if s["calls"] else 0.0,
+                "max_ms": round(s["max_ms"], 2),
+            }
+            for host, s in _stats.items()
+        }
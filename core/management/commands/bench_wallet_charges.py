@@ -0,0 +1,113 @@
+"""
+Wallet charge throughput: per-message row lock vs credit reservations.
+
+Creates a throwaway GHL account + wallet (bulk_create, so no onboarding signals
+fire), forks N worker processes that all charge the same wallet, and reports
+charges/sec for each worker count. The account and its ledger are deleted at
+the end.
+
+Examples:
+
+    python manage.py bench_wallet_charges
+
+    # 2000 charges per run, only the reservation path
+    python manage.py bench_wallet_charges --charges 2000 --workers 1,4,8,16 --mode reserve
+"""
+
+import multiprocessing
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Sum
+
+from core import wallet_reservations
+from core.models import GHLAuthCredentials, Wallet, WalletTransaction
+
+MESSAGE = "Benchmark message"
+
+
+def _worker(wallet_id, mode, charges, results):
+    # Each forked child opens its own DB connection lazily.
+    wallet = Wallet(pk=wallet_id)
+    started = time.perf_counter()
+    for _ in range(charges):
+        if mode == "reserve":
+            wallet_reservations.charge(wallet_id, "outbound", MESSAGE)
+        else:
+            wallet.charge_message("outbound", MESSAGE)
+    wallet_reservations.release_local_holds()
+    results.put(time.perf_counter() - started)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Benchmark wallet charges/sec by worker count (row lock vs reservations)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--charges", type=int, default=1000, help="Total charges per run")
+        parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker counts")
+        parser.add_argument("--mode", choices=["lock", "reserve", "both"], default="both")
+
+    def handle(self, *args, **options):
+        try:
+            worker_counts = [int(w) for w in options["workers"].split(",") if w.strip()]
+        except ValueError:
+            raise CommandError("--workers must be a comma-separated list of integers")
+        total = options["charges"]
+        modes = ["lock", "reserve"] if options["mode"] == "both" else [options["mode"]]
+
+        account_id = uuid.uuid4()
+        GHLAuthCredentials.objects.bulk_create([
+            GHLAuthCredentials(
+                id=account_id,
+                user_id="bench",
+                access_token="bench",
+                refresh_token="bench",
+                expires_in=0,
+                location_id=f"bench-{account_id.hex[:12]}",
+                location_name="Wallet benchmark",
+            )
+        ])
+        wallet = Wallet.objects.create(
+            account_id=account_id,
+            balance=Decimal("10000000.00"),
+            cred_remaining=Decimal("10000000.00"),
+        )
+
+        ctx = multiprocessing.get_context("fork")
+        try:
+            self.stdout.write(f"{'mode':<8} {'workers':>7} {'charges':>8} {'seconds':>8} {'charges/s':>10}")
+            for mode in modes:
+                for workers in worker_counts:
+                    per_worker = max(1, total // workers)
+                    results = ctx.Queue()
+                    connections.close_all()
+                    started = time.perf_counter()
+                    procs = [
+                        ctx.Process(target=_worker, args=(wallet.pk, mode, per_worker, results))
+                        for _ in range(workers)
+                    ]
+                    for proc in procs:
+                        proc.start()
+                    for proc in procs:
+                        proc.join()
+                    elapsed = time.perf_counter() - started
+                    failed = sum(1 for proc in procs if proc.exitcode != 0)
+                    done = per_worker * (workers - failed)
+                    self.stdout.write(
+                        f"{mode:<8} {workers:>7} {done:>8} {elapsed:>8.2f} {done / elapsed:>10.0f}"
+                        + (f"  ({failed} worker(s) failed)" if failed else "")
+                    )
+
+            # Ledger must match the balance movement exactly.
+            wallet.refresh_from_db()
+            debits = WalletTransaction.objects.filter(wallet=wallet, transaction_type="debit")
+            self.stdout.write(
+                f"ledger: {debits.count()} debit rows, total {debits.aggregate(t=Sum('amount'))['t'] or 0}, "
+                f"wallet reserved={wallet.reserved}"
+            )
+        finally:
+            GHLAuthCredentials.objects.filter(pk=account_id).delete()
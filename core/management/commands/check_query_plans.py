@@ -0,0 +1,131 @@
+"""
+EXPLAIN the hot-path SMSMessage / WalletTransaction queries and fail on sequential scans.
+
+Sample keys are taken from the live tables so the planner sees realistic
+values. A sequential scan only counts as a regression on tables whose planner
+row estimate (pg_class.reltuples) is at least --min-rows; on small tables a seq
+scan is the right plan.
+
+Exits non-zero (CommandError) when any query regresses, so it can run in CI or
+after a deploy.
+
+Examples:
+
+    python manage.py check_query_plans
+
+    # Also show every plan, and treat tables of 1k+ rows as large
+    python manage.py check_query_plans --verbose-plans --min-rows 1000
+"""
+
+import json
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Wallet, WalletTransaction
+from sms_management_app.models import SMSMessage
+
+
+def _sample(model, field, **filters):
+    value = (
+        model.objects.filter(**filters).exclude(**{f"{field}__isnull": True})
+        .order_by("-pk").values_list(field, flat=True).first()
+    )
+    return value if value is not None else "__missing__"
+
+
+def hot_queries():
+    """(name, queryset) pairs for the lookups on the request/worker hot paths."""
+    ghl_message_id = _sample(SMSMessage, "ghl_message_id")
+    transmit_message_id = _sample(SMSMessage, "transmit_message_id")
+    account_id = SMSMessage.objects.order_by("-created_at").values_list("ghl_account_id", flat=True).first()
+    wallet_id = Wallet.objects.values_list("pk", flat=True).first()
+    # Position of a deep cursor page (?pagination=cursor).
+    cursor_at, cursor_pk = (
+        SMSMessage.objects.filter(ghl_account_id=account_id).order_by("created_at")
+        .values_list("created_at", "pk").first()
+    ) or (timezone.now(), uuid.UUID(int=0))
+
+    return [
+        ("sms by ghl_message_id (idempotency, MMS DLR)",
+         SMSMessage.objects.filter(ghl_message_id=ghl_message_id)),
+        ("sms by ghl_message_id + account (reply threading)",
+         SMSMessage.objects.filter(ghl_message_id=ghl_message_id, ghl_account_id=account_id)),
+        ("sms by transmit_message_id (SMS DLR)",
+         SMSMessage.objects.filter(transmit_message_id=transmit_message_id)),
+        ("sms by transmit_message_id IN (batched DLR)",
+         SMSMessage.objects.filter(transmit_message_id__in=[transmit_message_id, "__missing__"])),
+        ("sms recent per account (dashboard/list)",
+         SMSMessage.objects.filter(ghl_account_id=account_id).order_by("-created_at")[:50]),
+        ("sms cursor page per account (keyset pagination)",
+         SMSMessage.objects.filter(ghl_account_id=account_id, created_at__lte=cursor_at)
+         .filter(Q(created_at__lt=cursor_at) | Q(pk__lt=cursor_pk))
+         .order_by("-created_at", "-pk")[:50]),
+        ("sms queued (requeue on top-up)",
+         SMSMessage.objects.filter(status="queued").order_by("created_at")[:100]),
+        ("sms failed/pending (bulk retry)",
+         SMSMessage.objects.filter(status__in=["failed", "pending"]).order_by("-created_at")[:100]),
+        ("wallet transactions per wallet",
+         WalletTransaction.objects.filter(wallet_id=wallet_id).order_by("-created_at")[:50]),
+        ("wallet transactions recent (admin list)",
+         WalletTransaction.objects.order_by("-created_at")[:50]),
+    ]
+
+
+def _seq_scans(plan):
+    """Relation names of every Seq Scan node in a JSON plan tree."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def _estimated_rows(table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        row = cursor.fetchone()
+    return max(0, row[0]) if row else 0
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN on hot-path queries and fail if any seq-scans a large table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-rows", dest="min_rows", type=int, default=10000,
+                            help="Seq scans on tables with fewer estimated rows are allowed")
+        parser.add_argument("--verbose-plans", dest="verbose_plans", action="store_true",
+                            help="Print the text plan of every query")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("check_query_plans needs PostgreSQL")
+
+        min_rows = options["min_rows"]
+        table_rows = {}
+        regressions = []
+
+        for name, queryset in hot_queries():
+            plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+            large = []
+            for table in _seq_scans(plan):
+                if table not in table_rows:
+                    table_rows[table] = _estimated_rows(table)
+                if table_rows[table] >= min_rows:
+                    large.append(f"{table} (~{table_rows[table]} rows)")
+
+            if large:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f"SEQ SCAN  {name}: {', '.join(large)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok        {name}"))
+            if options["verbose_plans"] or large:
+                for line in queryset.explain().splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} hot-path query(s) fall back to a sequential scan")
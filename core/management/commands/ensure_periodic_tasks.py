@@ -22,12 +22,19 @@ from django_celery_beat.models import PeriodicTask
 
 # Slightly longer than the configured interval to avoid false positives.
 TASK_MAX_AGE = {
-    "make-api-call-every-6-hours": timedelta(hours=11),
-    "make-api-call-for-agency-every-6-hours": timedelta(hours=11),
-    "make-api-call-for-company-every-6-hours": timedelta(hours=11),
+    "schedule-oauth-refreshes": timedelta(minutes=15),
     "sync-contact-wallet-custom-fields-every-10-hours": timedelta(hours=11),
     "make-api-call-for-sync_numbers": timedelta(hours=25),
     "sync-client-owned-numbers": timedelta(hours=25),
+    "drain-ghl-webhook-inbox": timedelta(minutes=10),
+    "release-expired-wallet-reservations": timedelta(minutes=10),
+    "apply-transmit-dlrs": timedelta(minutes=10),
+    "flush-ghl-status-updates": timedelta(minutes=10),
+    "flush-campaign-sends": timedelta(minutes=10),
+    "relay-task-outbox": timedelta(minutes=10),
+    "fold-usage-rollups": timedelta(minutes=10),
+    "refresh-number-inventory": timedelta(minutes=30),
+    "sync-sms-credits-records": timedelta(minutes=45),
 }
 
 DEFAULT_MAX_AGE = timedelta(hours=25)
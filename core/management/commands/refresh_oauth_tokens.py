@@ -6,10 +6,14 @@ Use for deploy hooks, emergency token refresh, or cron outside Celery:
     python manage.py refresh_oauth_tokens
     python manage.py refresh_oauth_tokens --agency-only
     python manage.py refresh_oauth_tokens --locations-only
+
+    # Only tokens close to expiry (same rule as schedule_oauth_refreshes)
+    python manage.py refresh_oauth_tokens --due
 """
 
 from django.core.management.base import BaseCommand
 
+from core import token_refresh
 from core.tasks import make_api_call, make_api_call_for_agency_token, make_api_call_for_company_token
 
 
@@ -32,8 +36,19 @@ class Command(BaseCommand):
             action="store_true",
             help="Only refresh GHLAuthCredentials (location) rows",
         )
+        parser.add_argument(
+            "--due",
+            action="store_true",
+            help="Only refresh tokens that are close to expiry (all kinds)",
+        )
 
     def handle(self, *args, **options):
+        if options["due"]:
+            self.stdout.write("Refreshing tokens close to expiry...")
+            counts = token_refresh.refresh_due_now()
+            self.stdout.write(self.style.SUCCESS(f"Due token refresh finished: {counts}"))
+            return
+
         agency_only = options["agency_only"]
         company_only = options["company_only"]
         locations_only = options["locations_only"]
@@ -0,0 +1,70 @@
+"""
+Publish TaskOutbox rows to Celery (long-running; see deploy/systemd/reloop-outbox-relay.service).
+
+Sleeps on Postgres LISTEN and relays as soon as a transaction that wrote outbox
+rows commits; --poll-seconds bounds how long a row can wait if a notify is
+missed. A broker outage only pauses the loop — rows stay in Postgres.
+
+Examples:
+
+    python manage.py run_outbox_relay
+
+    # Publish whatever is pending once and exit
+    python manage.py run_outbox_relay --once
+"""
+
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import outbox
+
+# Back-off after a broker/DB error so a dead broker is not hammered.
+ERROR_SLEEP_SECONDS = 2
+
+
+class Command(BaseCommand):
+    help = "Relay pending TaskOutbox rows to the Celery broker in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=outbox.RELAY_BATCH_SIZE)
+        parser.add_argument("--poll-seconds", dest="poll_seconds", type=float, default=1.0,
+                            help="Relay at least this often even without a notify")
+        parser.add_argument("--once", action="store_true", help="Relay pending rows once and exit")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if options["once"]:
+            published = outbox.relay_pending(batch_size)
+            self.stdout.write(f"Published {published} outbox row(s)")
+            return
+
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write(f"Outbox relay listening on {outbox.NOTIFY_CHANNEL}")
+        listening = False
+        while not self._stopping:
+            try:
+                if not listening:
+                    outbox.listen()
+                    listening = True
+                published = outbox.relay_pending(batch_size)
+                if published:
+                    self.stdout.write(f"Published {published} outbox row(s)")
+                if published < batch_size:
+                    outbox.wait_for_notify(options["poll_seconds"])
+            except Exception as e:
+                self.stderr.write(f"Outbox relay error: {e}")
+                # Drop the connection (and with it the LISTEN); re-subscribe next loop.
+                connection.close()
+                listening = False
+                time.sleep(ERROR_SLEEP_SECONDS)
+
+        self.stdout.write("Outbox relay stopped")
+
+    def _stop(self, signum, frame):
+        self._stopping = True
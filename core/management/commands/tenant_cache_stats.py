@@ -0,0 +1,47 @@
+"""
+Show hit ratios for the two-tier tenant cache (core.tenant_cache).
+
+Counters are aggregated across all gunicorn and Celery processes (each process
+flushes its counters to Redis every few seconds).
+
+Examples:
+
+    python manage.py tenant_cache_stats
+
+    # Start a fresh measurement window
+    python manage.py tenant_cache_stats --reset
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import tenant_cache
+
+
+class Command(BaseCommand):
+    help = "Show L1/L2 hit ratios for cached tenant lookups."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Clear the shared counters after printing.")
+        parser.add_argument("--json", action="store_true", help="Print raw JSON.")
+
+    def handle(self, *args, **options):
+        stats = tenant_cache.get_stats()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, indent=2, sort_keys=True))
+        elif not stats:
+            self.stdout.write("No tenant cache lookups recorded yet.")
+        else:
+            self.stdout.write(f"{'lookup':<12} {'l1_hit':>10} {'l2_hit':>10} {'miss':>10} {'hit_ratio':>10}")
+            for namespace in sorted(stats):
+                row = stats[namespace]
+                ratio = "-" if row["hit_ratio"] is None else f"{row['hit_ratio'] * 100:.1f}%"
+                self.stdout.write(
+                    f"{namespace:<12} {row['l1_hit']:>10} {row['l2_hit']:>10} {row['miss']:>10} {ratio:>10}"
+                )
+
+        if options["reset"]:
+            tenant_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Tenant cache counters reset."))
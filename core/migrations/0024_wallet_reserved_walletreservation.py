@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_seed_ghl_inbox_drain_periodic_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='reserved',
+            field=models.DecimalField(decimal_places=3, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.CreateModel(
+            name='WalletReservation',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('holder', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('settled_amount', models.DecimalField(decimal_places=3, default=Decimal('0.00'), max_digits=12)),
+                ('settled_entries', models.PositiveIntegerField(default=0)),
+                ('inbound_segment_charge', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('outbound_segment_charge', models.DecimalField(decimal_places=3, max_digits=6)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('released', 'Released')], default='active', max_length=10)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='core.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='wallet_res_status_exp_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def seed_transmit_dlr_apply_periodic_task(apps, schema_editor):
+    CrontabSchedule = apps.get_model("django_celery_beat", "CrontabSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    crontab, _ = CrontabSchedule.objects.get_or_create(
+        minute="*",
+        hour="*",
+        day_of_month="*",
+        month_of_year="*",
+        day_of_week="*",
+        timezone="UTC",
+    )
+
+    PeriodicTask.objects.update_or_create(
+        name="apply-transmit-dlrs",
+        defaults={
+            "task": "sms_management_app.tasks.apply_transmit_dlrs",
+            "crontab": crontab,
+            "queue": "ingest",
+            "enabled": True,
+            "description": "Apply buffered TransmitSMS DLRs (safety sweep for TRANSMIT_DLR_BATCHING).",
+        },
+    )
+
+    PeriodicTasks.objects.update_or_create(
+        ident=1,
+        defaults={"last_update": timezone.now()},
+    )
+
+
+def unseed_transmit_dlr_apply_periodic_task(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    PeriodicTask.objects.filter(name="apply-transmit-dlrs").delete()
+    PeriodicTasks.objects.update_or_create(
+        ident=1,
+        defaults={"last_update": timezone.now()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0025_seed_wallet_reservation_sweep_periodic_task"),
+        ("django_celery_beat", "0019_alter_periodictasks_options"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            seed_transmit_dlr_apply_periodic_task,
+            unseed_transmit_dlr_apply_periodic_task,
+        ),
+    ]
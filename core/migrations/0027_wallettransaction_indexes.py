@@ -0,0 +1,22 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("core", "0026_seed_transmit_dlr_apply_periodic_task"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="wallettransaction",
+            index=models.Index(fields=["wallet", "-created_at"], name="wallet_txn_wallet_created_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="wallettransaction",
+            index=models.Index(fields=["-created_at"], name="wallet_txn_created_idx"),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def seed_ghl_status_flush_periodic_task(apps, schema_editor):
+    CrontabSchedule = apps.get_model("django_celery_beat", "CrontabSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    crontab, _ = CrontabSchedule.objects.get_or_create(
+        minute="*",
+        hour="*",
+        day_of_month="*",
+        month_of_year="*",
+        day_of_week="*",
+        timezone="UTC",
+    )
+
+    PeriodicTask.objects.update_or_create(
+        name="flush-ghl-status-updates",
+        defaults={
+            "task": "sms_management_app.tasks.flush_ghl_status_updates",
+            "crontab": crontab,
+            "queue": "celery",
+            "enabled": True,
+            "description": "Send coalesced GHL status updates (safety flush for missed kicks).",
+        },
+    )
+
+    PeriodicTasks.objects.update_or_create(
+        ident=1,
+        defaults={"last_update": timezone.now()},
+    )
+
+
+def unseed_ghl_status_flush_periodic_task(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    PeriodicTask.objects.filter(name="flush-ghl-status-updates").delete()
+    PeriodicTasks.objects.update_or_create(
+        ident=1,
+        defaults={"last_update": timezone.now()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0027_wallettransaction_indexes"),
+        ("django_celery_beat", "0019_alter_periodictasks_options"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            seed_ghl_status_flush_periodic_task,
+            unseed_ghl_status_flush_periodic_task,
+        ),
+    ]
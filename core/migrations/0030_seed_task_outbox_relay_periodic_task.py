@@ -0,0 +1,59 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def seed_task_outbox_relay_periodic_task(apps, schema_editor):
+    CrontabSchedule = apps.get_model("django_celery_beat", "CrontabSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    crontab, _ = CrontabSchedule.objects.get_or_create(
+        minute="*",
+        hour="*",
+        day_of_month="*",
+        month_of_year="*",
+        day_of_week="*",
+        timezone="UTC",
+    )
+
+    PeriodicTask.objects.update_or_create(
+        name="relay-task-outbox",
+        defaults={
+            "task": "core.tasks.relay_task_outbox",
+            "crontab": crontab,
+            "queue": "celery",
+            "enabled": True,
+            "description": "Publish pending TaskOutbox rows (backstop for run_outbox_relay) and purge old ones.",
+        },
+    )
+
+    PeriodicTasks.objects.update_or_create(
+        ident=1,
+        defaults={"last_update": timezone.now()},
+    )
+
+
+def unseed_task_outbox_relay_periodic_task(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    PeriodicTask.objects.filter(name="relay-task-outbox").delete()
+    PeriodicTasks.objects.update_or_create(
+        ident=1,
+        defaults={"last_update": timezone.now()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0029_taskoutbox"),
+        ("django_celery_beat", "0019_alter_periodictasks_options"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            seed_task_outbox_relay_periodic_task,
+            unseed_task_outbox_relay_periodic_task,
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Statement-level triggers with transition tables: one delta row per
+# (wallet, day, type) per statement, however many ledger rows it touched.
+WALLET_USAGE_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION core_wallet_usage_delta() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO core_walletusagedelta (wallet_id, day, transaction_type, transaction_count, amount)
+        SELECT wallet_id, (created_at AT TIME ZONE 'UTC')::date, transaction_type, COUNT(*), SUM(amount)
+        FROM new_rows
+        GROUP BY 1, 2, 3;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO core_walletusagedelta (wallet_id, day, transaction_type, transaction_count, amount)
+        SELECT wallet_id, (created_at AT TIME ZONE 'UTC')::date, transaction_type, -COUNT(*), -SUM(amount)
+        FROM old_rows
+        GROUP BY 1, 2, 3;
+    ELSE
+        INSERT INTO core_walletusagedelta (wallet_id, day, transaction_type, transaction_count, amount)
+        SELECT wallet_id, day, transaction_type, SUM(n), SUM(amount)
+        FROM (
+            SELECT wallet_id, (created_at AT TIME ZONE 'UTC')::date AS day, transaction_type, 1 AS n, amount
+            FROM new_rows
+            UNION ALL
+            SELECT wallet_id, (created_at AT TIME ZONE 'UTC')::date, transaction_type, -1, -amount
+            FROM old_rows
+        ) changes
+        GROUP BY 1, 2, 3
+        HAVING SUM(n) <> 0 OR SUM(amount) <> 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_wallet_usage_insert AFTER INSERT ON core_wallettransaction
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_wallet_usage_delta();
+CREATE TRIGGER core_wallet_usage_update AFTER UPDATE ON core_wallettransaction
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_wallet_usage_delta();
+CREATE TRIGGER core_wallet_usage_delete AFTER DELETE ON core_wallettransaction
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_wallet_usage_delta();
+"""
+
+DROP_WALLET_USAGE_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS core_wallet_usage_insert ON core_wallettransaction;
+DROP TRIGGER IF EXISTS core_wallet_usage_update ON core_wallettransaction;
+DROP TRIGGER IF EXISTS core_wallet_usage_delete ON core_wallettransaction;
+DROP FUNCTION IF EXISTS core_wallet_usage_delta();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_seed_task_outbox_relay_periodic_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletUsageDelta',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('wallet_id', models.UUIDField()),
+                ('day', models.DateField()),
+                ('transaction_type', models.CharField(max_length=10)),
+                ('transaction_count', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WalletDailyUsage',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('transaction_type', models.CharField(max_length=10)),
+                ('transaction_count', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to='core.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='wallet_daily_usage_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('wallet', 'day', 'transaction_type'), name='wallet_daily_usage_bucket_uniq')],
+            },
+        ),
+        migrations.RunSQL(WALLET_USAGE_TRIGGERS_SQL, DROP_WALLET_USAGE_TRIGGERS_SQL),
+    ]
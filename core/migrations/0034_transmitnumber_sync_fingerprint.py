@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_seed_number_inventory_periodic_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transmitnumber',
+            name='sync_fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:05
+
+from django.db import migrations, models
+from django.db.models.expressions import RawSQL
+
+
+def backfill_token_expires_at(apps, schema_editor):
+    # Best estimate for existing rows: last write + token lifetime.
+    for model_name in ('AgencyToken', 'CompanyToken', 'GHLAuthCredentials'):
+        model = apps.get_model('core', model_name)
+        model.objects.filter(token_expires_at__isnull=True).update(
+            token_expires_at=RawSQL("updated_at + expires_in * interval '1 second'", [])
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_transmitnumber_sync_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agencytoken',
+            name='token_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='companytoken',
+            name='token_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ghlauthcredentials',
+            name='token_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_token_expires_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations
+from django.utils import timezone
+
+LEGACY_TASKS = [
+    "make-api-call-every-6-hours",
+    "make-api-call-for-agency-every-6-hours",
+    "make-api-call-for-company-every-6-hours",
+]
+
+
+def seed_oauth_refresh_periodic_task(apps, schema_editor):
+    CrontabSchedule = apps.get_model("django_celery_beat", "CrontabSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    crontab, _ = CrontabSchedule.objects.get_or_create(
+        minute="*/5",
+        hour="*",
+        day_of_month="*",
+        month_of_year="*",
+        day_of_week="*",
+        timezone="UTC",
+    )
+
+    PeriodicTask.objects.update_or_create(
+        name="schedule-oauth-refreshes",
+        defaults={
+            "task": "core.tasks.schedule_oauth_refreshes",
+            "crontab": crontab,
+            "queue": "critical",
+            "enabled": True,
+            "description": "Queue refreshes for GHL OAuth tokens close to expiry.",
+        },
+    )
+    # Superseded: these refreshed every token every 10 hours.
+    PeriodicTask.objects.filter(name__in=LEGACY_TASKS).update(enabled=False)
+
+    PeriodicTasks.objects.update_or_create(
+        ident=1,
+        defaults={"last_update": timezone.now()},
+    )
+
+
+def unseed_oauth_refresh_periodic_task(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    PeriodicTask.objects.filter(name="schedule-oauth-refreshes").delete()
+    PeriodicTask.objects.filter(name__in=LEGACY_TASKS).update(enabled=True)
+    PeriodicTasks.objects.update_or_create(
+        ident=1,
+        defaults={"last_update": timezone.now()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0035_token_expires_at"),
+        ("django_celery_beat", "0019_alter_periodictasks_options"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            seed_oauth_refresh_periodic_task,
+            unseed_oauth_refresh_periodic_task,
+        ),
+    ]
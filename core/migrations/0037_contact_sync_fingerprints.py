@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_seed_oauth_refresh_periodic_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ghlauthcredentials',
+            name='contact_fields_fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='ghl_record_fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0037_contact_sync_fingerprints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SMSCreditsRecord',
+            fields=[
+                ('record_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('location_id', models.CharField(blank=True, db_index=True, default='', max_length=255)),
+                ('account_id', models.CharField(blank=True, db_index=True, default='', max_length=255)),
+                ('business_name', models.CharField(blank=True, db_index=True, default='', max_length=255)),
+                ('properties', models.JSONField(default=dict)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
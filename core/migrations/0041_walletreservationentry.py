@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_seed_campaign_send_flush_periodic_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletReservationEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('segments', models.PositiveIntegerField()),
+                ('direction', models.CharField(max_length=10)),
+                ('reference_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='core.walletreservation')),
+            ],
+        ),
+    ]
@@ -12,6 +12,8 @@ class AgencyToken(models.Model):
     access_token = models.TextField()
     token_type = models.CharField(max_length=50, default='Bearer')
     expires_in = models.PositiveIntegerField(default=86399)
+    # When the current access token expires (set on every token write).
+    token_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
     refresh_token = models.TextField()
     scope = models.TextField(blank=True, null=True)
     refresh_token_id = models.CharField(max_length=128, blank=True, null=True)
@@ -30,6 +32,8 @@ class CompanyToken(models.Model):
     access_token = models.TextField()
     token_type = models.CharField(max_length=50, default="Bearer")
     expires_in = models.PositiveIntegerField(default=86399)
+    # When the current access token expires (set on every token write).
+    token_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
     refresh_token = models.TextField()
     scope = models.TextField(blank=True, null=True)
     refresh_token_id = models.CharField(max_length=128, blank=True, null=True)
@@ -51,6 +55,8 @@ class GHLAuthCredentials(models.Model):
     access_token = models.TextField()
     refresh_token = models.TextField()
     expires_in = models.IntegerField()
+    # When the current access token expires (set on every token write).
+    token_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
     scope = models.TextField(null=True, blank=True)
     user_type = models.CharField(max_length=50, null=True, blank=True)
     company_id = models.CharField(max_length=255, null=True, blank=True)
@@ -68,6 +74,8 @@ class GHLAuthCredentials(models.Model):
         blank=True,
         help_text="Mapped GoHighLevel contact ID used for contact custom field sync",
     )
+    # Hash of the contact custom field values last pushed by sync_contact_wallet_custom_fields.
+    contact_fields_fingerprint = models.CharField(max_length=64, null=True, blank=True)
 
     business_email = models.EmailField(null=True, blank=True, help_text="Business email for TransmitSMS account")
     business_phone = models.CharField(max_length=20, null=True, blank=True, help_text="Business phone number in E.164 format")
@@ -134,11 +142,16 @@ class Wallet(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     account = models.OneToOneField(GHLAuthCredentials, on_delete=models.CASCADE, related_name="wallet")
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Credit held by active WalletReservation blocks (spent by workers without the
+    # row lock, settled to the ledger in batches). Spendable credit = balance - reserved.
+    reserved = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal("0.00"))
 
     inbound_segment_charge = models.DecimalField(max_digits=6, decimal_places=2, default=0.00)  # per segment
     outbound_segment_charge = models.DecimalField(max_digits=6, decimal_places=3, default=0.074)
 
     ghl_object_id = models.CharField(max_length=255, blank=True, null=True)
+    # Hash of the record payload last pushed by sync_all_wallets_with_ghl.
+    ghl_record_fingerprint = models.CharField(max_length=64, null=True, blank=True)
     
     cred_purchased = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal("0.00"))
     cred_spent = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal("0.00"))
@@ -156,21 +169,27 @@ class Wallet(models.Model):
     def __str__(self):
         return f"Wallet for {self.account.user_id} - Balance: {self.balance}"
 
+    @property
+    def available_balance(self):
+        return self.balance - self.reserved
+
     def charge_message(self, direction: str, message: str, reference_id=None):
         """Charge wallet for inbound or outbound message"""
         segments = (len(message) // 160) + (1 if len(message) % 160 else 0)
 
-        if direction == "inbound":
-            cost = segments * self.inbound_segment_charge
-        elif direction == "outbound":
-            cost = segments * self.outbound_segment_charge
-        else:
+        if direction not in ("inbound", "outbound"):
             raise ValidationError("Invalid message direction")
 
         with transaction.atomic():
             wallet = Wallet.objects.select_for_update().get(pk=self.pk)
 
-            if wallet.balance < cost:
+            # Price from the locked row so a pk-only handle (see core.tenant_cache) charges correctly.
+            if direction == "inbound":
+                cost = segments * wallet.inbound_segment_charge
+            else:
+                cost = segments * wallet.outbound_segment_charge
+
+            if wallet.available_balance < cost:
                 raise ValidationError("Insufficient balance to send message")
 
             # Deduct balance
@@ -255,6 +274,48 @@ class Wallet(models.Model):
                 segments=segments,
             )
 
+    def refund_batch(self, items):
+        """Apply several refunds under one row lock, with one credit ledger row per item.
+
+        ``items`` is a list of dicts with ``amount`` and optional ``reference_id``,
+        ``description``, ``segments`` and ``direction`` — the same meaning as the
+        ``refund`` arguments (wallet segments are adjusted per item).
+        """
+        if not items:
+            return
+        with transaction.atomic():
+            wallet = Wallet.objects.select_for_update().get(pk=self.pk)
+            ledger = []
+            for item in items:
+                amount = Decimal(str(item["amount"]))
+                segments = item.get("segments")
+                if segments is not None:
+                    seg_delta = int(segments)
+                elif wallet.outbound_segment_charge and wallet.outbound_segment_charge > 0:
+                    seg_delta = int(amount / wallet.outbound_segment_charge)
+                else:
+                    seg_delta = 0
+
+                # Same per-refund rounding as saving balance after each refund().
+                wallet.balance = (wallet.balance + amount).quantize(Decimal("0.01"))
+                wallet.cred_remaining += amount
+                wallet.seg_remaining += seg_delta
+                wallet.seg_used -= seg_delta
+
+                ledger.append(WalletTransaction(
+                    wallet=wallet,
+                    transaction_type="credit",
+                    amount=amount,
+                    balance_after=wallet.balance,
+                    description=item.get("description") or "Refund",
+                    reference_id=item.get("reference_id"),
+                    direction=item.get("direction"),
+                    segments=segments,
+                ))
+
+            wallet.save(update_fields=["balance", "cred_remaining", "seg_remaining", "seg_used"])
+            WalletTransaction.objects.bulk_create(ledger)
+
 
     def add_funds(self, amount: float, reference_id=None, gift=None):
         """Add funds from webhook/payment"""
@@ -324,7 +385,7 @@ class Wallet(models.Model):
         with transaction.atomic():
             wallet = Wallet.objects.select_for_update().get(pk=self.pk)
 
-            if wallet.balance < amount:
+            if wallet.available_balance < amount:
                 raise ValidationError("Insufficient balance to deduct funds.")
 
             wallet.balance -= amount
@@ -380,11 +441,73 @@ class WalletTransaction(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["wallet", "-created_at"], name="wallet_txn_wallet_created_idx"),
+            models.Index(fields=["-created_at"], name="wallet_txn_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.wallet.account.user_id} | {self.transaction_type} {self.amount} | Balance: {self.balance_after}"
 
 
+class WalletReservation(models.Model):
+    """
+    A block of wallet credit held by one worker/campaign (see core.wallet_reservations).
+
+    Reserving moves credit into Wallet.reserved under one row lock; each charge is
+    then a WalletReservationEntry row, settled into WalletTransaction rows in
+    batches. Unused credit goes back to the wallet when the reservation is
+    released or expires.
+    """
+    STATUS_CHOICES = (
+        ("active", "Active"),
+        ("released", "Released"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    wallet = models.ForeignKey("Wallet", on_delete=models.CASCADE, related_name="reservations")
+    holder = models.CharField(max_length=255)  # e.g. "celery@host:1234"
+    amount = models.DecimalField(max_digits=12, decimal_places=3)
+    # Amount already written to the ledger, and how many entries that covers.
+    settled_amount = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal("0.00"))
+    settled_entries = models.PositiveIntegerField(default=0)
+    # Per-segment rates captured at reserve time; charges are priced from these.
+    inbound_segment_charge = models.DecimalField(max_digits=6, decimal_places=2)
+    outbound_segment_charge = models.DecimalField(max_digits=6, decimal_places=3)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="active")
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(default=now)
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "expires_at"], name="wallet_res_status_exp_idx"),
+        ]
+
+    def __str__(self):
+        return f"Reservation {self.amount} on wallet {self.wallet_id} [{self.status}]"
+
+
+class WalletReservationEntry(models.Model):
+    """
+    One message charged against a WalletReservation, not yet in the ledger.
+
+    Inserted in the charging transaction without touching the wallet row, so the
+    debit commits (or rolls back) with the message. Settlement turns entries into
+    WalletTransaction rows and deletes them in the same transaction.
+    """
+    id = models.BigAutoField(primary_key=True)
+    reservation = models.ForeignKey(WalletReservation, on_delete=models.CASCADE, related_name="entries")
+    amount = models.DecimalField(max_digits=12, decimal_places=3)
+    segments = models.PositiveIntegerField()
+    direction = models.CharField(max_length=10)
+    reference_id = models.CharField(max_length=255, null=True, blank=True)
+    created_at = models.DateTimeField(default=now)
+
+    def __str__(self):
+        return f"Reservation entry {self.pk} {self.amount} ({self.direction})"
+
+
 
 
 class TransmitNumber(models.Model):
@@ -432,6 +555,9 @@ class TransmitNumber(models.Model):
         blank=True,
         help_text="The next scheduled renewal/charge date from TransmitSMS"
     )
+    # Hash of the get-numbers.json list entry at the last sync; while it is
+    # unchanged sync_client_owned_numbers skips the get-number.json detail call.
+    sync_fingerprint = models.CharField(max_length=64, null=True, blank=True)
 
     class Meta:
         # Ensure same number can't be duplicated for the same account
@@ -482,4 +608,93 @@ class StripeCustomerData(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.email} ({self.customer_id})"
\ No newline at end of file
+        return f"{self.email} ({self.customer_id})"
+
+class TaskOutbox(models.Model):
+    """
+    Celery publishes recorded in the same transaction as the rows they act on.
+
+    core.outbox.enqueue writes a row instead of calling .delay(); the outbox relay
+    publishes pending rows in batches after commit, so a slow or down broker can
+    neither stall a request nor lose a send the wallet was already charged for.
+    """
+    id = models.BigAutoField(primary_key=True)
+    task_name = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                name="task_outbox_pending_idx",
+                condition=models.Q(published_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        state = "published" if self.published_at else "pending"
+        return f"Outbox {self.pk} {self.task_name} [{state}]"
+
+
+class WalletDailyUsage(models.Model):
+    """
+    Per-wallet daily ledger totals by transaction type, read by the wallet summary
+    and dashboards. Maintained like sms_management_app.MessageDailyUsage: triggers
+    on WalletTransaction write WalletUsageDelta rows, folded in every minute.
+    """
+    id = models.BigAutoField(primary_key=True)
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="daily_usage")
+    day = models.DateField()
+    transaction_type = models.CharField(max_length=10)
+    transaction_count = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=3, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["wallet", "day", "transaction_type"], name="wallet_daily_usage_bucket_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="wallet_daily_usage_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet_id} {self.day} {self.transaction_type}: {self.amount}"
+
+
+class WalletUsageDelta(models.Model):
+    """Not-yet-folded changes to WalletDailyUsage, written by the WalletTransaction triggers."""
+    id = models.BigAutoField(primary_key=True)
+    # No FK, for the same reason as MessageUsageDelta.ghl_account_id.
+    wallet_id = models.UUIDField()
+    day = models.DateField()
+    transaction_type = models.CharField(max_length=10)
+    transaction_count = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=3, default=0)
+
+    def __str__(self):
+        return f"Wallet usage delta {self.pk} {self.day} {self.transaction_type}: {self.amount}"
+
+
+class SMSCreditsRecord(models.Model):
+    """
+    Local mirror of the main location's custom_objects.sms_credits records, kept
+    current by core.sms_credits_mirror (write-through from GHLService plus a
+    periodic reconcile). Lookups by location/account/business name read this
+    table instead of paging the GHL records search.
+    """
+    record_id = models.CharField(max_length=64, primary_key=True)
+    location_id = models.CharField(max_length=255, blank=True, default="", db_index=True)
+    account_id = models.CharField(max_length=255, blank=True, default="", db_index=True)
+    business_name = models.CharField(max_length=255, blank=True, default="", db_index=True)
+    properties = models.JSONField(default=dict)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"sms_credits {self.record_id} ({self.location_id or self.account_id})"
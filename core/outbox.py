@@ -0,0 +1,133 @@
+"""
+Transactional outbox for Celery publishes made from request handlers.
+
+    from core import outbox
+
+    with transaction.atomic():
+        sms.save(...)
+        outbox.enqueue(send_outbound_sms_task, str(sms.id))
+
+With TASK_OUTBOX_ENABLED, enqueue() inserts a TaskOutbox row (plus a
+pg_notify, delivered on commit) instead of talking to the broker. The relay
+(`manage.py run_outbox_relay`, one long-running process) wakes on the notify
+and publishes pending rows in batches; relay_task_outbox sweeps every minute
+as a backstop. If the transaction rolls back, nothing is published; if the
+broker is down, rows wait in Postgres until it is back.
+
+Delivery is at-least-once: a relay that dies between publishing and marking a
+batch republishes it, so consumers must tolerate duplicates (the send/process
+tasks already skip rows that are no longer pending/queued).
+
+With the flag off, enqueue() is a .delay() deferred to transaction commit.
+"""
+
+import logging
+import select
+
+from celery import current_app
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import TaskOutbox
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "reloop_task_outbox"
+RELAY_BATCH_SIZE = 500
+
+
+def enabled():
+    return bool(getattr(settings, "TASK_OUTBOX_ENABLED", False))
+
+
+def enqueue(task, *args, **kwargs):
+    """Publish ``task`` with args/kwargs when the current transaction commits."""
+    if not enabled():
+        # Still never publish work that rolls back (runs immediately outside atomic).
+        transaction.on_commit(lambda: task.delay(*args, **kwargs))
+        return
+
+    TaskOutbox.objects.create(task_name=task.name, args=list(args), kwargs=kwargs)
+    with connection.cursor() as cursor:
+        # NOTIFY is transactional: the relay only wakes once the row is visible.
+        cursor.execute("SELECT pg_notify(%s, '')", [NOTIFY_CHANNEL])
+
+
+def relay_batch(batch_size=RELAY_BATCH_SIZE):
+    """
+    Publish up to ``batch_size`` pending rows in id order. Returns the number published.
+
+    Rows are claimed with SKIP LOCKED, so several relays (the process and the
+    beat sweep) never publish the same row concurrently. Publishing stops at the
+    first broker error; the failing row keeps its place and records the error.
+    """
+    with transaction.atomic():
+        rows = list(
+            TaskOutbox.objects.select_for_update(skip_locked=True)
+            .filter(published_at__isnull=True)
+            .order_by("id")[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        published = []
+        failed = None
+        for row in rows:
+            try:
+                # Routed by CELERY_TASK_ROUTES exactly like .delay().
+                current_app.send_task(row.task_name, args=row.args, kwargs=row.kwargs)
+            except Exception as e:
+                failed = (row, e)
+                break
+            published.append(row.pk)
+
+        if published:
+            TaskOutbox.objects.filter(pk__in=published).update(published_at=timezone.now())
+        if failed:
+            row, error = failed
+            TaskOutbox.objects.filter(pk=row.pk).update(
+                attempts=F("attempts") + 1, last_error=str(error)[:2000]
+            )
+            logger.warning("Outbox relay: publish of %s (%s) failed: %s", row.pk, row.task_name, error)
+
+    return len(published)
+
+
+def relay_pending(batch_size=RELAY_BATCH_SIZE, max_batches=100):
+    """Relay full batches until the outbox is empty (or a publish fails)."""
+    total = 0
+    for _ in range(max_batches):
+        published = relay_batch(batch_size)
+        total += published
+        if published < batch_size:
+            break
+    return total
+
+
+def purge_published(older_than):
+    """Delete rows published before ``older_than``. Returns the number deleted."""
+    deleted, _ = TaskOutbox.objects.filter(published_at__lt=older_than).delete()
+    return deleted
+
+
+def listen():
+    """Subscribe this process's DB connection to outbox notifications."""
+    connection.ensure_connection()
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+
+
+def wait_for_notify(timeout):
+    """Block until an outbox notification arrives or ``timeout`` seconds pass."""
+    raw = connection.connection
+    if raw.notifies:
+        raw.notifies.clear()
+        return True
+    ready, _, _ = select.select([raw], [], [], timeout)
+    if not ready:
+        return False
+    raw.poll()
+    raw.notifies.clear()
+    return True
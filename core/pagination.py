@@ -1,6 +1,187 @@
+"""
+Default DRF pagination (REST_FRAMEWORK["DEFAULT_PAGINATION_CLASS"]).
+
+Page-number pagination (?page=, ?per_page=) with two opt-ins for large lists:
+
+    ?pagination=cursor   keyset pagination on (created_at, id): no OFFSET scan
+                         and no COUNT(*); follow the next/previous links (they
+                         carry ?cursor=). Only for created_at / -created_at
+                         ordering; filters apply as usual.
+    ?count=approximate   count from the Postgres planner estimate instead of
+                         COUNT(*), flagged with "count_is_approximate". Good
+                         for "about N results"; the last page number may be off.
+
+In cursor mode the response has no count unless ?count=exact or
+?count=approximate is passed.
+"""
+
+import base64
+import binascii
+import json
+import logging
+import uuid
+
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+logger = logging.getLogger(__name__)
+
+# Below this estimate an exact COUNT(*) is cheap, and estimates for small or
+# heavily filtered sets are the least reliable.
+APPROXIMATE_COUNT_EXACT_BELOW = 10000
+
+
+def approximate_count(queryset, exact_below=APPROXIMATE_COUNT_EXACT_BELOW):
+    """Row estimate for ``queryset`` from EXPLAIN; exact when small or if EXPLAIN fails."""
+    try:
+        plan = json.loads(queryset.order_by().explain(format="json"))
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        logger.warning("approximate count failed, counting exactly: %s", e)
+        return queryset.count()
+    if estimate < exact_below:
+        return queryset.count()
+    return estimate
+
+
+class ApproximateCountPaginator(DjangoPaginator):
+    @cached_property
+    def count(self):
+        return approximate_count(self.object_list)
+
+
+class CreatedAtCursorPagination:
+    """
+    Keyset pagination on (created_at, id) in the queryset's created_at direction.
+
+    Pages are fetched with ``created_at <= x AND (created_at < x OR id < y)``
+    (flipped for ascending/previous pages), which the (…, created_at) indexes
+    serve directly however deep the page is.
+    """
+    cursor_query_param = "cursor"
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        descending = self._descending(queryset)
+        position = self._decode(request.query_params.get(self.cursor_query_param))
+        reverse = bool(position and position["r"])
+
+        scan_descending = descending != reverse
+        if scan_descending:
+            queryset = queryset.order_by("-created_at", "-pk")
+        else:
+            queryset = queryset.order_by("created_at", "pk")
+        if position:
+            created_at, pk = position["c"], position["i"]
+            if scan_descending:
+                queryset = queryset.filter(created_at__lte=created_at).filter(
+                    Q(created_at__lt=created_at) | Q(pk__lt=pk)
+                )
+            else:
+                queryset = queryset.filter(created_at__gte=created_at).filter(
+                    Q(created_at__gt=created_at) | Q(pk__gt=pk)
+                )
+
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+            # We came back from a later page, so there is always a next one.
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.rows = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.rows:
+            return None
+        return self._link(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.rows:
+            return None
+        return self._link(self.rows[0], reverse=True)
+
+    def _link(self, row, reverse):
+        url = remove_query_param(self.request.build_absolute_uri(), "page")
+        cursor = {"c": row.created_at.isoformat(), "i": str(row.pk), "r": reverse}
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def _decode(self, encoded):
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            cursor["c"] = parse_datetime(cursor["c"])
+            if cursor["c"] is None or not cursor["i"]:
+                raise ValueError("incomplete cursor")
+            # Paginated models have UUID keys; a tampered id must not reach the pk filter.
+            cursor["i"] = uuid.UUID(cursor["i"])
+            return cursor
+        except (binascii.Error, ValueError, KeyError, TypeError, AttributeError):
+            raise NotFound("Invalid cursor")
+
+    def _descending(self, queryset):
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        first = ordering[0] if ordering else "-created_at"
+        if first not in ("created_at", "-created_at"):
+            raise ValidationError(
+                {"ordering": "Cursor pagination supports ordering=created_at or -created_at only; "
+                             "use page-number pagination for other orderings."}
+            )
+        return first.startswith("-")
+
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 20  # default
     page_size_query_param = "per_page"  # allow ?per_page=
     max_page_size = 100  # safety limit
+    pagination_query_param = "pagination"  # ?pagination=cursor
+    count_query_param = "count"  # ?count=approximate | exact
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count_mode = request.query_params.get(self.count_query_param)
+        self.cursor = None
+
+        if request.query_params.get(self.pagination_query_param) == "cursor" or "cursor" in request.query_params:
+            self.cursor = CreatedAtCursorPagination(self.get_page_size(request))
+            self.cursor_count = None
+            if self.count_mode == "approximate":
+                self.cursor_count = approximate_count(queryset)
+            elif self.count_mode == "exact":
+                self.cursor_count = queryset.count()
+            return self.cursor.paginate_queryset(queryset, request)
+
+        if self.count_mode == "approximate":
+            self.django_paginator_class = ApproximateCountPaginator
+        return super().paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        if self.cursor is not None:
+            payload = {
+                "next": self.cursor.get_next_link(),
+                "previous": self.cursor.get_previous_link(),
+                "results": data,
+            }
+            if self.cursor_count is not None:
+                payload = {"count": self.cursor_count, **payload}
+                payload["count_is_approximate"] = self.count_mode == "approximate"
+            return Response(payload)
+
+        response = super().get_paginated_response(data)
+        if self.count_mode == "approximate":
+            response.data["count_is_approximate"] = True
+        return response
@@ -0,0 +1,158 @@
+"""
+Distributed token-bucket rate limiter (Redis + Lua).
+
+All gunicorn/Celery processes on every node share the same buckets, and a
+take is atomic across any number of buckets: either every bucket has enough
+tokens and all are debited, or none are and the caller learns how long to wait.
+
+Typical use (GHL API):
+
+    from core.rate_limit import acquire, ghl_buckets
+
+    ok, wait_ms = acquire(ghl_buckets(location_id), max_wait_ms=2000)
+    if not ok:
+        # Re-queue rather than self.retry(): a wait is not a failed attempt.
+        my_task.apply_async(args=[...], countdown=retry_countdown(wait_ms))
+        return
+
+If Redis is unreachable the limiter fails open (GHL 429s are still handled by
+the callers) so a cache outage cannot stall message delivery.
+"""
+
+import logging
+import math
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "reloop:ratelimit:"
+
+# KEYS: one hash per bucket ({tokens, ts}).
+# ARGV: now_ms, cost, then (rate_per_sec, capacity) per bucket.
+# Returns 0 when the tokens were taken, else the ms until every bucket could pay.
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[1 + i * 2])
+    local capacity = tonumber(ARGV[2 + i * 2])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1])
+    local ts = tonumber(state[2])
+    if tokens == nil then
+        tokens = capacity
+        ts = now
+    end
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+    levels[i] = tokens
+    if tokens < cost then
+        wait = math.max(wait, math.ceil((cost - tokens) * 1000 / rate))
+    end
+end
+if wait > 0 then
+    return wait
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[1 + i * 2])
+    local capacity = tonumber(ARGV[2 + i * 2])
+    redis.call('HSET', key, 'tokens', levels[i] - cost, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity * 1000 / rate) + 1000)
+end
+return 0
+"""
+
+_script = None
+
+
+@dataclass(frozen=True)
+class Bucket:
+    """``rate`` tokens/second refill, bursting up to ``capacity``."""
+    name: str
+    rate: float
+    capacity: float
+
+
+def _take_script():
+    global _script
+    if _script is None:
+        _script = get_redis().register_script(_TAKE_SCRIPT)
+    return _script
+
+
+def try_acquire(buckets, cost=1):
+    """
+    Single atomic attempt. Returns (acquired, wait_ms).
+
+    A cost above the smallest bucket's capacity could never be paid, so it is
+    clamped to that capacity: the caller gets a full bucket instead of waiting forever.
+    """
+    buckets = list(buckets)
+    if not buckets:
+        return True, 0
+    cost = min(cost, min(b.capacity for b in buckets))
+    keys = [f"{KEY_PREFIX}{b.name}" for b in buckets]
+    args = [int(time.time() * 1000), cost]
+    for b in buckets:
+        args.extend([b.rate, b.capacity])
+    try:
+        # Pass the client explicitly: the script object may predate a fork.
+        wait_ms = int(_take_script()(keys=keys, args=args, client=get_redis()))
+    except Exception as e:
+        logger.warning("Rate limiter unavailable, failing open: %s", e)
+        return True, 0
+    return wait_ms == 0, wait_ms
+
+
+def acquire(buckets, cost=1, max_wait_ms=0):
+    """
+    Take ``cost`` tokens from every bucket, sleeping up to ``max_wait_ms`` for them.
+
+    Returns (acquired, wait_ms); when not acquired, wait_ms is the remaining wait
+    the caller should defer by (e.g. Celery retry countdown).
+    """
+    deadline = time.monotonic() + max_wait_ms / 1000
+    while True:
+        acquired, wait_ms = try_acquire(buckets, cost)
+        if acquired:
+            return True, 0
+        remaining_ms = (deadline - time.monotonic()) * 1000
+        if wait_ms > remaining_ms:
+            return False, wait_ms
+        time.sleep(wait_ms / 1000)
+
+
+def retry_countdown(wait_ms):
+    """Celery countdown (whole seconds, at least 1) for a limiter wait."""
+    return max(1, math.ceil(wait_ms / 1000))
+
+
+def ghl_buckets(location_id=None):
+    """
+    Buckets for one GHL API call: app-wide, plus the per-location burst and daily
+    limits GHL enforces per resource (defaults: 100 req / 10 s, 200k / day).
+    """
+    buckets = [
+        Bucket(
+            "ghl:global",
+            getattr(settings, "GHL_RATE_GLOBAL_PER_SECOND", 10),
+            getattr(settings, "GHL_RATE_GLOBAL_BURST", 20),
+        ),
+    ]
+    if location_id:
+        buckets.append(
+            Bucket(
+                f"ghl:loc:{location_id}",
+                getattr(settings, "GHL_RATE_LOCATION_PER_SECOND", 10),
+                getattr(settings, "GHL_RATE_LOCATION_BURST", 100),
+            )
+        )
+        daily = getattr(settings, "GHL_RATE_LOCATION_PER_DAY", 200000)
+        buckets.append(Bucket(f"ghl:loc_day:{location_id}", daily / 86400, daily))
+    return buckets
@@ -0,0 +1,27 @@
+"""
+Process-wide redis-py client for features the Django cache API does not cover
+(pub/sub, hashes, Lua scripts). Points at the same Redis as CACHES.
+"""
+
+import os
+import threading
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+
+
+def get_redis():
+    """Shared client; recreated after fork so processes never share sockets."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                import redis
+
+                _client = redis.Redis.from_url(settings.REDIS_CACHE_URL)
+                _client_pid = pid
+    return _client
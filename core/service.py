@@ -33,33 +33,29 @@ class GHLService:
             self.access_token = self.auth_credentials.access_token
         return response
 
-    def search_records(self, main_location_id, page=1, page_limit=50):
+    def search_records(self, main_location_id, page=1, page_limit=50, filters=None):
         payload = {"locationId": main_location_id, "page": page, "pageLimit": page_limit}
+        if filters:
+            payload["filters"] = filters
         r = self._request("POST", f"{GHL_BASE_URL}/records/search", json=payload)
         r.raise_for_status()
         return r.json()
 
     def create_record(self, main_location_id, properties):
+        from core import sms_credits_mirror
+
         payload = {"locationId": main_location_id, "properties": properties}
         r = self._request("POST", f"{GHL_BASE_URL}/records", json=payload)
         r.raise_for_status()
-        return r.json()
+        data = r.json()
+        sms_credits_mirror.remember(data)
+        return data
 
     def get_record(self, record_id, main_location_id):
-        # If GHL provides a GET endpoint, prefer it. If not, fallback to search and filter by id.
-        r = self._request(
-            "POST",
-            f"{GHL_BASE_URL}/records/search",
-            json={"locationId": main_location_id, "page": 1, "pageLimit": 1, "searchAfter": None},
-        )
-        r.raise_for_status()
-        # fallback simple scan — you may adapt if API has GET /records/{id}
-        data = r.json()
-        print("data: ",data)
-        for rec in data.get("records", []):
-            if rec.get("id") == record_id:
-                return rec
-        return None
+        # Local mirror first (core.sms_credits_mirror); GET /records/{id} on a miss.
+        from core import sms_credits_mirror
+
+        return sms_credits_mirror.get(record_id) or self.get_record_by_id(record_id)
 
     def get_record_by_id(self, record_id):
         """
@@ -84,6 +80,10 @@ class GHLService:
             # Extract the record from the response
             record = response_data.get("record")
             print(f"📋 [get_record_by_id] Record extracted: {record is not None}")
+            if record:
+                from core import sms_credits_mirror
+
+                sms_credits_mirror.remember(record)
             return record
         except requests.exceptions.HTTPError as e:
             print(f"📋 [get_record_by_id] HTTP Error: {e.response.status_code} - {e.response.text}")
@@ -100,6 +100,9 @@ class GHLService:
 
     def update_record(self, record_id, main_location_id, payload):
         import json
+
+        from core import sms_credits_mirror
+
         url = f"{GHL_BASE_URL}/records/{record_id}?locationId={main_location_id}"
         payload = {
             "properties": payload
@@ -119,7 +122,9 @@ class GHLService:
             print(f"⬅️ Response Text: {r.text}")
 
         r.raise_for_status()
-        return r.json()
+        data = r.json()
+        sms_credits_mirror.remember(data)
+        return data
 
     def _normalize_props(self, props: dict) -> dict:
         """
@@ -210,4 +215,25 @@ class GHLService:
             print(f"✏️ [update_contact_custom_field] Exception: {e}")
             import traceback
             print(f"✏️ [update_contact_custom_field] Traceback: {traceback.format_exc()}")
-            raise
\ No newline at end of file
+            raise
+
+    def update_contact_custom_fields(self, contact_id, fields):
+        """
+        Update several custom fields of a contact in one PUT.
+
+        Args:
+            contact_id: The contact ID to update
+            fields: {custom_field_id: value}
+
+        Returns:
+            dict: Updated contact data if successful
+        """
+        url = f"https://services.leadconnectorhq.com/contacts/{contact_id}"
+        payload = {
+            "customFields": [
+                {"id": field_id, "field_value": str(value)} for field_id, value in fields.items()
+            ]
+        }
+        r = self._request("PUT", url, json=payload)
+        r.raise_for_status()
+        return r.json()
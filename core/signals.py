@@ -10,24 +10,33 @@ from core.models import GHLAuthCredentials, Wallet, AgencyToken
 
 
 
+import logging
+
+from django.core.cache import cache
 from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from decimal import Decimal
 from core.models import GHLAuthCredentials, Wallet, WalletTransaction
+from core import sms_credits_mirror
+from core.ghl_auth import ghl_request
 from core.service import GHLService
 from django.conf import settings
 from decimal import Decimal, InvalidOperation
 
 
+logger = logging.getLogger(__name__)
+
 MAIN_LOCATION_ID = "fM52tHdamVZya3QZH3ck"  # your main location
+CUSTOM_MENU_KICK_CACHE_KEY = "ghl_custom_menu:kick"
 
 @receiver(post_save, sender=GHLAuthCredentials)
 def sync_wallet_with_ghl(sender, instance, created, **kwargs):
     if not created:
         return
-    
-    update_custom_menu_link()
+
+    # Menu update runs in the background, debounced, once the row is committed.
+    transaction.on_commit(request_custom_menu_update)
     
 
 
@@ -40,24 +49,17 @@ def sync_wallet_with_ghl(sender, instance, created, **kwargs):
         # You may want to log/error notify here
         return
 
-    ghl = GHLService(access_token=main_creds.access_token)
+    ghl = GHLService(access_token=main_creds.access_token, auth_credentials=main_creds)
 
-    # 2) search for records on main location
+    # 2) find the account's record in the local sms_credits mirror
+    # (account_id may be company_name or user_id depending on how you pre-created the object)
     try:
-        search = ghl.search_records(MAIN_LOCATION_ID, page=1, page_limit=50)
+        found_record = sms_credits_mirror.find_for_account(instance, ghl)
     except Exception as e:
-        # log error
+        logger.warning("sms_credits lookup failed for %s: %s", instance.location_id, e)
         return
 
-    found_record = None
-    found_record_id = None
-    for rec in search.get("records", []):
-        props = rec.get("properties", {})
-        # account_id may be company_name or user_id depending on how you pre-created the object
-        if props.get("locationid") == instance.location_id or props.get("account_id") == instance.location_name or props.get("business_name") == instance.location_name:
-            found_record = rec
-            found_record_id = rec.get("id")
-            break
+    found_record_id = found_record.get("id") if found_record else None
 
     def extract_values_from_props(props):
         # defensive extraction
@@ -274,9 +276,32 @@ import requests
 # 3764931e-b906-4b23-a543-6d5ec3fa6f20
 
 
+def request_custom_menu_update():
+    """
+    Debounced update_custom_menu: the first install in a window schedules one
+    run after GHL_CUSTOM_MENU_DEBOUNCE_SECONDS and later installs fold into it.
+    The run reads the full location list, so a bulk install costs one update.
+    The kick key expires before the run starts, so nothing committed after
+    the run's read is missed.
+    """
+    window = getattr(settings, "GHL_CUSTOM_MENU_DEBOUNCE_SECONDS", 30)
+    try:
+        if not cache.add(CUSTOM_MENU_KICK_CACHE_KEY, 1, timeout=window):
+            return
+        from core.tasks import update_custom_menu
+
+        update_custom_menu.apply_async(countdown=window)
+    except Exception as e:
+        logger.warning("Failed to schedule GHL custom menu update: %s", e)
+
+
 def update_custom_menu_link():
+    """Add every connected location to the dashboard custom menu (one PUT, only when some are missing)."""
     agency_instance = AgencyToken.objects.all().first()
-    tokens = GHLAuthCredentials.objects.all().values_list("location_id", flat=True)
+    if agency_instance is None:
+        print("No agency token; custom menu not updated.")
+        return
+    tokens = GHLAuthCredentials.objects.exclude(location_id__isnull=True).values_list("location_id", flat=True)
     
     menu_id = "3764931e-b906-4b23-a543-6d5ec3fa6f20"
     base_url = f"https://services.leadconnectorhq.com/custom-menus/{menu_id}/"
@@ -295,7 +320,9 @@ def update_custom_menu_link():
             "Version": "2021-07-28",
             "Authorization": f"Bearer {agency_instance.access_token}"
         }
-        fetch_response = requests.get(fetch_url, headers=fetch_headers)
+        fetch_response = ghl_request(
+            "GET", fetch_url, headers=fetch_headers, auth_credentials=agency_instance, timeout=30
+        )
         fetch_response.raise_for_status()
         menus = fetch_response.json().get("customMenus", [])
     except Exception as e:
@@ -308,35 +335,24 @@ def update_custom_menu_link():
         print(f"Menu with ID {menu_id} not found.")
         return
 
+    # Step 2: Add every location that is not in the menu yet
     existing_locations = set(existing_menu.get("locations", []))
+    missing = set(tokens) - existing_locations
+    if not missing:
+        print("All locations already exist in the menu.")
+        return
 
-    for location_id in tokens:
-        try:
-            # Step 2: Add new location if not already present
-            if location_id not in existing_locations:
-                existing_locations.add(location_id)
-
-                payload = {
-                    "locations": list(existing_locations)
-                }
-
-                # Step 3: Update the menu
-                
-            else:
-                print(f"Location {location_id} already exists in the menu.")
-
-        except Exception as e:
-            print(f"Error updating menu for location {location_id}: {e}")
-
-
+    # Step 3: Update the menu
     payload = {
-        "locations": list(existing_locations)
+        "locations": sorted(existing_locations | missing)
     }
 
-    response = requests.put(base_url, json=payload, headers=headers)
+    response = ghl_request(
+        "PUT", base_url, json=payload, headers=headers, auth_credentials=agency_instance, timeout=30
+    )
 
     if response.status_code in (200, 201):
-        print(f"✅ Location added successfully.")
+        print(f"✅ {len(missing)} location(s) added successfully.")
     else:
         print(f"❌ Failed to update")
 
@@ -0,0 +1,163 @@
+"""
+Local mirror of the main location's GHL custom_objects.sms_credits records
+(SMSCreditsRecord), so wallet onboarding and record lookups are indexed reads
+instead of paging the records search.
+
+    write-through   GHLService.create_record / update_record / get_record_by_id
+                    store the record GHL returns
+    reconcile       sync_sms_credits_records (every 15 minutes) pages through the
+                    whole records search; only new or changed records are
+                    written, and after a complete pass records GHL no longer
+                    returns are deleted
+    lookups         find_for_account / get
+
+Records can also be created in GHL directly, so a find_for_account miss asks
+GHL for that one location's records (at most once a minute per location),
+stores them and looks again. Everything else is left to the periodic reconcile.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.models import GHLAuthCredentials, SMSCreditsRecord
+
+logger = logging.getLogger(__name__)
+
+PAGE_LIMIT = 100
+MAX_PAGES = 1000
+MISS_SYNC_KEY = "sms_credits_mirror:miss_sync:{key}"
+MISS_SYNC_SECONDS = 60
+UPDATE_FIELDS = ["location_id", "account_id", "business_name", "properties", "synced_at"]
+
+
+def _text(value):
+    if isinstance(value, dict):
+        value = value.get("value")
+    return "" if value is None else str(value)[:255]
+
+
+def _row(record):
+    props = record.get("properties") or {}
+    return SMSCreditsRecord(
+        record_id=str(record["id"]),
+        location_id=_text(props.get("locationid")),
+        account_id=_text(props.get("account_id")),
+        business_name=_text(props.get("business_name")),
+        properties=props,
+    )
+
+
+def _as_record(row):
+    """Same shape as a records search result."""
+    return {"id": row.record_id, "properties": row.properties}
+
+
+def store(records):
+    """Upsert GHL record dicts into the mirror."""
+    rows = [_row(record) for record in records if record and record.get("id")]
+    if rows:
+        SMSCreditsRecord.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=["record_id"], update_fields=UPDATE_FIELDS
+        )
+    return len(rows)
+
+
+def remember(response):
+    """Write-through for a create/update/get response ({"record": {...}} or the record itself)."""
+    try:
+        record = response.get("record") if isinstance(response, dict) and "record" in response else response
+        if isinstance(record, dict):
+            store([record])
+    except Exception as e:
+        # The mirror must never fail the GHL write; reconcile will catch up.
+        logger.warning("sms_credits mirror: could not store record: %s", e)
+
+
+def _main_service():
+    from core.service import GHLService
+
+    main_creds = GHLAuthCredentials.objects.get(location_id=settings.GHL_MAIN_LOCATION_ID)
+    return GHLService(access_token=main_creds.access_token, auth_credentials=main_creds)
+
+
+def reconcile(service=None):
+    """Page through every sms_credits record and bring the mirror up to date. Returns counts."""
+    service = service or _main_service()
+    # Rows written through create_record / update_record while we page are newer
+    # than the pass; only rows last synced before it started may be deleted.
+    started = timezone.now()
+    seen = {}
+    complete = False
+    for page in range(1, MAX_PAGES + 1):
+        data = service.search_records(settings.GHL_MAIN_LOCATION_ID, page=page, page_limit=PAGE_LIMIT)
+        records = data.get("records") or []
+        for record in records:
+            if record.get("id"):
+                seen[str(record["id"])] = record
+        if len(records) < PAGE_LIMIT:
+            complete = True
+            break
+
+    existing = dict(SMSCreditsRecord.objects.values_list("record_id", "properties"))
+    changed = [record for record_id, record in seen.items() if existing.get(record_id) != (record.get("properties") or {})]
+    written = store(changed)
+    deleted = 0
+    if complete:
+        gone = set(existing) - set(seen)
+        if gone:
+            deleted, _ = SMSCreditsRecord.objects.filter(record_id__in=gone, synced_at__lt=started).delete()
+    else:
+        logger.warning("sms_credits mirror: stopped after %s pages; deletions skipped", MAX_PAGES)
+    return {"records": len(seen), "written": written, "deleted": deleted}
+
+
+def _lookup(account):
+    qs = SMSCreditsRecord.objects
+    row = None
+    if account.location_id:
+        row = qs.filter(location_id=account.location_id).first()
+    if row is None and account.location_name:
+        row = (
+            qs.filter(account_id=account.location_name).first()
+            or qs.filter(business_name=account.location_name).first()
+        )
+    return _as_record(row) if row else None
+
+
+def find_for_account(account, service=None):
+    """
+    The sms_credits record for a GHLAuthCredentials row, matched on locationid,
+    then account_id / business_name = location name. None when there is none.
+    """
+    record = _lookup(account)
+    if record is None and _fetch_for_account(account, service):
+        record = _lookup(account)
+    return record
+
+
+def _fetch_for_account(account, service=None):
+    """Store the GHL records filtered on this account's locationid (or name). True if any came back."""
+    if account.location_id:
+        field, value = "properties.locationid", account.location_id
+    elif account.location_name:
+        field, value = "properties.account_id", account.location_name
+    else:
+        return False
+    if not cache.add(MISS_SYNC_KEY.format(key=value), 1, MISS_SYNC_SECONDS):
+        return False
+    service = service or _main_service()
+    data = service.search_records(
+        settings.GHL_MAIN_LOCATION_ID,
+        page_limit=PAGE_LIMIT,
+        filters=[{"field": field, "operator": "eq", "value": value}],
+    )
+    return store(data.get("records") or []) > 0
+
+
+def get(record_id):
+    """The mirrored record with this id, or None."""
+    row = SMSCreditsRecord.objects.filter(pk=record_id).first()
+    return _as_record(row) if row else None
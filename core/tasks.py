@@ -1,9 +1,12 @@
 import logging
+from datetime import timedelta
 
 import requests
 from celery import shared_task
 from django.conf import settings
+from django.utils import timezone
 
+from core import contact_field_sync, token_refresh
 from core.ghl_auth import refresh_agency_token, refresh_company_token, refresh_location_token
 from core.models import AgencyToken, CompanyToken, GHLAuthCredentials
 
@@ -65,6 +68,28 @@ def make_api_call_for_agency_token():
     return summary
 
 
+@shared_task(soft_time_limit=120, time_limit=150)
+def schedule_oauth_refreshes():
+    """
+    Queue refreshes for OAuth tokens close to expiry (every 5 minutes).
+
+    See core/token_refresh.py. The make_api_call* tasks above refresh every row
+    and are kept for refresh_oauth_tokens.
+    """
+    summary = token_refresh.schedule()
+    logger.info("OAuth refresh tick: %s", summary)
+    return summary
+
+
+@shared_task(soft_time_limit=300, time_limit=330)
+def refresh_oauth_token(kind, pk):
+    """Refresh one location/company/agency token queued by schedule_oauth_refreshes."""
+    result = token_refresh.refresh_one(kind, pk)
+    if result == "failed":
+        logger.error("Scheduled %s token refresh failed for %s", kind, pk)
+    return result
+
+
 @shared_task(bind=True, max_retries=2, default_retry_delay=60)
 def notify_ghl_auth_failure_task(self, payload):
     """POST an alert to the configured GHL workflow webhook when token refresh fails."""
@@ -110,99 +135,89 @@ from core.service import GHLService
 MAIN_LOCATION_ID = settings.GHL_MAIN_LOCATION_ID
 
 
+# Contact custom field that mirrors cred_remaining for sync_all_wallets_with_ghl.
+CRED_REMAINING_CONTACT_FIELD_ID = "32pWXPxvOxP5CGWZbaBZ"
+
+
 @shared_task
 def sync_all_wallets_with_ghl():
-    # find the creds for main location
+    """
+    Push wallet figures into each wallet's sms_credits record on the main
+    location, and cred_remaining into the record's contact. Wallets whose
+    payload matches the last push (ghl_record_fingerprint) are skipped.
+    """
     try:
         main_creds = GHLAuthCredentials.objects.get(location_id=MAIN_LOCATION_ID)
     except GHLAuthCredentials.DoesNotExist:
         return
 
     service = GHLService(access_token=main_creds.access_token, auth_credentials=main_creds)
+    summary = {"wallets": 0, "unchanged": 0, "pushed": 0, "failed": 0}
+
+    for wallet in Wallet.objects.select_related("account").exclude(ghl_object_id__isnull=True).exclude(ghl_object_id=""):
+        summary["wallets"] += 1
+        payload = {
+            "cred_remaining": {
+                "currency": "default",
+                "value": float(wallet.cred_remaining)
+            },
+            "seg_remaining": int(wallet.seg_remaining),
+            "cred_spent": {
+                "currency": "default",
+                "value": float(wallet.cred_spent)
+            },
+            "seg_rates": {
+                "currency": "default",
+                "value": float(wallet.outbound_segment_charge)
+            },
+            "seg_used": int(wallet.seg_used),
+            "standard_numbers": wallet.account.current_standard_purchased,
+            "max_premium_numbers": wallet.account.max_premium_numbers,
+            "max_standard_numbers": wallet.account.max_standard_numbers,
+            "premium_numbers": wallet.account.current_premium_purchased,
+        }
+        current = contact_field_sync.fingerprint(wallet.ghl_object_id, payload)
+        if current == wallet.ghl_record_fingerprint:
+            summary["unchanged"] += 1
+            continue
 
-    for wallet in Wallet.objects.select_related("account").all():
         try:
-          
-           if wallet.ghl_object_id:
-                print("type(wallet.cred_remaining)",type(wallet.cred_remaining))
-                print("type(wallet.seg_remaining)",type(wallet.seg_remaining))
-                print("type(wallet.cred_spent)",type(wallet.cred_spent))
-                print("type(wallet.seg_used)",type(wallet.seg_used))
-                payload = {
-                    "cred_remaining": {
-                        "currency": "default",
-                        "value": float(wallet.cred_remaining)
-                    },
-                    "seg_remaining": int(wallet.seg_remaining),
-                    "cred_spent": {
-                        "currency": "default",
-                        "value": float(wallet.cred_spent)
-                    },
-                    "seg_rates": {
-                        "currency": "default",
-                        "value": float(wallet.outbound_segment_charge)
-                    },
-                    "seg_used": int(wallet.seg_used),
-                    "standard_numbers": wallet.account.current_standard_purchased,
-                    "max_premium_numbers": wallet.account.max_premium_numbers,
-                    "max_standard_numbers": wallet.account.max_standard_numbers,
-                    "premium_numbers": wallet.account.current_premium_purchased,
-                }
-                update_response = service.update_record(wallet.ghl_object_id,MAIN_LOCATION_ID,payload)
-                main_location = GHLAuthCredentials.objects.get(location_id=MAIN_LOCATION_ID)
-                
-                # After updating the record, update the contact's custom field if it exists
-                print(f"\n===== Starting Contact Custom Field Update for Wallet {wallet.id} =====")
-                try:
-                    # Extract account_id from the update_record response
-                    print(f"📋 Step 1: Extracting account_id from update_record response")
-                    # Handle different response structures (could be directly the record or wrapped in "record")
-                    record = update_response.get("record") if isinstance(update_response, dict) and "record" in update_response else update_response
-                    props = record.get("properties", {}) if record and isinstance(record, dict) else {}
-                    account_id = props.get("account_id")
-                    print(f"📋 Step 1 Result: account_id = {account_id}")
-                    
-                    if account_id:
-                        if main_location and main_location.access_token:
-                            print(f"📋 Step 2: Creating GHLService with main location access token")
-                            location_service = GHLService(
-                                access_token=main_location.access_token,
-                                auth_credentials=main_location,
-                            )
-                            
-                            # Update the contact's custom field with cred_remaining value
-                            CUSTOM_FIELD_ID = "32pWXPxvOxP5CGWZbaBZ"
-                            print(f"📋 Step 3: Updating contact custom field")
-                            print(f"📋 Contact ID: {account_id}")
-                            print(f"📋 Custom Field ID: {CUSTOM_FIELD_ID}")
-                            print(f"📋 Field Value: {wallet.cred_remaining} (type: {type(wallet.cred_remaining)})")
-                            
-                            location_service.update_contact_custom_field(
-                                account_id,
-                                CUSTOM_FIELD_ID,
-                                f"{wallet.cred_remaining}"
-                            )
-                            print(f"✅ Step 3 Result: Successfully updated contact {account_id} custom field with cred_remaining: {wallet.cred_remaining}")
-                        else:
-                            print(f"⚠️ Step 2 Result: Missing main_location or access_token")
-                    else:
-                        print(f"⚠️ Step 1 Result: account_id is None or empty in update_record response")
-                except Exception as contact_error:
-                    # Log contact update error but don't fail the whole task
-                    import traceback
-                    print(f"❌ Error updating contact custom field: {contact_error}")
-                    print(f"❌ Traceback: {traceback.format_exc()}")
-                print(f"===== Finished Contact Custom Field Update for Wallet {wallet.id} =====\n")
+            update_response = service.update_record(wallet.ghl_object_id, MAIN_LOCATION_ID, payload)
+
+            # Mirror cred_remaining onto the record's contact. The response is either
+            # the record itself or wrapped in "record".
+            record = update_response.get("record") if isinstance(update_response, dict) and "record" in update_response else update_response
+            props = record.get("properties", {}) if record and isinstance(record, dict) else {}
+            account_id = props.get("account_id")
+            if account_id:
+                service.update_contact_custom_field(
+                    account_id,
+                    CRED_REMAINING_CONTACT_FIELD_ID,
+                    f"{wallet.cred_remaining}"
+                )
+            else:
+                logger.warning("sms_credits record %s has no account_id; contact not updated", wallet.ghl_object_id)
         except Exception:
-            # log exception and continue with next wallet
+            summary["failed"] += 1
+            logger.exception("Failed syncing wallet %s with GHL", wallet.id)
             continue
 
+        # queryset update: no need to fire the Wallet cache signals for a sync marker.
+        Wallet.objects.filter(pk=wallet.pk).update(ghl_record_fingerprint=current)
+        summary["pushed"] += 1
+
+    logger.info("Wallet record sync complete: %s", summary)
+    return summary
+
 
 @shared_task(soft_time_limit=600, time_limit=660)
 def sync_contact_wallet_custom_fields():
     """
     Sync wallet/contact data into GoHighLevel contact custom fields.
 
+    Only accounts whose values changed since the last push are sent, one PUT
+    per contact (see core/contact_field_sync.py).
+
     Requires:
     - GHL_CF_CREDITS_REMAINING_NEW_ID in environment/settings
     - GHL_CF_SMS_RECHARGE_LOCATION_ID in environment/settings
@@ -229,39 +244,63 @@ def sync_contact_wallet_custom_fields():
         return
 
     service = GHLService(access_token=main_creds.access_token, auth_credentials=main_creds)
-    accounts = GHLAuthCredentials.objects.select_related("wallet").all()
-    for account in accounts:
-        try:
-            wallet = getattr(account, "wallet", None)
-            if not wallet:
-                logger.info("Skipping location %s: no wallet", account.location_id)
-                continue
-
-            if not account.ghl_contact_id:
-                logger.info("Skipping location %s: missing ghl_contact_id", account.location_id)
-                continue
-
-            if not account.location_id:
-                logger.warning("Skipping account %s: missing location_id", account.pk)
-                continue
-
-            service.update_contact_custom_field(
-                account.ghl_contact_id,
-                credits_field_id,
-                str(wallet.balance),
-            )
-            service.update_contact_custom_field(
-                account.ghl_contact_id,
-                location_field_id,
-                account.location_id,
-            )
-            logger.info(
-                "Synced contact custom fields for location %s contact %s",
-                account.location_id,
-                account.ghl_contact_id,
-            )
-        except Exception:
-            logger.exception(
-                "Failed syncing contact custom fields for location %s",
-                account.location_id,
-            )
+    summary = contact_field_sync.sync(service, credits_field_id, location_field_id)
+    logger.info("Contact custom field sync complete: %s", summary)
+    return summary
+
+
+@shared_task(soft_time_limit=120, time_limit=150)
+def update_custom_menu():
+    """
+    Add newly installed locations to the GHL dashboard custom menu.
+    Scheduled (debounced) by core.signals.request_custom_menu_update.
+    """
+    from core.signals import update_custom_menu_link
+
+    update_custom_menu_link()
+
+
+@shared_task(soft_time_limit=300, time_limit=330)
+def sync_sms_credits_records():
+    """Reconcile the local mirror of the GHL sms_credits records (core/sms_credits_mirror.py)."""
+    from core import sms_credits_mirror
+
+    try:
+        summary = sms_credits_mirror.reconcile()
+    except GHLAuthCredentials.DoesNotExist:
+        logger.error("Main location credentials not found for location_id=%s", MAIN_LOCATION_ID)
+        return
+    logger.info("sms_credits mirror reconcile: %s", summary)
+    return summary
+
+
+@shared_task
+def release_expired_wallet_reservations():
+    """
+    Settle journaled reservation charges into the ledger and release expired
+    reservations (including holds left behind by workers that died).
+    """
+    from core import wallet_reservations
+
+    summary = wallet_reservations.sweep()
+    if summary["settled_entries"] or summary["released"] or summary["errors"]:
+        logger.info("release_expired_wallet_reservations: %s", summary)
+    return summary
+
+
+TASK_OUTBOX_RETENTION = timedelta(days=1)
+
+
+@shared_task
+def relay_task_outbox():
+    """
+    Backstop for the outbox relay process: publish any pending TaskOutbox rows
+    and purge rows published more than a day ago.
+    """
+    from core import outbox
+
+    published = outbox.relay_pending()
+    purged = outbox.purge_published(timezone.now() - TASK_OUTBOX_RETENTION)
+    if published or purged:
+        logger.info("relay_task_outbox: published=%s purged=%s", published, purged)
+    return {"published": published, "purged": purged}
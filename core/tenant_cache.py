@@ -0,0 +1,350 @@
+"""
+Two-tier cache for the tenant lookups done on every message.
+
+    L1  bounded per-process LRU (short TTL, no network hop)
+    L2  shared Django cache (Redis, see CACHES in settings)
+
+Covered lookups:
+    get_credentials(location_id)        GHLAuthCredentials by location_id
+    get_credentials_by_pk(pk)           GHLAuthCredentials by primary key
+    get_transmit_mapping(account_id)    GHLTransmitSMSMapping (+ TransmitSMSAccount) by GHL account
+    get_wallet_id(account)              Wallet id for a GHL account (created if missing)
+
+Rows are invalidated from post_save/post_delete receivers: the L2 key is deleted
+and the key is published on a Redis channel so every process drops its L1 copy.
+The L1 TTL bounds staleness if a pub/sub message is ever missed.
+
+Hit/miss counters are kept per process and flushed to a shared Redis hash;
+inspect them with ``python manage.py tenant_cache_stats``.
+"""
+
+import copy
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "reloop:tenant_cache:invalidate"
+STATS_HASH_KEY = "reloop:tenant_cache:stats"
+STATS_FLUSH_SECONDS = 10
+
+NS_CREDENTIALS = "creds_loc"
+NS_CREDENTIALS_PK = "creds_pk"
+NS_MAPPING = "mapping"
+NS_WALLET_ID = "wallet_id"
+
+# Wallet rows are saved on every charge; only these fields matter to the cached id.
+_WALLET_CACHE_FIELDS = {"id", "account"}
+
+
+def _l1_size():
+    return getattr(settings, "TENANT_CACHE_L1_SIZE", 1024)
+
+
+def _l1_ttl():
+    return getattr(settings, "TENANT_CACHE_L1_TTL", 30)
+
+
+def _l2_ttl():
+    return getattr(settings, "TENANT_CACHE_L2_TTL", 300)
+
+
+class _LocalLRU:
+    """Thread-safe bounded LRU with per-entry expiry."""
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + _l1_ttl(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > _l1_size():
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_l1 = _LocalLRU()
+_stats_lock = threading.Lock()
+_stats = {}
+_stats_flushed_at = time.monotonic()
+_subscriber_pid = None
+
+
+def _cache_key(namespace, key):
+    return f"tenant:{namespace}:{key}"
+
+
+# ---------------------------------------------------------------------------
+# Stats
+# ---------------------------------------------------------------------------
+
+def _record(namespace, outcome):
+    global _stats_flushed_at
+    with _stats_lock:
+        counters = _stats.setdefault(namespace, {"l1_hit": 0, "l2_hit": 0, "miss": 0})
+        counters[outcome] += 1
+        if time.monotonic() - _stats_flushed_at < STATS_FLUSH_SECONDS:
+            return
+        pending = {ns: dict(c) for ns, c in _stats.items()}
+        _stats.clear()
+        _stats_flushed_at = time.monotonic()
+    _flush_stats(pending)
+
+
+def _flush_stats(pending):
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for namespace, counters in pending.items():
+            for outcome, count in counters.items():
+                if count:
+                    pipe.hincrby(STATS_HASH_KEY, f"{namespace}:{outcome}", count)
+        pipe.execute()
+    except Exception as e:
+        logger.debug("tenant cache stats flush failed: %s", e)
+
+
+def get_stats():
+    """
+    Shared counters (all processes, last flush) merged with this process's unflushed ones.
+
+    Returns {namespace: {"l1_hit", "l2_hit", "miss", "hit_ratio"}}.
+    """
+    merged = {}
+    try:
+        raw = get_redis().hgetall(STATS_HASH_KEY)
+    except Exception as e:
+        logger.warning("tenant cache stats unavailable: %s", e)
+        raw = {}
+    for field, value in raw.items():
+        field = field.decode() if isinstance(field, bytes) else field
+        namespace, _, outcome = field.rpartition(":")
+        merged.setdefault(namespace, {"l1_hit": 0, "l2_hit": 0, "miss": 0})[outcome] = int(value)
+    with _stats_lock:
+        for namespace, counters in _stats.items():
+            bucket = merged.setdefault(namespace, {"l1_hit": 0, "l2_hit": 0, "miss": 0})
+            for outcome, count in counters.items():
+                bucket[outcome] = bucket.get(outcome, 0) + count
+    for counters in merged.values():
+        total = counters["l1_hit"] + counters["l2_hit"] + counters["miss"]
+        counters["hit_ratio"] = round((counters["l1_hit"] + counters["l2_hit"]) / total, 4) if total else None
+    return merged
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+    try:
+        get_redis().delete(STATS_HASH_KEY)
+    except Exception as e:
+        logger.warning("tenant cache stats reset failed: %s", e)
+
+
+# ---------------------------------------------------------------------------
+# Invalidation
+# ---------------------------------------------------------------------------
+
+def _ensure_subscriber():
+    """Start (once per process, again after fork) the thread that applies remote invalidations."""
+    global _subscriber_pid
+    pid = os.getpid()
+    if _subscriber_pid == pid:
+        return
+    _subscriber_pid = pid
+    # Anything cached in the parent before fork may have missed invalidations.
+    _l1.clear()
+    thread = threading.Thread(target=_subscribe_forever, name="tenant-cache-invalidation", daemon=True)
+    thread.start()
+
+
+def _subscribe_forever():
+    while True:
+        try:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            for message in pubsub.listen():
+                data = message.get("data")
+                if isinstance(data, bytes):
+                    data = data.decode()
+                if data:
+                    _l1.delete(data)
+        except Exception as e:
+            logger.warning("tenant cache invalidation listener error: %s", e)
+            _l1.clear()
+            time.sleep(5)
+
+
+def invalidate(namespace, key):
+    cache_key = _cache_key(namespace, key)
+    _l1.delete(cache_key)
+    try:
+        cache.delete(cache_key)
+    except Exception as e:
+        logger.warning("tenant cache L2 delete failed for %s: %s", cache_key, e)
+    try:
+        get_redis().publish(INVALIDATION_CHANNEL, cache_key)
+    except Exception as e:
+        logger.warning("tenant cache invalidation publish failed for %s: %s", cache_key, e)
+
+
+# ---------------------------------------------------------------------------
+# Lookups
+# ---------------------------------------------------------------------------
+
+def _get(namespace, key, loader):
+    """
+    Read-through lookup. ``loader`` returns the value or None; None is never cached.
+    Returns a shallow copy for model instances so callers cannot mutate the cached one.
+    """
+    _ensure_subscriber()
+    cache_key = _cache_key(namespace, key)
+
+    value = _l1.get(cache_key)
+    if value is not None:
+        _record(namespace, "l1_hit")
+        return copy.copy(value)
+
+    try:
+        value = cache.get(cache_key)
+    except Exception as e:
+        logger.warning("tenant cache L2 get failed for %s: %s", cache_key, e)
+        value = None
+    if value is not None:
+        _record(namespace, "l2_hit")
+        _l1.set(cache_key, value)
+        return copy.copy(value)
+
+    _record(namespace, "miss")
+    value = loader()
+    if value is None:
+        return None
+    try:
+        cache.set(cache_key, value, timeout=_l2_ttl())
+    except Exception as e:
+        logger.warning("tenant cache L2 set failed for %s: %s", cache_key, e)
+    _l1.set(cache_key, value)
+    return copy.copy(value)
+
+
+def get_credentials(location_id):
+    """GHLAuthCredentials for a location, or None."""
+    from core.models import GHLAuthCredentials
+
+    if not location_id:
+        return None
+    return _get(
+        NS_CREDENTIALS,
+        location_id,
+        lambda: GHLAuthCredentials.objects.filter(location_id=location_id).first(),
+    )
+
+
+def get_credentials_by_pk(pk):
+    """GHLAuthCredentials by primary key, or None."""
+    from core.models import GHLAuthCredentials
+
+    if not pk:
+        return None
+    return _get(
+        NS_CREDENTIALS_PK,
+        str(pk),
+        lambda: GHLAuthCredentials.objects.filter(pk=pk).first(),
+    )
+
+
+def get_transmit_mapping(ghl_account_id):
+    """GHLTransmitSMSMapping (with transmit_account loaded) for a GHL account, or None."""
+    from sms_management_app.models import GHLTransmitSMSMapping
+
+    if not ghl_account_id:
+        return None
+    return _get(
+        NS_MAPPING,
+        str(ghl_account_id),
+        lambda: GHLTransmitSMSMapping.objects.select_related("transmit_account")
+        .filter(ghl_account_id=ghl_account_id)
+        .first(),
+    )
+
+
+def get_wallet_id(account):
+    """Wallet id for a GHL account, creating the wallet if it does not exist yet."""
+    from core.models import Wallet
+
+    def load():
+        wallet, _ = Wallet.objects.get_or_create(account=account)
+        return wallet.pk
+
+    return _get(NS_WALLET_ID, str(account.pk), load)
+
+
+# ---------------------------------------------------------------------------
+# Receivers (connected on import from CoreConfig.ready)
+# ---------------------------------------------------------------------------
+
+@receiver([post_save, post_delete], sender="core.GHLAuthCredentials")
+def _invalidate_credentials(sender, instance, **kwargs):
+    if instance.location_id:
+        invalidate(NS_CREDENTIALS, instance.location_id)
+    invalidate(NS_CREDENTIALS_PK, str(instance.pk))
+
+
+@receiver([post_save, post_delete], sender="sms_management_app.GHLTransmitSMSMapping")
+def _invalidate_mapping(sender, instance, **kwargs):
+    invalidate(NS_MAPPING, str(instance.ghl_account_id))
+
+
+@receiver([post_save, post_delete], sender="transmitsms.TransmitSMSAccount")
+def _invalidate_transmit_account(sender, instance, **kwargs):
+    from sms_management_app.models import GHLTransmitSMSMapping
+
+    account_ids = GHLTransmitSMSMapping.objects.filter(transmit_account_id=instance.pk).values_list(
+        "ghl_account_id", flat=True
+    )
+    for ghl_account_id in account_ids:
+        invalidate(NS_MAPPING, str(ghl_account_id))
+
+
+@receiver(post_save, sender="core.Wallet")
+def _invalidate_wallet_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not (set(update_fields) & _WALLET_CACHE_FIELDS):
+        return
+    invalidate(NS_WALLET_ID, str(instance.account_id))
+
+
+@receiver(post_delete, sender="core.Wallet")
+def _invalidate_wallet_on_delete(sender, instance, **kwargs):
+    invalidate(NS_WALLET_ID, str(instance.account_id))
@@ -0,0 +1,284 @@
+"""
+Expiry-aware GHL OAuth refresh (schedule_oauth_refreshes, every 5 minutes).
+
+Every token row stores when its access token expires (``token_expires_at``,
+written with each token; rows that predate it fall back to
+``updated_at + expires_in``). A token is due at
+
+    expires_at - GHL_TOKEN_REFRESH_MARGIN_MINUTES - jitter
+
+where jitter is a stable per-row offset in [0, GHL_TOKEN_REFRESH_SPREAD_MINUTES).
+Tokens minted together (bulk installs, the old refresh-everything runs)
+therefore drift apart a little on every cycle instead of staying clustered.
+
+Each tick selects the rows due before the next tick, most urgent first and at
+most GHL_TOKEN_REFRESH_MAX_PER_TICK of them, and queues one refresh_oauth_token
+subtask per row on the critical queue. The countdowns are spaced evenly across
+the tick, so the refresh rate stays flat however many locations there are, and
+concurrency is bounded by the critical worker. Rows over the cap wait for the
+next tick.
+
+Location rows whose company has a CompanyToken are skipped, as before: the
+company refresh re-mints their tokens.
+
+refresh_after_auth_error is the inline path for ghl_request's 401 retry. It
+refreshes only the token row behind the request (a company-managed location
+re-mints its own token through its CompanyToken; CompanyToken and AgencyToken
+rows refresh themselves), single-flight: callers take a Redis lock per owning
+token, and whoever waits on it re-reads the row and reuses the new token
+instead of refreshing again. A failed refresh is
+remembered for NEGATIVE_CACHE_SECONDS so a revoked location cannot set off a
+refresh storm. Scheduled refreshes (refresh_one) take the same per-owner lock
+and re-check freshness inside it, so the two paths never spend one refresh
+token twice.
+"""
+
+import hashlib
+import logging
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import AgencyToken, CompanyToken, GHLAuthCredentials
+from core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+TICK_SECONDS = 300
+SCHEDULED_KEY = "ghl_token_refresh:scheduled:{kind}:{pk}"
+# Long enough to cover a tick's countdowns plus a busy critical queue.
+SCHEDULED_TTL_SECONDS = 3 * TICK_SECONDS
+FAILURE_RETRY_SECONDS = 1800
+
+INLINE_LOCK_KEY = "reloop:ghl_token_refresh:lock:{owner}"
+INLINE_FAILED_KEY = "ghl_token_refresh:failed:{kind}:{pk}"
+# Longer than one token call (60s timeout) so the lock outlives a slow refresh.
+LOCK_TIMEOUT_SECONDS = 90
+# How long a caller waits for someone else's in-flight refresh.
+LOCK_WAIT_SECONDS = 30
+NEGATIVE_CACHE_SECONDS = 60
+
+MODELS = {
+    "location": GHLAuthCredentials,
+    "company": CompanyToken,
+    "agency": AgencyToken,
+}
+
+
+def _margin():
+    return timedelta(minutes=getattr(settings, "GHL_TOKEN_REFRESH_MARGIN_MINUTES", 120))
+
+
+def _spread_seconds():
+    return max(1, int(getattr(settings, "GHL_TOKEN_REFRESH_SPREAD_MINUTES", 240) * 60))
+
+
+def _max_per_tick():
+    return max(1, getattr(settings, "GHL_TOKEN_REFRESH_MAX_PER_TICK", 200))
+
+
+def _refresher(kind):
+    from core.ghl_auth import refresh_agency_token, refresh_company_token, refresh_location_token
+
+    return {
+        "location": refresh_location_token,
+        "company": refresh_company_token,
+        "agency": refresh_agency_token,
+    }[kind]
+
+
+def expires_at(row):
+    if row.token_expires_at:
+        return row.token_expires_at
+    return row.updated_at + timedelta(seconds=row.expires_in or 0)
+
+
+def refresh_at(kind, row):
+    """When ``row`` should be refreshed."""
+    digest = hashlib.sha1(f"{kind}:{row.pk}".encode()).digest()
+    jitter = int.from_bytes(digest[:4], "big") % _spread_seconds()
+    return expires_at(row) - _margin() - timedelta(seconds=jitter)
+
+
+def _candidates(kind, horizon):
+    """Rows of ``kind`` that could be due before ``horizon`` (refined by refresh_at)."""
+    latest_expiry = horizon + _margin() + timedelta(seconds=_spread_seconds())
+    qs = MODELS[kind].objects.filter(Q(token_expires_at__lte=latest_expiry) | Q(token_expires_at__isnull=True))
+    if kind == "location":
+        qs = qs.exclude(company_id__in=CompanyToken.objects.values("company_id"))
+    return qs.only("pk", "token_expires_at", "updated_at", "expires_in")
+
+
+def due(now=None, horizon_seconds=TICK_SECONDS):
+    """[(refresh_at, kind, pk)] due before now + horizon_seconds, most urgent first."""
+    now = now or timezone.now()
+    horizon = now + timedelta(seconds=horizon_seconds)
+    rows = []
+    for kind in MODELS:
+        for row in _candidates(kind, horizon):
+            when = refresh_at(kind, row)
+            if when < horizon:
+                rows.append((when, kind, row.pk))
+    rows.sort(key=lambda entry: entry[0])
+    return rows
+
+
+def schedule():
+    """Queue refresh_oauth_token for this tick's due rows. Returns the summary dict."""
+    from core.tasks import refresh_oauth_token
+
+    now = timezone.now()
+    pending = due(now)
+    batch = pending[:_max_per_tick()]
+    summary = {"due": len(pending), "queued": 0, "already_queued": 0, "deferred": len(pending) - len(batch)}
+    for i, (when, kind, pk) in enumerate(batch):
+        if not cache.add(SCHEDULED_KEY.format(kind=kind, pk=pk), 1, SCHEDULED_TTL_SECONDS):
+            summary["already_queued"] += 1
+            continue
+        slot = i * TICK_SECONDS / len(batch)
+        countdown = min(max(slot, (when - now).total_seconds()), TICK_SECONDS - 1)
+        refresh_oauth_token.apply_async(args=[kind, str(pk)], countdown=round(countdown))
+        summary["queued"] += 1
+    if summary["deferred"]:
+        logger.warning("OAuth refresh backlog: %s token(s) deferred to the next tick", summary["deferred"])
+    return summary
+
+
+def _fresh(kind, row):
+    return refresh_at(kind, row) >= timezone.now() + timedelta(seconds=TICK_SECONDS)
+
+
+def refresh_one(kind, pk):
+    """
+    Refresh one token if it is still due. Returns "ok", "failed", "fresh",
+    "missing" or "busy" (another refresh of the same owner kept the lock; the
+    next tick looks again).
+    """
+    key = SCHEDULED_KEY.format(kind=kind, pk=pk)
+    result = "failed"
+    try:
+        row = MODELS[kind].objects.get(pk=pk)
+        owner, refresh = _owner(row)
+        # Same lock as the inline 401 path: refresh tokens are single-use.
+        with _owner_lock(owner) as locked:
+            row.refresh_from_db()
+            if _fresh(kind, row):
+                # Refreshed by someone else since it was scheduled.
+                result = "fresh"
+            elif not locked:
+                result = "busy"
+            elif refresh():
+                result = "ok"
+    except MODELS[kind].DoesNotExist:
+        result = "missing"
+    finally:
+        if result == "failed":
+            # Keep the marker so a broken token is retried every half hour, not every tick.
+            cache.set(key, 1, FAILURE_RETRY_SECONDS)
+        else:
+            cache.delete(key)
+    return result
+
+
+def refresh_due_now():
+    """Refresh every due token in-process (cron safety net; no worker needed). Returns counts."""
+    counts = {"ok": 0, "failed": 0, "fresh": 0, "missing": 0, "busy": 0, "already_queued": 0}
+    for _, kind, pk in due():
+        if not cache.add(SCHEDULED_KEY.format(kind=kind, pk=pk), 1, SCHEDULED_TTL_SECONDS):
+            # A worker has it (or it failed recently); refresh tokens are single-use.
+            counts["already_queued"] += 1
+            continue
+        counts[refresh_one(kind, pk)] += 1
+    return counts
+
+
+def kind_of(credentials):
+    """"location", "company" or "agency" for a token row (see MODELS)."""
+    for kind, model in MODELS.items():
+        if isinstance(credentials, model):
+            return kind
+    raise TypeError(f"Not a GHL token row: {type(credentials).__name__}")
+
+
+def _owner(credentials):
+    """(lock name, refresh callable) for the token that has to be refreshed for ``credentials``."""
+    from core.ghl_auth import refresh_location_token, refresh_managed_location_token
+
+    kind = kind_of(credentials)
+    if kind != "location":
+        return f"{kind}:{credentials.pk}", lambda: _refresher(kind)(credentials)
+    company_token = None
+    if credentials.company_id:
+        company_token = CompanyToken.objects.filter(company_id=credentials.company_id).first()
+    if company_token is not None:
+        # Re-read when called (under the lock): whoever held it before may have
+        # replaced the company's access and single-use refresh tokens.
+        return f"company:{company_token.pk}", lambda: refresh_managed_location_token(
+            credentials, CompanyToken.objects.get(pk=company_token.pk)
+        )
+    return f"location:{credentials.pk}", lambda: refresh_location_token(credentials)
+
+
+@contextmanager
+def _owner_lock(owner):
+    """
+    Hold the refresh lock for ``owner``. Yields False when another refresh kept
+    it past LOCK_WAIT_SECONDS, True otherwise (also when Redis is unavailable).
+    """
+    lock = None
+    try:
+        lock = get_redis().lock(
+            INLINE_LOCK_KEY.format(owner=owner), timeout=LOCK_TIMEOUT_SECONDS, blocking_timeout=LOCK_WAIT_SECONDS
+        )
+        acquired = lock.acquire()
+    except Exception as e:
+        logger.warning("OAuth refresh lock unavailable for %s, refreshing without it: %s", owner, e)
+        lock, acquired = None, True
+    if not acquired:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        if lock is not None:
+            try:
+                lock.release()
+            except Exception:
+                # Expired while refreshing; another caller may hold it now.
+                pass
+
+
+def _replaced(credentials, stale_token):
+    credentials.refresh_from_db()
+    return credentials.access_token != stale_token
+
+
+def refresh_after_auth_error(credentials, stale_token):
+    """
+    Single-flight refresh of ``credentials`` (GHLAuthCredentials, CompanyToken or
+    AgencyToken) after GHL rejected ``stale_token``. Returns True when
+    ``credentials`` (reloaded) now holds a different token.
+    """
+    if credentials.access_token != stale_token or _replaced(credentials, stale_token):
+        return True
+    failed_key = INLINE_FAILED_KEY.format(kind=kind_of(credentials), pk=credentials.pk)
+    if cache.get(failed_key):
+        return False
+
+    owner, refresh = _owner(credentials)
+    with _owner_lock(owner) as locked:
+        if not locked:
+            # Someone else's refresh is still running; use whatever it has saved by now.
+            return _replaced(credentials, stale_token)
+        if _replaced(credentials, stale_token):
+            return True
+        if cache.get(failed_key):
+            return False
+        if not refresh():
+            cache.set(failed_key, 1, NEGATIVE_CACHE_SECONDS)
+            return False
+    return _replaced(credentials, stale_token)
@@ -31,6 +31,7 @@ import stripe
 
 from core.models import GHLAuthCredentials
 from core.services import get_location_name
+from core.ghl_auth import ghl_request
 from core.service import GHLService
 from .serializers import UserSerializer, RegisterSerializer
 from .models import GHLAuthCredentials, Wallet, WalletTransaction, StripeCustomerData
@@ -274,6 +275,7 @@ from sms_management_app.services import GHLIntegrationService, TransmitSMSServic
 from core.models import GHLAuthCredentials, AgencyToken
 from django.utils import timezone
 from sms_management_app.utils import format_password
+from sms_management_app.usage_rollup import wallet_usage
 
 def tokens(request):
     from core.ghl_auth import exchange_location_oauth_code, parse_location_ids_from_query_params
@@ -502,7 +504,7 @@ class GHLAuthCredentialsDetailView(generics.RetrieveUpdateDestroyAPIView):
                         status=status.HTTP_400_BAD_REQUEST,
                     )
 
-                service = GHLService(access_token=main_creds.access_token)
+                service = GHLService(access_token=main_creds.access_token, auth_credentials=main_creds)
                 service.update_contact_custom_field(
                     contact_id=contact_id,
                     custom_field_id=settings.GHL_CF_STRIPE_ID,
@@ -639,13 +641,15 @@ class WalletTransactionListingViewSet(viewsets.ReadOnlyModelViewSet):
 class WalletSummaryView(APIView):
     def get(self, request, *args, **kwargs):
         qs = Wallet.objects.all()
+        # Ledger totals from the daily rollup instead of scanning WalletTransaction.
+        usage = wallet_usage()
 
         summary_data = {
             "total_accounts": qs.count(),
             "total_balance": qs.aggregate(total=Sum("balance"))["total"] or 0,
-            "total_credits": WalletTransaction.objects.filter(transaction_type="credit").aggregate(total=Sum("amount"))["total"] or 0,
-            "total_debits": WalletTransaction.objects.filter(transaction_type="debit").aggregate(total=Sum("amount"))["total"] or 0,
-            "total_transactions": WalletTransaction.objects.count(),
+            "total_credits": usage.get("credit", {}).get("amount", 0),
+            "total_debits": usage.get("debit", {}).get("amount", 0),
+            "total_transactions": sum(values["transaction_count"] for values in usage.values()),
         }
         return Response(summary_data, status=200)
 
@@ -707,7 +711,7 @@ def stripe_customer_lookup(request):
 
         location_id = None
         try:
-            response = requests.get(url, headers=headers, timeout=15)
+            response = ghl_request("GET", url, headers=headers, auth_credentials=agency, timeout=15)
             response.raise_for_status()
             location_data = response.json()
 
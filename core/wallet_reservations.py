@@ -0,0 +1,352 @@
+"""
+Pre-authorised wallet credit reservations.
+
+Wallet.charge_message locks the wallet row and inserts a WalletTransaction for
+every message, so a large campaign for one location serialises on that row.
+With reservations a worker instead:
+
+    1. reserves a block of credit (one locked update: Wallet.reserved += block),
+    2. charges messages against it in memory, recording each charge as a
+       WalletReservationEntry row in the caller's transaction (one insert, no
+       wallet lock), so the debit commits or rolls back with the message,
+    3. settles entries in batches: one wallet lock, a bulk_create of the exact
+       per-message debit rows, balance/credit/segment counters applied and the
+       entries deleted in the same transaction,
+    4. releases the reservation when it runs out or expires, returning any
+       credit not covered by settled entries to the wallet.
+
+Entries are only ever removed by the transaction that writes their ledger rows,
+so a crash or a cache outage cannot lose a charge. An entry that commits after
+its reservation was released (a charge racing the release) is still settled,
+against the wallet balance, since its credit is no longer held.
+release_expired_wallet_reservations runs every minute to settle entries and
+release holds left behind by workers that died, so the ledger lags at most one
+sweep behind.
+
+Enable with WALLET_RESERVATIONS_ENABLED; block size, TTL and flush thresholds
+are WALLET_RESERVATION_* settings.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from decimal import ROUND_DOWN, Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Wallet, WalletReservation, WalletReservationEntry, WalletTransaction
+
+logger = logging.getLogger(__name__)
+
+def enabled():
+    return bool(getattr(settings, "WALLET_RESERVATIONS_ENABLED", False))
+
+
+def _block_amount():
+    return Decimal(str(getattr(settings, "WALLET_RESERVATION_BLOCK", "5.00")))
+
+
+def _ttl_seconds():
+    return getattr(settings, "WALLET_RESERVATION_TTL_SECONDS", 120)
+
+
+def _flush_every():
+    return getattr(settings, "WALLET_RESERVATION_FLUSH_EVERY", 50)
+
+
+def _flush_seconds():
+    return getattr(settings, "WALLET_RESERVATION_FLUSH_SECONDS", 2)
+
+
+def _holder():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _segments(message):
+    return (len(message) // 160) + (1 if len(message) % 160 else 0)
+
+
+class _Hold:
+    """This process's view of one active reservation."""
+
+    def __init__(self, reservation):
+        self.reservation_id = reservation.id
+        self.remaining = reservation.amount
+        self.rates = {
+            "inbound": reservation.inbound_segment_charge,
+            "outbound": reservation.outbound_segment_charge,
+        }
+        # Stop using the hold well before the sweeper may release it.
+        self.usable_until = time.monotonic() + _ttl_seconds() / 2
+        self.pending = 0
+        self.last_flush = time.monotonic()
+        self.released = False
+
+
+_lock = threading.Lock()
+_wallet_locks = {}
+_holds = {}
+_holds_pid = None
+
+
+def _wallet_lock(wallet_id):
+    global _holds_pid
+    with _lock:
+        if _holds_pid != os.getpid():
+            # Forked child: the parent's holds belong to the parent (the sweeper cleans up).
+            _holds.clear()
+            _wallet_locks.clear()
+            _holds_pid = os.getpid()
+        return _wallet_locks.setdefault(wallet_id, threading.Lock())
+
+
+def _open(wallet_id, cost_for):
+    """Reserve a new block; cost_for(wallet) prices the first charge with the wallet's rates."""
+    with transaction.atomic():
+        wallet = Wallet.objects.select_for_update().get(pk=wallet_id)
+        cost = cost_for(wallet)
+        available = wallet.available_balance
+        if available < cost:
+            raise ValidationError("Insufficient balance to send message")
+
+        # Never grab more than a quarter of what is left, so several workers can
+        # still reserve when the wallet runs low.
+        quarter = (available / 4).quantize(Decimal("0.001"), rounding=ROUND_DOWN)
+        amount = max(cost, min(_block_amount(), quarter))
+        wallet.reserved += amount
+        wallet.save(update_fields=["reserved"])
+
+        reservation = WalletReservation.objects.create(
+            wallet=wallet,
+            holder=_holder(),
+            amount=amount,
+            inbound_segment_charge=wallet.inbound_segment_charge,
+            outbound_segment_charge=wallet.outbound_segment_charge,
+            expires_at=timezone.now() + timedelta(seconds=_ttl_seconds()),
+        )
+    return _Hold(reservation)
+
+
+def charge(wallet_id, direction, message, reference_id=None):
+    """
+    Charge one message against this process's reservation for the wallet.
+
+    Same contract as Wallet.charge_message: returns (cost, segments) and raises
+    ValidationError when the wallet cannot cover the message.
+
+    Called inside the caller's transaction: the WalletReservationEntry (and a
+    newly opened reservation) commit or roll back with it. In-memory hold state
+    only changes on commit: a new reservation becomes this process's hold and a
+    replaced hold is released.
+    """
+    if direction not in ("inbound", "outbound"):
+        raise ValidationError("Invalid message direction")
+    segments = _segments(message)
+
+    replaced = None
+    opened = False
+    with _wallet_lock(wallet_id):
+        hold = _holds.get(wallet_id)
+        cost = segments * hold.rates[direction] if hold else None
+        if hold is None or hold.usable_until < time.monotonic() or hold.remaining < cost:
+            if hold is not None:
+                _holds.pop(wallet_id, None)
+                replaced = hold
+            hold = _open(wallet_id, lambda w: segments * (
+                w.inbound_segment_charge if direction == "inbound" else w.outbound_segment_charge
+            ))
+            opened = True
+            cost = segments * hold.rates[direction]
+        # Spent in memory right away; on rollback only this hold's headroom is lost.
+        hold.remaining -= cost
+
+    WalletReservationEntry.objects.create(
+        reservation_id=hold.reservation_id,
+        amount=cost,
+        segments=segments,
+        direction=direction,
+        reference_id=str(reference_id) if reference_id is not None else None,
+    )
+    # on_commit callbacks run in registration order (immediately outside atomic).
+    if replaced is not None:
+        transaction.on_commit(lambda: _release_hold(wallet_id, replaced))
+    if opened:
+        transaction.on_commit(lambda: _install(wallet_id, hold))
+    transaction.on_commit(lambda: _after_charge(wallet_id, hold))
+    return cost, segments
+
+
+def _install(wallet_id, hold):
+    """Make a committed reservation this process's hold for the wallet."""
+    with _wallet_lock(wallet_id):
+        previous = _holds.get(wallet_id)
+        _holds[wallet_id] = hold
+    if previous is not None and previous is not hold:
+        # Another thread opened one in the meantime; keep the newest.
+        _release_hold(wallet_id, previous)
+
+
+def _drop(wallet_id, hold):
+    """Forget ``hold`` (caller holds the wallet lock)."""
+    hold.released = True
+    if _holds.get(wallet_id) is hold:
+        _holds.pop(wallet_id, None)
+
+
+def _release_hold(wallet_id, hold):
+    with _wallet_lock(wallet_id):
+        _drop(wallet_id, hold)
+    try:
+        release(hold.reservation_id)
+    except WalletReservation.DoesNotExist:
+        logger.warning("Wallet reservation %s no longer exists", hold.reservation_id)
+
+
+def _after_charge(wallet_id, hold):
+    """Post-commit half of charge(): settle the hold's entries every so often."""
+    with _wallet_lock(wallet_id):
+        if hold.released:
+            return
+        hold.pending += 1
+        if hold.pending < _flush_every() and time.monotonic() - hold.last_flush < _flush_seconds():
+            return
+        hold.pending = 0
+        hold.last_flush = time.monotonic()
+        try:
+            settle(hold.reservation_id)
+        except WalletReservation.DoesNotExist:
+            logger.warning("Wallet reservation %s no longer exists; dropping hold", hold.reservation_id)
+            _drop(wallet_id, hold)
+        except Exception:
+            # The entries are committed; the sweep will settle them.
+            logger.exception("Reservation settle failed for %s", hold.reservation_id)
+
+
+def _locked_reservation(reservation_id):
+    # NO KEY UPDATE: charges inserting entries hold KEY SHARE on the reservation
+    # row, so settling never waits for (or blocks) an open charging transaction.
+    return WalletReservation.objects.select_for_update(no_key=True).get(pk=reservation_id)
+
+
+def _settle_locked(reservation):
+    """Move committed entries into the ledger. Caller holds the reservation lock."""
+    entries = list(WalletReservationEntry.objects.filter(reservation_id=reservation.id).order_by("id"))
+    if not entries:
+        return 0
+
+    wallet = Wallet.objects.select_for_update().get(pk=reservation.wallet_id)
+    balance = wallet.balance
+    total = Decimal("0")
+    outbound_total = Decimal("0")
+    outbound_segments = 0
+    ledger = []
+    for entry in entries:
+        # Same per-charge rounding as saving Wallet.balance after each charge_message.
+        balance = (balance - entry.amount).quantize(Decimal("0.01"))
+        total += entry.amount
+        if entry.direction == "outbound":
+            outbound_total += entry.amount
+            outbound_segments += entry.segments
+        ledger.append(
+            WalletTransaction(
+                wallet=wallet,
+                transaction_type="debit",
+                amount=entry.amount,
+                balance_after=balance,
+                description=f"Charged for {entry.direction} SMS ({entry.segments} segments)",
+                reference_id=entry.reference_id,
+                direction=entry.direction,
+                segments=entry.segments,
+                created_at=entry.created_at,
+            )
+        )
+
+    WalletTransaction.objects.bulk_create(ledger)
+    WalletReservationEntry.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+
+    wallet.balance = balance
+    if reservation.status == "active":
+        # A released reservation already gave its unsettled credit back.
+        wallet.reserved = max(Decimal("0"), wallet.reserved - total)
+    wallet.cred_spent += outbound_total
+    wallet.cred_remaining -= outbound_total
+    wallet.seg_used += outbound_segments
+    wallet.seg_remaining -= outbound_segments
+    wallet.save(update_fields=[
+        "balance", "reserved", "cred_spent", "cred_remaining", "seg_used", "seg_remaining"
+    ])
+
+    reservation.settled_amount += total
+    reservation.settled_entries += len(entries)
+    reservation.save(update_fields=["settled_amount", "settled_entries"])
+    return len(entries)
+
+
+def settle(reservation_id):
+    """Move a reservation's committed entries into WalletTransaction rows. Returns entries written."""
+    with transaction.atomic():
+        return _settle_locked(_locked_reservation(reservation_id))
+
+
+def release(reservation_id):
+    """Settle, then hand credit not covered by settled entries back to the wallet."""
+    with transaction.atomic():
+        reservation = _locked_reservation(reservation_id)
+        if reservation.status != "active":
+            return
+        _settle_locked(reservation)
+
+        wallet = Wallet.objects.select_for_update().get(pk=reservation.wallet_id)
+        unused = max(Decimal("0"), reservation.amount - reservation.settled_amount)
+        wallet.reserved = max(Decimal("0"), wallet.reserved - unused)
+        wallet.save(update_fields=["reserved"])
+
+        reservation.status = "released"
+        reservation.released_at = timezone.now()
+        reservation.save(update_fields=["status", "released_at"])
+
+
+def release_local_holds():
+    """Release every reservation held by this process (shutdown, benchmarks)."""
+    with _lock:
+        held = list(_holds.items())
+    for wallet_id, hold in held:
+        if _holds.get(wallet_id) is hold:
+            _release_hold(wallet_id, hold)
+
+
+def sweep():
+    """Settle all active reservations, release expired ones and settle late entries of released ones."""
+    summary = {"settled_entries": 0, "released": 0, "errors": 0}
+    now = timezone.now()
+    for reservation_id, expires_at in WalletReservation.objects.filter(status="active").values_list(
+        "id", "expires_at"
+    ):
+        try:
+            if expires_at <= now:
+                release(reservation_id)
+                summary["released"] += 1
+            else:
+                summary["settled_entries"] += settle(reservation_id)
+        except Exception:
+            summary["errors"] += 1
+            logger.exception("Failed to sweep wallet reservation %s", reservation_id)
+
+    late = (
+        WalletReservationEntry.objects.filter(reservation__status="released")
+        .values_list("reservation_id", flat=True)
+        .distinct()
+    )
+    for reservation_id in late:
+        try:
+            summary["settled_entries"] += settle(reservation_id)
+        except Exception:
+            summary["errors"] += 1
+            logger.exception("Failed to settle late entries of wallet reservation %s", reservation_id)
+    return summary
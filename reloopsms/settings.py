@@ -155,6 +155,50 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Shared cache for all gunicorn + Celery processes (rate limits, dedupe keys, tenant lookups).
+REDIS_CACHE_URL = config("REDIS_CACHE_URL", default="redis://localhost:6379/1")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_CACHE_URL,
+        "KEY_PREFIX": "reloop",
+    }
+}
+# core.tenant_cache: per-process LRU in front of Redis for hot tenant lookups.
+TENANT_CACHE_L1_SIZE = config("TENANT_CACHE_L1_SIZE", default=1024, cast=int)
+TENANT_CACHE_L1_TTL = config("TENANT_CACHE_L1_TTL", default=30, cast=int)
+TENANT_CACHE_L2_TTL = config("TENANT_CACHE_L2_TTL", default=300, cast=int)
+
+# core.http_client: keep-alive pools + timeouts for TransmitSMS / GHL calls.
+HTTP_POOL_CONNECTIONS = config("HTTP_POOL_CONNECTIONS", default=10, cast=int)
+HTTP_POOL_MAXSIZE = config("HTTP_POOL_MAXSIZE", default=20, cast=int)
+HTTP_MAX_RETRIES = config("HTTP_MAX_RETRIES", default=2, cast=int)
+HTTP_CONNECT_TIMEOUT = config("HTTP_CONNECT_TIMEOUT", default=5, cast=float)
+HTTP_READ_TIMEOUT = config("HTTP_READ_TIMEOUT", default=30, cast=float)
+# Load tests only: "host=base_url,..." re-points provider hosts (see fake_providers).
+HTTP_HOST_OVERRIDES = dict(
+    item.strip().split("=", 1)
+    for item in config("HTTP_HOST_OVERRIDES", default="").split(",")
+    if "=" in item
+)
+
+# core.rate_limit: GHL token buckets shared by every worker (Redis + Lua).
+# GHL allows 100 requests / 10 s and 200k / day per location for our app.
+GHL_RATE_GLOBAL_PER_SECOND = config("GHL_RATE_GLOBAL_PER_SECOND", default=10, cast=float)
+GHL_RATE_GLOBAL_BURST = config("GHL_RATE_GLOBAL_BURST", default=20, cast=int)
+GHL_RATE_LOCATION_PER_SECOND = config("GHL_RATE_LOCATION_PER_SECOND", default=10, cast=float)
+GHL_RATE_LOCATION_BURST = config("GHL_RATE_LOCATION_BURST", default=100, cast=int)
+GHL_RATE_LOCATION_PER_DAY = config("GHL_RATE_LOCATION_PER_DAY", default=200000, cast=int)
+
+# core.wallet_reservations: outbound charges spend from reserved credit blocks
+# instead of locking the wallet row per message (ledger settled in batches).
+WALLET_RESERVATIONS_ENABLED = config("WALLET_RESERVATIONS_ENABLED", default=False, cast=bool)
+WALLET_RESERVATION_BLOCK = config("WALLET_RESERVATION_BLOCK", default="5.00")
+WALLET_RESERVATION_TTL_SECONDS = config("WALLET_RESERVATION_TTL_SECONDS", default=120, cast=int)
+WALLET_RESERVATION_FLUSH_EVERY = config("WALLET_RESERVATION_FLUSH_EVERY", default=50, cast=int)
+WALLET_RESERVATION_FLUSH_SECONDS = config("WALLET_RESERVATION_FLUSH_SECONDS", default=2, cast=float)
+
+
 CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = config("CELERY_RESULT_BACKEND", default="redis://localhost:6379/0")
 CELERY_ACCEPT_CONTENT = ['json']
@@ -171,8 +215,15 @@ CELERY_TASK_ROUTES = {
     "core.tasks.make_api_call": {"queue": "critical"},
     "core.tasks.make_api_call_for_agency_token": {"queue": "critical"},
     "core.tasks.make_api_call_for_company_token": {"queue": "critical"},
+    "core.tasks.schedule_oauth_refreshes": {"queue": "critical"},
+    "core.tasks.refresh_oauth_token": {"queue": "critical"},
     "core.tasks.notify_ghl_auth_failure_task": {"queue": "critical"},
     "sms_management_app.tasks.send_outbound_sms_task": {"queue": "outbound"},
+    "sms_management_app.tasks.send_campaign_batch_task": {"queue": "outbound"},
+    "sms_management_app.tasks.submit_campaign_sends": {"queue": "outbound"},
+    "sms_management_app.tasks.flush_campaign_sends": {"queue": "outbound"},
+    "sms_management_app.tasks.drain_ghl_webhook_inbox": {"queue": "ingest"},
+    "sms_management_app.tasks.apply_transmit_dlrs": {"queue": "ingest"},
 }
 # Lower prefetch helps long-running tasks release the next message sooner (tune per deployment).
 CELERY_WORKER_PREFETCH_MULTIPLIER = config("CELERY_WORKER_PREFETCH_MULTIPLIER", default=2, cast=int)
@@ -183,23 +234,15 @@ from celery.schedules import crontab
 # DatabaseScheduler ignores this dict once PeriodicTask rows exist.
 CELERY_BEAT_SCHEDULE = {
 
-    # OAuth: every 10h on the critical queue (staggered). Run workers:
+    # OAuth: refresh tokens as they near expiry, spread across each 5 minute
+    # tick, on the critical queue (core/token_refresh.py). The old 10-hourly
+    # make-api-call* entries are disabled by core migration 0036. Run workers:
     #   reloop-celery-critical → -Q critical
     #   reloop-celery-outbound → -Q outbound
     #   reloop-celery          → -Q celery
-    "make-api-call-every-6-hours": {
-        "task": "core.tasks.make_api_call",
-        "schedule": crontab(minute=0, hour="*/10"),
-        "options": {"queue": "critical"},
-    },
-    "make-api-call-for-agency-every-6-hours": {
-        "task": "core.tasks.make_api_call_for_agency_token",
-        "schedule": crontab(minute=15, hour="*/10"),
-        "options": {"queue": "critical"},
-    },
-    "make-api-call-for-company-every-6-hours": {
-        "task": "core.tasks.make_api_call_for_company_token",
-        "schedule": crontab(minute=20, hour="*/10"),
+    "schedule-oauth-refreshes": {
+        "task": "core.tasks.schedule_oauth_refreshes",
+        "schedule": crontab(minute="*/5"),
         "options": {"queue": "critical"},
     },
     "sync-contact-wallet-custom-fields-every-10-hours": {
@@ -221,6 +264,68 @@ CELERY_BEAT_SCHEDULE = {
         "task": "sms_management_app.tasks.sync_client_owned_numbers",
         "schedule": crontab(minute=30, hour=0),
     },
+
+    # Safety sweep for fast-ack webhooks (retries, crashed workers, missed kicks).
+    "drain-ghl-webhook-inbox": {
+        "task": "sms_management_app.tasks.drain_ghl_webhook_inbox",
+        "schedule": crontab(minute="*"),
+        "options": {"queue": "ingest"},
+    },
+
+    # Backstop for the outbox relay process; purges published rows.
+    "relay-task-outbox": {
+        "task": "core.tasks.relay_task_outbox",
+        "schedule": crontab(minute="*"),
+        "options": {"queue": "celery"},
+    },
+
+    # Safety flush for coalesced GHL status updates (missed kicks).
+    "flush-ghl-status-updates": {
+        "task": "sms_management_app.tasks.flush_ghl_status_updates",
+        "schedule": crontab(minute="*"),
+        "options": {"queue": "celery"},
+    },
+
+    # Safety flush for campaign-batched outbound sends (missed kicks).
+    "flush-campaign-sends": {
+        "task": "sms_management_app.tasks.flush_campaign_sends",
+        "schedule": crontab(minute="*"),
+        "options": {"queue": "outbound"},
+    },
+
+    # Safety sweep for buffered TransmitSMS DLRs.
+    "apply-transmit-dlrs": {
+        "task": "sms_management_app.tasks.apply_transmit_dlrs",
+        "schedule": crontab(minute="*"),
+        "options": {"queue": "ingest"},
+    },
+
+    # Fold trigger-written usage deltas into the dashboard rollups.
+    "fold-usage-rollups": {
+        "task": "sms_management_app.tasks.fold_usage_rollups",
+        "schedule": crontab(minute="*"),
+        "options": {"queue": "celery"},
+    },
+
+    # Full Transmit available-number inventory for GetAvailableNumbers.
+    "refresh-number-inventory": {
+        "task": "sms_management_app.tasks.refresh_number_inventory",
+        "schedule": crontab(minute="*/10"),
+        "options": {"queue": "celery"},
+    },
+
+    # Reconcile the local mirror of the GHL sms_credits records.
+    "sync-sms-credits-records": {
+        "task": "core.tasks.sync_sms_credits_records",
+        "schedule": crontab(minute="*/15"),
+        "options": {"queue": "celery"},
+    },
+
+    # Settle reservation journals into the ledger; return credit from expired holds.
+    "release-expired-wallet-reservations": {
+        "task": "core.tasks.release_expired_wallet_reservations",
+        "schedule": crontab(minute="*"),
+    },
 }
 
 
@@ -285,6 +390,77 @@ TRANSMIT_SMS_AGENCY_API_KEY = config('TRANSMIT_SMS_AGENCY_API_KEY')
 TRANSMIT_SMS_AGENCY_API_SECRET = config('TRANSMIT_SMS_AGENCY_API_SECRET')
 BASE_URL = config('BASE_URI', 'http://localhost:8000')
 
+# GHL outbound webhook: buffer in GHLWebhookInbox and return 202 instead of
+# charging/queuing inside the request. Needs a worker on the "ingest" queue.
+GHL_WEBHOOK_FAST_ACK = config("GHL_WEBHOOK_FAST_ACK", default=False, cast=bool)
+
+# TransmitSMS DLR callback: buffer in TransmitDLRInbox and apply in micro-batches
+# (bulk status update, one refund lock per wallet). Also consumed on "ingest".
+TRANSMIT_DLR_BATCHING = config("TRANSMIT_DLR_BATCHING", default=False, cast=bool)
+
+# GHL status updates are coalesced per ghl_message_id for this many seconds so
+# only the latest status reaches GHL (0 = send every update immediately).
+GHL_STATUS_COALESCE_SECONDS = config("GHL_STATUS_COALESCE_SECONDS", default=2, cast=int)
+
+# Outbound SMS with the same body from the same TransmitSMSAccount, queued within
+# the window, go to Transmit as one multi-recipient send (campaign_batcher).
+TRANSMIT_CAMPAIGN_BATCHING = config("TRANSMIT_CAMPAIGN_BATCHING", default=False, cast=bool)
+TRANSMIT_CAMPAIGN_WINDOW_SECONDS = config("TRANSMIT_CAMPAIGN_WINDOW_SECONDS", default=3, cast=int)
+TRANSMIT_CAMPAIGN_MAX_RECIPIENTS = config("TRANSMIT_CAMPAIGN_MAX_RECIPIENTS", default=500, cast=int)
+
+# Adaptive Transmit send rate (sms_management_app/transmit_rate.py), msg/s per
+# TransmitSMSAccount and for the agency: grows while sends succeed, is cut on 429
+# (which also pauses the account's queue, doubling per consecutive 429).
+TRANSMIT_RATE_ACCOUNT_INITIAL = config("TRANSMIT_RATE_ACCOUNT_INITIAL", default=8, cast=float)
+TRANSMIT_RATE_ACCOUNT_MIN = config("TRANSMIT_RATE_ACCOUNT_MIN", default=1, cast=float)
+TRANSMIT_RATE_ACCOUNT_MAX = config("TRANSMIT_RATE_ACCOUNT_MAX", default=30, cast=float)
+TRANSMIT_RATE_AGENCY_INITIAL = config("TRANSMIT_RATE_AGENCY_INITIAL", default=16, cast=float)
+TRANSMIT_RATE_AGENCY_MIN = config("TRANSMIT_RATE_AGENCY_MIN", default=2, cast=float)
+TRANSMIT_RATE_AGENCY_MAX = config("TRANSMIT_RATE_AGENCY_MAX", default=100, cast=float)
+TRANSMIT_RATE_INCREASE = config("TRANSMIT_RATE_INCREASE", default=1, cast=float)
+TRANSMIT_RATE_DECREASE = config("TRANSMIT_RATE_DECREASE", default=0.5, cast=float)
+TRANSMIT_RATE_PAUSE_SECONDS = config("TRANSMIT_RATE_PAUSE_SECONDS", default=15, cast=int)
+
+# Request handlers write Celery publishes to core.TaskOutbox in the same
+# transaction as the SMS/wallet rows; run_outbox_relay publishes them.
+TASK_OUTBOX_ENABLED = config("TASK_OUTBOX_ENABLED", default=False, cast=bool)
+
+# Per-location GHL dashboard payloads are cached this long at most; they are
+# invalidated on writes, the TTL only bounds paths that bypass signals (0 = off).
+GHL_DASHBOARD_CACHE_SECONDS = config("GHL_DASHBOARD_CACHE_SECONDS", default=60, cast=int)
+
+# Background message exports (sms_management_app/message_export.py). The
+# directory must be shared by the Celery workers and the web process.
+MESSAGE_EXPORT_DIR = config("MESSAGE_EXPORT_DIR", default=str(BASE_DIR / "exports"))
+MESSAGE_EXPORT_CHUNKS = config("MESSAGE_EXPORT_CHUNKS", default=8, cast=int)
+MESSAGE_EXPORT_RETENTION_HOURS = config("MESSAGE_EXPORT_RETENTION_HOURS", default=24, cast=int)
+# The synchronous CSV endpoint answers 413 above this many rows (0 = no limit).
+MESSAGE_EXPORT_SYNC_MAX_ROWS = config("MESSAGE_EXPORT_SYNC_MAX_ROWS", default=50000, cast=int)
+
+# New installs within this window share one GHL custom menu update.
+GHL_CUSTOM_MENU_DEBOUNCE_SECONDS = config("GHL_CUSTOM_MENU_DEBOUNCE_SECONDS", default=30, cast=int)
+
+# Contacts updated in parallel by sync_contact_wallet_custom_fields (each PUT
+# also takes a token from the shared GHL rate limiter).
+GHL_CONTACT_SYNC_CONCURRENCY = config("GHL_CONTACT_SYNC_CONCURRENCY", default=4, cast=int)
+
+# Client accounts fetched in parallel by sync_client_owned_numbers.
+NUMBER_SYNC_CONCURRENCY = config("NUMBER_SYNC_CONCURRENCY", default=8, cast=int)
+
+# Page size used when number_inventory pages through Transmit's available numbers.
+NUMBER_INVENTORY_PAGE_SIZE = config("NUMBER_INVENTORY_PAGE_SIZE", default=500, cast=int)
+
+# Parquet analytics export (manage.py export_analytics_parquet, needs pyarrow).
+# Days younger than the settle window are skipped: DLRs still change statuses.
+ANALYTICS_EXPORT_DIR = config("ANALYTICS_EXPORT_DIR", default=str(BASE_DIR / "analytics"))
+ANALYTICS_EXPORT_SETTLE_DAYS = config("ANALYTICS_EXPORT_SETTLE_DAYS", default=2, cast=int)
+
+# Expiry-aware OAuth refresh (schedule_oauth_refreshes): refresh this long before
+# expiry, plus a stable per-token offset within the spread; cap per 5 minute tick.
+GHL_TOKEN_REFRESH_MARGIN_MINUTES = config("GHL_TOKEN_REFRESH_MARGIN_MINUTES", default=120, cast=int)
+GHL_TOKEN_REFRESH_SPREAD_MINUTES = config("GHL_TOKEN_REFRESH_SPREAD_MINUTES", default=240, cast=int)
+GHL_TOKEN_REFRESH_MAX_PER_TICK = config("GHL_TOKEN_REFRESH_MAX_PER_TICK", default=200, cast=int)
+
 
 STRIPE_TEST_API_KEY = config("STRIPE_TEST_API_KEY")
 STRIPE_LIVE_API_KEY = config("STRIPE_LIVE_API_KEY")
@@ -0,0 +1,248 @@
+"""
+Columnar (Parquet) export of SMSMessage and WalletTransaction for finance/ops.
+
+Layout under ANALYTICS_EXPORT_DIR, Hive-partitioned so DuckDB, Spark, Athena
+and pandas read it as one dataset per table:
+
+    messages/day=2026-06-19/location_id=<ghl location>/part-0.parquet
+    wallet_transactions/day=2026-06-19/location_id=<ghl location>/part-0.parquet
+
+Columns are typed: UTC timestamps, decimal128 money (same precision as the
+models) and dictionary-encoded low-cardinality strings (status, direction,
+error_category, transaction_type, location_name). Days are UTC.
+
+Exports are incremental by day. A day directory only appears, by atomic rename
+of a hidden staging directory, once every location in it is written, so a run
+exports the closed days that have no directory yet and never rewrites earlier
+ones. Days newer than ANALYTICS_EXPORT_SETTLE_DAYS are left for a later run
+because DLRs still change message status for a while after sending.
+Use ``rebuild=True`` (``--rebuild``) to replace days that already exist.
+
+pyarrow is optional: only this export needs it (``pip install pyarrow``).
+"""
+
+import itertools
+import logging
+import os
+import shutil
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.models import GHLAuthCredentials, Wallet, WalletTransaction
+from sms_management_app import usage_rollup
+from sms_management_app.error_sanitize import sanitize_error_text
+from sms_management_app.models import SMSMessage
+
+logger = logging.getLogger(__name__)
+
+ITERATOR_CHUNK_SIZE = 5000
+COMPRESSION = "zstd"
+
+# (column, source field, type). Types: "string", "dict" (dictionary<int32, string>),
+# "timestamp" (us, UTC), "int32", "decimal:P,S". "location_name" is filled from
+# the partition's account, not read per row.
+MESSAGES = {
+    "name": "messages",
+    "model": SMSMessage,
+    "owner_field": "ghl_account_id",
+    "columns": [
+        ("id", "id", "string"),
+        ("created_at", "created_at", "timestamp"),
+        ("sent_at", "sent_at", "timestamp"),
+        ("delivered_at", "delivered_at", "timestamp"),
+        ("direction", "direction", "dict"),
+        ("status", "status", "dict"),
+        ("error_category", "error_category", "dict"),
+        ("error_message", "error_message", "string"),
+        ("from_number", "from_number", "string"),
+        ("to_number", "to_number", "string"),
+        ("message_content", "message_content", "string"),
+        ("cost", "cost", "decimal:8,3"),
+        ("segments", "segments", "int32"),
+        ("ghl_account_id", "ghl_account_id", "string"),
+        ("transmit_account_id", "transmit_account_id", "string"),
+        ("ghl_message_id", "ghl_message_id", "string"),
+        ("transmit_message_id", "transmit_message_id", "string"),
+    ],
+    "rollup": usage_rollup.MESSAGE_ROLLUP,
+}
+WALLET_TRANSACTIONS = {
+    "name": "wallet_transactions",
+    "model": WalletTransaction,
+    "owner_field": "wallet_id",
+    "columns": [
+        ("id", "id", "string"),
+        ("created_at", "created_at", "timestamp"),
+        ("transaction_type", "transaction_type", "dict"),
+        ("direction", "direction", "dict"),
+        ("amount", "amount", "decimal:10,3"),
+        ("balance_after", "balance_after", "decimal:10,3"),
+        ("segments", "segments", "int32"),
+        ("reference_id", "reference_id", "string"),
+        ("description", "description", "string"),
+        ("wallet_id", "wallet_id", "string"),
+    ],
+    "rollup": usage_rollup.WALLET_ROLLUP,
+}
+DATASETS = [MESSAGES, WALLET_TRANSACTIONS]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("The analytics export needs pyarrow: pip install pyarrow")
+    return pyarrow, pyarrow.parquet
+
+
+def export_root():
+    return str(getattr(settings, "ANALYTICS_EXPORT_DIR", os.path.join(settings.BASE_DIR, "analytics")))
+
+
+def settle_days():
+    return getattr(settings, "ANALYTICS_EXPORT_SETTLE_DAYS", 2)
+
+
+def _day_dir(root, spec, day):
+    return os.path.join(root, spec["name"], f"day={day.isoformat()}")
+
+
+def _arrow_type(pa, kind):
+    if kind == "timestamp":
+        return pa.timestamp("us", tz="UTC")
+    if kind == "int32":
+        return pa.int32()
+    if kind.startswith("decimal:"):
+        precision, scale = kind.split(":")[1].split(",")
+        return pa.decimal128(int(precision), int(scale))
+    return pa.string()
+
+
+def schema(spec):
+    """Arrow schema of ``spec``'s files (location_name appended)."""
+    pa, _ = _pyarrow()
+    fields = []
+    for column, _, kind in spec["columns"]:
+        if kind == "dict":
+            fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(column, _arrow_type(pa, kind)))
+    fields.append(pa.field("location_name", pa.dictionary(pa.int32(), pa.string())))
+    return pa.schema(fields)
+
+
+def _owners(spec):
+    """{owner id: (location_id, location_name)} for the dataset's partition key."""
+    locations = {
+        account_id: (location_id or str(account_id), location_name or "")
+        for account_id, location_id, location_name in GHLAuthCredentials.objects.values_list(
+            "id", "location_id", "location_name"
+        )
+    }
+    if spec["owner_field"] == "ghl_account_id":
+        return locations
+    return {
+        wallet_id: locations.get(account_id, (str(account_id), ""))
+        for wallet_id, account_id in Wallet.objects.values_list("id", "account_id")
+    }
+
+
+def _table(pa, spec, table_schema, rows, location_name):
+    arrays = []
+    for index, (column, _, kind) in enumerate(spec["columns"]):
+        values = [row[index] for row in rows]
+        if column == "error_message":
+            values = [sanitize_error_text(value, placeholder_for_polluted=True) if value else value for value in values]
+        elif kind == "string":
+            values = [None if value is None else str(value) for value in values]
+        if kind == "dict":
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=_arrow_type(pa, kind)))
+    arrays.append(pa.array([location_name] * len(rows), type=pa.string()).dictionary_encode())
+    return pa.Table.from_arrays(arrays, schema=table_schema)
+
+
+def export_day(spec, day, root, owners=None):
+    """
+    Write one UTC day of ``spec`` (every location) and publish it atomically.
+    Returns {"rows": n, "partitions": n}.
+    """
+    pa, pq = _pyarrow()
+    owners = owners if owners is not None else _owners(spec)
+    table_schema = schema(spec)
+    target = _day_dir(root, spec, day)
+    staging = os.path.join(root, spec["name"], f".day={day.isoformat()}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+    owner_field = spec["owner_field"]
+    sources = [source for _, source, _ in spec["columns"]]
+    owner_index = sources.index(owner_field)
+    rows = (
+        spec["model"].objects
+        .filter(created_at__gte=start, created_at__lt=start + timedelta(days=1))
+        .order_by(owner_field, "created_at", "pk")
+        .values_list(*sources)
+        .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
+
+    summary = {"rows": 0, "partitions": 0}
+    for owner_id, group in itertools.groupby(rows, key=lambda row: row[owner_index]):
+        group = list(group)
+        location_id, location_name = owners.get(owner_id, (str(owner_id), ""))
+        partition = os.path.join(staging, f"location_id={location_id}")
+        os.makedirs(partition, exist_ok=True)
+        pq.write_table(
+            _table(pa, spec, table_schema, group, location_name),
+            os.path.join(partition, "part-0.parquet"),
+            compression=COMPRESSION,
+        )
+        summary["rows"] += len(group)
+        summary["partitions"] += 1
+
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.replace(staging, target)
+    return summary
+
+
+def pending_days(spec, root, since=None, until=None, rebuild=False):
+    """Closed UTC days of ``spec`` in since..until that still need exporting."""
+    bounds = usage_rollup.source_day_range(spec["rollup"])
+    if bounds is None:
+        return []
+    last_closed = timezone.now().astimezone(dt_timezone.utc).date() - timedelta(days=settle_days() + 1)
+    first = max(bounds[0], since) if since else bounds[0]
+    last = min(bounds[1], last_closed, until) if until else min(bounds[1], last_closed)
+
+    days = []
+    day = first
+    while day <= last:
+        if rebuild or not os.path.isdir(_day_dir(root, spec, day)):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def export(specs=DATASETS, root=None, since=None, until=None, rebuild=False, progress=None):
+    """Export every pending day of ``specs``. Returns {dataset name: {"days", "rows", "partitions"}}."""
+    _pyarrow()
+    root = root or export_root()
+    results = {}
+    for spec in specs:
+        owners = _owners(spec)
+        totals = {"days": 0, "rows": 0, "partitions": 0}
+        for day in pending_days(spec, root, since, until, rebuild):
+            written = export_day(spec, day, root, owners)
+            totals["days"] += 1
+            totals["rows"] += written["rows"]
+            totals["partitions"] += written["partitions"]
+            if progress:
+                progress(spec["name"], day, written)
+        results[spec["name"]] = totals
+    return results
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SmsManagementAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sms_management_app'
+
+    def ready(self):
+        import sms_management_app.dashboard_cache
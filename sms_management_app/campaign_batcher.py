@@ -0,0 +1,295 @@
+"""
+Campaign-aware batching of outbound SMS in front of the outbound queue.
+
+A GHL campaign arrives as thousands of webhooks with the same message body from
+the same location. With TRANSMIT_CAMPAIGN_BATCHING enabled, producers call
+enqueue_send() instead of queuing send_outbound_sms_task per message:
+
+    - the message id and its group, (TransmitSMSAccount, hash of the body), go
+      through the outbox (submit_campaign_sends) like any paid send, and that
+      task writes them to a Redis hash. The account fixes the sender, so one
+      group is one sender + one text,
+    - the first submit in a window schedules flush_campaign_sends, which moves
+      the whole hash atomically to a per-flush claim (same script as
+      ghl_status_coalescer) and deletes the claim only after every send task
+      is published; a claim left by a crashed flush is picked up again after
+      CLAIM_STALE_SECONDS,
+    - groups of one go to send_outbound_sms_task as before; larger groups are
+      cut into chunks of TRANSMIT_CAMPAIGN_MAX_RECIPIENTS and each chunk becomes
+      one send_campaign_batch_task, i.e. one multi-recipient send-sms.json call
+      that takes a single slot from the account's rate (transmit_rate).
+
+Transmit returns one message_id per send, so every row of a batch stores that
+id; delivery receipts and replies carry the recipient's mobile, which picks the
+row (dlr_batch.pick_recipient). Recipients listed in ``fails`` are failed and
+refunded individually. A batch Transmit rejects as a whole (other than for rate
+limiting) is split back into single sends so one bad number cannot fail a
+campaign.
+
+TRANSMIT_CAMPAIGN_WINDOW_SECONDS sets the window. If Redis is unavailable
+messages are queued directly, as before.
+"""
+
+import hashlib
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core import outbox
+from core.redis_client import get_redis
+from sms_management_app.dlr_batch import recipient_key
+from sms_management_app.ghl_status_coalescer import CLAIM_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "reloop:campaign_send:pending"
+CLAIMS_KEY = "reloop:campaign_send:claims"
+CLAIM_KEY = "reloop:campaign_send:claim:{}"
+# A flush that has not acked its claim by then is taken to have crashed.
+CLAIM_STALE_SECONDS = 300
+FLUSH_KICK_CACHE_KEY = "campaign_send_flush_kick"
+# send-sms.json accepts up to 500 recipients per call.
+TRANSMIT_MAX_RECIPIENTS = 500
+# Longest a batch waits for a Transmit rate slot before re-queuing itself.
+RATE_WAIT_MS = 2000
+
+_script = None
+
+
+def enabled():
+    return bool(getattr(settings, "TRANSMIT_CAMPAIGN_BATCHING", False))
+
+
+def _window_seconds():
+    return max(1, getattr(settings, "TRANSMIT_CAMPAIGN_WINDOW_SECONDS", 3))
+
+
+def _max_recipients():
+    configured = getattr(settings, "TRANSMIT_CAMPAIGN_MAX_RECIPIENTS", TRANSMIT_MAX_RECIPIENTS)
+    return max(2, min(configured, TRANSMIT_MAX_RECIPIENTS))
+
+
+def group_key(transmit_account_id, message_content):
+    digest = hashlib.sha256((message_content or "").encode()).hexdigest()
+    return f"{transmit_account_id}:{digest}"
+
+
+def enqueue_send(sms):
+    """
+    Queue the send of a pending outbound SMS. Call inside the transaction that
+    charged it: without batching this is outbox.enqueue(send_outbound_sms_task),
+    with batching the grouping step goes through the outbox instead.
+    """
+    from sms_management_app.tasks import send_outbound_sms_task, submit_campaign_sends
+
+    if not enabled() or not sms.transmit_account_id:
+        outbox.enqueue(send_outbound_sms_task, str(sms.id))
+        return
+    entry = {"sms_id": str(sms.id), "group": group_key(sms.transmit_account_id, sms.message_content)}
+    outbox.enqueue(submit_campaign_sends, [entry])
+
+
+def _queue_directly(entries):
+    from sms_management_app.tasks import send_outbound_sms_task
+
+    for entry in entries:
+        send_outbound_sms_task.delay(entry["sms_id"])
+
+
+def submit(entries):
+    """Add {"sms_id", "group"} entries to the pending hash (an id submitted twice is sent once)."""
+    if not entries:
+        return
+    try:
+        pipe = get_redis().pipeline()
+        for entry in entries:
+            pipe.hset(PENDING_KEY, entry["sms_id"], entry["group"])
+        pipe.execute()
+    except Exception as e:
+        logger.warning("Campaign batcher unavailable, queuing %s send(s) directly: %s", len(entries), e)
+        _queue_directly(entries)
+        return
+    _kick_flush(_window_seconds())
+
+
+def _kick_flush(window):
+    """Schedule one flush per window. The kick key expires before the flush runs."""
+    try:
+        if not cache.add(FLUSH_KICK_CACHE_KEY, 1, timeout=window):
+            return
+        from sms_management_app.tasks import flush_campaign_sends
+
+        flush_campaign_sends.apply_async(countdown=window)
+    except Exception as e:
+        # Sends are in Redis; the periodic flush will dispatch them.
+        logger.warning("Failed to schedule campaign send flush: %s", e)
+
+
+def claim_pending():
+    """
+    Atomically move every pending entry to a new claim. Returns (claim, groups)
+    with groups as {group: [sms_id, ...]}; call ack(claim) once they are dispatched.
+    """
+    global _script
+    redis = get_redis()
+    if _script is None:
+        _script = redis.register_script(CLAIM_SCRIPT)
+    claim = CLAIM_KEY.format(uuid.uuid4().hex)
+    # Pass the client explicitly: the script object may predate a fork.
+    raw = _script(
+        keys=[PENDING_KEY, CLAIMS_KEY, claim],
+        args=[int(time.time() * 1000), CLAIM_STALE_SECONDS * 1000],
+        client=redis,
+    )
+    groups = {}
+    for sms_id, group in zip(raw[0::2], raw[1::2]):
+        groups.setdefault(group.decode(), []).append(sms_id.decode())
+    return claim, groups
+
+
+def ack(claim):
+    """Drop a claim whose sends have all been published."""
+    pipe = get_redis().pipeline()
+    pipe.delete(claim)
+    pipe.zrem(CLAIMS_KEY, claim)
+    pipe.execute()
+
+
+def dispatch(groups):
+    """Queue one task per single message or per chunk of a group. Returns the summary dict."""
+    from sms_management_app.tasks import send_campaign_batch_task, send_outbound_sms_task
+
+    size = _max_recipients()
+    summary = {"messages": 0, "single": 0, "batches": 0}
+    for sms_ids in groups.values():
+        summary["messages"] += len(sms_ids)
+        for start in range(0, len(sms_ids), size):
+            chunk = sms_ids[start:start + size]
+            if len(chunk) == 1:
+                send_outbound_sms_task.delay(chunk[0])
+                summary["single"] += 1
+            else:
+                send_campaign_batch_task.delay(chunk)
+                summary["batches"] += 1
+    return summary
+
+
+def flush():
+    claim, groups = claim_pending()
+    if not groups:
+        return {"messages": 0, "single": 0, "batches": 0}
+    summary = dispatch(groups)
+    # A publish error above leaves the claim for a later flush; send tasks skip
+    # rows that are no longer pending, so a repeated dispatch is harmless.
+    ack(claim)
+    return summary
+
+
+def _sendable(sms_ids):
+    """(rows to send together, ids to send one by one) for the pending rows of a batch."""
+    from sms_management_app.models import SMSMessage
+
+    rows = list(
+        SMSMessage.objects.select_related("ghl_account", "transmit_account")
+        .filter(pk__in=sms_ids, direction="outbound", status="pending")
+        .order_by("created_at")
+    )
+    batch, singles, seen = [], [], set()
+    for sms in rows:
+        key = recipient_key(sms.to_number)
+        if key in seen:
+            # Same number twice in one send would be one delivery; send the repeat on its own.
+            singles.append(str(sms.id))
+            continue
+        seen.add(key)
+        batch.append(sms)
+    return batch, singles
+
+
+def send_batch(sms_ids):
+    """
+    Send one campaign chunk. Returns the summary dict. "retry_ids" are the ids to
+    send again when the chunk got no rate slot ("deferred_ms" is the wait) or
+    Transmit throttled it ("rate_limited" is the error, "resume_ms" the pause).
+    """
+    from sms_management_app import dashboard_cache, transmit_rate
+    from sms_management_app.error_utils import RATE_LIMITED, categorize_failure
+    from sms_management_app.models import SMSMessage
+    from sms_management_app.services import GHLIntegrationService
+    from sms_management_app.tasks import send_outbound_sms_task
+
+    batch, singles = _sendable(sms_ids)
+    if len(batch) == 1:
+        singles.append(str(batch[0].id))
+        batch = []
+    summary = {
+        "requested": len(sms_ids), "sent": 0, "failed": 0, "single": len(singles),
+        "deferred_ms": 0, "rate_limited": None, "resume_ms": 0, "retry_ids": [],
+    }
+    for sms_id in singles:
+        send_outbound_sms_task.delay(sms_id)
+    if not batch:
+        return summary
+
+    transmit_account_id = batch[0].transmit_account_id
+    acquired, wait_ms = transmit_rate.acquire(transmit_account_id, max_wait_ms=RATE_WAIT_MS)
+    if not acquired:
+        summary["deferred_ms"] = wait_ms
+        summary["retry_ids"] = [str(sms.id) for sms in batch]
+        return summary
+
+    service = GHLIntegrationService()
+    result = service.send_outbound_batch(batch)
+
+    if not result.get("success"):
+        error_code = result.get("error_code")
+        if categorize_failure(result.get("error", ""), error_code) == RATE_LIMITED:
+            summary["rate_limited"] = result.get("error")
+            summary["resume_ms"] = transmit_rate.record_rate_limited(transmit_account_id)
+            summary["retry_ids"] = [str(sms.id) for sms in batch]
+            return summary
+        # Most likely one recipient the whole send was rejected for; retry each alone.
+        logger.warning("Campaign send of %s messages rejected (%s); sending individually", len(batch), result.get("error"))
+        for sms in batch:
+            send_outbound_sms_task.delay(str(sms.id))
+        summary["single"] += len(batch)
+        return summary
+
+    transmit_rate.record_success(transmit_account_id)
+    now = timezone.now()
+    transmit_message_id = str(result.get("transmit_message_id") or "")
+    rejected = {recipient_key(number) for number in result["fails"]}
+    sent, failed = [], []
+    for sms in batch:
+        sms.from_number = result.get("from_number") or sms.from_number
+        if recipient_key(sms.to_number) in rejected:
+            failed.append(sms)
+            continue
+        sms.transmit_message_id = transmit_message_id
+        sms.status = "sent"
+        sms.sent_at = now
+        sms.error_message = None
+        sms.error_category = None
+        sms.updated_at = now
+        sent.append(sms)
+
+    if sent:
+        SMSMessage.objects.bulk_update(
+            sent,
+            ["from_number", "transmit_message_id", "status", "sent_at", "error_message", "error_category", "updated_at"],
+            batch_size=500,
+        )
+        # bulk_update sends no post_save.
+        dashboard_cache.invalidate_accounts({sms.ghl_account_id for sms in sent})
+    for sms in failed:
+        service.apply_outbound_send_result(
+            sms, {"success": False, "error": "Recipient rejected by Transmit"}, cost=sms.cost, segments=sms.segments
+        )
+
+    summary["sent"] = len(sent)
+    summary["failed"] = len(failed)
+    return summary
@@ -0,0 +1,91 @@
+"""
+Per-location cache of the GHL sub-account dashboard (GHLAccountDashboardAPIView).
+
+The payload is built from the usage rollups plus a few indexed queries and
+cached under the GHL account id. It is dropped on commit whenever something it
+shows changes: an SMSMessage or WalletTransaction of the location, or its
+Wallet, mapping or credentials row (receivers below, connected from
+SmsManagementAppConfig.ready). Bulk paths that bypass signals call
+invalidate_accounts() themselves; queryset .update() calls are bounded by
+GHL_DASHBOARD_CACHE_SECONDS.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = "ghl_dashboard:{}"
+
+
+def _ttl():
+    return getattr(settings, "GHL_DASHBOARD_CACHE_SECONDS", 60)
+
+
+def get_cached(account_id):
+    """Cached payload for a GHL account, or None."""
+    try:
+        return cache.get(CACHE_KEY.format(account_id))
+    except Exception as e:
+        logger.warning("dashboard cache get failed for %s: %s", account_id, e)
+        return None
+
+
+def store(account_id, payload):
+    if _ttl() <= 0:
+        return
+    try:
+        cache.set(CACHE_KEY.format(account_id), payload, timeout=_ttl())
+    except Exception as e:
+        logger.warning("dashboard cache set failed for %s: %s", account_id, e)
+
+
+def invalidate_accounts(account_ids):
+    """Drop the cached payloads of these GHL accounts once the current transaction commits."""
+    keys = sorted({CACHE_KEY.format(account_id) for account_id in account_ids if account_id})
+    if not keys:
+        return
+
+    def drop():
+        try:
+            cache.delete_many(keys)
+        except Exception as e:
+            logger.warning("dashboard cache invalidation failed for %s: %s", keys, e)
+
+    transaction.on_commit(drop)
+
+
+@receiver([post_save, post_delete], sender="sms_management_app.SMSMessage")
+def _invalidate_message(sender, instance, **kwargs):
+    invalidate_accounts([instance.ghl_account_id])
+
+
+@receiver([post_save, post_delete], sender="sms_management_app.GHLTransmitSMSMapping")
+def _invalidate_mapping(sender, instance, **kwargs):
+    invalidate_accounts([instance.ghl_account_id])
+
+
+@receiver([post_save, post_delete], sender="core.Wallet")
+def _invalidate_wallet(sender, instance, **kwargs):
+    invalidate_accounts([instance.account_id])
+
+
+@receiver([post_save, post_delete], sender="core.WalletTransaction")
+def _invalidate_wallet_transaction(sender, instance, **kwargs):
+    from core.models import Wallet
+
+    if sender._meta.get_field("wallet").is_cached(instance):
+        account_id = instance.wallet.account_id
+    else:
+        account_id = Wallet.objects.filter(pk=instance.wallet_id).values_list("account_id", flat=True).first()
+    invalidate_accounts([account_id])
+
+
+@receiver([post_save, post_delete], sender="core.GHLAuthCredentials")
+def _invalidate_credentials(sender, instance, **kwargs):
+    invalidate_accounts([instance.pk])
@@ -0,0 +1,240 @@
+"""
+Micro-batched application of TransmitSMS delivery receipts.
+
+With TRANSMIT_DLR_BATCHING enabled the DLR callback only buffers the payload in
+TransmitDLRInbox. apply_transmit_dlrs then applies a batch at a time:
+
+    - matching SMSMessage rows are loaded with two IN queries,
+    - statuses are written with a single bulk_update,
+    - refunds for failed/expired messages are aggregated per wallet into one
+      locked Wallet.refund_batch (one credit ledger row per message),
+    - GHL status updates are handed to ghl_status_coalescer in one call.
+
+parse_dlr is shared with the synchronous callback path so both map Transmit
+statuses identically. Campaign sends (campaign_batcher) give many rows the same
+transmit_message_id; pick_recipient chooses among them by the receipt's mobile.
+"""
+
+import json
+import logging
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Wallet
+from sms_management_app.models import SMSMessage
+from sms_management_app.utils import format_international
+
+logger = logging.getLogger(__name__)
+
+APPLY_KICK_CACHE_KEY = "transmit_dlr_apply_kick"
+APPLY_KICK_WINDOW_SECONDS = 1
+
+_REFUND_STATUSES = ("failed", "expired")
+_MESSAGE_UPDATE_FIELDS = [
+    "status", "delivered_at", "delivery_status", "transmit_message_id",
+    "error_message", "error_category", "updated_at",
+]
+
+
+def dlr_batching_enabled():
+    return bool(getattr(settings, "TRANSMIT_DLR_BATCHING", False))
+
+
+def parse_dlr(data):
+    """
+    Normalise a DLR payload (SMS or MMS_STATUS format).
+
+    Returns {"lookup": field, "key": value, "status": mapped, "reason": str|None,
+    "transmit_id": str, "mobile": str|None} or None when the payload carries no
+    message reference.
+    """
+    if data.get("event_type") == "MMS_STATUS":
+        status_obj = data.get("status") or {}
+        message_ref = status_obj.get("message_ref")
+        if not message_ref:
+            return None
+        raw_status = (status_obj.get("status") or "").upper()
+        if raw_status in ("DELIVERED", "SUCCESS"):
+            mapped = "delivered"
+        elif raw_status in ("SENT", "PENDING"):
+            mapped = "sent"
+        elif raw_status in ("FAILED", "ERROR", "HARD-BOUNCE", "SOFT-BOUNCE"):
+            mapped = "failed"
+        elif raw_status == "EXPIRED":
+            mapped = "expired"
+        else:
+            mapped = "sent"
+        return {
+            "lookup": "ghl_message_id",
+            "key": message_ref,
+            "status": mapped,
+            "reason": status_obj.get("description"),
+            "transmit_id": status_obj.get("id", ""),
+            "mobile": None,
+        }
+
+    message_id = data.get("message_id")
+    if not message_id:
+        return None
+    raw_status = (data.get("status") or "").lower()
+    if raw_status in ("delivered", "success"):
+        mapped = "delivered"
+    elif raw_status in ("failed", "error", "hard-bounce", "soft-bounce"):
+        mapped = "failed"
+    elif raw_status == "expired":
+        mapped = "expired"
+    else:
+        mapped = "sent"
+    return {
+        "lookup": "transmit_message_id",
+        "key": str(message_id),
+        "status": mapped,
+        "reason": data.get("error_description", "Delivery failed"),
+        "transmit_id": "",
+        "mobile": data.get("mobile"),
+    }
+
+
+def recipient_key(number):
+    """Digits of ``number`` in format_international form (what Transmit reports as mobile)."""
+    return re.sub(r"\D", "", format_international(number)) if number else ""
+
+
+def pick_recipient(messages, mobile):
+    """
+    The row among ``messages`` (all matching one Transmit message_id) the receipt
+    or reply for ``mobile`` belongs to; None when that cannot be told.
+    """
+    if len(messages) == 1:
+        return messages[0]
+    if not messages or not mobile:
+        return None
+    key = recipient_key(mobile)
+    for msg in messages:
+        if recipient_key(msg.to_number) == key:
+            return msg
+    return None
+
+
+def apply_dlr_payloads(payloads):
+    """
+    Apply DLR payloads (in arrival order) as one batch. Returns a summary dict.
+
+    Message updates and refunds commit together; GHL updates are submitted on commit.
+    A duplicate failed/expired receipt never refunds twice.
+    """
+    from sms_management_app import dashboard_cache, ghl_status_coalescer
+
+    parsed = [(data, parse_dlr(data)) for data in payloads]
+    refs = {p["key"] for _, p in parsed if p and p["lookup"] == "ghl_message_id"}
+    transmit_ids = {p["key"] for _, p in parsed if p and p["lookup"] == "transmit_message_id"}
+
+    summary = {"received": len(payloads), "applied": 0, "unmatched": 0, "refunds": 0, "ghl_updates": 0}
+    with transaction.atomic():
+        # Lock the matching rows (one query, pk order) so concurrent applies of a
+        # duplicate receipt serialise here; the refund check below then sees the
+        # status the other apply committed.
+        rows = []
+        if refs or transmit_ids:
+            rows = SMSMessage.objects.select_for_update().filter(
+                Q(ghl_message_id__in=refs) | Q(transmit_message_id__in=transmit_ids)
+            ).order_by("pk")
+        by_ref = {}
+        by_transmit_id = {}
+        for msg in rows:
+            # MMS receipts reference our outbound row by GHL messageId.
+            if msg.ghl_message_id in refs and (msg.ghl_message_id not in by_ref or msg.direction == "outbound"):
+                by_ref[msg.ghl_message_id] = msg
+            if msg.transmit_message_id in transmit_ids:
+                by_transmit_id.setdefault(msg.transmit_message_id, []).append(msg)
+
+        touched = {}
+        refunds = defaultdict(list)
+        now = timezone.now()
+
+        for data, dlr in parsed:
+            if dlr is None:
+                summary["unmatched"] += 1
+                continue
+            if dlr["lookup"] == "ghl_message_id":
+                msg = by_ref.get(dlr["key"])
+            else:
+                msg = pick_recipient(by_transmit_id.get(dlr["key"], []), dlr["mobile"])
+            if msg is None:
+                summary["unmatched"] += 1
+                continue
+
+            previous_status = msg.status
+            msg.delivery_status = json.dumps(data)
+            if dlr["transmit_id"] and not msg.transmit_message_id:
+                msg.transmit_message_id = dlr["transmit_id"]
+
+            if dlr["status"] == "delivered":
+                msg.status = "delivered"
+                msg.delivered_at = now
+            elif dlr["status"] == "failed":
+                msg.status = "failed"
+                msg.apply_failure(dlr["reason"] or "Delivery failed")
+            elif dlr["status"] == "expired":
+                msg.status = "expired"
+
+            if msg.status in _REFUND_STATUSES and previous_status not in _REFUND_STATUSES and msg.cost:
+                refunds[msg.ghl_account_id].append({
+                    "amount": msg.cost,
+                    "reference_id": str(msg.id),
+                    "description": f"Refund for {msg.status} message {msg.id}",
+                    "segments": msg.segments,
+                    "direction": msg.direction,
+                })
+
+            msg.updated_at = now
+            touched[msg.id] = msg
+            summary["applied"] += 1
+
+        # Latest status per message wins; one GHL update per message per batch.
+        ghl_updates = [
+            {
+                "message_id": msg.ghl_message_id,
+                "status": msg.status,
+                "sms_message_id": str(msg.id),
+                "ghl_account_id": str(msg.ghl_account_id),
+            }
+            for msg in touched.values()
+            if msg.ghl_message_id
+        ]
+
+        if touched:
+            SMSMessage.objects.bulk_update(list(touched.values()), _MESSAGE_UPDATE_FIELDS, batch_size=500)
+            # bulk_update sends no post_save.
+            dashboard_cache.invalidate_accounts({msg.ghl_account_id for msg in touched.values()})
+        if refunds:
+            # Lock wallets in pk order so concurrent batches cannot deadlock.
+            for wallet in Wallet.objects.filter(account_id__in=list(refunds)).order_by("pk"):
+                items = refunds[wallet.account_id]
+                wallet.refund_batch(items)
+                summary["refunds"] += len(items)
+
+        if ghl_updates:
+            transaction.on_commit(lambda: ghl_status_coalescer.submit_many(ghl_updates))
+            summary["ghl_updates"] = len(ghl_updates)
+
+    return summary
+
+
+def kick_dlr_apply():
+    """Publish an apply task unless one was published within the kick window."""
+    try:
+        if not cache.add(APPLY_KICK_CACHE_KEY, 1, timeout=APPLY_KICK_WINDOW_SECONDS):
+            return
+        from sms_management_app.tasks import apply_transmit_dlrs
+
+        apply_transmit_dlrs.delay()
+    except Exception as e:
+        # The receipt is already buffered; the periodic sweep will apply it.
+        logger.warning("Failed to kick DLR apply: %s", e)
@@ -0,0 +1,191 @@
+"""
+Local stand-ins for TransmitSMS and GoHighLevel, for load tests.
+
+Each FakeProvider is a threaded HTTP server with configurable latency and
+429 / 5xx injection. Point the app at them with HTTP_HOST_OVERRIDES (applied
+by core.http_client), e.g.
+
+    HTTP_HOST_OVERRIDES=api.transmitsms.com=http://127.0.0.1:9101,api.transmitmessage.com=http://127.0.0.1:9101,services.leadconnectorhq.com=http://127.0.0.1:9102
+
+Served routes:
+
+    transmit  POST /send-sms.json, GET/POST /get-numbers.json, /get-balance.json,
+              POST /v2/mms
+    ghl       POST /conversations/messages/inbound, PUT /conversations/messages/<id>/status,
+              POST /oauth/token, anything else -> {}
+
+Sends are recorded (message_id, dlr/reply callback, ref) so the load generator
+can play the provider's side of the conversation (DLRs, replies).
+"""
+
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class FakeProvider:
+    """One fake provider server. ``kind`` is "transmit" or "ghl"."""
+
+    def __init__(self, kind, port=0, latency_ms=0, jitter_ms=0, rate_429=0.0, rate_5xx=0.0, host="127.0.0.1"):
+        self.kind = kind
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.sends = []
+        self._sends_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+        self._ids = itertools.count(int(time.time()) * 1000)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"fake-{self.kind}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def take_sends(self):
+        """Return and clear the sends recorded since the last call."""
+        with self._sends_lock:
+            sends, self.sends = self.sends, []
+        return sends
+
+    def stats(self):
+        """Per-route {requests, 429, 5xx, first_ts, last_ts}."""
+        with self._stats_lock:
+            return {route: dict(values) for route, values in self._stats.items()}
+
+    def _record(self, route, injected):
+        now = time.time()
+        with self._stats_lock:
+            entry = self._stats.setdefault(route, {"requests": 0, "429": 0, "5xx": 0, "first_ts": now, "last_ts": now})
+            entry["requests"] += 1
+            entry["last_ts"] = now
+            if injected:
+                entry[injected] += 1
+
+    def _respond(self, route, params):
+        """(status, body) for a request that was not failure-injected."""
+        if self.kind == "transmit":
+            if route == "/send-sms.json":
+                message_id = next(self._ids)
+                with self._sends_lock:
+                    self.sends.append({
+                        "message_id": str(message_id),
+                        "to": params.get("to"),
+                        "dlr_callback": params.get("dlr_callback"),
+                        "reply_callback": params.get("reply_callback"),
+                        "sent_at": time.time(),
+                    })
+                return 200, {"message_id": message_id, "recipients": 1, "sms": 1, "cost": 0.05,
+                             "error": {"code": "SUCCESS", "description": "OK"}}
+            if route == "/v2/mms":
+                mms_id = str(uuid.uuid4())
+                with self._sends_lock:
+                    self.sends.append({
+                        "message_id": mms_id,
+                        "message_ref": params.get("message_ref"),
+                        "mms": True,
+                        "sent_at": time.time(),
+                    })
+                return 200, {"id": mms_id, "status": "PENDING"}
+            if route == "/get-numbers.json":
+                return 200, {"numbers": [], "numbers_total": 0, "page": {"count": 1, "number": 1},
+                             "error": {"code": "SUCCESS", "description": "OK"}}
+            if route == "/get-balance.json":
+                return 200, {"balance": 1000000, "currency": "AUD",
+                             "error": {"code": "SUCCESS", "description": "OK"}}
+            return 404, {"error": {"code": "NOT_FOUND", "description": route}}
+
+        if route == "/oauth/token":
+            return 200, {"access_token": f"fake-{uuid.uuid4().hex}", "refresh_token": f"fake-{uuid.uuid4().hex}",
+                         "expires_in": 86399, "token_type": "Bearer", "scope": "conversations/message.write"}
+        if route == "/conversations/messages/inbound":
+            return 200, {"success": True, "conversationId": params.get("conversationId") or uuid.uuid4().hex,
+                         "messageId": uuid.uuid4().hex}
+        if route.startswith("/conversations/messages/") and route.endswith("/status"):
+            return 200, {"success": True}
+        return 200, {}
+
+    def _handler_class(self):
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _params(self):
+                parts = urlsplit(self.path)
+                params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if body:
+                    if "json" in (self.headers.get("Content-Type") or ""):
+                        try:
+                            params.update(json.loads(body))
+                        except ValueError:
+                            pass
+                    else:
+                        params.update({k: v[0] for k, v in parse_qs(body.decode()).items()})
+                return parts.path, params
+
+            def _handle(self):
+                route, params = self._params()
+                delay = provider.latency_ms + (random.uniform(0, provider.jitter_ms) if provider.jitter_ms else 0)
+                if delay:
+                    time.sleep(delay / 1000)
+
+                roll = random.random()
+                headers = {}
+                if roll < provider.rate_429:
+                    injected, status, body = "429", 429, {"error": {"code": "OVER_LIMIT", "description": "Too many requests"}}
+                    headers["Retry-After"] = "1"
+                elif roll < provider.rate_429 + provider.rate_5xx:
+                    injected, status, body = "5xx", 503, {"error": {"code": "UNAVAILABLE", "description": "Injected"}}
+                else:
+                    injected = None
+                    status, body = provider._respond(route, params)
+                stat_route = route
+                if route.startswith("/conversations/messages/") and route.endswith("/status"):
+                    stat_route = "/conversations/messages/*/status"
+                provider._record(stat_route, injected)
+
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+        return Handler
+
+
+def host_overrides(transmit, ghl):
+    """HTTP_HOST_OVERRIDES dict routing the real provider hosts to the fakes."""
+    return {
+        "api.transmitsms.com": transmit.base_url,
+        "api.transmitmessage.com": transmit.base_url,
+        "services.leadconnectorhq.com": ghl.base_url,
+    }
@@ -1,5 +1,8 @@
 import django_filters
+from rest_framework.filters import SearchFilter
+
 from .models import SMSMessage
+from .search import SEARCH_FIELDS, search_messages
 
 class SMSMessageFilter(django_filters.FilterSet):
     # Date range filters
@@ -24,4 +27,20 @@ class SMSMessageFilter(django_filters.FilterSet):
             "location_id",
             "transmitsms_account",
             "error_category",
-        ]
\ No newline at end of file
+        ]
+
+class MessageSearchFilter(SearchFilter):
+    """
+    ?search= for SMSMessage lists through the indexed search in search.py.
+
+    Keeps SearchFilter semantics: the view's search_fields, terms split on
+    whitespace/commas, every term must match some field. ?search_mode=words
+    switches content matching to word prefixes.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        fields = getattr(view, "search_fields", None) or SEARCH_FIELDS
+        mode = request.query_params.get("search_mode")
+        for term in self.get_search_terms(request):
+            queryset = search_messages(queryset, term, fields, mode)
+        return queryset
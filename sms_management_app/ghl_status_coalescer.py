@@ -0,0 +1,183 @@
+"""
+Coalescing sender for GHL message status updates.
+
+A message usually produces several status updates a few seconds apart (sent,
+then delivered/failed), and during GHL rate-limit storms an older update can be
+retried after a newer one was queued. Instead of one update_ghl_message_status_task
+per DLR, producers call submit()/submit_many():
+
+    - the update is written to a Redis hash keyed by ghl_message_id, so within
+      the coalescing window only the latest status per message survives,
+    - the first submit in a window schedules flush_ghl_status_updates, which
+      moves the whole hash atomically to a per-flush claim key, drains it
+      through batch_update_ghl_statuses and deletes the claim only once every
+      update is queued. A claim left by a crashed flush is folded into the
+      next flush after CLAIM_STALE_SECONDS,
+    - every submit bumps a per-message sequence number; a queued or retrying
+      update whose sequence has been superseded is dropped by the task instead
+      of spending a GHL call.
+
+GHL_STATUS_COALESCE_SECONDS sets the window (0 disables coalescing). If Redis is
+unavailable updates are queued directly, as before.
+"""
+
+import json
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "reloop:ghl_status:pending"
+SEQ_KEY = "reloop:ghl_status:seq"
+LATEST_KEY = "reloop:ghl_status:latest:{}"
+# Long enough to outlive every retry of update_ghl_message_status_task.
+LATEST_TTL_SECONDS = 24 * 3600
+CLAIMS_KEY = "reloop:ghl_status:claims"
+CLAIM_KEY = "reloop:ghl_status:claim:{}"
+# A flush that has not acked its claim by then is taken to have crashed.
+CLAIM_STALE_SECONDS = 300
+FLUSH_KICK_CACHE_KEY = "ghl_status_flush_kick"
+
+# KEYS: pending hash, claims zset (claim key -> claimed at ms), new claim key.
+# ARGV: now_ms, stale_ms.
+# Moves stale claims, then the pending hash, into the new claim (later entries
+# overwrite earlier ones) in one step, so updates submitted mid-flush land in
+# the next window. Returns the claim's entries.
+CLAIM_SCRIPT = """
+local now = tonumber(ARGV[1])
+local function move(source)
+    local entries = redis.call('HGETALL', source)
+    for i = 1, #entries, 2 do
+        redis.call('HSET', KEYS[3], entries[i], entries[i + 1])
+    end
+    redis.call('DEL', source)
+end
+for _, claim in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now - tonumber(ARGV[2]))) do
+    move(claim)
+    redis.call('ZREM', KEYS[2], claim)
+end
+move(KEYS[1])
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    return {}
+end
+redis.call('ZADD', KEYS[2], now, KEYS[3])
+return redis.call('HGETALL', KEYS[3])
+"""
+
+_script = None
+
+
+def _window_seconds():
+    return getattr(settings, "GHL_STATUS_COALESCE_SECONDS", 2)
+
+
+def _queue_directly(updates):
+    from sms_management_app.tasks import update_ghl_message_status_task
+
+    for update in updates:
+        update_ghl_message_status_task.delay(
+            message_id=update["message_id"],
+            status=update["status"],
+            sms_message_id=update.get("sms_message_id"),
+            ghl_account_id=update.get("ghl_account_id"),
+        )
+
+
+def submit(message_id, status, sms_message_id=None, ghl_account_id=None):
+    """Queue one GHL status update; a later submit for the same message replaces it."""
+    submit_many([{
+        "message_id": message_id,
+        "status": status,
+        "sms_message_id": sms_message_id,
+        "ghl_account_id": ghl_account_id,
+    }])
+
+
+def submit_many(updates):
+    """
+    Queue GHL status updates (dicts with message_id, status, sms_message_id,
+    ghl_account_id), in order — the last entry per message wins.
+    """
+    updates = [u for u in updates if u.get("message_id")]
+    if not updates:
+        return
+    window = _window_seconds()
+    if window <= 0:
+        _queue_directly(updates)
+        return
+
+    try:
+        redis = get_redis()
+        last_seq = redis.incrby(SEQ_KEY, len(updates))
+        pipe = redis.pipeline()
+        for offset, update in enumerate(updates):
+            seq = last_seq - len(updates) + offset + 1
+            entry = dict(update, seq=seq)
+            pipe.hset(PENDING_KEY, update["message_id"], json.dumps(entry))
+            pipe.set(LATEST_KEY.format(update["message_id"]), seq, ex=LATEST_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.warning("GHL status coalescer unavailable, queuing %s update(s) directly: %s", len(updates), e)
+        _queue_directly(updates)
+        return
+
+    _kick_flush(window)
+
+
+def _kick_flush(window):
+    """Schedule one flush per window. The kick key expires before the flush runs."""
+    try:
+        if not cache.add(FLUSH_KICK_CACHE_KEY, 1, timeout=window):
+            return
+        from sms_management_app.tasks import flush_ghl_status_updates
+
+        flush_ghl_status_updates.apply_async(countdown=window)
+    except Exception as e:
+        # Updates are in Redis; the periodic flush will send them.
+        logger.warning("Failed to schedule GHL status flush: %s", e)
+
+
+def claim_pending():
+    """
+    Atomically move every pending update to a new claim. Returns (claim, updates),
+    oldest submission first; call ack(claim) once the updates are queued.
+    """
+    global _script
+    redis = get_redis()
+    if _script is None:
+        _script = redis.register_script(CLAIM_SCRIPT)
+    claim = CLAIM_KEY.format(uuid.uuid4().hex)
+    # Pass the client explicitly: the script object may predate a fork.
+    raw = _script(
+        keys=[PENDING_KEY, CLAIMS_KEY, claim],
+        args=[int(time.time() * 1000), CLAIM_STALE_SECONDS * 1000],
+        client=redis,
+    )
+    values = raw[1::2]
+    updates = [json.loads(value) for value in values]
+    return claim, sorted(updates, key=lambda update: update["seq"])
+
+
+def ack(claim):
+    """Drop a claim whose updates have all been queued."""
+    pipe = get_redis().pipeline()
+    pipe.delete(claim)
+    pipe.zrem(CLAIMS_KEY, claim)
+    pipe.execute()
+
+
+def is_superseded(message_id, seq):
+    """True when a newer update than ``seq`` has been submitted for the message."""
+    if seq is None or not message_id:
+        return False
+    try:
+        latest = get_redis().get(LATEST_KEY.format(message_id))
+    except Exception:
+        return False
+    return latest is not None and int(latest) > int(seq)
@@ -0,0 +1,75 @@
+"""
+Fast-ack ingestion for the GHL outbound webhook.
+
+With GHL_WEBHOOK_FAST_ACK enabled the webhook view only validates the payload,
+inserts it into GHLWebhookInbox (messageId is the dedupe key) and returns 202.
+drain_ghl_webhook_inbox then runs GHLIntegrationService.process_ghl_message for
+the buffered rows in batches, so gunicorn workers are not held for the wallet
+charge / SMSMessage insert during GHL campaign bursts.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from sms_management_app.models import GHLWebhookInbox
+
+logger = logging.getLogger(__name__)
+
+DRAIN_KICK_CACHE_KEY = "ghl_inbox_drain_kick"
+# At most one drain task is published per window per web process; the beat
+# sweep picks up anything that lands after the kick fired.
+DRAIN_KICK_WINDOW_SECONDS = 1
+
+REQUIRED_FIELDS = ("locationId", "messageId", "phone")
+
+
+def fast_ack_enabled():
+    return bool(getattr(settings, "GHL_WEBHOOK_FAST_ACK", False))
+
+
+def validate_ghl_webhook(data):
+    """Return an error string when the SMS webhook payload cannot be processed, else None."""
+    if not isinstance(data, dict):
+        return "Payload must be a JSON object"
+    missing = [field for field in REQUIRED_FIELDS if not data.get(field)]
+    if missing:
+        return f"Missing required field(s): {', '.join(missing)}"
+    attachments = data.get("attachments")
+    if attachments is not None and not isinstance(attachments, list):
+        return "attachments must be a list"
+    return None
+
+
+def enqueue_ghl_webhook(data):
+    """
+    Durably buffer a validated GHL SMS webhook.
+
+    Uses INSERT ... ON CONFLICT DO NOTHING on message_id, so GHL retries of the
+    same messageId never create a second row (and never charge twice).
+    """
+    GHLWebhookInbox.objects.bulk_create(
+        [
+            GHLWebhookInbox(
+                message_id=str(data["messageId"]),
+                location_id=str(data["locationId"]),
+                payload=data,
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    kick_inbox_drain()
+
+
+def kick_inbox_drain():
+    """Publish a drain task unless one was published within the kick window."""
+    try:
+        if not cache.add(DRAIN_KICK_CACHE_KEY, 1, timeout=DRAIN_KICK_WINDOW_SECONDS):
+            return
+        from sms_management_app.tasks import drain_ghl_webhook_inbox
+
+        drain_ghl_webhook_inbox.delay()
+    except Exception as e:
+        # The row is already committed; the periodic sweep will drain it.
+        logger.warning("Failed to kick GHL inbox drain: %s", e)
@@ -0,0 +1,73 @@
+"""
+Rebuild MessageDailyUsage / WalletDailyUsage from SMSMessage and WalletTransaction.
+
+Run once after migrating (the triggers only record changes made after they were
+created), and again for any range that looks wrong. Safe while traffic is
+flowing: each chunk is recomputed in one statement together with dropping that
+range's pending deltas, so nothing is counted twice or missed.
+
+Examples:
+
+    # Everything
+    python manage.py backfill_usage_rollups
+
+    # Last 7 UTC days of the message rollup only
+    python manage.py backfill_usage_rollups --days 7 --only messages
+"""
+
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sms_management_app import usage_rollup
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily usage rollups from the source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="First UTC day to rebuild (YYYY-MM-DD); default: oldest row")
+        parser.add_argument("--until", help="Last UTC day to rebuild (YYYY-MM-DD); default: newest row")
+        parser.add_argument("--days", type=int, help="Rebuild only the last N UTC days (overrides --since)")
+        parser.add_argument("--only", choices=[spec["name"] for spec in usage_rollup.ROLLUPS])
+        parser.add_argument("--chunk-days", dest="chunk_days", type=int, default=usage_rollup.BACKFILL_CHUNK_DAYS,
+                            help="Days rebuilt per transaction")
+
+    def handle(self, *args, **options):
+        if options["chunk_days"] < 1:
+            raise CommandError("--chunk-days must be >= 1")
+        since = self._parse_day(options["since"], "--since")
+        until = self._parse_day(options["until"], "--until")
+        if options["days"]:
+            since = timezone.now().date() - timedelta(days=options["days"] - 1)
+
+        for spec in usage_rollup.ROLLUPS:
+            if options["only"] and spec["name"] != options["only"]:
+                continue
+            bounds = usage_rollup.source_day_range(spec)
+            if bounds is None and not (since and until):
+                self.stdout.write(f"{spec['name']}: source table is empty, nothing to rebuild")
+                continue
+            start = since or bounds[0]
+            end = until or (bounds[1] if bounds else start)
+            if start > end:
+                raise CommandError(f"{spec['name']}: start {start} is after end {end}")
+
+            written = usage_rollup.backfill(spec, start, end, options["chunk_days"], progress=self._progress)
+            self.stdout.write(self.style.SUCCESS(f"{spec['name']}: rebuilt {start}..{end}, {written} bucket(s)"))
+
+        # Whatever was recorded outside the rebuilt range.
+        folded = usage_rollup.fold()
+        self.stdout.write(f"Folded pending deltas: {folded}")
+
+    def _progress(self, name, first, last, buckets):
+        self.stdout.write(f"  {name} {first}..{last}: {buckets} bucket(s)")
+
+    def _parse_day(self, value, flag):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"{flag} must be YYYY-MM-DD")
@@ -0,0 +1,224 @@
+"""
+Dashboard analytics at scale: per-request COUNT/SUM/AVG queries vs the daily rollups.
+
+Creates throwaway locations (each with a Transmit account and a wallet), bulk
+inserts --messages SMSMessage rows and --transactions WalletTransaction rows
+spread over the last --days days with generate_series (the usage triggers run
+as in production), folds the deltas, then times for all locations and for one:
+
+    legacy  the aggregate queries DashboardAnalyticsView used to run
+    rollup  usage_rollup.dashboard_message_stats + wallet_usage
+
+and checks both return the same figures. Everything created is deleted at the
+end unless --keep-data. Existing rows count towards the "all locations" figures,
+so run backfill_usage_rollups first on a database with history.
+
+Examples:
+
+    # 10M messages (takes a while and a few GB)
+    python manage.py bench_dashboard_analytics
+
+    # Quick run
+    python manage.py bench_dashboard_analytics --messages 200000 --transactions 100000 --repeat 3
+"""
+
+import statistics
+import time
+import uuid
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Avg, Sum
+from django.utils import timezone
+
+from core.models import GHLAuthCredentials, Wallet, WalletTransaction
+from sms_management_app import usage_rollup
+from sms_management_app.models import SMSMessage
+from transmitsms.models import TransmitSMSAccount
+
+INSERT_CHUNK = 1_000_000
+
+# Weighted so most traffic is delivered outbound, as in production.
+_STATUSES = "ARRAY['delivered','delivered','delivered','delivered','delivered','sent','failed','pending','queued','expired']"
+
+_INSERT_MESSAGES_SQL = f"""
+    INSERT INTO {SMSMessage._meta.db_table}
+        (id, ghl_account_id, transmit_account_id, message_content, to_number, from_number,
+         direction, status, cost, segments, created_at, updated_at)
+    SELECT gen_random_uuid(), (%(accounts)s::uuid[])[1 + g %% %(n)s], (%(transmit)s::uuid[])[1 + g %% %(n)s],
+           'Benchmark message', '61400000000', '61400000001',
+           CASE WHEN g %% 7 = 0 THEN 'inbound' ELSE 'outbound' END,
+           ({_STATUSES})[1 + floor(random() * 10)::int],
+           CASE WHEN g %% 7 = 0 THEN 0 ELSE 0.074 * (1 + g %% 3) END,
+           1 + g %% 3,
+           now() - random() * %(days)s * interval '1 day',
+           now()
+    FROM generate_series(%(first)s, %(last)s) AS g
+"""
+
+_INSERT_TRANSACTIONS_SQL = f"""
+    INSERT INTO {WalletTransaction._meta.db_table}
+        (id, wallet_id, transaction_type, amount, balance_after, created_at)
+    SELECT gen_random_uuid(), (%(wallets)s::uuid[])[1 + g %% %(n)s],
+           CASE WHEN g %% 50 = 0 THEN 'credit' ELSE 'debit' END,
+           CASE WHEN g %% 50 = 0 THEN 100 ELSE 0.074 * (1 + g %% 3) END,
+           1000,
+           now() - random() * %(days)s * interval '1 day'
+    FROM generate_series(%(first)s, %(last)s) AS g
+"""
+
+
+def _legacy_stats(start, end, accounts):
+    messages = SMSMessage.objects.filter(created_at__gte=start, created_at__lte=end)
+    transactions = WalletTransaction.objects.filter(created_at__gte=start, created_at__lte=end)
+    if accounts is not None:
+        messages = messages.filter(ghl_account__in=accounts)
+        transactions = transactions.filter(wallet__account__in=accounts)
+    return {
+        "total_messages": messages.count(),
+        "outbound_messages": messages.filter(direction="outbound").count(),
+        "inbound_messages": messages.filter(direction="inbound").count(),
+        "delivered_messages": messages.filter(status="delivered").count(),
+        "failed_messages": messages.filter(status="failed").count(),
+        "sent_messages": messages.filter(status__in=["sent", "delivered"]).count(),
+        "avg_message_cost": messages.exclude(cost=0).aggregate(Avg("cost"))["cost__avg"] or 0,
+        "total_spent": transactions.filter(transaction_type="debit").aggregate(Sum("amount"))["amount__sum"] or 0,
+    }
+
+
+def _rollup_stats(start_day, end_day, accounts):
+    stats = usage_rollup.dashboard_message_stats(start_day, end_day, accounts)
+    wallets = Wallet.objects.filter(account__in=accounts) if accounts is not None else None
+    debits = usage_rollup.wallet_usage(start_day, end_day, wallets).get("debit", {})
+    stats["total_spent"] = debits.get("amount", 0)
+    return stats
+
+
+def _comparable(stats):
+    return {
+        key: round(Decimal(value), 4) if key in ("avg_message_cost", "total_spent") else value
+        for key, value in stats.items()
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark dashboard analytics queries against the daily usage rollups on synthetic data."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=10_000_000)
+        parser.add_argument("--transactions", type=int, default=5_000_000)
+        parser.add_argument("--accounts", type=int, default=50, help="Throwaway locations to spread rows over")
+        parser.add_argument("--days", type=int, default=90, help="Spread rows over the last N days")
+        parser.add_argument("--window", type=int, default=30, help="Dashboard window in days (?days=)")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--keep-data", dest="keep_data", action="store_true",
+                            help="Leave the synthetic locations and rows in place")
+
+    def handle(self, *args, **options):
+        if options["accounts"] < 1 or options["repeat"] < 1 or options["days"] < 1:
+            raise CommandError("--accounts, --days and --repeat must be >= 1")
+
+        run_id = uuid.uuid4().hex[:8]
+        accounts, transmit_ids, wallet_ids = self._create_tenants(run_id, options["accounts"])
+        try:
+            self._generate(_INSERT_MESSAGES_SQL, "messages", options["messages"],
+                           {"accounts": accounts, "transmit": transmit_ids, "n": len(accounts), "days": options["days"]})
+            self._generate(_INSERT_TRANSACTIONS_SQL, "wallet transactions", options["transactions"],
+                           {"wallets": wallet_ids, "n": len(wallet_ids), "days": options["days"]})
+            started = time.perf_counter()
+            folded = usage_rollup.fold()
+            self.stdout.write(f"Folded {folded} in {(time.perf_counter() - started) * 1000:.0f} ms")
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {SMSMessage._meta.db_table}")
+                cursor.execute(f"ANALYZE {WalletTransaction._meta.db_table}")
+
+            end = timezone.now()
+            start_day = (end - timedelta(days=options["window"])).date()
+            # The rollup works in whole UTC days; give the legacy queries the same window.
+            start = datetime.combine(start_day, dt_time.min, tzinfo=dt_timezone.utc)
+            one_location = GHLAuthCredentials.objects.filter(pk=accounts[0])
+
+            for label, scope in (("all locations", None), ("one location", one_location)):
+                legacy, legacy_ms = self._time(lambda: _legacy_stats(start, end, scope), options["repeat"])
+                rollup, rollup_ms = self._time(lambda: _rollup_stats(start_day, end.date(), scope), options["repeat"])
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{label}, last {options['window']} days"))
+                self.stdout.write(f"  legacy  median {legacy_ms:8.1f} ms")
+                self.stdout.write(f"  rollup  median {rollup_ms:8.1f} ms  ({legacy_ms / rollup_ms if rollup_ms else 0:.0f}x)")
+                if _comparable(legacy) == _comparable(rollup):
+                    self.stdout.write(self.style.SUCCESS("  figures match"))
+                else:
+                    self.stdout.write(self.style.ERROR(
+                        f"  figures differ (run backfill_usage_rollups?)\n    legacy {legacy}\n    rollup {rollup}"
+                    ))
+        finally:
+            if options["keep_data"]:
+                self.stdout.write(f"Kept synthetic data (locations bench-{run_id}-*)")
+            else:
+                self._cleanup(accounts, transmit_ids, wallet_ids)
+
+    def _create_tenants(self, run_id, count):
+        account_ids = [uuid.uuid4() for _ in range(count)]
+        # bulk_create: no onboarding signals (they call GHL).
+        GHLAuthCredentials.objects.bulk_create([
+            GHLAuthCredentials(
+                id=account_id,
+                user_id="bench",
+                access_token="bench",
+                refresh_token="bench",
+                expires_in=86399,
+                location_id=f"bench-{run_id}-{i}",
+                location_name=f"Benchmark {run_id} {i}",
+                company_id="bench-company",
+            )
+            for i, account_id in enumerate(account_ids)
+        ])
+        transmit = TransmitSMSAccount.objects.bulk_create([
+            TransmitSMSAccount(
+                account_name=f"Benchmark {run_id} {i}",
+                api_key="bench",
+                api_secret="bench",
+                account_id=f"bench-{run_id}-{i}",
+                phone_number="61400000000",
+            )
+            for i in range(count)
+        ])
+        wallets = Wallet.objects.bulk_create([Wallet(account_id=account_id) for account_id in account_ids])
+        return (
+            [str(account_id) for account_id in account_ids],
+            [str(account.pk) for account in transmit],
+            [str(wallet.pk) for wallet in wallets],
+        )
+
+    def _generate(self, sql, label, total, params):
+        started = time.perf_counter()
+        for first in range(0, total, INSERT_CHUNK):
+            last = min(first + INSERT_CHUNK, total) - 1
+            with connection.cursor() as cursor:
+                cursor.execute(sql, {**params, "first": first, "last": last})
+            self.stdout.write(f"  {label}: {last + 1}/{total}")
+        self.stdout.write(f"Inserted {total} {label} in {time.perf_counter() - started:.1f} s")
+
+    def _time(self, fn, repeat):
+        timings = []
+        result = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        return result, statistics.median(timings)
+
+    def _cleanup(self, accounts, transmit_ids, wallet_ids):
+        self.stdout.write("Deleting synthetic data...")
+        with connection.cursor() as cursor:
+            # Set-based deletes; the ORM cascade would load millions of rows.
+            cursor.execute(
+                f"DELETE FROM {SMSMessage._meta.db_table} WHERE ghl_account_id = ANY(%s::uuid[])", [accounts]
+            )
+            cursor.execute(
+                f"DELETE FROM {WalletTransaction._meta.db_table} WHERE wallet_id = ANY(%s::uuid[])", [wallet_ids]
+            )
+        GHLAuthCredentials.objects.filter(pk__in=accounts).delete()
+        TransmitSMSAccount.objects.filter(pk__in=transmit_ids).delete()
+        usage_rollup.fold()
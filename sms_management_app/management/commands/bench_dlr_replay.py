@@ -0,0 +1,108 @@
+"""
+Replay TransmitSMS delivery receipts: per-request DLR handling vs micro-batches.
+
+Builds legacy-format DLRs for the most recent outbound messages that have a
+transmit_message_id (a share of them failed, so refunds are exercised) and
+applies them through:
+
+    legacy  transmit_dlr_callback, one request per receipt
+    batch   dlr_batch.apply_dlr_payloads, --batch-size receipts at a time
+
+Each mode runs inside its own transaction that is rolled back, and GHL status
+publishes are stubbed, so nothing is changed or sent.
+
+Examples:
+
+    python manage.py bench_dlr_replay
+
+    # 5000 receipts, 20% failures, batches of 500
+    python manage.py bench_dlr_replay --dlrs 5000 --fail-ratio 0.2 --batch-size 500
+"""
+
+import contextlib
+import io
+import json
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from sms_management_app.dlr_batch import apply_dlr_payloads
+from sms_management_app.models import SMSMessage
+from sms_management_app.views import transmit_dlr_callback
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark DLRs/sec for the per-request and batched DLR paths (rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dlrs", type=int, default=1000, help="Receipts to replay")
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=200)
+        parser.add_argument("--fail-ratio", dest="fail_ratio", type=float, default=0.1,
+                            help="Share of receipts reported as failed (refunded)")
+        parser.add_argument("--mode", choices=["legacy", "batch", "both"], default="both")
+
+    def handle(self, *args, **options):
+        if options["dlrs"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--dlrs and --batch-size must be >= 1")
+
+        messages = list(
+            SMSMessage.objects.filter(direction="outbound", transmit_message_id__isnull=False)
+            .exclude(transmit_message_id="")
+            .order_by("-created_at")
+            .values_list("transmit_message_id", flat=True)[: options["dlrs"]]
+        )
+        if not messages:
+            raise CommandError("No outbound messages with a transmit_message_id to replay")
+
+        fail_every = round(1 / options["fail_ratio"]) if options["fail_ratio"] > 0 else 0
+        payloads = [
+            {
+                "message_id": transmit_id,
+                "status": "hard-bounce" if fail_every and i % fail_every == 0 else "delivered",
+                "error_description": "Benchmark failure",
+            }
+            for i, transmit_id in enumerate(messages)
+        ]
+
+        modes = ["legacy", "batch"] if options["mode"] == "both" else [options["mode"]]
+        for mode in modes:
+            self._run_mode(mode, payloads, options["batch_size"])
+
+    def _run_mode(self, mode, payloads, batch_size):
+        factory = RequestFactory()
+        totals = {}
+        elapsed = 0.0
+
+        try:
+            with transaction.atomic(), \
+                    override_settings(TRANSMIT_DLR_BATCHING=False), \
+                    mock.patch("sms_management_app.ghl_status_coalescer.submit_many"), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                if mode == "legacy":
+                    for payload in payloads:
+                        request = factory.post("/api/sms/transmit-sms/dlr-callback/",
+                                               data=json.dumps(payload), content_type="application/json")
+                        response = transmit_dlr_callback(request)
+                        totals[response.status_code] = totals.get(response.status_code, 0) + 1
+                else:
+                    for start in range(0, len(payloads), batch_size):
+                        result = apply_dlr_payloads(payloads[start:start + batch_size])
+                        for key in ("applied", "unmatched", "refunds"):
+                            totals[key] = totals.get(key, 0) + result[key]
+                elapsed = time.perf_counter() - started
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        rate = len(payloads) / elapsed if elapsed else 0
+        label = mode if mode == "legacy" else f"batch ({batch_size}/batch)"
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{label}: {len(payloads)} DLRs"))
+        self.stdout.write(f"  {elapsed * 1000:.0f} ms, {rate:.0f} DLRs/s  {totals}")
@@ -0,0 +1,130 @@
+"""
+Measure GHL outbound webhook latency: synchronous processing vs fast-ack ingestion.
+
+Posts synthetic SMS webhooks for a mapped location straight into the view
+(no HTTP server), inside a transaction that is rolled back afterwards. Celery
+publishes are stubbed so nothing reaches Transmit or the broker.
+
+Examples:
+
+    # Both modes, 200 requests each
+    python manage.py bench_ghl_webhook --location-id gKnZUcMflBkB0OAHZiZe
+
+    # Fast-ack only, and also time the batched drain of what was accepted
+    python manage.py bench_ghl_webhook --location-id gKnZUcMflBkB0OAHZiZe --mode fast --drain
+"""
+
+import contextlib
+import io
+import json
+import statistics
+import time
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.test import RequestFactory, override_settings
+
+from core.models import GHLAuthCredentials, Wallet
+from sms_management_app.models import GHLTransmitSMSMapping
+from sms_management_app.views import ghl_webhook_handler
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = "Benchmark GHL webhook latency in sync vs fast-ack ingestion mode (rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--location-id", dest="location_id", required=True,
+                            help="GHL location_id with a Transmit mapping")
+        parser.add_argument("--requests", type=int, default=200, help="Webhooks per mode")
+        parser.add_argument("--mode", choices=["sync", "fast", "both"], default="both")
+        parser.add_argument("--drain", action="store_true",
+                            help="After fast mode, time drain_ghl_webhook_inbox over the accepted rows")
+
+    def handle(self, *args, **options):
+        location_id = options["location_id"]
+        total = options["requests"]
+        if total < 1:
+            raise CommandError("--requests must be >= 1")
+
+        account = GHLAuthCredentials.objects.filter(location_id=location_id).first()
+        if not account:
+            raise CommandError(f"No GHLAuthCredentials for location_id={location_id}")
+        if not GHLTransmitSMSMapping.objects.filter(ghl_account=account).exists():
+            raise CommandError(f"Location {location_id} has no Transmit mapping")
+
+        modes = ["sync", "fast"] if options["mode"] == "both" else [options["mode"]]
+        for mode in modes:
+            self._run_mode(account, mode, total, options["drain"] and mode == "fast")
+
+    def _run_mode(self, account, mode, total, drain):
+        from sms_management_app.tasks import drain_ghl_webhook_inbox
+
+        factory = RequestFactory()
+        latencies = []
+        statuses = {}
+        drain_seconds = None
+        drain_summary = None
+        run_id = uuid.uuid4().hex[:8]
+
+        try:
+            with transaction.atomic(), \
+                    override_settings(GHL_WEBHOOK_FAST_ACK=(mode == "fast")), \
+                    mock.patch("sms_management_app.tasks.send_outbound_sms_task.delay"), \
+                    mock.patch("sms_management_app.ingest.kick_inbox_drain"), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                wallet, _ = Wallet.objects.get_or_create(account=account)
+                # Enough credit that every synthetic message takes the charge path.
+                Wallet.objects.filter(pk=wallet.pk).update(balance=F("balance") + Decimal("100000"))
+
+                for i in range(total):
+                    body = json.dumps({
+                        "type": "SMS",
+                        "locationId": account.location_id,
+                        "messageId": f"bench-{run_id}-{i}",
+                        "conversationId": f"bench-conv-{run_id}",
+                        "contactId": f"bench-contact-{run_id}",
+                        "phone": "+61400000000",
+                        "message": "Benchmark message",
+                    })
+                    request = factory.post("/api/sms/ghl-conversation-webhook/", data=body,
+                                           content_type="application/json")
+                    started = time.perf_counter()
+                    response = ghl_webhook_handler(request)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+                if drain:
+                    started = time.perf_counter()
+                    drain_summary = drain_ghl_webhook_inbox.run()
+                    drain_seconds = time.perf_counter() - started
+
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        latencies.sort()
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{mode} mode ({total} webhooks)"))
+        self.stdout.write(f"  responses: {statuses}")
+        self.stdout.write(
+            f"  latency ms: mean={statistics.mean(latencies):.2f} "
+            f"p50={_percentile(latencies, 50):.2f} p95={_percentile(latencies, 95):.2f} "
+            f"p99={_percentile(latencies, 99):.2f} max={latencies[-1]:.2f}"
+        )
+        if drain_seconds is not None:
+            rate = total / drain_seconds if drain_seconds else 0
+            self.stdout.write(f"  drain: {drain_seconds * 1000:.0f} ms ({rate:.0f} msg/s) {drain_summary}")
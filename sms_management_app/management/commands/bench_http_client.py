@@ -0,0 +1,71 @@
+"""
+Compare per-request latency of bare requests calls vs the pooled core.http_client.
+
+Uses a read-only TransmitSMS endpoint (get-balance.json with agency credentials)
+so nothing is sent; the difference is the TCP+TLS handshake that keep-alive
+pooling saves on every send.
+
+Examples:
+
+    python manage.py bench_http_client
+
+    # More samples against another read-only URL
+    python manage.py bench_http_client --requests 100 --url https://api.transmitsms.com/get-numbers.json
+"""
+
+import statistics
+import time
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from core import http_client
+from sms_management_app.services import TransmitSMSService
+
+
+def _percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = "Benchmark bare requests vs pooled http_client latency against TransmitSMS."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=30, help="Requests per client")
+        parser.add_argument("--url", default=f"{TransmitSMSService().base_url}/get-balance.json")
+
+    def handle(self, *args, **options):
+        total = options["requests"]
+        if total < 1:
+            raise CommandError("--requests must be >= 1")
+        url = options["url"]
+        headers = TransmitSMSService()._get_auth_header()
+
+        clients = [
+            ("bare requests", lambda: requests.get(url, headers=headers, timeout=30)),
+            ("http_client", lambda: http_client.get(url, headers=headers, timeout=30)),
+        ]
+        for label, call in clients:
+            latencies = []
+            errors = 0
+            for _ in range(total):
+                started = time.perf_counter()
+                try:
+                    response = call()
+                    if response.status_code >= 400:
+                        errors += 1
+                except requests.RequestException:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+            first = latencies[0]
+            latencies.sort()
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{label} ({total} x GET {url})"))
+            self.stdout.write(
+                f"  latency ms: mean={statistics.mean(latencies):.1f} "
+                f"p50={_percentile(latencies, 50):.1f} p95={_percentile(latencies, 95):.1f} "
+                f"first={first:.1f} max={latencies[-1]:.1f} errors={errors}"
+            )
+
+        self.stdout.write(f"http_client stats: {http_client.get_stats()}")
@@ -0,0 +1,199 @@
+"""
+Message search latency: the old icontains-OR over joins vs search.search_messages.
+
+For each term, times what the message list does per request, a COUNT and the
+first page (newest --page-size matches), on both paths, and prints the plan
+nodes the new path used. Terms default to a sample taken from the table: a
+phone number in national format, a content word, a location name fragment
+and a term that matches nothing.
+
+With --generate N, N synthetic messages (varied content and numbers, one
+throwaway location) are inserted first and deleted afterwards unless
+--keep-data, so the benchmark can run at scale on an empty database.
+
+Examples:
+
+    python manage.py bench_message_search
+
+    # 5M synthetic messages, custom terms
+    python manage.py bench_message_search --generate 5000000 --term "0412 555" --term invoice
+"""
+
+import json
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from core.models import GHLAuthCredentials
+from sms_management_app import usage_rollup
+from sms_management_app.models import SMSMessage
+from sms_management_app.search import SEARCH_FIELDS, search_messages
+from transmitsms.models import TransmitSMSAccount
+
+INSERT_CHUNK = 500_000
+
+_WORDS = "ARRAY['appointment','reminder','invoice','delivery','confirm','booking','thanks','offer','renewal','survey']"
+
+_INSERT_SQL = f"""
+    INSERT INTO {SMSMessage._meta.db_table}
+        (id, ghl_account_id, transmit_account_id, message_content, to_number, from_number,
+         direction, status, cost, segments, created_at, updated_at)
+    SELECT gen_random_uuid(), %(account)s, %(transmit)s,
+           'Hi ' || md5(g::text) || ', your ' || ({_WORDS})[1 + g %% 10] || ' ' || (g %% 100000)::text,
+           '614' || lpad(((g::bigint * 7919) %% 100000000)::text, 8, '0'),
+           '61400000000',
+           'outbound', 'delivered', 0.074, 1,
+           now() - random() * interval '90 days', now()
+    FROM generate_series(%(first)s, %(last)s) AS g
+"""
+
+
+def _legacy(term):
+    match = Q()
+    for field in SEARCH_FIELDS:
+        match |= Q(**{f"{field}__icontains": term})
+    return SMSMessage.objects.filter(match)
+
+
+def _plan_nodes(queryset):
+    plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+    nodes = []
+
+    def walk(node):
+        label = node["Node Type"]
+        if node.get("Index Name"):
+            label += f" {node['Index Name']}"
+        elif node.get("Relation Name"):
+            label += f" {node['Relation Name']}"
+        nodes.append(label)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan)
+    return nodes
+
+
+class Command(BaseCommand):
+    help = "Benchmark ?search= on SMS messages: icontains-OR vs the indexed search."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--term", action="append", dest="terms", help="Search term (repeatable)")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--page-size", dest="page_size", type=int, default=20)
+        parser.add_argument("--mode", choices=["substring", "words"], default="substring")
+        parser.add_argument("--generate", type=int, default=0, help="Insert N synthetic messages first")
+        parser.add_argument("--keep-data", dest="keep_data", action="store_true")
+        parser.add_argument("--skip-legacy", dest="skip_legacy", action="store_true",
+                            help="Only time the new path (the old one can take minutes at scale)")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be >= 1")
+
+        created = self._generate(options["generate"]) if options["generate"] else None
+        try:
+            terms = options["terms"] or self._sample_terms()
+            if not terms:
+                raise CommandError("No messages to sample terms from; pass --term or --generate")
+            mode = "words" if options["mode"] == "words" else None
+            for term in terms:
+                self._bench(term, mode, options)
+        finally:
+            if created and options["keep_data"]:
+                self.stdout.write(f"Kept synthetic data (GHL account {created[0]})")
+            elif created:
+                self._cleanup(*created)
+
+    def _bench(self, term, mode, options):
+        page_size = options["page_size"]
+        new_qs = search_messages(SMSMessage.objects.all(), term, SEARCH_FIELDS, mode)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"search={term!r}"))
+
+        rows = [("indexed", new_qs)]
+        if not options["skip_legacy"]:
+            rows.insert(0, ("legacy", _legacy(term)))
+        for label, qs in rows:
+            count, count_ms = self._time(qs.count, options["repeat"])
+            _, page_ms = self._time(lambda: list(qs.order_by("-created_at")[:page_size]), options["repeat"])
+            self.stdout.write(
+                f"  {label:8} count {count:>9}  COUNT {count_ms:9.1f} ms  page {page_ms:9.1f} ms"
+            )
+        self.stdout.write(f"  plan: {', '.join(_plan_nodes(new_qs.order_by()))}")
+
+    def _time(self, fn, repeat):
+        timings = []
+        result = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        return result, statistics.median(timings)
+
+    def _sample_terms(self):
+        sample = SMSMessage.objects.order_by("-created_at").select_related("ghl_account").first()
+        if sample is None:
+            return []
+        terms = []
+        digits = "".join(ch for ch in sample.to_number if ch.isdigit())
+        if digits.startswith("61") and len(digits) > 6:
+            # As a user would type it: national format with spaces.
+            national = "0" + digits[2:]
+            terms.append(f"{national[:4]} {national[4:7]}")
+        elif len(digits) >= 6:
+            terms.append(digits[-6:])
+        words = [word for word in sample.message_content.split() if len(word) >= 4 and word.isalpha()]
+        if words:
+            terms.append(words[0].lower())
+        if sample.ghl_account.location_name:
+            terms.append(sample.ghl_account.location_name[:5])
+        terms.append(f"zz{uuid.uuid4().hex[:6]}")
+        return terms
+
+    def _generate(self, total):
+        suffix = uuid.uuid4().hex[:8]
+        account_id = uuid.uuid4()
+        # bulk_create: no onboarding signals (they call GHL).
+        GHLAuthCredentials.objects.bulk_create([
+            GHLAuthCredentials(
+                id=account_id,
+                user_id="bench",
+                access_token="bench",
+                refresh_token="bench",
+                expires_in=86399,
+                location_id=f"bench-search-{suffix}",
+                location_name=f"Search bench {suffix}",
+                company_id="bench-company",
+            )
+        ])
+        [transmit] = TransmitSMSAccount.objects.bulk_create([
+            TransmitSMSAccount(
+                account_name=f"Search bench {suffix}",
+                api_key="bench",
+                api_secret="bench",
+                account_id=f"bench-search-{suffix}",
+                phone_number="61400000000",
+            )
+        ])
+        started = time.perf_counter()
+        for first in range(0, total, INSERT_CHUNK):
+            last = min(first + INSERT_CHUNK, total) - 1
+            with connection.cursor() as cursor:
+                cursor.execute(_INSERT_SQL, {"account": account_id, "transmit": transmit.pk, "first": first, "last": last})
+            self.stdout.write(f"  messages: {last + 1}/{total}")
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {SMSMessage._meta.db_table}")
+        self.stdout.write(f"Inserted {total} messages in {time.perf_counter() - started:.1f} s")
+        return account_id, transmit.pk
+
+    def _cleanup(self, account_id, transmit_id):
+        self.stdout.write("Deleting synthetic messages...")
+        with connection.cursor() as cursor:
+            # Set-based delete; the ORM cascade would load every row.
+            cursor.execute(f"DELETE FROM {SMSMessage._meta.db_table} WHERE ghl_account_id = %s", [account_id])
+        GHLAuthCredentials.objects.filter(pk=account_id).delete()
+        TransmitSMSAccount.objects.filter(pk=transmit_id).delete()
+        usage_rollup.fold()
@@ -0,0 +1,64 @@
+"""
+Export SMSMessage and WalletTransaction as day/location-partitioned Parquet.
+
+Incremental: each run writes only the closed UTC days that are not exported yet
+(see sms_management_app/analytics_export.py), so it is safe to run from cron.
+Needs pyarrow.
+
+Examples:
+
+    # Everything not exported yet, into ANALYTICS_EXPORT_DIR
+    python manage.py export_analytics_parquet
+
+    # Re-export June for the ledger only
+    python manage.py export_analytics_parquet --only wallet_transactions --since 2026-06-01 --until 2026-06-30 --rebuild
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sms_management_app import analytics_export
+
+
+class Command(BaseCommand):
+    help = "Append new day partitions of messages and the wallet ledger as Parquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--root", help="Output directory (default: ANALYTICS_EXPORT_DIR)")
+        parser.add_argument("--since", help="First UTC day (YYYY-MM-DD); default: oldest row")
+        parser.add_argument("--until", help="Last UTC day (YYYY-MM-DD); default: newest settled day")
+        parser.add_argument("--only", choices=[spec["name"] for spec in analytics_export.DATASETS])
+        parser.add_argument("--rebuild", action="store_true", help="Replace days that were already exported")
+
+    def handle(self, *args, **options):
+        since = self._parse_day(options["since"], "--since")
+        until = self._parse_day(options["until"], "--until")
+        if since and until and since > until:
+            raise CommandError("--since is after --until")
+        specs = [
+            spec for spec in analytics_export.DATASETS if not options["only"] or spec["name"] == options["only"]
+        ]
+
+        def progress(name, day, written):
+            self.stdout.write(f"  {name} {day}: {written['rows']} rows, {written['partitions']} locations")
+
+        try:
+            results = analytics_export.export(
+                specs, root=options["root"], since=since, until=until, rebuild=options["rebuild"], progress=progress
+            )
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        for name, totals in results.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: {totals['days']} days, {totals['rows']} rows, {totals['partitions']} partitions"
+            ))
+
+    def _parse_day(self, value, flag):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"{flag} must be YYYY-MM-DD")
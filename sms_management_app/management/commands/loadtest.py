@@ -0,0 +1,363 @@
+"""
+End-to-end load generator against local TransmitSMS / GHL stand-ins.
+
+Starts the fake providers from sms_management_app.fake_providers, points
+core.http_client at them (HTTP_HOST_OVERRIDES), creates a throwaway mapped
+location with a funded wallet, then drives through the real URL routing:
+
+    - GHL outbound webhooks at --rate per second for --duration seconds,
+    - a DLR for every send the fake Transmit accepted, --dlr-delay seconds later,
+    - a customer reply for --reply-ratio of the sends.
+
+Reports p50/p99 latency per request type, queue lag (created -> sent_at),
+sends/sec seen by the fake Transmit, provider error injection counts and DB
+time per message (queries issued by this process; with --eager that includes
+the Celery tasks). The location and its rows are deleted at the end.
+
+Without --eager the Celery workers must run with the HTTP_HOST_OVERRIDES value
+printed at start-up (use fixed --transmit-port/--ghl-port), otherwise they call
+the real providers.
+
+Examples:
+
+    # Everything in-process, 20 webhooks/s for 30 s
+    python manage.py loadtest --eager
+
+    # Real workers, slow providers with 2% 429s
+    python manage.py loadtest --rate 50 --duration 60 --transmit-port 9101 --ghl-port 9102 \\
+        --transmit-latency-ms 150 --rate-429 0.02
+
+    # Only serve the fakes (point a running stack at them)
+    python manage.py loadtest --serve-only --transmit-port 9101 --ghl-port 9102
+"""
+
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from celery import current_app
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client, override_settings
+
+from core.models import GHLAuthCredentials, Wallet
+from sms_management_app.fake_providers import FakeProvider, host_overrides
+from sms_management_app.models import GHLTransmitSMSMapping, GHLWebhookInbox, SMSMessage
+from transmitsms.models import TransmitSMSAccount
+
+WEBHOOK_PATH = "/api/sms/ghl-conversation-webhook/"
+DLR_PATH = "/api/sms/transmit-sms/dlr-callback/"
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class _Recorder:
+    """Thread-safe latency samples per request type, plus DB time from execute_wrapper."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+        self.db_ms = 0.0
+        self.db_queries = 0
+
+    def request(self, kind, elapsed_ms, status_code):
+        with self._lock:
+            self.latencies.setdefault(kind, []).append(elapsed_ms)
+            counts = self.statuses.setdefault(kind, {})
+            counts[status_code] = counts.get(status_code, 0) + 1
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.db_ms += elapsed
+                self.db_queries += 1
+
+
+class Command(BaseCommand):
+    help = "Drive webhooks/DLRs/replies at a target rate against fake TransmitSMS and GHL servers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rate", type=float, default=20, help="GHL webhooks per second")
+        parser.add_argument("--duration", type=float, default=30, help="Seconds to generate webhooks")
+        parser.add_argument("--concurrency", type=int, default=16, help="Client threads")
+        parser.add_argument("--mms-ratio", dest="mms_ratio", type=float, default=0.0)
+        parser.add_argument("--dlr-delay", dest="dlr_delay", type=float, default=1.0,
+                            help="Seconds between a send and its DLR")
+        parser.add_argument("--dlr-fail-ratio", dest="dlr_fail_ratio", type=float, default=0.05)
+        parser.add_argument("--reply-ratio", dest="reply_ratio", type=float, default=0.1)
+        parser.add_argument("--transmit-latency-ms", dest="transmit_latency_ms", type=float, default=50)
+        parser.add_argument("--ghl-latency-ms", dest="ghl_latency_ms", type=float, default=80)
+        parser.add_argument("--jitter-ms", dest="jitter_ms", type=float, default=20)
+        parser.add_argument("--rate-429", dest="rate_429", type=float, default=0.0,
+                            help="Share of provider responses that are 429")
+        parser.add_argument("--rate-5xx", dest="rate_5xx", type=float, default=0.0,
+                            help="Share of provider responses that are 503")
+        parser.add_argument("--transmit-port", dest="transmit_port", type=int, default=0)
+        parser.add_argument("--ghl-port", dest="ghl_port", type=int, default=0)
+        parser.add_argument("--eager", action="store_true",
+                            help="Run Celery tasks in-process (no workers needed)")
+        parser.add_argument("--drain-timeout", dest="drain_timeout", type=float, default=60,
+                            help="Seconds to wait for queued sends after generation stops")
+        parser.add_argument("--serve-only", dest="serve_only", action="store_true",
+                            help="Only run the fake providers until interrupted")
+        parser.add_argument("--keep-data", dest="keep_data", action="store_true",
+                            help="Do not delete the load-test location afterwards")
+
+    def handle(self, *args, **options):
+        if options["rate"] <= 0 or options["duration"] <= 0:
+            raise CommandError("--rate and --duration must be > 0")
+
+        provider_kwargs = {
+            "jitter_ms": options["jitter_ms"],
+            "rate_429": options["rate_429"],
+            "rate_5xx": options["rate_5xx"],
+        }
+        transmit = FakeProvider("transmit", port=options["transmit_port"],
+                                latency_ms=options["transmit_latency_ms"], **provider_kwargs).start()
+        ghl = FakeProvider("ghl", port=options["ghl_port"],
+                           latency_ms=options["ghl_latency_ms"], **provider_kwargs).start()
+        overrides = host_overrides(transmit, ghl)
+        self.stdout.write("Fake providers: transmit=%s ghl=%s" % (transmit.base_url, ghl.base_url))
+        self.stdout.write("Workers need: HTTP_HOST_OVERRIDES=" + ",".join(f"{h}={u}" for h, u in overrides.items()))
+
+        try:
+            if options["serve_only"]:
+                self._serve(transmit, ghl)
+                return
+
+            account, transmit_account = self._create_tenant()
+            try:
+                self._run(account, transmit, ghl, overrides, options)
+            finally:
+                if options["keep_data"]:
+                    self.stdout.write(f"Kept load-test location {account.location_id}")
+                else:
+                    GHLWebhookInbox.objects.filter(location_id=account.location_id).delete()
+                    GHLAuthCredentials.objects.filter(pk=account.pk).delete()
+                    TransmitSMSAccount.objects.filter(pk=transmit_account.pk).delete()
+        finally:
+            transmit.stop()
+            ghl.stop()
+
+    def _serve(self, transmit, ghl):
+        self.stdout.write("Serving fakes; Ctrl-C to stop")
+        try:
+            while True:
+                time.sleep(10)
+                self.stdout.write(json.dumps({"transmit": transmit.stats(), "ghl": ghl.stats()}, default=str))
+        except KeyboardInterrupt:
+            pass
+
+    def _create_tenant(self):
+        suffix = uuid.uuid4().hex[:12]
+        account_id = uuid.uuid4()
+        # bulk_create: no onboarding signals (they call GHL).
+        GHLAuthCredentials.objects.bulk_create([
+            GHLAuthCredentials(
+                id=account_id,
+                user_id="loadtest",
+                access_token="loadtest",
+                refresh_token="loadtest",
+                expires_in=86399,
+                location_id=f"loadtest-{suffix}",
+                location_name="Load test",
+                company_id="loadtest-company",
+            )
+        ])
+        account = GHLAuthCredentials.objects.get(pk=account_id)
+        transmit_account = TransmitSMSAccount.objects.create(
+            account_name=f"Load test {suffix}",
+            api_key="loadtest",
+            api_secret="loadtest",
+            account_id=f"loadtest-{suffix}",
+            phone_number="61400000000",
+        )
+        GHLTransmitSMSMapping.objects.create(ghl_account=account, transmit_account=transmit_account)
+        Wallet.objects.create(
+            account=account,
+            balance=Decimal("10000000.00"),
+            cred_remaining=Decimal("10000000.00"),
+        )
+        return account, transmit_account
+
+    def _run(self, account, transmit, ghl, overrides, options):
+        recorder = _Recorder()
+        local = threading.local()
+        run_id = uuid.uuid4().hex[:8]
+
+        def client():
+            if not hasattr(local, "client"):
+                local.client = Client()
+            return local.client
+
+        def timed(kind, call):
+            close_old_connections()
+            with connection.execute_wrapper(recorder):
+                started = time.perf_counter()
+                try:
+                    response = call(client())
+                    status_code = response.status_code
+                except Exception:
+                    status_code = "exception"
+                recorder.request(kind, (time.perf_counter() - started) * 1000, status_code)
+
+        def send_webhook(i):
+            payload = {
+                "type": "SMS",
+                "locationId": account.location_id,
+                "messageId": f"loadtest-{run_id}-{i}",
+                "conversationId": f"loadtest-conv-{run_id}-{i % 50}",
+                "contactId": f"loadtest-contact-{run_id}-{i % 50}",
+                "phone": "+61400%06d" % (i % 1000000),
+                "message": "Load test message %d" % i,
+            }
+            if random.random() < options["mms_ratio"]:
+                payload["attachments"] = ["https://example.com/loadtest.jpg"]
+            timed("webhook", lambda c: c.post(WEBHOOK_PATH, data=json.dumps(payload), content_type="application/json"))
+
+        def send_dlr(send):
+            failed = random.random() < options["dlr_fail_ratio"]
+            if send.get("mms"):
+                payload = {"event_type": "MMS_STATUS", "status": {
+                    "id": send["message_id"], "message_ref": send.get("message_ref"),
+                    "status": "FAILED" if failed else "DELIVERED",
+                    "description": "Load test failure" if failed else "",
+                }}
+            else:
+                payload = {"message_id": send["message_id"], "status": "hard-bounce" if failed else "delivered",
+                           "error_description": "Load test failure"}
+            timed("dlr", lambda c: c.post(DLR_PATH, data=json.dumps(payload), content_type="application/json"))
+
+        def send_reply(send):
+            path = urlsplit(send["reply_callback"]).path
+            params = {
+                "mobile": (send.get("to") or "61400000000").lstrip("+"),
+                "response": "Load test reply",
+                "message_id": send["message_id"],
+                "response_id": str(random.randint(10 ** 8, 10 ** 9)),
+                "longcode": "61400000000",
+                "is_optout": "no",
+            }
+            timed("reply", lambda c: c.get(path, params))
+
+        previous_eager = current_app.conf.task_always_eager
+        if options["eager"]:
+            current_app.conf.task_always_eager = True
+        pending_dlrs = []
+        pool = ThreadPoolExecutor(max_workers=options["concurrency"], thread_name_prefix="loadtest")
+        in_flight = [0]
+        in_flight_lock = threading.Lock()
+
+        def submit(fn, arg):
+            with in_flight_lock:
+                in_flight[0] += 1
+
+            def done(_future):
+                with in_flight_lock:
+                    in_flight[0] -= 1
+
+            pool.submit(fn, arg).add_done_callback(done)
+
+        def pump_provider_events(now):
+            for send in transmit.take_sends():
+                pending_dlrs.append(send)
+                if send.get("reply_callback") and random.random() < options["reply_ratio"]:
+                    submit(send_reply, send)
+            while pending_dlrs and pending_dlrs[0]["sent_at"] + options["dlr_delay"] <= now:
+                submit(send_dlr, pending_dlrs.pop(0))
+
+        total = int(options["rate"] * options["duration"])
+        self.stdout.write(f"Generating {total} webhooks at {options['rate']}/s "
+                          f"({'eager' if options['eager'] else 'workers'})")
+        try:
+            # The app's print() debugging would swamp the report; self.stdout is unaffected.
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), \
+                    override_settings(HTTP_HOST_OVERRIDES=overrides,
+                                      ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+                started = time.time()
+                for i in range(total):
+                    target = started + i / options["rate"]
+                    while time.time() < target:
+                        pump_provider_events(time.time())
+                        time.sleep(min(0.01, max(0.0, target - time.time())))
+                    submit(send_webhook, i)
+                generated_at = time.time()
+
+                # Keep playing the provider's side until queued sends have gone out.
+                deadline = generated_at + options["drain_timeout"]
+                while time.time() < deadline:
+                    pump_provider_events(time.time())
+                    outstanding = SMSMessage.objects.filter(
+                        ghl_account=account, direction="outbound", status="pending", transmit_message_id__isnull=True
+                    ).count()
+                    if not outstanding and not pending_dlrs and not in_flight[0]:
+                        break
+                    time.sleep(0.2)
+                pool.shutdown(wait=True)
+                finished_at = time.time()
+        finally:
+            pool.shutdown(wait=True)
+            current_app.conf.task_always_eager = previous_eager
+
+        self._report(account, recorder, transmit, ghl, started, generated_at, finished_at)
+
+    def _report(self, account, recorder, transmit, ghl, started, generated_at, finished_at):
+        self.stdout.write(self.style.MIGRATE_HEADING("Requests"))
+        for kind, samples in sorted(recorder.latencies.items()):
+            samples.sort()
+            self.stdout.write(
+                f"  {kind:<8} n={len(samples):<6} p50={_percentile(samples, 50):.1f} ms "
+                f"p99={_percentile(samples, 99):.1f} ms max={samples[-1]:.1f} ms  {recorder.statuses[kind]}"
+            )
+        self.stdout.write(f"  generation {generated_at - started:.1f} s, total {finished_at - started:.1f} s")
+
+        messages = SMSMessage.objects.filter(ghl_account=account)
+        lags = sorted(
+            (sent_at - created_at).total_seconds() * 1000
+            for created_at, sent_at in messages.filter(direction="outbound", sent_at__isnull=False)
+            .values_list("created_at", "sent_at")
+        )
+        statuses = {}
+        for direction, status in messages.values_list("direction", "status"):
+            key = f"{direction}:{status}"
+            statuses[key] = statuses.get(key, 0) + 1
+        message_count = sum(statuses.values())
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Messages"))
+        self.stdout.write(f"  {statuses}")
+        self.stdout.write(
+            f"  queue lag (created -> sent) p50={_percentile(lags, 50):.0f} ms "
+            f"p99={_percentile(lags, 99):.0f} ms (n={len(lags)})"
+        )
+        per_message = recorder.db_ms / message_count if message_count else 0.0
+        self.stdout.write(
+            f"  DB time: {recorder.db_ms:.0f} ms over {recorder.db_queries} queries "
+            f"= {per_message:.2f} ms/message (this process)"
+        )
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Providers"))
+        for name, provider in (("transmit", transmit), ("ghl", ghl)):
+            for route, stats in sorted(provider.stats().items()):
+                window = max(stats["last_ts"] - stats["first_ts"], 1e-6)
+                self.stdout.write(
+                    f"  {name:<8} {route:<36} n={stats['requests']:<6} "
+                    f"{stats['requests'] / window:.1f}/s 429={stats['429']} 5xx={stats['5xx']}"
+                )
@@ -0,0 +1,314 @@
+"""
+CSV export of the SMS message list, synchronous or as a background job.
+
+SMSMessageExportCSVView streams small exports in the request. Larger ones go
+through MessageExportJob (POST sms-messages/export-jobs/ with the list's query
+params):
+
+    start_message_export    counts the matching rows, splits [first, last]
+                            created_at into MESSAGE_EXPORT_CHUNKS equal time
+                            ranges and fans out one export_message_chunk each
+    export_message_chunk    writes its range as a gzip member to
+                            <dir>/<job>/part-NNNN.csv.gz (tmp + rename, so a
+                            redelivered chunk just rewrites its part)
+    finish (last chunk)     under the job row lock, once every part exists,
+                            concatenates header + parts into one .csv.gz
+
+A file of concatenated gzip members is a valid gzip stream, so parts are
+joined byte for byte without recompressing. The download endpoint serves the
+file with HTTP Range support so interrupted downloads resume. Jobs order by
+created_at only (ascending or descending); other orderings need the
+synchronous endpoint.
+
+Parts and results live on local disk (MESSAGE_EXPORT_DIR): workers running
+exports and the web process serving downloads must share that directory.
+"""
+
+import csv
+import gzip
+import logging
+import os
+import re
+import shutil
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Min
+from django.http import QueryDict
+from django.utils import timezone
+
+from sms_management_app.error_sanitize import sanitize_error_text
+from sms_management_app.filters import SMSMessageFilter
+from sms_management_app.models import MessageExportJob, SMSMessage
+from sms_management_app.search import SEARCH_FIELDS, search_messages
+
+logger = logging.getLogger(__name__)
+
+HEADER = [
+    "created_at", "direction", "status", "from_number", "to_number",
+    "message_content", "error_category", "error_message", "ghl_sync_error",
+    "location_name", "location_id",
+    "cost", "segments", "sent_at", "delivered_at",
+    "ghl_message_id", "transmit_message_id",
+]
+JOB_ORDERINGS = {"created_at", "-created_at"}
+
+# Columns read per row; the location columns come from a per-chunk lookup
+# instead of a join.
+_VALUES = [
+    "created_at", "direction", "status", "from_number", "to_number",
+    "message_content", "error_category", "error_message", "ghl_sync_error",
+    "ghl_account_id",
+    "cost", "segments", "sent_at", "delivered_at",
+    "ghl_message_id", "transmit_message_id",
+]
+ITERATOR_CHUNK_SIZE = 2000
+GZIP_LEVEL = 6
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def export_dir():
+    return str(_setting("MESSAGE_EXPORT_DIR", os.path.join(settings.BASE_DIR, "exports")))
+
+
+def job_dir(job_id):
+    return os.path.join(export_dir(), str(job_id))
+
+
+def filtered_messages(params):
+    """Messages matching the list filters and ?search= in ``params`` (a QueryDict or dict), unordered."""
+    if not isinstance(params, QueryDict):
+        query = QueryDict(mutable=True)
+        for key, value in params.items():
+            query.setlist(key, value if isinstance(value, list) else [value])
+        params = query
+    qs = SMSMessageFilter(params, queryset=SMSMessage.objects.all()).qs
+    return search_messages(qs, params.get("search"), SEARCH_FIELDS, params.get("search_mode"))
+
+
+# Error texts repeat heavily across a large export; sanitising is regex work.
+@lru_cache(maxsize=1024)
+def _sanitized_error(text):
+    return sanitize_error_text(text, placeholder_for_polluted=True)
+
+
+@lru_cache(maxsize=1024)
+def _sanitized_sync_error(text):
+    return sanitize_error_text(text)
+
+
+def _iso(value):
+    return value.isoformat() if value else ""
+
+
+def iter_rows(queryset):
+    """CSV rows (HEADER order) for an ordered SMSMessage queryset."""
+    from core.models import GHLAuthCredentials
+
+    locations = {}
+    for (created_at, direction, status, from_number, to_number, content, error_category, error_message,
+         ghl_sync_error, account_id, cost, segments, sent_at, delivered_at, ghl_message_id,
+         transmit_message_id) in queryset.values_list(*_VALUES).iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        if account_id not in locations:
+            locations[account_id] = GHLAuthCredentials.objects.filter(pk=account_id).values_list(
+                "location_name", "location_id"
+            ).first() or ("", "")
+        location_name, location_id = locations[account_id]
+        yield [
+            _iso(created_at),
+            direction,
+            status,
+            from_number,
+            to_number,
+            content,
+            error_category or "",
+            _sanitized_error(error_message or ""),
+            _sanitized_sync_error(ghl_sync_error or ""),
+            location_name or "",
+            location_id or "",
+            cost,
+            segments,
+            _iso(sent_at),
+            _iso(delivered_at),
+            ghl_message_id or "",
+            transmit_message_id or "",
+        ]
+
+
+def split_ranges(first, last, chunks):
+    """``chunks`` equal [start, end] created_at ranges covering first..last (end exclusive except the last)."""
+    span = (last - first) / chunks
+    if span <= timedelta(0):
+        return [[first.isoformat(), last.isoformat()]]
+    bounds = [first + span * i for i in range(chunks)] + [last]
+    return [[bounds[i].isoformat(), bounds[i + 1].isoformat()] for i in range(chunks)]
+
+
+def create_job(params):
+    """Record an export job for the given list query params (QueryDict). Caller enqueues start_message_export."""
+    return MessageExportJob.objects.create(params={key: params.getlist(key) for key in params})
+
+
+def _job_ordering(job):
+    ordering = (job.params.get("ordering") or ["-created_at"])[0]
+    return ordering if ordering in JOB_ORDERINGS else "-created_at"
+
+
+def _part_path(job, index):
+    return os.path.join(job_dir(job.pk), f"part-{index:04d}.csv.gz")
+
+
+def _write_gzip_csv(path, rows):
+    """Write rows as one gzip member via a temp file; returns the number of rows."""
+    tmp = f"{path}.tmp"
+    written = 0
+    with gzip.open(tmp, "wt", newline="", encoding="utf-8", compresslevel=GZIP_LEVEL) as fh:
+        writer = csv.writer(fh)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+    os.replace(tmp, path)
+    return written
+
+
+def start(job):
+    """Count, split and create the job directory. Returns the chunk indexes to dispatch."""
+    qs = filtered_messages(job.params)
+    bounds = qs.aggregate(first=Min("created_at"), last=Max("created_at"))
+    job.total_rows = qs.count()
+    job.status = "running"
+    job.started_at = timezone.now()
+    job.chunks = []
+    if bounds["first"] is not None:
+        chunks = max(1, int(_setting("MESSAGE_EXPORT_CHUNKS", 8)))
+        job.chunks = split_ranges(bounds["first"], bounds["last"], chunks)
+
+    os.makedirs(job_dir(job.pk), exist_ok=True)
+    _write_gzip_csv(os.path.join(job_dir(job.pk), "header.csv.gz"), [HEADER])
+    job.save(update_fields=["total_rows", "status", "started_at", "chunks"])
+    return list(range(len(job.chunks)))
+
+
+def export_chunk(job, index):
+    """Write part ``index``; returns rows written (0 when the part already existed)."""
+    path = _part_path(job, index)
+    if os.path.exists(path):
+        return 0
+
+    first, last = (datetime.fromisoformat(value) for value in job.chunks[index])
+    qs = filtered_messages(job.params).filter(created_at__gte=first)
+    # Ranges are half-open except the one ending at the newest row.
+    if index == len(job.chunks) - 1:
+        qs = qs.filter(created_at__lte=last)
+    else:
+        qs = qs.filter(created_at__lt=last)
+    if _job_ordering(job).startswith("-"):
+        qs = qs.order_by("-created_at", "-pk")
+    else:
+        qs = qs.order_by("created_at", "pk")
+
+    written = _write_gzip_csv(path, iter_rows(qs))
+    MessageExportJob.objects.filter(pk=job.pk).update(exported_rows=F("exported_rows") + written)
+    return written
+
+
+def finish_if_complete(job_id):
+    """Stitch the parts together once all of them exist. Returns True when the job is done."""
+    with transaction.atomic():
+        job = MessageExportJob.objects.select_for_update().get(pk=job_id)
+        if job.status != "running":
+            return job.status == "done"
+        done = sum(1 for index in range(len(job.chunks)) if os.path.exists(_part_path(job, index)))
+        job.chunks_done = done
+        if done < len(job.chunks):
+            job.save(update_fields=["chunks_done"])
+            return False
+
+        directory = job_dir(job.pk)
+        file_name = f"sms_messages_{job.created_at.strftime('%Y%m%d_%H%M%S')}_{str(job.pk)[:8]}.csv.gz"
+        target = os.path.join(directory, file_name)
+        indexes = list(range(len(job.chunks)))
+        if _job_ordering(job).startswith("-"):
+            indexes.reverse()
+        parts = [os.path.join(directory, "header.csv.gz")] + [_part_path(job, index) for index in indexes]
+        with open(f"{target}.tmp", "wb") as out:
+            for part in parts:
+                with open(part, "rb") as src:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+        os.replace(f"{target}.tmp", target)
+        for part in parts:
+            os.remove(part)
+
+        job.status = "done"
+        job.file_name = file_name
+        job.file_size = os.path.getsize(target)
+        job.finished_at = timezone.now()
+        job.save(update_fields=["chunks_done", "status", "file_name", "file_size", "finished_at"])
+    return True
+
+
+def fail(job_id, error):
+    MessageExportJob.objects.filter(pk=job_id, status__in=["pending", "running"]).update(
+        status="failed", error_message=str(error)[:2000], finished_at=timezone.now()
+    )
+    shutil.rmtree(job_dir(job_id), ignore_errors=True)
+
+
+def purge_expired():
+    """Delete jobs (and files) older than MESSAGE_EXPORT_RETENTION_HOURS. Returns the number removed."""
+    cutoff = timezone.now() - timedelta(hours=_setting("MESSAGE_EXPORT_RETENTION_HOURS", 24))
+    expired = list(MessageExportJob.objects.filter(created_at__lt=cutoff).values_list("pk", flat=True))
+    for job_id in expired:
+        shutil.rmtree(job_dir(job_id), ignore_errors=True)
+    MessageExportJob.objects.filter(pk__in=expired).delete()
+    return len(expired)
+
+
+def file_path(job):
+    if job.status != "done" or not job.file_name:
+        return None
+    path = os.path.join(job_dir(job.pk), job.file_name)
+    return path if os.path.exists(path) else None
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single-range ``Range: bytes=...`` header.
+
+    Returns None when there is no usable header (serve the whole file) and
+    raises ValueError when the range cannot be satisfied (416).
+    """
+    match = _RANGE_RE.match((header or "").strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    start_at = int(first)
+    end_at = min(int(last), size - 1) if last else size - 1
+    if start_at >= size or end_at < start_at:
+        raise ValueError("range not satisfiable")
+    return start_at, end_at
+
+
+def iter_file_range(path, start_at, end_at, block_size=64 * 1024):
+    with open(path, "rb") as fh:
+        fh.seek(start_at)
+        remaining = end_at - start_at + 1
+        while remaining > 0:
+            data = fh.read(min(block_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
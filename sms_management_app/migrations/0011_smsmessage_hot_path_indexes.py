@@ -0,0 +1,35 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; building the
+    # indexes this way keeps SMSMessage writable while they are built.
+    atomic = False
+
+    dependencies = [
+        ("sms_management_app", "0010_transmitdlrinbox"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="smsmessage",
+            index=models.Index(fields=["ghl_message_id"], name="sms_ghl_message_id_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="smsmessage",
+            index=models.Index(fields=["transmit_message_id"], name="sms_transmit_message_id_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="smsmessage",
+            index=models.Index(fields=["ghl_account", "-created_at"], name="sms_account_created_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="smsmessage",
+            index=models.Index(
+                condition=models.Q(("status__in", ["queued", "pending", "failed"])),
+                fields=["status", "created_at"],
+                name="sms_open_status_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Statement-level triggers with transition tables: one delta row per
+# (account, day, direction, status) per statement, so a bulk_update of a DLR
+# batch costs a handful of delta rows rather than two per message.
+MESSAGE_USAGE_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION sms_message_usage_delta() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO sms_management_app_messageusagedelta
+            (ghl_account_id, day, direction, status, message_count, segments, cost, costed_count)
+        SELECT ghl_account_id, (created_at AT TIME ZONE 'UTC')::date, direction, status,
+               COUNT(*), SUM(segments), SUM(cost), COUNT(*) FILTER (WHERE cost <> 0)
+        FROM new_rows
+        GROUP BY 1, 2, 3, 4;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO sms_management_app_messageusagedelta
+            (ghl_account_id, day, direction, status, message_count, segments, cost, costed_count)
+        SELECT ghl_account_id, (created_at AT TIME ZONE 'UTC')::date, direction, status,
+               -COUNT(*), -SUM(segments), -SUM(cost), -COUNT(*) FILTER (WHERE cost <> 0)
+        FROM old_rows
+        GROUP BY 1, 2, 3, 4;
+    ELSE
+        -- Updates that do not move a message between buckets (or change its
+        -- cost/segments) cancel out and write nothing.
+        INSERT INTO sms_management_app_messageusagedelta
+            (ghl_account_id, day, direction, status, message_count, segments, cost, costed_count)
+        SELECT ghl_account_id, day, direction, status, SUM(n), SUM(segments), SUM(cost), SUM(costed)
+        FROM (
+            SELECT ghl_account_id, (created_at AT TIME ZONE 'UTC')::date AS day, direction, status,
+                   1 AS n, segments::bigint AS segments, cost, CASE WHEN cost <> 0 THEN 1 ELSE 0 END AS costed
+            FROM new_rows
+            UNION ALL
+            SELECT ghl_account_id, (created_at AT TIME ZONE 'UTC')::date, direction, status,
+                   -1, -segments::bigint, -cost, CASE WHEN cost <> 0 THEN -1 ELSE 0 END
+            FROM old_rows
+        ) changes
+        GROUP BY 1, 2, 3, 4
+        HAVING SUM(n) <> 0 OR SUM(segments) <> 0 OR SUM(cost) <> 0 OR SUM(costed) <> 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER sms_message_usage_insert AFTER INSERT ON sms_management_app_smsmessage
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sms_message_usage_delta();
+CREATE TRIGGER sms_message_usage_update AFTER UPDATE ON sms_management_app_smsmessage
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sms_message_usage_delta();
+CREATE TRIGGER sms_message_usage_delete AFTER DELETE ON sms_management_app_smsmessage
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sms_message_usage_delta();
+"""
+
+DROP_MESSAGE_USAGE_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS sms_message_usage_insert ON sms_management_app_smsmessage;
+DROP TRIGGER IF EXISTS sms_message_usage_update ON sms_management_app_smsmessage;
+DROP TRIGGER IF EXISTS sms_message_usage_delete ON sms_management_app_smsmessage;
+DROP FUNCTION IF EXISTS sms_message_usage_delta();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_walletdailyusage'),
+        ('sms_management_app', '0011_smsmessage_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageUsageDelta',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('ghl_account_id', models.UUIDField()),
+                ('day', models.DateField()),
+                ('direction', models.CharField(max_length=10)),
+                ('status', models.CharField(max_length=20)),
+                ('message_count', models.BigIntegerField(default=0)),
+                ('segments', models.BigIntegerField(default=0)),
+                ('cost', models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+                ('costed_count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MessageDailyUsage',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('direction', models.CharField(max_length=10)),
+                ('status', models.CharField(max_length=20)),
+                ('message_count', models.BigIntegerField(default=0)),
+                ('segments', models.BigIntegerField(default=0)),
+                ('cost', models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+                ('costed_count', models.BigIntegerField(default=0)),
+                ('ghl_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to='core.ghlauthcredentials')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='msg_daily_usage_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ghl_account', 'day', 'direction', 'status'), name='msg_daily_usage_bucket_uniq')],
+            },
+        ),
+        migrations.RunSQL(MESSAGE_USAGE_TRIGGERS_SQL, DROP_MESSAGE_USAGE_TRIGGERS_SQL),
+    ]
@@ -0,0 +1,17 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("sms_management_app", "0012_messagedailyusage"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="smsmessage",
+            index=models.Index(fields=["-created_at"], name="sms_created_idx"),
+        ),
+    ]
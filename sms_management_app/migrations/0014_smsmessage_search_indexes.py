@@ -0,0 +1,60 @@
+import django.contrib.postgres.search
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+
+class Migration(migrations.Migration):
+    # GIN indexes on a large table: build them without blocking writes.
+    atomic = False
+
+    dependencies = [
+        ("sms_management_app", "0013_smsmessage_created_idx"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name="smsmessage",
+            index=GinIndex(
+                OpClass(Upper("to_number"), name="gin_trgm_ops"),
+                OpClass(Upper("from_number"), name="gin_trgm_ops"),
+                name="sms_numbers_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="smsmessage",
+            index=GinIndex(
+                OpClass(
+                    models.Func(
+                        models.F("to_number"), models.Value("\\D"), models.Value(""), models.Value("g"),
+                        function="REGEXP_REPLACE", output_field=models.CharField(),
+                    ),
+                    name="gin_trgm_ops",
+                ),
+                OpClass(
+                    models.Func(
+                        models.F("from_number"), models.Value("\\D"), models.Value(""), models.Value("g"),
+                        function="REGEXP_REPLACE", output_field=models.CharField(),
+                    ),
+                    name="gin_trgm_ops",
+                ),
+                name="sms_number_digits_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="smsmessage",
+            index=GinIndex(OpClass(Upper("message_content"), name="gin_trgm_ops"), name="sms_content_trgm_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="smsmessage",
+            index=GinIndex(
+                models.Func(
+                    models.Value("simple"), models.F("message_content"),
+                    function="TO_TSVECTOR", output_field=django.contrib.postgres.search.SearchVectorField(),
+                ),
+                name="sms_content_tsv_idx",
+            ),
+        ),
+    ]
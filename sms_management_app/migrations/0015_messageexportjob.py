@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:05
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms_management_app', '0014_smsmessage_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageExportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('params', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('chunks', models.JSONField(default=list)),
+                ('chunks_done', models.PositiveIntegerField(default=0)),
+                ('total_rows', models.BigIntegerField(blank=True, null=True)),
+                ('exported_rows', models.BigIntegerField(default=0)),
+                ('file_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('file_size', models.BigIntegerField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='msg_export_created_idx')],
+            },
+        ),
+    ]
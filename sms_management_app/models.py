@@ -1,8 +1,12 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from core.models import GHLAuthCredentials
 from transmitsms.models import TransmitSMSAccount
 import uuid
 
+from sms_management_app.search import content_tsvector, digits_only
+
 # models.py
 class GHLTransmitSMSMapping(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -86,6 +90,38 @@ class SMSMessage(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Idempotency checks, reply threading and MMS DLRs.
+            models.Index(fields=["ghl_message_id"], name="sms_ghl_message_id_idx"),
+            # SMS DLRs.
+            models.Index(fields=["transmit_message_id"], name="sms_transmit_message_id_idx"),
+            # Per-location lists and dashboards.
+            models.Index(fields=["ghl_account", "-created_at"], name="sms_account_created_idx"),
+            # Unfiltered "latest messages" and last-24h counts on the dashboard.
+            models.Index(fields=["-created_at"], name="sms_created_idx"),
+            # Retry/requeue scans only ever look at these statuses.
+            models.Index(
+                fields=["status", "created_at"],
+                name="sms_open_status_created_idx",
+                condition=models.Q(status__in=["queued", "pending", "failed"]),
+            ),
+            # ?search= (see search.py): substring and digit-normalised number
+            # matching, substring and word-prefix content matching.
+            GinIndex(
+                OpClass(Upper("to_number"), name="gin_trgm_ops"),
+                OpClass(Upper("from_number"), name="gin_trgm_ops"),
+                name="sms_numbers_trgm_idx",
+            ),
+            GinIndex(
+                OpClass(digits_only("to_number"), name="gin_trgm_ops"),
+                OpClass(digits_only("from_number"), name="gin_trgm_ops"),
+                name="sms_number_digits_trgm_idx",
+            ),
+            GinIndex(OpClass(Upper("message_content"), name="gin_trgm_ops"), name="sms_content_trgm_idx"),
+            GinIndex(content_tsvector(), name="sms_content_tsv_idx"),
+        ]
+
     def __str__(self):
         return f"SMS {self.direction} - {self.to_number} [{self.status}]"
 
@@ -101,3 +137,165 @@ class WebhookLog(models.Model):
         return f"{self.webhook_type} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
 
+
+class GHLWebhookInbox(models.Model):
+    """
+    Durable buffer for GHL outbound webhooks when fast-ack ingestion is enabled.
+
+    The webhook view only inserts here (messageId is unique, so GHL retries are
+    dropped by the database) and returns 202. drain_ghl_webhook_inbox claims
+    rows in batches and runs the normal process_ghl_message flow.
+    """
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("processing", "Processing"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    message_id = models.CharField(max_length=255, unique=True)
+    location_id = models.CharField(max_length=255)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="ghl_inbox_status_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"GHL inbox {self.message_id} [{self.status}]"
+
+
+class TransmitDLRInbox(models.Model):
+    """
+    Buffer for TransmitSMS delivery receipts when TRANSMIT_DLR_BATCHING is enabled.
+
+    The DLR callback only inserts here; apply_transmit_dlrs applies the receipts
+    in micro-batches (see sms_management_app/dlr_batch.py).
+    """
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("processing", "Processing"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="dlr_inbox_status_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"DLR inbox {self.pk} [{self.status}]"
+
+
+class MessageDailyUsage(models.Model):
+    """
+    Per-location daily message totals by (direction, status), read by the dashboards.
+
+    Postgres triggers on SMSMessage record every insert, delete and change of
+    status/direction/cost/segments as +/- rows in MessageUsageDelta;
+    fold_usage_rollups folds those in here every minute. Days are UTC. Rebuild
+    with `manage.py backfill_usage_rollups` (see sms_management_app/usage_rollup.py).
+    """
+    id = models.BigAutoField(primary_key=True)
+    ghl_account = models.ForeignKey(GHLAuthCredentials, on_delete=models.CASCADE, related_name="daily_usage")
+    day = models.DateField()
+    direction = models.CharField(max_length=10)
+    status = models.CharField(max_length=20)
+    message_count = models.BigIntegerField(default=0)
+    segments = models.BigIntegerField(default=0)
+    cost = models.DecimalField(max_digits=16, decimal_places=3, default=0)
+    # Messages with a non-zero cost; the dashboard's average cost ignores free ones.
+    costed_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ghl_account", "day", "direction", "status"], name="msg_daily_usage_bucket_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="msg_daily_usage_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.ghl_account_id} {self.day} {self.direction}/{self.status}: {self.message_count}"
+
+
+class MessageUsageDelta(models.Model):
+    """
+    Not-yet-folded changes to MessageDailyUsage, written by the SMSMessage triggers.
+
+    Append-only, so concurrent sends never queue on a shared rollup row.
+    """
+    id = models.BigAutoField(primary_key=True)
+    # Plain column, no FK: the delete trigger writes rows for accounts that are
+    # being deleted in the same transaction.
+    ghl_account_id = models.UUIDField()
+    day = models.DateField()
+    direction = models.CharField(max_length=10)
+    status = models.CharField(max_length=20)
+    message_count = models.BigIntegerField(default=0)
+    segments = models.BigIntegerField(default=0)
+    cost = models.DecimalField(max_digits=16, decimal_places=3, default=0)
+    costed_count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Usage delta {self.pk} {self.day} {self.direction}/{self.status}: {self.message_count:+d}"
+
+
+class MessageExportJob(models.Model):
+    """
+    Background CSV export of the SMS message list (see sms_management_app/message_export.py).
+
+    ``params`` holds the list filters (status, location_id, search, created_at
+    range, ...) as submitted. Workers write the matching rows as gzip parts,
+    one per created_at range in ``chunks``; the last part to finish stitches
+    them into ``file_name`` under MESSAGE_EXPORT_DIR.
+    """
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    # [[start, end], ...] ISO timestamps, oldest first.
+    chunks = models.JSONField(default=list)
+    chunks_done = models.PositiveIntegerField(default=0)
+    total_rows = models.BigIntegerField(null=True, blank=True)
+    exported_rows = models.BigIntegerField(default=0)
+    file_name = models.CharField(max_length=255, null=True, blank=True)
+    file_size = models.BigIntegerField(null=True, blank=True)
+    error_message = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="msg_export_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"Message export {self.pk} [{self.status}]"
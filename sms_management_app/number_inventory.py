@@ -0,0 +1,275 @@
+"""
+Local copy of the Transmit available-number inventory behind GetAvailableNumbers.
+
+refresh_number_inventory (every 10 minutes) pages through the whole of
+get-numbers.json?filter=available and stores a snapshot in the shared cache.
+Each process turns the snapshot into an in-memory index the first time it sees
+a new version:
+
+    numbers / prices    sorted by (price, number): price filters and the
+                        Standard/Premium label are two bisects, price_asc /
+                        price_desc are slices in either direction
+    grams               digit trigram -> positions, for substring ("1234"),
+                        suffix ("*1234") and prefix ("6148*") vanity search
+
+Numbers claimed through RegisterNumber, RegisterPremiumNumber or OwnNumber are
+added to a shared Redis set and hidden immediately, without waiting for the
+next refresh; the set is pruned once Transmit stops listing them.
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = "number_inventory:snapshot"
+VERSION_KEY = "number_inventory:version"
+CLAIMED_KEY = "reloop:number_inventory:claimed"
+CLAIMED_TTL_SECONDS = 86400
+KICK_KEY = "number_inventory:kick"
+KICK_SECONDS = 60
+# How often a process checks the shared version key.
+VERSION_CHECK_SECONDS = 5
+# Standard numbers cost at most this much (same rule as the register flows).
+STANDARD_MAX_PRICE = Decimal("11")
+GRAM = 3
+MAX_PAGES = 1000
+
+
+def _page_size():
+    return getattr(settings, "NUMBER_INVENTORY_PAGE_SIZE", 500)
+
+
+class _Index:
+    def __init__(self, version, numbers):
+        rows = sorted(((number, Decimal(price)) for number, price in numbers), key=lambda row: (row[1], row[0]))
+        self.version = version
+        self.numbers = [number for number, _ in rows]
+        self.prices = [price for _, price in rows]
+        self.positions = {number: i for i, number in enumerate(self.numbers)}
+        grams = defaultdict(list)
+        for i, number in enumerate(self.numbers):
+            for gram in sorted({number[j:j + GRAM] for j in range(len(number) - GRAM + 1)}):
+                grams[gram].append(i)
+        self.grams = dict(grams)
+
+    def price_bounds(self, price_min=None, price_max=None, label=None):
+        lo, hi = 0, len(self.prices)
+        if price_min is not None:
+            lo = bisect.bisect_left(self.prices, price_min)
+        if price_max is not None:
+            hi = bisect.bisect_right(self.prices, price_max)
+        if label == "standard":
+            hi = min(hi, bisect.bisect_right(self.prices, STANDARD_MAX_PRICE))
+        elif label == "premium":
+            lo = max(lo, bisect.bisect_right(self.prices, STANDARD_MAX_PRICE))
+        return lo, hi
+
+    def matching(self, pattern, lo, hi):
+        """Positions in [lo, hi) whose number matches ``pattern`` (see parse_pattern), ascending."""
+        digits, anchor = pattern
+        if anchor == "prefix":
+            match = lambda number: number.startswith(digits)  # noqa: E731
+        elif anchor == "suffix":
+            match = lambda number: number.endswith(digits)  # noqa: E731
+        else:
+            match = lambda number: digits in number  # noqa: E731
+
+        if len(digits) < GRAM:
+            candidates = range(lo, hi)
+        else:
+            postings = [self.grams.get(digits[j:j + GRAM], []) for j in range(len(digits) - GRAM + 1)]
+            shortest = min(postings, key=len)
+            candidates = shortest[bisect.bisect_left(shortest, lo):bisect.bisect_left(shortest, hi)]
+        return [i for i in candidates if match(self.numbers[i])]
+
+
+_lock = threading.Lock()
+_index = None
+_checked_at = 0.0
+
+
+def _current_index():
+    """This process's index for the newest snapshot, or None when there is no snapshot yet."""
+    global _index, _checked_at
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < VERSION_CHECK_SECONDS:
+        return _index
+    with _lock:
+        if _index is not None and now - _checked_at < VERSION_CHECK_SECONDS:
+            return _index
+        try:
+            version = cache.get(VERSION_KEY)
+            if version is not None and (_index is None or _index.version != version):
+                snapshot = cache.get(SNAPSHOT_KEY)
+                if snapshot is not None:
+                    _index = _Index(snapshot["version"], snapshot["numbers"])
+        except Exception as e:
+            # Keep serving the index we have.
+            logger.warning("number inventory: snapshot check failed: %s", e)
+        _checked_at = now
+        return _index
+
+
+def _claimed():
+    try:
+        return {member.decode() for member in get_redis().smembers(CLAIMED_KEY)}
+    except Exception as e:
+        logger.warning("number inventory: claimed set unavailable: %s", e)
+        return set()
+
+
+def mark_claimed(number):
+    """Hide ``number`` from every process's search right away."""
+    try:
+        redis = get_redis()
+        pipe = redis.pipeline()
+        pipe.sadd(CLAIMED_KEY, str(number))
+        pipe.expire(CLAIMED_KEY, CLAIMED_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.warning("number inventory: could not mark %s claimed: %s", number, e)
+
+
+def request_refresh():
+    """Queue refresh_number_inventory unless one was queued in the last minute."""
+    from sms_management_app.tasks import refresh_number_inventory
+
+    try:
+        if cache.add(KICK_KEY, 1, KICK_SECONDS):
+            refresh_number_inventory.delay()
+    except Exception as e:
+        logger.warning("number inventory: could not queue a refresh: %s", e)
+
+
+def parse_pattern(search):
+    """
+    (digits, anchor) for a search string: "*1234" -> suffix, "6148*" -> prefix,
+    anything else -> substring. Non-digits are ignored; None when no digits are left.
+    """
+    search = (search or "").strip()
+    digits = re.sub(r"\D", "", search)
+    if not digits:
+        return None
+    starts, ends = search.startswith("*"), search.endswith("*")
+    if starts and not ends:
+        return digits, "suffix"
+    if ends and not starts:
+        return digits, "prefix"
+    return digits, "substring"
+
+
+def _decimal(value):
+    if value in (None, ""):
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+def row(number, price):
+    """Response row, same shape as the live GetAvailableNumbers results."""
+    return {
+        "number": number,
+        "price": float(price),
+        "label": "Standard" if price <= STANDARD_MAX_PRICE else "Premium",
+        "display_price": f"${price}",
+        "can_auto_register": price <= STANDARD_MAX_PRICE,
+    }
+
+
+def search(query=None, price_min=None, price_max=None, label=None, sort_by="price_asc", page=1, page_size=10):
+    """
+    (total, rows) for one page of the inventory, or None when no snapshot is loaded.
+    """
+    index = _current_index()
+    if index is None:
+        return None
+
+    lo, hi = index.price_bounds(_decimal(price_min), _decimal(price_max), (label or "").lower() or None)
+    claimed = {index.positions[number] for number in _claimed() if number in index.positions}
+
+    if query:
+        pattern = parse_pattern(query)
+        positions = index.matching(pattern, lo, hi) if pattern else []
+        positions = [i for i in positions if i not in claimed]
+    elif any(lo <= i < hi for i in claimed):
+        positions = [i for i in range(lo, hi) if i not in claimed]
+    else:
+        positions = range(lo, max(lo, hi))
+
+    if sort_by == "price_desc":
+        positions = positions[::-1]
+    start = (page - 1) * page_size
+    page_positions = positions[start:start + page_size]
+    return len(positions), [row(index.numbers[i], index.prices[i]) for i in page_positions]
+
+
+def price_of(number):
+    """
+    Price of an available ``number`` from the inventory: a Decimal, False when
+    the inventory does not list it (or it was claimed), None when no snapshot
+    is loaded.
+    """
+    index = _current_index()
+    if index is None:
+        return None
+    position = index.positions.get(str(number))
+    if position is None or str(number) in _claimed():
+        return False
+    return index.prices[position]
+
+
+def fetch_available(service=None):
+    """{number: price string} for every page of Transmit's available inventory."""
+    from sms_management_app.services import TransmitSMSService
+
+    service = service or TransmitSMSService()
+    numbers = {}
+    page = 1
+    while page <= MAX_PAGES:
+        result = service.get_numbers(page=page, page_size=_page_size(), filter_type="available")
+        error = (result.get("error") or {}).get("code")
+        if error and error != "SUCCESS":
+            raise RuntimeError(f"get-numbers.json page {page}: {result.get('error')}")
+        batch = result.get("numbers") or []
+        for item in batch:
+            numbers[str(item["number"])] = str(Decimal(str(item.get("price") or 0)))
+        pages = int((result.get("page") or {}).get("count") or 1)
+        if not batch or page >= pages:
+            break
+        page += 1
+    return numbers
+
+
+def refresh(service=None):
+    """Fetch the full inventory and publish it as the new snapshot. Returns the number count."""
+    numbers = fetch_available(service)
+    version = f"{time.time():.6f}"
+    cache.set(
+        SNAPSHOT_KEY,
+        {"version": version, "fetched_at": timezone.now().isoformat(), "numbers": sorted(numbers.items())},
+        timeout=None,
+    )
+    cache.set(VERSION_KEY, version, timeout=None)
+
+    # Claims Transmit no longer lists have done their job.
+    try:
+        stale = [number for number in _claimed() if number not in numbers]
+        if stale:
+            get_redis().srem(CLAIMED_KEY, *stale)
+    except Exception as e:
+        logger.warning("number inventory: could not prune claimed set: %s", e)
+    return len(numbers)
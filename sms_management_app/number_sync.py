@@ -0,0 +1,289 @@
+"""
+Nightly sync of client-owned Transmit numbers (sync_client_owned_numbers).
+
+    1. One query loads the stored fingerprints of every synced number.
+    2. A bounded thread pool (NUMBER_SYNC_CONCURRENCY) fetches each client
+       account: every page of get-numbers.json?filter=owned, then
+       get-number.json only for numbers that are new or whose list entry no
+       longer matches the stored fingerprint.
+    3. As accounts finish, their changes are applied in the calling thread, one
+       transaction per account: a delete for numbers Transmit no longer lists,
+       bulk_create for new numbers (with the same quota/wallet logic as
+       before) and bulk_update for changed ones.
+
+Workers only do HTTP; all database work stays on the task's own connection.
+Per-account timings are logged and returned so the job can be watched as the
+fleet grows.
+"""
+
+import hashlib
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+
+from dateutil import parser as date_parser
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import GHLAuthCredentials, TransmitNumber, Wallet
+from transmitsms.models import TransmitSMSAccount
+
+logger = logging.getLogger(__name__)
+
+LIST_PAGE_SIZE = 100
+MAX_LIST_PAGES = 100
+STANDARD_MAX_PRICE = Decimal("11")
+SLOWEST_REPORTED = 10
+
+
+def _concurrency():
+    return max(1, getattr(settings, "NUMBER_SYNC_CONCURRENCY", 8))
+
+
+def fingerprint(item):
+    """Stable hash of a get-numbers.json list entry."""
+    return hashlib.sha256(json.dumps(item, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _ms(started):
+    return round((time.perf_counter() - started) * 1000)
+
+
+def list_owned(service, account):
+    """Every owned number of ``account`` as list entries; raises if a page fails."""
+    numbers = []
+    page = 1
+    while page <= MAX_LIST_PAGES:
+        result = service.get_numbers(
+            page=page, page_size=LIST_PAGE_SIZE, api_key=account.api_key, api_secret=account.api_secret,
+            filter_type="owned",
+        )
+        error = (result.get("error") or {}).get("code")
+        if error and error != "SUCCESS":
+            raise RuntimeError(f"get-numbers.json page {page}: {result.get('error')}")
+        batch = result.get("numbers") or []
+        numbers.extend(batch)
+        pages = int((result.get("page") or {}).get("count") or 1)
+        if not batch or page >= pages:
+            break
+        page += 1
+    return numbers
+
+
+def fetch_account(service, account, known):
+    """
+    HTTP half of the sync for one account (runs in a worker thread).
+    ``known`` maps number -> stored fingerprint.
+    """
+    started = time.perf_counter()
+    result = {"account": account, "listed": None, "changed": {}, "detail_failures": 0, "error": None}
+    timings = {"list_ms": 0, "details_ms": 0, "detail_calls": 0, "skipped": 0}
+    result["timings"] = timings
+    try:
+        items = list_owned(service, account)
+        timings["list_ms"] = _ms(started)
+        result["listed"] = {str(item.get("number")) for item in items}
+
+        details_started = time.perf_counter()
+        for item in items:
+            msisdn = str(item.get("number"))
+            item_fingerprint = fingerprint(item)
+            if known.get(msisdn) == item_fingerprint:
+                timings["skipped"] += 1
+                continue
+            timings["detail_calls"] += 1
+            details = service.get_number(number=msisdn, api_key=account.api_key, api_secret=account.api_secret)
+            if not details.get("success"):
+                logger.error(f"[ERROR] Failed details for {msisdn}: {details.get('error')}")
+                result["detail_failures"] += 1
+                continue
+            result["changed"][msisdn] = (item, details.get("data", {}), item_fingerprint)
+        timings["details_ms"] = _ms(details_started)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _number_fields(item, data):
+    price = Decimal(str(data.get("price", item.get("price", 0) or 0)))
+    status_raw = data.get("status") or item.get("status")
+    # Map Transmit status to our status
+    status = "owned" if (status_raw or "").lower() == "active" else "pending"
+    next_renewal_date = None
+    next_charge_str = data.get("next_charge")
+    if next_charge_str:
+        try:
+            next_renewal_date = date_parser.parse(next_charge_str).date()
+        except Exception:
+            next_renewal_date = None
+    return price, status, next_renewal_date
+
+
+def _new_number(ghl_account, msisdn, price, status, next_renewal_date, item_fingerprint):
+    """Unsaved TransmitNumber for a number first seen in Transmit, with quota/wallet applied."""
+    tn = TransmitNumber(
+        id=uuid.uuid4(),
+        ghl_account=ghl_account,
+        number=msisdn,
+        price=price,
+        status=status,
+        is_active=True,
+        next_renewal_date=next_renewal_date,
+        monthly_charge=price,
+        sync_fingerprint=item_fingerprint,
+    )
+    wallet = getattr(ghl_account, "wallet", None)
+    if price <= STANDARD_MAX_PRICE:
+        kind, has_quota = "standard", ghl_account.can_purchase_standard()
+    else:
+        kind, has_quota = "premium", ghl_account.can_purchase_premium()
+
+    if has_quota:
+        if kind == "standard":
+            ghl_account.current_standard_purchased += 1
+        else:
+            ghl_account.current_premium_purchased += 1
+        tn.is_extra_number = False
+        return tn
+
+    tn.is_extra_number = True
+    if not (wallet and _charge_extra_number(wallet.pk, tn, kind, msisdn, price)):
+        logger.warning(f"[WARN] Insufficient funds for extra {kind} number {msisdn} during sync")
+    return tn
+
+
+def _charge_extra_number(wallet_id, tn, kind, msisdn, price):
+    """
+    Charge an extra number to the wallet in its own savepoint, so one failed
+    charge cannot roll back the rest of the account's sync. Returns True if charged.
+    """
+    try:
+        with transaction.atomic():
+            # Fresh, locked row: spendable credit is net of reservations and of
+            # the numbers already charged earlier in this sync.
+            wallet = Wallet.objects.select_for_update().get(pk=wallet_id)
+            if wallet.available_balance < price:
+                return False
+            wallet.deduct_funds(
+                amount=price,
+                reference_id=str(tn.id),
+                description=f"Sync purchase of extra {kind} number {msisdn}",
+            )
+        return True
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to charge extra {kind} number {msisdn} during sync: {e}")
+        return False
+
+
+def apply_account(ghl_account_id, fetched):
+    """DB half of the sync for one account. Returns {"created", "updated", "deleted"}."""
+    counts = {"created": 0, "updated": 0, "deleted": 0}
+    with transaction.atomic():
+        # Serialises quota counters with the register flows.
+        ghl_account = GHLAuthCredentials.objects.select_for_update().get(pk=ghl_account_id)
+
+        deleted, _ = TransmitNumber.objects.filter(
+            ghl_account=ghl_account,
+            status__in=["owned", "pending"],  # Only delete owned/pending, not registered
+        ).exclude(number__in=fetched["listed"]).delete()
+        counts["deleted"] = deleted
+
+        existing = {
+            tn.number: tn
+            for tn in TransmitNumber.objects.filter(ghl_account=ghl_account, number__in=list(fetched["changed"]))
+        }
+        quota_before = (ghl_account.current_standard_purchased, ghl_account.current_premium_purchased)
+        now = timezone.now()
+        to_create, to_update = [], []
+        for msisdn, (item, data, item_fingerprint) in fetched["changed"].items():
+            price, status, next_renewal_date = _number_fields(item, data)
+            tn = existing.get(msisdn)
+            if tn is None:
+                to_create.append(_new_number(ghl_account, msisdn, price, status, next_renewal_date, item_fingerprint))
+                logger.info(f"[SUCCESS] New number added: {msisdn}")
+                continue
+            if (tn.price, tn.status, tn.next_renewal_date) != (price, status, next_renewal_date):
+                counts["updated"] += 1
+                logger.info(f"[UPDATE] Updated existing number: {msisdn}")
+            tn.price, tn.status, tn.next_renewal_date = price, status, next_renewal_date
+            tn.sync_fingerprint = item_fingerprint
+            tn.last_synced_at = now
+            to_update.append(tn)
+
+        if to_create:
+            TransmitNumber.objects.bulk_create(to_create)
+            counts["created"] = len(to_create)
+        if to_update:
+            TransmitNumber.objects.bulk_update(
+                to_update, ["price", "status", "next_renewal_date", "sync_fingerprint", "last_synced_at"]
+            )
+        if (ghl_account.current_standard_purchased, ghl_account.current_premium_purchased) != quota_before:
+            ghl_account.save(update_fields=["current_standard_purchased", "current_premium_purchased"])
+    return counts
+
+
+def sync_owned_numbers(service=None):
+    """Run the sync over every active mapped TransmitSMSAccount. Returns the summary dict."""
+    from sms_management_app.services import TransmitSMSService
+
+    service = service or TransmitSMSService()
+    started = time.perf_counter()
+    accounts = [
+        account
+        for account in TransmitSMSAccount.objects.filter(is_active=True).select_related("ghl_mapping__ghl_account")
+        if hasattr(account, "ghl_mapping")
+    ]
+    known = {}
+    for ghl_account_id, number, stored in TransmitNumber.objects.filter(
+        ghl_account_id__in=[account.ghl_mapping.ghl_account_id for account in accounts]
+    ).values_list("ghl_account_id", "number", "sync_fingerprint"):
+        known.setdefault(ghl_account_id, {})[number] = stored
+
+    summary = {"accounts": len(accounts), "failed_accounts": 0, "processed": 0, "detail_calls": 0,
+               "skipped": 0, "created": 0, "updated": 0, "deleted": 0}
+    timings = []
+    with ThreadPoolExecutor(max_workers=_concurrency(), thread_name_prefix="number-sync") as pool:
+        futures = [
+            pool.submit(fetch_account, service, account, known.get(account.ghl_mapping.ghl_account_id, {}))
+            for account in accounts
+        ]
+        for future in as_completed(futures):
+            fetched = future.result()
+            account = fetched["account"]
+            ghl_account = account.ghl_mapping.ghl_account
+            label = ghl_account.location_name or account.account_name or str(account.id)
+            entry = {"account": label, **fetched["timings"], "apply_ms": 0}
+            timings.append(entry)
+            if fetched["error"]:
+                summary["failed_accounts"] += 1
+                logger.error(f"[ERROR] Failed to fetch owned numbers for client {label}: {fetched['error']}")
+                continue
+
+            apply_started = time.perf_counter()
+            try:
+                counts = apply_account(ghl_account.pk, fetched)
+            except Exception as e:
+                summary["failed_accounts"] += 1
+                logger.exception(f"[ERROR] Exception syncing client {label}: {e}")
+                continue
+            entry["apply_ms"] = _ms(apply_started)
+            summary["processed"] += len(fetched["listed"])
+            summary["detail_calls"] += fetched["timings"]["detail_calls"]
+            summary["skipped"] += fetched["timings"]["skipped"]
+            for key, value in counts.items():
+                summary[key] += value
+            logger.info(
+                f"[SYNC] {label}: {len(fetched['listed'])} numbers, "
+                f"{fetched['timings']['detail_calls']} detail calls, {fetched['timings']['skipped']} unchanged, "
+                f"list {entry['list_ms']} ms, details {entry['details_ms']} ms, apply {entry['apply_ms']} ms, {counts}"
+            )
+
+    for entry in timings:
+        entry["total_ms"] = entry["list_ms"] + entry["details_ms"] + entry["apply_ms"]
+    summary["elapsed_ms"] = _ms(started)
+    summary["slowest"] = sorted(timings, key=lambda entry: entry["total_ms"], reverse=True)[:SLOWEST_REPORTED]
+    return summary
@@ -0,0 +1,103 @@
+"""
+Message search behind ?search= on the SMS list, CSV export and bulk-retry endpoints.
+
+Same semantics as the icontains-OR it replaces (a message matches when the term
+occurs, case-insensitively, in any searched field), but every branch is index
+backed so Postgres can BitmapOr them instead of scanning and joining:
+
+    to_number / from_number      trigram GIN on UPPER(number), plus trigram GIN
+                                 on the digits-only number so phone-like terms
+                                 match regardless of formatting ("+61 412-345"
+                                 and "0412 345" both find 61412345678)
+    message_content              trigram GIN on UPPER(message_content)
+    location / Transmit account  names resolved to ids first (small tables),
+                                 then matched on the FK indexes, no joins
+
+?search_mode=words matches content on word prefixes instead ("hel wor" finds
+"Hello world") through the tsvector index. Terms shorter than three characters
+cannot use trigram indexes and fall back to a scan, as before.
+"""
+
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchVectorField
+from django.db.models import CharField, F, Func, Q, Value
+
+SEARCH_FIELDS = [
+    "to_number", "from_number", "message_content",
+    "ghl_account__location_name", "transmit_account__account_name",
+]
+NUMBER_FIELDS = ("to_number", "from_number")
+MIN_PHONE_DIGITS = 3
+TSVECTOR_CONFIG = "simple"
+
+_PHONE_RE = re.compile(r"^\+?[\d\s().-]+$")
+
+
+def digits_only(field):
+    """SQL expression for ``field`` with every non-digit removed (matches sms_number_digits_trgm_idx)."""
+    return Func(F(field), Value(r"\D"), Value(""), Value("g"), function="REGEXP_REPLACE", output_field=CharField())
+
+
+def content_tsvector():
+    """SQL expression for the content tsvector (matches sms_content_tsv_idx)."""
+    return Func(
+        Value(TSVECTOR_CONFIG), F("message_content"), function="TO_TSVECTOR", output_field=SearchVectorField()
+    )
+
+
+def phone_digits(term):
+    """Digits to look for when ``term`` looks like a phone number, else None."""
+    if not _PHONE_RE.match(term):
+        return None
+    digits = re.sub(r"\D", "", term)
+    # National format (0412 345 678) vs numbers stored with the country code (61412345678).
+    if digits.startswith("0"):
+        digits = digits[1:]
+    return digits if len(digits) >= MIN_PHONE_DIGITS else None
+
+
+def words_query(term):
+    """Raw tsquery matching every word of ``term`` as a prefix, or None."""
+    words = re.findall(r"\w+", term)
+    return " & ".join(f"{word}:*" for word in words) or None
+
+
+def search_messages(queryset, term, fields=SEARCH_FIELDS, mode=None):
+    """Filter an SMSMessage queryset to messages matching ``term`` in any of ``fields``."""
+    from core.models import GHLAuthCredentials
+    from transmitsms.models import TransmitSMSAccount
+
+    term = (term or "").strip()
+    if not term:
+        return queryset
+
+    match = Q()
+    number_fields = [field for field in NUMBER_FIELDS if field in fields]
+    for field in number_fields:
+        match |= Q(**{f"{field}__icontains": term})
+    digits = phone_digits(term) if number_fields else None
+    if digits:
+        aliases = {f"{field}_digits": digits_only(field) for field in number_fields}
+        queryset = queryset.alias(**aliases)
+        for alias in aliases:
+            match |= Q(**{f"{alias}__contains": digits})
+
+    if "message_content" in fields:
+        query = words_query(term) if mode == "words" else None
+        if query:
+            queryset = queryset.alias(content_search=content_tsvector())
+            match |= Q(content_search=SearchQuery(query, search_type="raw", config=TSVECTOR_CONFIG))
+        else:
+            match |= Q(message_content__icontains=term)
+
+    if "ghl_account__location_name" in fields:
+        ids = list(GHLAuthCredentials.objects.filter(location_name__icontains=term).values_list("id", flat=True))
+        if ids:
+            match |= Q(ghl_account_id__in=ids)
+    if "transmit_account__account_name" in fields:
+        ids = list(TransmitSMSAccount.objects.filter(account_name__icontains=term).values_list("id", flat=True))
+        if ids:
+            match |= Q(transmit_account_id__in=ids)
+
+    return queryset.filter(match)
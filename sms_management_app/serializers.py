@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from django.db.models import Count, Q, Sum
+from django.urls import reverse
 
-from .models import GHLTransmitSMSMapping, SMSMessage, WebhookLog
+from .models import GHLTransmitSMSMapping, MessageExportJob, SMSMessage, WebhookLog
 from core.models import GHLAuthCredentials, Wallet, WalletTransaction, TransmitNumber
+from .usage_rollup import wallet_usage
 
 class GHLTransmitSMSMappingSerializer(serializers.ModelSerializer):
     class Meta:
@@ -139,13 +141,19 @@ class WalletSerializer(serializers.ModelSerializer):
         transactions = obj.transactions.all().order_by("-created_at")[:5]
         return WalletTransactionSerializer(transactions, many=True).data
 
+    def _ledger_totals(self, obj):
+        # Both totals from one read of the daily rollup, not two scans of the ledger.
+        totals = getattr(obj, "_ledger_totals", None)
+        if totals is None:
+            totals = wallet_usage(wallets=Wallet.objects.filter(pk=obj.pk))
+            obj._ledger_totals = totals
+        return totals
+
     def get_total_spent(self, obj):
-        spent = obj.transactions.filter(transaction_type="debit").aggregate(total=Sum("amount"))["total"] or 0
-        return float(spent)
+        return float(self._ledger_totals(obj).get("debit", {}).get("amount", 0))
 
     def get_total_credits(self, obj):
-        credits = obj.transactions.filter(transaction_type="credit").aggregate(total=Sum("amount"))["total"] or 0
-        return float(credits)
+        return float(self._ledger_totals(obj).get("credit", {}).get("amount", 0))
 
 class MappingSerializer(serializers.ModelSerializer):
     transmit_account_name = serializers.CharField(source="transmit_account.account_name", read_only=True)
@@ -185,4 +193,31 @@ class TransmitNumberSerializer(serializers.ModelSerializer):
         fields = ['id', 'number', 'status', 'location_id', 'price', 'is_active', 'purchased_at', 'registered_at', 'last_synced_at']
 
     def get_location_id(self, obj):
-        return obj.ghl_account.id if obj.ghl_account else None
\ No newline at end of file
+        return obj.ghl_account.id if obj.ghl_account else None
+
+
+class MessageExportJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MessageExportJob
+        fields = [
+            "id", "status", "params", "total_rows", "exported_rows", "progress",
+            "file_name", "file_size", "download_url", "error_message",
+            "created_at", "started_at", "finished_at",
+        ]
+
+    def get_progress(self, obj):
+        if obj.status == "done":
+            return 1.0
+        if not obj.total_rows:
+            return 0.0
+        return round(min(obj.exported_rows / obj.total_rows, 1.0), 4)
+
+    def get_download_url(self, obj):
+        if obj.status != "done":
+            return None
+        request = self.context.get("request")
+        url = reverse("sms-message-export-job-download", kwargs={"pk": obj.pk})
+        return request.build_absolute_uri(url) if request else url
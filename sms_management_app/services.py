@@ -3,12 +3,18 @@ import base64
 import json
 from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
 from .models import TransmitSMSAccount, GHLTransmitSMSMapping, SMSMessage, WebhookLog
 from core.models import GHLAuthCredentials, Wallet
+from core import http_client, tenant_cache, wallet_reservations
+from sms_management_app import campaign_batcher
 from sms_management_app.utils import format_international
 from django.core.exceptions import ValidationError
 
+# reply_callback path segment for multi-recipient campaign sends (no single GHL messageId).
+CAMPAIGN_REPLY_REF = "campaign"
+
 
 class TransmitSMSService:
     def __init__(self):
@@ -24,18 +30,22 @@ class TransmitSMSService:
         return {"Authorization": f"Basic {credentials}"}
     
 
-    def get_numbers(self, page=1, page_size=100, api_key=None, api_secret=None):
+    def get_numbers(self, page=1, page_size=100, api_key=None, api_secret=None, filter_type=None):
         """
-        Fetch all numbers from TransmitSMS
+        Fetch one page of numbers from TransmitSMS
         API docs: https://api.transmitsms.com/get-numbers.json
+
+        filter_type: None (all), 'owned' or 'available'
         """
         url = f"{self.base_url}/get-numbers.json"
-        headers = self._get_auth_header()
+        headers = self._get_auth_header(api_key, api_secret)
         params = {
             "page": page,
             "max": page_size
         }
-        response = requests.get(url, headers=headers, params=params)
+        if filter_type:
+            params["filter"] = filter_type
+        response = http_client.get(url, headers=headers, params=params)
         response.raise_for_status()  # will raise error for non-200 responses
         return response.json()
     
@@ -68,7 +78,7 @@ class TransmitSMSService:
         print(f"[DEBUG] Request Data: {data}")
 
         try:
-            response = requests.post(url, data=data, headers=headers)
+            response = http_client.post(url, data=data, headers=headers)
             print(f"[INFO] Response Status Code: {response.status_code}")
             print(f"[DEBUG] Raw Response: {response.text}")
 
@@ -108,7 +118,7 @@ class TransmitSMSService:
         print(f"[DEBUG] Request Data: {data}")
         
         try:
-            response = requests.post(url, data=data, headers=headers)
+            response = http_client.post(url, data=data, headers=headers)
             print(f"[INFO] Response Status Code: {response.status_code}")
             print(f"[DEBUG] Raw Response: {response.text}")
 
@@ -143,7 +153,7 @@ class TransmitSMSService:
         headers = self._get_auth_header()
         
         try:
-            response = requests.get(url, headers=headers)
+            response = http_client.get(url, headers=headers)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -173,7 +183,7 @@ class TransmitSMSService:
         headers = self._get_auth_header(api_key=api_key, api_secret=api_secret)
 
         try:
-            response = requests.get(url, headers=headers, timeout=30)
+            response = http_client.get(url, headers=headers, timeout=30)
             print(f"[get_balance] Response [{response.status_code}]: {response.text}")
             response.raise_for_status()
             result = response.json()
@@ -222,7 +232,7 @@ class TransmitSMSService:
         data = {"client_id": str(client_id)}
 
         try:
-            response = requests.post(url, data=data, headers=headers, timeout=30)
+            response = http_client.post(url, data=data, headers=headers, timeout=30)
             print(f"[get_client] Response [{response.status_code}]: {response.text}")
             response.raise_for_status()
             result = response.json()
@@ -282,7 +292,7 @@ class TransmitSMSService:
 
         try:
             print("🔹 [purchase_number] Sending POST request to TransmitSMS...")
-            response = requests.post(url, data=payload, headers=headers, timeout=30)
+            response = http_client.post(url, data=payload, headers=headers, timeout=30)
             print(f"✅ [purchase_number] Response Status Code: {response.status_code}")
             print(f"✅ [purchase_number] Raw Response Text: {response.text}")
 
@@ -383,6 +393,61 @@ class TransmitSMSService:
         cache.set(cache_key, dedicated_number or '', 300)
         return dedicated_number
 
+    def _post_send_sms(self, url, headers, payload):
+        try:
+            response = http_client.post(url, data=payload, headers=headers)
+            print(f"➡️ Sending request with payload: {payload}")
+            print(f"⬅️ Response [{response.status_code}]: {response.text}")
+            response.raise_for_status()
+            result = response.json()
+            return {
+                'success': True,
+                'data': result,
+                'message_id': result.get('message_id')
+            }
+        except requests.exceptions.RequestException as e:
+            response_text = getattr(e.response, "text", None)
+            human_error = str(e)
+            error_code = None
+            if response_text:
+                try:
+                    err_json = json.loads(response_text)
+                    error_code = err_json.get("error", {}).get("code")
+                    description = err_json.get("error", {}).get("description") or err_json.get("description")
+                    if error_code == "RECIPIENTS_ERROR" and isinstance(description, dict):
+                        reason = description.get("reason", "Unknown recipient error")
+                        human_error = f"Recipient error: {reason}"
+                    elif error_code == "BAD_CALLER_ID":
+                        human_error = "BAD_CALLER_ID: sender number is inactive or invalid"
+                    elif description and isinstance(description, str):
+                        human_error = description
+                    elif error_code:
+                        human_error = error_code
+                except Exception:
+                    pass
+            return {
+                'success': False,
+                'error': human_error,
+                'error_code': error_code,
+                'response_text': response_text,
+            }
+
+    def _send_payload(self, url, headers, data, transmit_account):
+        """POST send-sms.json; on BAD_CALLER_ID drop the (possibly stale cached) sender and retry once."""
+        result = self._post_send_sms(url, headers, data)
+
+        if not result['success'] and result.get('response_text'):
+            try:
+                error_code = json.loads(result['response_text']).get("error", {}).get("code")
+                if error_code == "BAD_CALLER_ID":
+                    print("⚠️ BAD_CALLER_ID detected. Clearing cache and retrying without 'from'...")
+                    cache.delete(f"dedicated_num_{transmit_account.id}")
+                    data.pop('from', None)
+                    result = self._post_send_sms(url, headers, data)
+            except Exception as parse_err:
+                print("❌ Failed to parse error JSON:", parse_err)
+        return result
+
     def send_sms(
         self, message, to_number, from_number, transmit_account,
         dlr_callback=None, reply_callback=None, sms_message=None, **kwargs
@@ -410,45 +475,6 @@ class TransmitSMSService:
         if dedicated_number:
             from_number = format_international(from_number)
 
-        def _make_request(payload):
-            try:
-                response = requests.post(url, data=payload, headers=headers)
-                print(f"➡️ Sending request with payload: {payload}")
-                print(f"⬅️ Response [{response.status_code}]: {response.text}")
-                response.raise_for_status()
-                result = response.json()
-                return {
-                    'success': True,
-                    'data': result,
-                    'message_id': result.get('message_id')
-                }
-            except requests.exceptions.RequestException as e:
-                response_text = getattr(e.response, "text", None)
-                human_error = str(e)
-                error_code = None
-                if response_text:
-                    try:
-                        err_json = json.loads(response_text)
-                        error_code = err_json.get("error", {}).get("code")
-                        description = err_json.get("error", {}).get("description") or err_json.get("description")
-                        if error_code == "RECIPIENTS_ERROR" and isinstance(description, dict):
-                            reason = description.get("reason", "Unknown recipient error")
-                            human_error = f"Recipient error: {reason}"
-                        elif error_code == "BAD_CALLER_ID":
-                            human_error = "BAD_CALLER_ID: sender number is inactive or invalid"
-                        elif description and isinstance(description, str):
-                            human_error = description
-                        elif error_code:
-                            human_error = error_code
-                    except Exception:
-                        pass
-                return {
-                    'success': False,
-                    'error': human_error,
-                    'error_code': error_code,
-                    'response_text': response_text,
-                }
-
         # Build payload — only include 'from' if we have a real dedicated number
         data = {'message': message, 'to': to_number}
         if dedicated_number:
@@ -459,19 +485,7 @@ class TransmitSMSService:
             data['reply_callback'] = reply_callback
         data.update(kwargs)
 
-        result = _make_request(data)
-
-        # Safety net: if a (possibly stale cached) dedicated number is rejected, retry without it
-        if not result['success'] and result.get('response_text'):
-            try:
-                error_code = json.loads(result['response_text']).get("error", {}).get("code")
-                if error_code == "BAD_CALLER_ID":
-                    print("⚠️ BAD_CALLER_ID detected. Clearing cache and retrying without 'from'...")
-                    cache.delete(f"dedicated_num_{transmit_account.id}")
-                    data.pop('from', None)
-                    result = _make_request(data)
-            except Exception as parse_err:
-                print("❌ Failed to parse error JSON:", parse_err)
+        result = self._send_payload(url, headers, data, transmit_account)
 
         if result['success']:
             print("✅ SMS sent successfully:", result)
@@ -480,6 +494,41 @@ class TransmitSMSService:
 
         return result
 
+    def send_sms_bulk(self, message, to_numbers, transmit_account, dlr_callback=None, reply_callback=None):
+        """
+        One send-sms.json call to several recipients (comma-separated ``to``) from the
+        account's sender. Transmit returns a single message_id for the whole send;
+        recipients it rejected are listed in ``fails``.
+
+        Returns the send_sms result plus 'from_number' (what to record on the rows)
+        and 'fails' (a set of rejected numbers, in format_international form).
+        """
+        url = f"{self.base_url}/send-sms.json"
+        headers = self._get_auth_header(
+            transmit_account.api_key,
+            transmit_account.api_secret
+        )
+        dedicated_number = self._get_dedicated_number_cached(transmit_account)
+
+        data = {'message': message, 'to': ",".join(format_international(n) for n in to_numbers)}
+        if dedicated_number:
+            data['from'] = format_international(dedicated_number)
+        if dlr_callback:
+            data['dlr_callback'] = dlr_callback
+        if reply_callback:
+            data['reply_callback'] = reply_callback
+
+        result = self._send_payload(url, headers, data, transmit_account)
+        result['from_number'] = dedicated_number if 'from' in data else "Shared Number"
+
+        fails = set()
+        for entry in (result.get('data') or {}).get('fails') or []:
+            number = (entry.get('number') or entry.get('mobile')) if isinstance(entry, dict) else entry
+            if number:
+                fails.add(format_international(number))
+        result['fails'] = fails
+        return result
+
     def send_mms(
         self,
         content_urls,
@@ -529,7 +578,7 @@ class TransmitSMSService:
         }
 
         try:
-            response = requests.post(url, json=payload, headers=headers)
+            response = http_client.post(url, json=payload, headers=headers)
             print(f"➡️ MMS request: {url}")
             print(f"⬅️ MMS Response [{response.status_code}]: {response.text[:500]}")
 
@@ -573,7 +622,7 @@ class TransmitSMSService:
         print(f"[DEBUG] Request Params: {params}")
 
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = http_client.get(url, headers=headers, params=params)
             print(f"[INFO] Response Status Code: {response.status_code}")
             # print(f"[DEBUG] Raw Response: {response.text}")
 
@@ -616,7 +665,7 @@ class TransmitSMSService:
         print(f"[DEBUG] Request Data: {data}")
 
         try:
-            response = requests.post(url, data=data, headers=headers)
+            response = http_client.post(url, data=data, headers=headers)
             print(f"[INFO] Response Status Code: {response.status_code}")
             print(f"[DEBUG] Raw Response: {response.text}")
 
@@ -667,7 +716,7 @@ class TransmitSMSService:
         print(f"[DEBUG] Request Data: {data}")
 
         try:
-            response = requests.post(url, data=data, headers=headers)
+            response = http_client.post(url, data=data, headers=headers)
             print(f"[INFO] Response Status Code: {response.status_code}")
             print(f"[DEBUG] Raw Response: {response.text}")
 
@@ -781,10 +830,8 @@ class GHLIntegrationService:
                     direction="outbound",
                 ).first()
                 if existing:
-                    from sms_management_app.tasks import send_outbound_sms_task
-
                     if existing.status == "pending":
-                        send_outbound_sms_task.delay(str(existing.id))
+                        campaign_batcher.enqueue_send(existing)
                     return {
                         "success": existing.status in ("pending", "sent", "delivered"),
                         "message_id": existing.id,
@@ -792,15 +839,19 @@ class GHLIntegrationService:
                         "duplicate": True,
                     }
 
-            ghl_account = GHLAuthCredentials.objects.get(location_id=location_id)
-            wallet, _ = Wallet.objects.get_or_create(account=ghl_account)
+            ghl_account = tenant_cache.get_credentials(location_id)
+            if ghl_account is None:
+                raise GHLAuthCredentials.DoesNotExist(
+                    "GHLAuthCredentials matching query does not exist."
+                )
+            # pk-only handle: charge_message/refund lock and re-read the row.
+            wallet = Wallet(id=tenant_cache.get_wallet_id(ghl_account), account=ghl_account)
 
-            try:
-                mapping = GHLTransmitSMSMapping.objects.get(ghl_account=ghl_account)
-                transmit_account = mapping.transmit_account
-            except GHLTransmitSMSMapping.DoesNotExist:
+            mapping = tenant_cache.get_transmit_mapping(ghl_account.pk)
+            if mapping is None:
                 print("❌ No mapping found for location:", location_id)
                 raise Exception(f"No TransmitSMS account mapped for GHL location {location_id}")
+            transmit_account = mapping.transmit_account
 
             from_number = transmit_account.phone_number
 
@@ -819,10 +870,22 @@ class GHLIntegrationService:
 
             charge_content = message_content if message_content else " "
             try:
-                cost, segments = wallet.charge_message("outbound", charge_content, reference_id=sms_message.id)
-                sms_message.cost = cost
-                sms_message.segments = segments
-                sms_message.save(update_fields=["cost", "segments"])
+                with transaction.atomic():
+                    if wallet_reservations.enabled():
+                        cost, segments = wallet_reservations.charge(
+                            wallet.pk, "outbound", charge_content, reference_id=sms_message.id
+                        )
+                    else:
+                        cost, segments = wallet.charge_message("outbound", charge_content, reference_id=sms_message.id)
+                    sms_message.cost = cost
+                    sms_message.segments = segments
+                    sms_message.save(update_fields=["cost", "segments"])
+                    if not is_mms:
+                        # SMS: queue for rate-limited Celery worker (campaign-safe). The
+                        # outbox row commits with the charge, so a paid send is never lost;
+                        # with campaign batching the outbox carries it to the batcher, whose
+                        # claims are only dropped once the send tasks are published.
+                        campaign_batcher.enqueue_send(sms_message)
             except ValidationError:
                 sms_message.status = "queued"
                 sms_message.cost = 0
@@ -868,10 +931,6 @@ class GHLIntegrationService:
                     "message_id": sms_message.id,
                 }
 
-            # SMS: queue for rate-limited Celery worker (campaign-safe).
-            from sms_management_app.tasks import send_outbound_sms_task
-
-            send_outbound_sms_task.delay(str(sms_message.id))
             print(f"📬 Outbound SMS {sms_message.id} queued for Transmit send")
             return {
                 "success": True,
@@ -941,6 +1000,41 @@ class GHLIntegrationService:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def send_outbound_batch(self, sms_messages):
+        """
+        Send pending outbound rows that share one TransmitSMSAccount and message body
+        as a single multi-recipient send (see campaign_batcher). Replies come back on
+        the shared campaign reply callback and are matched by message_id + mobile.
+        """
+        try:
+            first = sms_messages[0]
+            transmit_account = first.transmit_account
+            dlr_callback = f"{settings.BASE_URL}/api/sms/transmit-sms/dlr-callback/"
+            reply_callback = f"{settings.BASE_URL}/api/sms/transmit-sms/reply-callback/{CAMPAIGN_REPLY_REF}/"
+
+            result = self.transmit_service.send_sms_bulk(
+                message=first.message_content,
+                to_numbers=[sms.to_number for sms in sms_messages],
+                transmit_account=transmit_account,
+                dlr_callback=dlr_callback,
+                reply_callback=reply_callback,
+            )
+            if result["success"]:
+                return {
+                    "success": True,
+                    "transmit_message_id": result.get("message_id"),
+                    "from_number": result.get("from_number"),
+                    "fails": result.get("fails") or set(),
+                }
+            return {
+                "success": False,
+                "error": result.get("error", "Unknown error"),
+                "error_code": result.get("error_code"),
+                "response_text": result.get("response_text"),
+            }
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
     def apply_outbound_send_result(self, sms_message, result, *, cost=None, segments=None):
         """
         Persist outbound send outcome: mark sent or failed + refund on failure.
@@ -1,6 +1,5 @@
 # tasks.py
 from celery import shared_task
-from django.core.cache import cache
 from django.utils import timezone
 import time
 import requests
@@ -10,58 +9,21 @@ from datetime import timedelta
 
 logger = logging.getLogger(__name__)
 
-class GHLRateLimiter:
-    """
-    GoHighLevel API rate limiter
-    - 10 requests per second
-    - 200,000 requests per day (2 lakh)
-    """
-    REQUESTS_PER_SECOND = 10
-    REQUESTS_PER_DAY = 200000
-    
-    @staticmethod
-    def get_rate_limit_keys():
-        """Get cache keys for rate limiting"""
-        current_time = timezone.now()
-        second_key = f"ghl_rate_limit_second_{current_time.strftime('%Y%m%d_%H%M%S')}"
-        day_key = f"ghl_rate_limit_day_{current_time.strftime('%Y%m%d')}"
-        return second_key, day_key
-    
-    @staticmethod
-    def can_make_request():
-        """Check if we can make a request within rate limits"""
-        second_key, day_key = GHLRateLimiter.get_rate_limit_keys()
-        
-        # Check per-second limit
-        current_second_count = cache.get(second_key, 0)
-        if current_second_count >= GHLRateLimiter.REQUESTS_PER_SECOND:
-            return False, "Per-second rate limit exceeded"
-        
-        # Check per-day limit
-        current_day_count = cache.get(day_key, 0)
-        if current_day_count >= GHLRateLimiter.REQUESTS_PER_DAY:
-            return False, "Daily rate limit exceeded"
-        
-        return True, "OK"
-    
-    @staticmethod
-    def increment_counters():
-        """Increment rate limit counters"""
-        second_key, day_key = GHLRateLimiter.get_rate_limit_keys()
-        
-        # Increment per-second counter (expires in 1 second)
-        try:
-            cache.add(second_key, 0, timeout=1)
-            cache.incr(second_key)
-        except ValueError:
-            cache.set(second_key, 1, timeout=1)
-        
-        # Increment per-day counter (expires in 24 hours)
-        try:
-            cache.add(day_key, 0, timeout=86400)  # 24 hours
-            cache.incr(day_key)
-        except ValueError:
-            cache.set(day_key, 1, timeout=86400)
+# GHL API budget is enforced by the shared token buckets in core.rate_limit.
+# Tasks wait up to this long for a slot before deferring; they re-queue themselves
+# instead of using self.retry() so a wait never uses up max_retries.
+GHL_ACQUIRE_MAX_WAIT_MS = 2000
+
+# Transmit send rate is set by sms_management_app.transmit_rate (adaptive, per
+# account and agency-wide). Sends wait this long for a slot before re-queuing.
+TRANSMIT_ACQUIRE_MAX_WAIT_MS = 2000
+
+
+def _location_id_for_account(ghl_account_id):
+    from core import tenant_cache
+
+    credentials = tenant_cache.get_credentials_by_pk(ghl_account_id) if ghl_account_id else None
+    return credentials.location_id if credentials else None
 
 
 # Outcome markers returned by _make_ghl_api_call
@@ -71,34 +33,51 @@ _GHL_TERMINAL = "terminal"  # permanent rejection (e.g. 422) — retrying is poi
 
 
 @shared_task(bind=True, max_retries=2, default_retry_delay=30)
-def update_ghl_message_status_task(self, message_id, status, ghl_token=None, sms_message_id=None, ghl_account_id=None):
+def update_ghl_message_status_task(self, message_id, status, ghl_token=None, sms_message_id=None, ghl_account_id=None,
+                                   coalesce_seq=None):
     """
     Celery task to update GHL message status with rate limiting.
 
     Note: ``ghl_token`` is accepted for backward compatibility but should be left
     None — the token is resolved inside the task from ``ghl_account_id`` so the
     secret is never embedded in task args (which leak into retry exceptions/logs).
+
+    ``coalesce_seq`` is set for updates sent through ghl_status_coalescer; the
+    update is dropped (also on retry) once a newer one exists for the message.
     """
+    from core.rate_limit import acquire, ghl_buckets, retry_countdown
+    from sms_management_app.ghl_status_coalescer import is_superseded
+
+    if is_superseded(message_id, coalesce_seq):
+        logger.info(f"Skipping superseded GHL status update for message_id: {message_id} ({status})")
+        return {"status": "skipped", "reason": "superseded", "message_id": message_id}
+
+    # Wait briefly for a shared GHL slot; defer the task only for long waits.
+    acquired, wait_ms = acquire(
+        ghl_buckets(_location_id_for_account(ghl_account_id)),
+        max_wait_ms=GHL_ACQUIRE_MAX_WAIT_MS,
+    )
+    if not acquired:
+        logger.warning(f"GHL rate limit: deferring {message_id} by {wait_ms} ms. Task: {self.request.id}")
+        # Re-queued, not retried: waiting for the GHL budget must not use up max_retries.
+        update_ghl_message_status_task.apply_async(
+            kwargs={
+                "message_id": message_id,
+                "status": status,
+                "ghl_token": ghl_token,
+                "sms_message_id": sms_message_id,
+                "ghl_account_id": ghl_account_id,
+                "coalesce_seq": coalesce_seq,
+            },
+            countdown=retry_countdown(wait_ms),
+        )
+        return {"status": "deferred", "message_id": message_id, "wait_ms": wait_ms}
+
     try:
-        # Check rate limits
-        can_proceed, reason = GHLRateLimiter.can_make_request()
-        
-        if not can_proceed:
-            if "Per-second" in reason:
-                # Retry after 1 second for per-second limit
-                logger.warning(f"GHL per-second rate limit hit. Retrying in 1 second. Task: {self.request.id}")
-                raise self.retry(countdown=1, exc=Exception(reason))
-            elif "Daily" in reason:
-                # Retry after 1 hour for daily limit
-                logger.error(f"GHL daily rate limit hit. Retrying in 1 hour. Task: {self.request.id}")
-                raise self.retry(countdown=3600, exc=Exception(reason))
-        
         # Make the API call
         outcome = _make_ghl_api_call(message_id, status, ghl_token, ghl_account_id=ghl_account_id)
         
         if outcome == _GHL_OK:
-            # Increment counters only on successful request
-            GHLRateLimiter.increment_counters()
             logger.info(f"Successfully updated GHL message status for message_id: {message_id}")
             return {"status": "success", "message_id": message_id}
         elif outcome == _GHL_TERMINAL:
@@ -121,10 +100,6 @@ def update_ghl_message_status_task(self, message_id, status, ghl_token=None, sms
         # real failure reason stored in error_message.
         if sms_message_id:
             _record_ghl_sync_error(sms_message_id, f"GHL status sync failed: {str(exc)}")
-        if "Daily rate limit" in str(exc) and self.request.retries >= 3:
-            logger.error(f"Giving up on GHL update after daily rate limit. Message ID: {message_id}")
-            return {"status": "failed", "reason": "Daily rate limit exceeded", "message_id": message_id}
-        
         raise self.retry(exc=exc)
 
 
@@ -136,12 +111,12 @@ def _make_ghl_api_call(message_id, status, ghl_token=None, ghl_account_id=None):
     The bearer token is resolved from ``ghl_account_id`` when not supplied, so we
     never need the raw token passed through task args.
     """
-    from core.models import GHLAuthCredentials
+    from core import tenant_cache
     from sms_management_app.services import update_ghl_message_status  # Replace with your actual import path
     
     auth_credentials = None
     if ghl_account_id:
-        auth_credentials = GHLAuthCredentials.objects.filter(pk=ghl_account_id).first()
+        auth_credentials = tenant_cache.get_credentials_by_pk(ghl_account_id)
 
     # Resolve token internally — avoid passing secrets through Celery args.
     if not ghl_token and auth_credentials:
@@ -219,6 +194,7 @@ def batch_update_ghl_statuses(self, updates_batch):
                 status=update['status'],
                 sms_message_id=update.get('sms_message_id'),
                 ghl_account_id=update.get('ghl_account_id'),
+                coalesce_seq=update.get('seq'),
             )
             successful_updates += 1
         except Exception as e:
@@ -232,6 +208,40 @@ def batch_update_ghl_statuses(self, updates_batch):
     }
 
 
+@shared_task(bind=True)
+def flush_ghl_status_updates(self):
+    """
+    Drain the coalesced GHL status updates (latest status per message) through
+    batch_update_ghl_statuses. Scheduled by ghl_status_coalescer and swept every minute.
+    """
+    from sms_management_app.ghl_status_coalescer import ack, claim_pending
+
+    claim, updates = claim_pending()
+    if not updates:
+        return {"successful_queued": 0, "failed_to_queue": 0, "total": 0}
+    result = batch_update_ghl_statuses(updates)
+    # Only now are the updates safe in the broker. A crash before this, or an
+    # update that could not be published, leaves the claim for a later flush.
+    if not result["failed_to_queue"]:
+        ack(claim)
+    logger.info(f"flush_ghl_status_updates: {result}")
+    return result
+
+
+@shared_task(bind=True)
+def fold_usage_rollups(self):
+    """
+    Fold trigger-written usage deltas into MessageDailyUsage / WalletDailyUsage.
+    Readers include unfolded deltas, so this only keeps the delta tables small.
+    """
+    from sms_management_app.usage_rollup import fold
+
+    folded = fold()
+    if any(folded.values()):
+        logger.info(f"fold_usage_rollups: {folded}")
+    return folded
+
+
 # Priority queue for urgent updates
 @shared_task(bind=True, max_retries=2, default_retry_delay=30)
 def urgent_update_ghl_message_status(self, message_id, status, ghl_token=None, sms_message_id=None, ghl_account_id=None):
@@ -256,15 +266,29 @@ from sms_management_app.models import SMSMessage
 import time
 
 # enforce rate-limit per worker
-@shared_task(rate_limit="9/s", bind=True, max_retries=3, default_retry_delay=5)
+@shared_task(bind=True, max_retries=3, default_retry_delay=5)
 def process_sms_message(self, sms_id: str):
     """
-    Push a queued inbound SMS message into GHL, respecting API rate limits (10 req/s).
+    Push a queued inbound SMS message into GHL, respecting the shared GHL rate limits.
     """
+    from celery.exceptions import Retry
+    from core.rate_limit import acquire, ghl_buckets, retry_countdown
+
     try:
         print(f"🔎 [Task Start] Processing inbound SMS {sms_id}")
 
         sms = SMSMessage.objects.get(id=sms_id)
+
+        # Take the GHL slot before charging so a deferral never leaves a charged row behind.
+        if sms.direction == "inbound" and sms.status == "queued":
+            acquired, wait_ms = acquire(
+                ghl_buckets(sms.ghl_account.location_id), max_wait_ms=GHL_ACQUIRE_MAX_WAIT_MS
+            )
+            if not acquired:
+                # A wait for the shared GHL budget is not a failed attempt; keep the retry budget.
+                process_sms_message.apply_async(args=[sms_id], countdown=retry_countdown(wait_ms))
+                return {"status": "deferred", "sms_id": sms_id, "wait_ms": wait_ms}
+
         wallet = Wallet.objects.get(account=sms.ghl_account)
 
         print(f"✅ Found SMS {sms.id} (direction={sms.direction}, status={sms.status})")
@@ -344,21 +368,25 @@ def process_sms_message(self, sms_id: str):
         msg = f"⚠️ SMS {sms_id} not found"
         print(msg)
         return msg
+    except Retry:
+        raise
     except Exception as e:
         print(f"🔥 Unexpected error in process_sms_message({sms_id}): {str(e)}")
         # retry if it looks transient (network/api issue)
         raise self.retry(exc=e)
 
 
-@shared_task(rate_limit="9/s", bind=True, max_retries=3, default_retry_delay=5)
+@shared_task(bind=True, max_retries=3, default_retry_delay=5)
 def process_mms_inbound_message(self, payload: dict):
     """
     Process inbound MMS from TransmitSMS (MMS_INBOUND event).
     Look up GHL account by webhook_id, create SMSMessage, push to GHL with attachments.
     """
     import base64
+    from celery.exceptions import Retry
     from transmitsms.models import TransmitSMSMMSWebhook
     from core.models import Wallet
+    from core.rate_limit import acquire, ghl_buckets, retry_countdown
 
     try:
         event_type = payload.get("event_type")
@@ -377,6 +405,17 @@ def process_mms_inbound_message(self, payload: dict):
         ghl_account = mapping.ghl_account
 
         mo = payload.get("mo") or {}
+
+        # One GHL call per media upload plus the inbound push; reserve them all
+        # before the SMSMessage row is created so a deferral cannot double-charge.
+        ghl_calls = 1 + sum(1 for m in (mo.get("media") or []) if m.get("content"))
+        acquired, wait_ms = acquire(
+            ghl_buckets(ghl_account.location_id), cost=ghl_calls, max_wait_ms=GHL_ACQUIRE_MAX_WAIT_MS
+        )
+        if not acquired:
+            # Re-queued, not retried: waiting for the GHL budget must not use up max_retries.
+            process_mms_inbound_message.apply_async(args=[payload], countdown=retry_countdown(wait_ms))
+            return {"status": "deferred", "webhook_id": webhook_id, "wait_ms": wait_ms}
         sender = mo.get("sender", "")
         recipient = mo.get("recipient", "")
         message_text = mo.get("message", "")
@@ -504,6 +543,8 @@ def process_mms_inbound_message(self, payload: dict):
     except GHLTransmitSMSMapping.DoesNotExist:
         logger.error(f"MMS_INBOUND: no GHL mapping for transmit account")
         return "MMS_INBOUND: no GHL mapping"
+    except Retry:
+        raise
     except Exception as e:
         logger.exception(f"process_mms_inbound_message error: {e}")
         raise self.retry(exc=e)
@@ -591,179 +632,44 @@ def sync_numbers(account_id=None, filter_type='available'):
     }
 
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def sync_client_owned_numbers(self):
+@shared_task(bind=True, max_retries=2, default_retry_delay=60)
+def refresh_number_inventory(self):
     """
-    Periodically sync owned numbers for each active TransmitSMS client account.
-    - For each client (TransmitSMSAccount with a mapping), fetch 'owned' numbers
-    - For each number, fetch details via get_number
-    - Update existing TransmitNumber or create new one
-    - For new numbers, apply deduction logic based on subscription quota and price
-    - Remove numbers from our DB that are no longer in TransmitSMS for that client
+    Page through Transmit's available numbers and publish the snapshot that
+    GetAvailableNumbers searches (see sms_management_app/number_inventory.py).
     """
-    logger.info("[INFO] Starting owned numbers sync across clients")
-    service = TransmitSMSService()
-
-    # Iterate over active TransmitSMS accounts that are mapped to GHL accounts
-    accounts = TransmitSMSAccount.objects.filter(is_active=True).select_related("ghl_mapping")
-    processed = created_count = updated_count = deleted_count = 0
+    from sms_management_app import number_inventory
 
-    for account in accounts:
-        if not hasattr(account, "ghl_mapping"):
-            continue
-        ghl_account = account.ghl_mapping.ghl_account
-        client_label = getattr(ghl_account, "location_name", getattr(account, "account_name", str(account.id)))
-        try:
-            logger.info(f"[INFO] Syncing numbers for client: {client_label}")
-            resp = service.get_dedicated_numbers(filter_type="owned", api_key=account.api_key, api_secret=account.api_secret)
-            if not resp.get("success"):
-                logger.error(f"[ERROR] Failed to fetch owned numbers for client {client_label}: {resp.get('error')}")
-                continue
-            numbers = resp.get("data", {}).get("numbers", []) or []
-            logger.debug(f"[DEBUG] Found {len(numbers)} numbers")
-
-            # Get all numbers from API response (set of number strings)
-            api_number_set = {str(item.get("number")) for item in numbers}
-
-            # Get existing numbers in DB for this client
-            existing_numbers = TransmitNumber.objects.filter(ghl_account=ghl_account, status__in=["owned", "pending"])
-            existing_number_set = {tn.number for tn in existing_numbers}
-
-            # Find numbers to delete (in DB but not in API response)
-            numbers_to_delete = existing_number_set - api_number_set
-            if numbers_to_delete:
-                deleted_objs = TransmitNumber.objects.filter(
-                    ghl_account=ghl_account,
-                    number__in=numbers_to_delete,
-                    status__in=["owned", "pending"]  # Only delete owned/pending, not registered
-                )
-                deleted_count_for_client = deleted_objs.count()
-                deleted_objs.delete()
-                deleted_count += deleted_count_for_client
-                logger.info(f"[DELETE] Removed {deleted_count_for_client} numbers not found in TransmitSMS for client {client_label}: {list(numbers_to_delete)}")
-
-            for item in numbers:
-                processed += 1
-                msisdn = str(item.get("number"))
-                # Fetch number details for precise fields (price, auto_renew, status, next_charge)
-                details = service.get_number(number=msisdn, api_key=account.api_key, api_secret=account.api_secret)
-                if not details.get("success"):
-                    logger.error(f"[ERROR] Failed details for {msisdn}: {details.get('error')}")
-                    continue
-                data = details.get("data", {})
-                price = Decimal(str(data.get("price", item.get("price", 0) or 0)))
-                status_raw = data.get("status") or item.get("status")
-                # Map Transmit status to our status
-                status = "owned" if (status_raw or "").lower() == "active" else "pending"
-                next_charge_str = data.get("next_charge")
-                next_renewal_date = None
-                if next_charge_str:
-                    try:
-                        next_renewal_date = date_parser.parse(next_charge_str).date()
-                    except Exception:
-                        next_renewal_date = None
-
-                # Upsert TransmitNumber
-                try:
-                    with transaction.atomic():
-                        tn, created = TransmitNumber.objects.select_for_update().get_or_create(
-                            number=msisdn,
-                            ghl_account=ghl_account,  # Add this to make it unique per account
-                            defaults={
-                                "price": price,
-                                "status": status,
-                                "is_active": True,
-                                "next_renewal_date": next_renewal_date,
-                                "monthly_charge": Decimal(str(price)),
-                            },
-                        )
+    try:
+        count = number_inventory.refresh()
+    except Exception as e:
+        logger.warning(f"refresh_number_inventory failed: {e}")
+        raise self.retry(exc=e)
+    logger.info(f"refresh_number_inventory: {count} available numbers")
+    return {"numbers": count}
 
-                        if created:
-                            # Determine standard vs premium and apply deduction logic if extra
-                            is_standard = price <= Decimal("11")
-                            use_wallet = False
-                            charge_amount = Decimal("0.00")
-                            wallet = getattr(ghl_account, "wallet", None)
-
-                            if is_standard:
-                                if ghl_account.can_purchase_standard():
-                                    ghl_account.current_standard_purchased += 1
-                                    ghl_account.save(update_fields=["current_standard_purchased"])
-                                    tn.is_extra_number = False
-                                else:
-                                    use_wallet = True
-                                    charge_amount = price
-                                    if wallet and ghl_account.has_sufficient_wallet_balance(price):
-                                        wallet.deduct_funds(
-                                            amount=price,
-                                            reference_id=str(tn.id),
-                                            description=f"Sync purchase of extra standard number {msisdn}",
-                                        )
-                                        tn.is_extra_number = True
-                                        tn.monthly_charge = price
-                                    else:
-                                        logger.warning(f"[WARN] Insufficient funds for extra standard number {msisdn} during sync")
-                                        tn.is_extra_number = True
-                                        tn.monthly_charge = price
-                            else:
-                                # Premium
-                                if ghl_account.can_purchase_premium():
-                                    ghl_account.current_premium_purchased += 1
-                                    ghl_account.save(update_fields=["current_premium_purchased"])
-                                    tn.is_extra_number = False
-                                else:
-                                    use_wallet = True
-                                    charge_amount = price
-                                    if wallet and ghl_account.has_sufficient_wallet_balance(price):
-                                        wallet.deduct_funds(
-                                            amount=price,
-                                            reference_id=str(tn.id),
-                                            description=f"Sync purchase of extra premium number {msisdn}",
-                                        )
-                                        tn.is_extra_number = True
-                                        tn.monthly_charge = price
-                                    else:
-                                        logger.warning(f"[WARN] Insufficient funds for extra premium number {msisdn} during sync")
-                                        tn.is_extra_number = True
-                                        tn.monthly_charge = price
-
-                            tn.next_renewal_date = next_renewal_date
-                            tn.status = status
-                            tn.price = price
-                            tn.ghl_account = ghl_account
-                            tn.save()
-                            created_count += 1
-                            logger.info(f"[SUCCESS] New number added: {msisdn}")
-                        else:
-                            # Update existing record
-                            updated_fields = []
-                            if tn.ghl_account_id != ghl_account.id:
-                                tn.ghl_account = ghl_account
-                                updated_fields.append("ghl_account")
-                            if tn.price != price:
-                                tn.price = price
-                                updated_fields.append("price")
-                            if tn.status != status:
-                                tn.status = status
-                                updated_fields.append("status")
-                            if tn.next_renewal_date != next_renewal_date:
-                                tn.next_renewal_date = next_renewal_date
-                                updated_fields.append("next_renewal_date")
-                            if updated_fields:
-                                tn.save(update_fields=updated_fields + ["last_synced_at"])
-                                updated_count += 1
-                                logger.info(f"[UPDATE] Updated existing number: {msisdn}")
-                except Exception as e:
-                    logger.exception(f"[ERROR] Exception syncing number {msisdn} for {client_label}: {e}")
-                    continue
 
-        except Exception as e:
-            logger.exception(f"[ERROR] Exception syncing client {client_label}: {e}")
-            # Retry on transient issues
-            continue
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def sync_client_owned_numbers(self):
+    """
+    Periodically sync owned numbers for each active TransmitSMS client account.
+    - Accounts are fetched concurrently (NUMBER_SYNC_CONCURRENCY)
+    - get_number is only called for new numbers and numbers whose list entry changed
+    - New numbers get the same deduction logic based on subscription quota and price
+    - Numbers no longer in TransmitSMS for that client are removed
+    See sms_management_app/number_sync.py.
+    """
+    from sms_management_app.number_sync import sync_owned_numbers
 
-    logger.info(f"[INFO] Owned numbers sync complete. Processed={processed}, Created={created_count}, Updated={updated_count}, Deleted={deleted_count}")
-    return {"processed": processed, "created": created_count, "updated": updated_count, "deleted": deleted_count}
+    logger.info("[INFO] Starting owned numbers sync across clients")
+    summary = sync_owned_numbers()
+    logger.info(
+        f"[INFO] Owned numbers sync complete in {summary['elapsed_ms']} ms. Processed={summary['processed']}, "
+        f"Created={summary['created']}, Updated={summary['updated']}, Deleted={summary['deleted']}, "
+        f"DetailCalls={summary['detail_calls']}, Unchanged={summary['skipped']}, "
+        f"FailedAccounts={summary['failed_accounts']}"
+    )
+    return summary
 
 from dateutil.relativedelta import relativedelta
 
@@ -814,7 +720,6 @@ def charge_due_transmit_numbers():
 
 @shared_task(
     bind=True,
-    rate_limit="8/s",
     max_retries=8,
     default_retry_delay=30,
     queue="outbound",
@@ -823,7 +728,12 @@ def send_outbound_sms_task(self, sms_id: str):
     """
     Rate-limited outbound send to TransmitSMS. Keeps campaign bursts off the
     webhook thread and protects OAuth/critical workers on the celery queue.
+
+    The rate comes from transmit_rate: a message that gets no slot is re-queued
+    for when one frees up (without spending a retry), and a 429 pauses the
+    whole account, so this message retries when the account resumes.
     """
+    from sms_management_app import transmit_rate
     from sms_management_app.models import SMSMessage
     from sms_management_app.services import GHLIntegrationService
     from sms_management_app.error_utils import RATE_LIMITED, categorize_failure
@@ -842,30 +752,94 @@ def send_outbound_sms_task(self, sms_id: str):
     if sms.status != "pending":
         return {"status": "skipped", "reason": f"status={sms.status}"}
 
+    acquired, wait_ms = transmit_rate.acquire(sms.transmit_account_id, max_wait_ms=TRANSMIT_ACQUIRE_MAX_WAIT_MS)
+    if not acquired:
+        # A wait for the shared rate is not a failed attempt; keep the retry budget.
+        send_outbound_sms_task.apply_async(args=[sms_id], countdown=transmit_rate.resume_countdown(wait_ms))
+        return {"status": "deferred", "sms_id": sms_id, "wait_ms": wait_ms}
+
     service = GHLIntegrationService()
     result = service.send_outbound_sms(sms, sms.cost, sms.segments)
 
     if result.get("success"):
+        transmit_rate.record_success(sms.transmit_account_id)
         service.apply_outbound_send_result(sms, result, cost=sms.cost, segments=sms.segments)
         return {"status": "sent", "sms_id": sms_id}
 
     error_code = result.get("error_code")
     category = categorize_failure(result.get("error", ""), error_code)
 
-    if category == RATE_LIMITED and self.request.retries < self.max_retries:
-        countdown = min(30 * (2 ** self.request.retries), 300)
-        logger.warning(
-            "Transmit rate limited for SMS %s, retry %s in %ss",
-            sms_id,
-            self.request.retries + 1,
-            countdown,
-        )
-        raise self.retry(countdown=countdown)
+    if category == RATE_LIMITED:
+        resume_ms = transmit_rate.record_rate_limited(sms.transmit_account_id)
+        if self.request.retries < self.max_retries:
+            countdown = transmit_rate.resume_countdown(resume_ms)
+            logger.warning(
+                "Transmit rate limited for SMS %s, retry %s in %.0fs",
+                sms_id,
+                self.request.retries + 1,
+                countdown,
+            )
+            raise self.retry(countdown=countdown)
 
     service.apply_outbound_send_result(sms, result, cost=sms.cost, segments=sms.segments)
     return {"status": "failed", "sms_id": sms_id, "error": result.get("error")}
 
 
+@shared_task(bind=True, queue="outbound")
+def submit_campaign_sends(self, entries):
+    """Hand charged campaign sends (published through the outbox) to campaign_batcher."""
+    from sms_management_app import campaign_batcher
+
+    campaign_batcher.submit(entries)
+    return {"submitted": len(entries)}
+
+
+@shared_task(bind=True, queue="outbound")
+def flush_campaign_sends(self):
+    """
+    Dispatch the sends grouped by campaign_batcher: one send_campaign_batch_task per
+    chunk of identical messages, send_outbound_sms_task for the rest. Scheduled by
+    campaign_batcher and swept every minute.
+    """
+    from sms_management_app import campaign_batcher
+
+    summary = campaign_batcher.flush()
+    if summary["messages"]:
+        logger.info(f"flush_campaign_sends: {summary}")
+    return summary
+
+
+@shared_task(
+    bind=True,
+    max_retries=8,
+    default_retry_delay=30,
+    queue="outbound",
+)
+def send_campaign_batch_task(self, sms_ids):
+    """One multi-recipient send-sms.json call for a chunk of identical campaign messages."""
+    from sms_management_app import campaign_batcher, transmit_rate
+
+    summary = campaign_batcher.send_batch(sms_ids)
+    if summary["deferred_ms"]:
+        send_campaign_batch_task.apply_async(
+            args=[summary["retry_ids"]], countdown=transmit_rate.resume_countdown(summary["deferred_ms"])
+        )
+    elif summary["rate_limited"]:
+        if self.request.retries < self.max_retries:
+            countdown = transmit_rate.resume_countdown(summary["resume_ms"])
+            logger.warning(
+                "Transmit rate limited campaign send of %s messages, retry %s in %.0fs",
+                len(summary["retry_ids"]),
+                self.request.retries + 1,
+                countdown,
+            )
+            raise self.retry(args=[summary["retry_ids"]], countdown=countdown)
+        # Out of batch retries: each message gets its own send (and retries) from here.
+        for sms_id in summary["retry_ids"]:
+            send_outbound_sms_task.delay(sms_id)
+    return summary
+
+
 @shared_task(bind=True)
 def bulk_retry_messages(self, message_ids, include_permanent=False, location_id=None):
     """
@@ -882,8 +856,11 @@ def bulk_retry_messages(self, message_ids, include_permanent=False, location_id=
     from sms_management_app.models import SMSMessage
     from sms_management_app.services import GHLIntegrationService
     from sms_management_app.error_utils import is_retryable_category
+    from sms_management_app import campaign_batcher
+    from core import outbox
     from core.models import Wallet
     from django.core.exceptions import ValidationError
+    from django.db import transaction
 
     qs = SMSMessage.objects.filter(
         id__in=message_ids, status__in=["failed", "pending"]
@@ -908,11 +885,12 @@ def bulk_retry_messages(self, message_ids, include_permanent=False, location_id=
         try:
             if sms.direction == "inbound":
                 if sms.status == "failed":
-                    sms.status = "queued"
-                    sms.error_message = None
-                    sms.error_category = None
-                    sms.save(update_fields=["status", "error_message", "error_category"])
-                    process_sms_message.delay(str(sms.id))
+                    with transaction.atomic():
+                        sms.status = "queued"
+                        sms.error_message = None
+                        sms.error_category = None
+                        sms.save(update_fields=["status", "error_message", "error_category"])
+                        outbox.enqueue(process_sms_message, str(sms.id))
                     summary["requeued"] += 1
                 else:
                     summary["skipped"] += 1
@@ -924,33 +902,35 @@ def bulk_retry_messages(self, message_ids, include_permanent=False, location_id=
 
             wallet = Wallet.objects.get(account=sms.ghl_account)
 
-            # Failed rows were refunded on failure → charge again. Pending rows that
-            # already carry a cost are still debited → reuse it (no double charge).
-            if sms.status == "failed" or not sms.cost:
-                try:
-                    cost, segments = wallet.charge_message(
-                        "outbound", sms.message_content, reference_id=sms.id
-                    )
-                except ValidationError as e:
-                    sms.apply_failure(f"Insufficient balance: {e}")
-                    sms.save(update_fields=["error_message", "error_category"])
-                    summary["failed"] += 1
-                    continue
-                sms.cost = cost
-                sms.segments = segments
-            else:
-                cost, segments = sms.cost, sms.segments
-
-            sms.error_message = None
-            sms.error_category = None
-            sms.transmit_message_id = None
-            if sms.status == "failed":
-                sms.status = "pending"
-            sms.save(update_fields=[
-                "cost", "segments", "status", "error_message", "error_category", "transmit_message_id"
-            ])
-
-            send_outbound_sms_task.delay(str(sms.id))
+            try:
+                # Charge, status change and the send publish commit together.
+                with transaction.atomic():
+                    # Failed rows were refunded on failure → charge again. Pending rows that
+                    # already carry a cost are still debited → reuse it (no double charge).
+                    if sms.status == "failed" or not sms.cost:
+                        cost, segments = wallet.charge_message(
+                            "outbound", sms.message_content, reference_id=sms.id
+                        )
+                        sms.cost = cost
+                        sms.segments = segments
+                    else:
+                        cost, segments = sms.cost, sms.segments
+
+                    sms.error_message = None
+                    sms.error_category = None
+                    sms.transmit_message_id = None
+                    if sms.status == "failed":
+                        sms.status = "pending"
+                    sms.save(update_fields=[
+                        "cost", "segments", "status", "error_message", "error_category", "transmit_message_id"
+                    ])
+
+                    campaign_batcher.enqueue_send(sms)
+            except ValidationError as e:
+                sms.apply_failure(f"Insufficient balance: {e}")
+                sms.save(update_fields=["error_message", "error_category"])
+                summary["failed"] += 1
+                continue
             summary["queued_outbound"] += 1
 
         except Exception as e:
@@ -958,4 +938,252 @@ def bulk_retry_messages(self, message_ids, include_permanent=False, location_id=
             logger.exception(f"bulk_retry_messages: error retrying {sms.id}: {e}")
 
     logger.info(f"bulk_retry_messages complete: {summary}")
-    return summary
\ No newline at end of file
+    return summary
+
+GHL_INBOX_BATCH_SIZE = 100
+GHL_INBOX_MAX_BATCHES = 50
+GHL_INBOX_MAX_ATTEMPTS = 5
+# Rows left in "processing" this long (worker crash) are claimed again.
+# process_ghl_message is idempotent on messageId, so a re-run cannot double-charge.
+GHL_INBOX_CLAIM_TIMEOUT = timedelta(minutes=5)
+# Rows put back to "pending" after a failed attempt wait this long (next sweep).
+GHL_INBOX_RETRY_DELAY = timedelta(seconds=30)
+GHL_INBOX_RETENTION = timedelta(days=7)
+
+
+@shared_task(bind=True)
+def drain_ghl_webhook_inbox(self, batch_size=GHL_INBOX_BATCH_SIZE, max_batches=GHL_INBOX_MAX_BATCHES):
+    """
+    Consume fast-acked GHL webhooks from GHLWebhookInbox in batches.
+
+    Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED so several
+    ingest workers can drain in parallel, then every row goes through the
+    normal GHLIntegrationService.process_ghl_message flow. WebhookLog rows and
+    inbox status changes are written in bulk per batch.
+    """
+    from django.db import transaction
+    from django.db.models import F, Q
+    from sms_management_app.models import GHLWebhookInbox, WebhookLog
+    from sms_management_app.services import GHLIntegrationService
+
+    service = GHLIntegrationService()
+    summary = {"batches": 0, "processed": 0, "failed": 0, "retrying": 0}
+
+    for _ in range(max_batches):
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                GHLWebhookInbox.objects.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status="pending", claimed_at__isnull=True)
+                    | Q(status="pending", claimed_at__lt=now - GHL_INBOX_RETRY_DELAY)
+                    | Q(status="processing", claimed_at__lt=now - GHL_INBOX_CLAIM_TIMEOUT)
+                )
+                .order_by("created_at")[:batch_size]
+            )
+            if not rows:
+                break
+            GHLWebhookInbox.objects.filter(pk__in=[row.pk for row in rows]).update(
+                status="processing", claimed_at=now, attempts=F("attempts") + 1
+            )
+
+        summary["batches"] += 1
+        logs = []
+        for row in rows:
+            row.attempts += 1
+            try:
+                result = service.process_ghl_message(row.payload)
+            except Exception as e:
+                logger.exception(f"drain_ghl_webhook_inbox: error processing {row.message_id}")
+                result = {"success": False, "error": str(e)}
+
+            error = None if result.get("success") else str(result.get("error") or "Processing failed")
+            # No SMSMessage row means we failed before charging (DB blip, missing
+            # mapping, ...) — worth another attempt. Otherwise the outcome is final.
+            if error and not result.get("message_id") and row.attempts < GHL_INBOX_MAX_ATTEMPTS:
+                row.status = "pending"
+                summary["retrying"] += 1
+            elif error:
+                row.status = "failed"
+                summary["failed"] += 1
+            else:
+                row.status = "done"
+                summary["processed"] += 1
+
+            row.error_message = error[:2000] if error else None
+            row.processed_at = timezone.now()
+            logs.append(
+                WebhookLog(
+                    webhook_type="ghl_inbound",
+                    raw_data=row.payload,
+                    processed=error is None,
+                    error_message=error,
+                )
+            )
+
+        GHLWebhookInbox.objects.bulk_update(rows, ["status", "error_message", "processed_at"])
+        WebhookLog.objects.bulk_create(logs)
+
+        if len(rows) < batch_size:
+            break
+
+    GHLWebhookInbox.objects.filter(
+        status="done", created_at__lt=timezone.now() - GHL_INBOX_RETENTION
+    ).delete()
+
+    if summary["batches"]:
+        logger.info(f"drain_ghl_webhook_inbox complete: {summary}")
+    return summary
+
+
+DLR_INBOX_BATCH_SIZE = 200
+DLR_INBOX_MAX_BATCHES = 50
+DLR_INBOX_MAX_ATTEMPTS = 5
+# apply_dlr_payloads never refunds twice, so re-applying a crashed batch is safe.
+DLR_INBOX_CLAIM_TIMEOUT = timedelta(minutes=5)
+DLR_INBOX_RETRY_DELAY = timedelta(seconds=30)
+DLR_INBOX_RETENTION = timedelta(days=7)
+
+
+@shared_task(bind=True)
+def apply_transmit_dlrs(self, batch_size=DLR_INBOX_BATCH_SIZE, max_batches=DLR_INBOX_MAX_BATCHES):
+    """
+    Apply buffered TransmitSMS DLRs from TransmitDLRInbox in micro-batches.
+
+    Rows are claimed with SKIP LOCKED like drain_ghl_webhook_inbox. Each batch is
+    applied by dlr_batch.apply_dlr_payloads; if the batch raises, its rows are
+    applied one at a time so a single bad payload cannot hold back the rest.
+    """
+    from django.db import transaction
+    from django.db.models import F, Q
+    from sms_management_app.dlr_batch import apply_dlr_payloads
+    from sms_management_app.models import TransmitDLRInbox, WebhookLog
+
+    summary = {"batches": 0, "applied": 0, "unmatched": 0, "refunds": 0, "failed": 0, "retrying": 0}
+
+    for _ in range(max_batches):
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                TransmitDLRInbox.objects.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status="pending", claimed_at__isnull=True)
+                    | Q(status="pending", claimed_at__lt=now - DLR_INBOX_RETRY_DELAY)
+                    | Q(status="processing", claimed_at__lt=now - DLR_INBOX_CLAIM_TIMEOUT)
+                )
+                .order_by("id")[:batch_size]
+            )
+            if not rows:
+                break
+            TransmitDLRInbox.objects.filter(pk__in=[row.pk for row in rows]).update(
+                status="processing", claimed_at=now, attempts=F("attempts") + 1
+            )
+
+        summary["batches"] += 1
+        errors = {}
+        try:
+            result = apply_dlr_payloads([row.payload for row in rows])
+            for key in ("applied", "unmatched", "refunds"):
+                summary[key] += result[key]
+        except Exception:
+            logger.exception("apply_transmit_dlrs: batch failed, applying rows individually")
+            for row in rows:
+                try:
+                    result = apply_dlr_payloads([row.payload])
+                    for key in ("applied", "unmatched", "refunds"):
+                        summary[key] += result[key]
+                except Exception as e:
+                    logger.exception(f"apply_transmit_dlrs: error applying DLR {row.pk}")
+                    errors[row.pk] = str(e)
+
+        logs = []
+        for row in rows:
+            row.attempts += 1
+            error = errors.get(row.pk)
+            if error and row.attempts < DLR_INBOX_MAX_ATTEMPTS:
+                row.status = "pending"
+                summary["retrying"] += 1
+            elif error:
+                row.status = "failed"
+                summary["failed"] += 1
+            else:
+                row.status = "done"
+            row.error_message = error[:2000] if error else None
+            row.processed_at = timezone.now()
+            logs.append(
+                WebhookLog(
+                    webhook_type="transmit_dlr",
+                    raw_data=row.payload,
+                    processed=error is None,
+                    error_message=error,
+                )
+            )
+
+        TransmitDLRInbox.objects.bulk_update(rows, ["status", "error_message", "processed_at"])
+        WebhookLog.objects.bulk_create(logs)
+
+        if len(rows) < batch_size:
+            break
+
+    TransmitDLRInbox.objects.filter(
+        status="done", created_at__lt=timezone.now() - DLR_INBOX_RETENTION
+    ).delete()
+
+    if summary["batches"]:
+        logger.info(f"apply_transmit_dlrs complete: {summary}")
+    return summary
+
+
+@shared_task(bind=True)
+def start_message_export(self, job_id):
+    """
+    Plan a MessageExportJob and fan out its chunks (see message_export.py).
+    Also removes jobs past MESSAGE_EXPORT_RETENTION_HOURS.
+    """
+    from sms_management_app import message_export
+    from sms_management_app.models import MessageExportJob
+
+    message_export.purge_expired()
+    job = MessageExportJob.objects.filter(pk=job_id, status="pending").first()
+    if job is None:
+        return {"job_id": job_id, "skipped": True}
+
+    try:
+        indexes = message_export.start(job)
+        if not indexes:
+            message_export.finish_if_complete(job.pk)
+    except Exception as e:
+        logger.exception(f"start_message_export: job {job_id} failed")
+        message_export.fail(job_id, e)
+        return {"job_id": job_id, "status": "failed"}
+
+    for index in indexes:
+        export_message_chunk.delay(str(job.pk), index)
+    return {"job_id": job_id, "chunks": len(indexes), "rows": job.total_rows}
+
+
+# acks_late: a chunk lost with its worker is redelivered; parts are written
+# tmp + rename, so a re-run only redoes an unfinished part.
+@shared_task(bind=True, acks_late=True, max_retries=3, default_retry_delay=30)
+def export_message_chunk(self, job_id, index):
+    """Write one created_at range of an export job; the last chunk assembles the file."""
+    from sms_management_app import message_export
+    from sms_management_app.models import MessageExportJob
+
+    job = MessageExportJob.objects.filter(pk=job_id, status="running").first()
+    if job is None:
+        return {"job_id": job_id, "index": index, "skipped": True}
+
+    try:
+        written = message_export.export_chunk(job, index)
+        done = message_export.finish_if_complete(job.pk)
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        logger.exception(f"export_message_chunk: job {job_id} chunk {index} failed")
+        message_export.fail(job_id, e)
+        return {"job_id": job_id, "index": index, "status": "failed"}
+
+    if done:
+        logger.info(f"export_message_chunk: job {job_id} complete")
+    return {"job_id": job_id, "index": index, "rows": written}
@@ -183,7 +183,7 @@ from core.service import GHLService
 
 def get_sms_record(record_id,main_location_id):
     main_creds = GHLAuthCredentials.objects.get(location_id=main_location_id)
-    service = GHLService(access_token=main_creds.access_token)
+    service = GHLService(access_token=main_creds.access_token, auth_credentials=main_creds)
 
     record  = service.get_record(record_id,main_location_id)
     print(record)
\ No newline at end of file
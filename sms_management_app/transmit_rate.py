@@ -0,0 +1,213 @@
+"""
+Adaptive (AIMD) send rate for TransmitSMS, shared by every outbound worker.
+
+Two controllers gate every send-sms.json call: one per TransmitSMSAccount and
+one for the agency as a whole. Each keeps its current rate in Redis and feeds
+a token bucket in core.rate_limit, so the limit holds across processes and
+nodes (Celery's rate_limit only counts per worker process).
+
+    success      rate += TRANSMIT_RATE_INCREASE / rate on both controllers,
+                 i.e. about TRANSMIT_RATE_INCREASE msg/s more per second of
+                 clean sending, up to the scope's max
+    429          rate *= TRANSMIT_RATE_DECREASE on both controllers, and the
+                 account's queue is paused for TRANSMIT_RATE_PAUSE_SECONDS,
+                 doubling for each 429 in a row (at most MAX_PAUSE_SECONDS)
+
+A 429 cuts each controller once: further 429s from requests that were already
+in flight land inside the cut window and are ignored. While an account is
+paused, acquire() returns the time left, so its queued messages wait for the
+same resume time instead of each backing off on its own. resume_countdown()
+adds a little jitter so they do not all wake together.
+
+If Redis is unavailable the controllers fail open at their initial rates.
+"""
+
+import logging
+import random
+import time
+
+from django.conf import settings
+
+from core import rate_limit
+from core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY = "reloop:transmit_rate:{scope}"
+AGENCY_SCOPE = "agency"
+MAX_PAUSE_SECONDS = 300
+# The agency is never paused; one cut per this window however many accounts see 429s.
+AGENCY_CUT_WINDOW_MS = 2000
+STATE_TTL_MS = 24 * 3600 * 1000
+
+# KEYS: one state hash per controller ({rate, strikes, cut_until, paused_until}).
+# ARGV: now_ms, outcome ("ok" | "limited"), increase, decrease, max_pause_ms, ttl_ms,
+# then (initial, min, max, pause_ms, cut_window_ms) per key.
+# Returns the latest paused_until (ms) over all keys.
+_ADJUST_SCRIPT = """
+local now = tonumber(ARGV[1])
+local outcome = ARGV[2]
+local increase = tonumber(ARGV[3])
+local decrease = tonumber(ARGV[4])
+local max_pause = tonumber(ARGV[5])
+local ttl = tonumber(ARGV[6])
+local resume = 0
+for i, key in ipairs(KEYS) do
+    local base = 6 + (i - 1) * 5
+    local initial = tonumber(ARGV[base + 1])
+    local low = tonumber(ARGV[base + 2])
+    local high = tonumber(ARGV[base + 3])
+    local pause = tonumber(ARGV[base + 4])
+    local window = tonumber(ARGV[base + 5])
+    local state = redis.call('HMGET', key, 'rate', 'strikes', 'cut_until', 'paused_until')
+    local rate = tonumber(state[1]) or initial
+    local strikes = tonumber(state[2]) or 0
+    local cut_until = tonumber(state[3]) or 0
+    local paused_until = tonumber(state[4]) or 0
+    if outcome == 'ok' then
+        rate = math.min(high, rate + increase / rate)
+        strikes = 0
+    elseif now >= cut_until then
+        rate = math.max(low, rate * decrease)
+        if pause > 0 then
+            paused_until = now + math.min(max_pause, pause * 2 ^ strikes)
+        end
+        strikes = strikes + 1
+        cut_until = math.max(paused_until, now + window)
+    end
+    redis.call('HSET', key, 'rate', tostring(rate), 'strikes', strikes,
+        'cut_until', cut_until, 'paused_until', paused_until)
+    redis.call('PEXPIRE', key, ttl)
+    resume = math.max(resume, paused_until)
+end
+return resume
+"""
+
+_script = None
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _limits(scope):
+    """(initial, min, max) msg/s for a controller."""
+    if scope == AGENCY_SCOPE:
+        return (
+            _setting("TRANSMIT_RATE_AGENCY_INITIAL", 16),
+            _setting("TRANSMIT_RATE_AGENCY_MIN", 2),
+            _setting("TRANSMIT_RATE_AGENCY_MAX", 100),
+        )
+    return (
+        _setting("TRANSMIT_RATE_ACCOUNT_INITIAL", 8),
+        _setting("TRANSMIT_RATE_ACCOUNT_MIN", 1),
+        _setting("TRANSMIT_RATE_ACCOUNT_MAX", 30),
+    )
+
+
+def _scopes(transmit_account_id):
+    return [f"account:{transmit_account_id}", AGENCY_SCOPE]
+
+
+def _states(scopes):
+    """{scope: (rate, paused_until_ms)}; initial rates when Redis is unavailable."""
+    states = {scope: (float(_limits(scope)[0]), 0) for scope in scopes}
+    try:
+        pipe = get_redis().pipeline()
+        for scope in scopes:
+            pipe.hmget(KEY.format(scope=scope), "rate", "paused_until")
+        for scope, (rate, paused_until) in zip(scopes, pipe.execute()):
+            if rate is not None:
+                states[scope] = (float(rate), int(float(paused_until or 0)))
+    except Exception as e:
+        logger.warning("Transmit rate state unavailable, using initial rates: %s", e)
+    return states
+
+
+def _bucket(scope, rate):
+    # About one second of burst at the current rate.
+    return rate_limit.Bucket(f"transmit:{scope}", rate, max(1.0, rate))
+
+
+def current_rates(transmit_account_id):
+    """{"account": msg/s, "agency": msg/s, "paused_ms": ms left} for monitoring."""
+    account_scope, agency_scope = _scopes(transmit_account_id)
+    states = _states([account_scope, agency_scope])
+    return {
+        "account": states[account_scope][0],
+        "agency": states[agency_scope][0],
+        "paused_ms": max(0, states[account_scope][1] - _now_ms()),
+    }
+
+
+def acquire(transmit_account_id, max_wait_ms=0):
+    """
+    Take a send slot for ``transmit_account_id``, waiting up to ``max_wait_ms``.
+    Returns (acquired, wait_ms) like core.rate_limit.acquire; a paused account
+    reports the time left until it resumes.
+    """
+    scopes = _scopes(transmit_account_id)
+    states = _states(scopes)
+    paused_ms = max(paused_until for _, paused_until in states.values()) - _now_ms()
+    if paused_ms > 0:
+        return False, paused_ms
+    return rate_limit.acquire([_bucket(scope, states[scope][0]) for scope in scopes], max_wait_ms=max_wait_ms)
+
+
+def _adjust(transmit_account_id, outcome):
+    global _script
+    scopes = _scopes(transmit_account_id)
+    now = _now_ms()
+    args = [
+        now,
+        outcome,
+        _setting("TRANSMIT_RATE_INCREASE", 1),
+        _setting("TRANSMIT_RATE_DECREASE", 0.5),
+        MAX_PAUSE_SECONDS * 1000,
+        STATE_TTL_MS,
+    ]
+    for scope in scopes:
+        initial, low, high = _limits(scope)
+        if scope == AGENCY_SCOPE:
+            pause_ms, window_ms = 0, AGENCY_CUT_WINDOW_MS
+        else:
+            pause_ms, window_ms = _setting("TRANSMIT_RATE_PAUSE_SECONDS", 15) * 1000, 0
+        args.extend([initial, low, high, pause_ms, window_ms])
+    try:
+        redis = get_redis()
+        if _script is None:
+            _script = redis.register_script(_ADJUST_SCRIPT)
+        # Pass the client explicitly: the script object may predate a fork.
+        resume = int(_script(keys=[KEY.format(scope=scope) for scope in scopes], args=args, client=redis))
+    except Exception as e:
+        logger.warning("Transmit rate controller unavailable (%s): %s", outcome, e)
+        return 0
+    return max(0, resume - now)
+
+
+def record_success(transmit_account_id):
+    """Additive increase after a send Transmit accepted."""
+    _adjust(transmit_account_id, "ok")
+
+
+def record_rate_limited(transmit_account_id):
+    """
+    Multiplicative decrease and pause after a 429. Returns the ms until the
+    account's queue resumes (the pause already running, if another send got there first).
+    """
+    resume_ms = _adjust(transmit_account_id, "limited")
+    logger.warning(
+        "Transmit rate limited account %s: %s, queue paused for %s ms",
+        transmit_account_id, current_rates(transmit_account_id), resume_ms,
+    )
+    return resume_ms
+
+
+def resume_countdown(wait_ms):
+    """Celery countdown for a message waiting ``wait_ms``, with jitter so waiters do not wake together."""
+    spread = _setting("TRANSMIT_RATE_RESUME_SPREAD_SECONDS", 5)
+    return rate_limit.retry_countdown(wait_ms) + random.uniform(0, spread)
@@ -21,6 +21,13 @@ urlpatterns = [
     #messages list
     path('sms-messages/', SMSMessageListView.as_view(), name='sms-message-list'),
     path('sms-messages/export/', SMSMessageExportCSVView.as_view(), name='sms-message-export'),
+    path('sms-messages/export-jobs/', MessageExportJobCreateView.as_view(), name='sms-message-export-jobs'),
+    path('sms-messages/export-jobs/<uuid:pk>/', MessageExportJobDetailView.as_view(), name='sms-message-export-job'),
+    path(
+        'sms-messages/export-jobs/<uuid:pk>/download/',
+        MessageExportJobDownloadView.as_view(),
+        name='sms-message-export-job-download',
+    ),
     path("wallet/<str:location_id>/add-funds/", wallet_adjust_funds, name="wallet_add_funds"),
     path("wallet/recharge/", wallet_recharge_from_form, name="wallet_recharge_from_form"),
     path("dashboard/analytics/", DashboardAnalyticsView.as_view(), name="dashboard-analytics"),
@@ -0,0 +1,258 @@
+"""
+Daily usage rollups behind the dashboard analytics and wallet summary endpoints.
+
+    MessageDailyUsage  (location, UTC day, direction, status) -> messages, segments, cost
+    WalletDailyUsage   (wallet, UTC day, transaction type)    -> transactions, amount
+
+Statement-level triggers on SMSMessage and WalletTransaction (migrations
+sms_management_app 0012 / core 0031) append +/- rows to the *UsageDelta tables
+for every insert, delete and bucket-changing update, whichever code path made
+it (save(), .update(), bulk_update, admin). fold() moves the deltas into the
+rollups; fold_usage_rollups runs it every minute. Readers add the deltas that
+are not folded yet, so totals are exact without waiting for the fold.
+
+backfill() rebuilds a range of days from the source tables (run it once after
+migrating, and whenever a rollup is suspected to have drifted).
+"""
+
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from core.models import GHLAuthCredentials, Wallet, WalletDailyUsage, WalletTransaction, WalletUsageDelta
+from sms_management_app.models import MessageDailyUsage, MessageUsageDelta, SMSMessage
+
+FOLD_BATCH_SIZE = 5000
+BACKFILL_CHUNK_DAYS = 7
+
+# Bucket keys, summed columns and how each is computed from the source rows.
+MESSAGE_ROLLUP = {
+    "name": "messages",
+    "rollup": MessageDailyUsage,
+    "delta": MessageUsageDelta,
+    "source": SMSMessage,
+    "owner": GHLAuthCredentials,
+    "keys": ["ghl_account_id", "day", "direction", "status"],
+    "sums": ["message_count", "segments", "cost", "costed_count"],
+    "source_select": (
+        "ghl_account_id, (created_at AT TIME ZONE 'UTC')::date, direction, status, "
+        "COUNT(*), SUM(segments), SUM(cost), COUNT(*) FILTER (WHERE cost <> 0)"
+    ),
+}
+WALLET_ROLLUP = {
+    "name": "wallet",
+    "rollup": WalletDailyUsage,
+    "delta": WalletUsageDelta,
+    "source": WalletTransaction,
+    "owner": Wallet,
+    "keys": ["wallet_id", "day", "transaction_type"],
+    "sums": ["transaction_count", "amount"],
+    "source_select": (
+        "wallet_id, (created_at AT TIME ZONE 'UTC')::date, transaction_type, COUNT(*), SUM(amount)"
+    ),
+}
+ROLLUPS = (MESSAGE_ROLLUP, WALLET_ROLLUP)
+
+
+def _tables(spec):
+    return (
+        spec["rollup"]._meta.db_table,
+        spec["delta"]._meta.db_table,
+        spec["source"]._meta.db_table,
+        spec["owner"]._meta.db_table,
+    )
+
+
+def _lock(cursor, spec):
+    # Folds and rebuilds of the same rollup must not interleave.
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [spec["rollup"]._meta.db_table])
+
+
+def _fold_batch(spec, batch_size):
+    rollup, delta, _, owner = _tables(spec)
+    keys = ", ".join(spec["keys"])
+    columns = ", ".join(spec["sums"])
+    sums = ", ".join(f"SUM({column})" for column in spec["sums"])
+    updates = ", ".join(f"{column} = r.{column} + EXCLUDED.{column}" for column in spec["sums"])
+    owner_column = spec["keys"][0]
+    sql = f"""
+        WITH moved AS (
+            DELETE FROM {delta}
+            WHERE id IN (SELECT id FROM {delta} ORDER BY id LIMIT %s)
+            RETURNING *
+        ), folded AS (
+            INSERT INTO {rollup} AS r ({keys}, {columns})
+            SELECT {keys}, {sums}
+            FROM moved
+            -- Deltas of deleted accounts/wallets have nothing left to roll up into.
+            WHERE {owner_column} IN (SELECT id FROM {owner})
+            GROUP BY {keys}
+            ON CONFLICT ({keys}) DO UPDATE SET {updates}
+        )
+        SELECT COUNT(*) FROM moved
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        _lock(cursor, spec)
+        cursor.execute(sql, [batch_size])
+        return cursor.fetchone()[0]
+
+
+def fold(batch_size=FOLD_BATCH_SIZE, max_batches=100):
+    """Fold pending deltas into both rollups. Returns {rollup name: deltas folded}."""
+    folded = {}
+    for spec in ROLLUPS:
+        total = 0
+        for _ in range(max_batches):
+            moved = _fold_batch(spec, batch_size)
+            total += moved
+            if moved < batch_size:
+                break
+        folded[spec["name"]] = total
+    return folded
+
+
+def _rebuild_days(spec, start_day, end_day):
+    """
+    Recompute the rollup for [start_day, end_day) from the source table.
+
+    One statement: the source scan and the delete of that range's deltas share
+    a snapshot, so every change is counted exactly once — either in the fresh
+    totals (its delta is deleted here) or, if committed later, by its delta.
+    """
+    rollup, delta, source, _ = _tables(spec)
+    keys = ", ".join(spec["keys"])
+    columns = ", ".join(spec["sums"])
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in spec["sums"])
+    key_match = " AND ".join(f"f.{key} = r.{key}" for key in spec["keys"])
+    group_by = ", ".join(str(position) for position in range(1, len(spec["keys"]) + 1))
+    sql = f"""
+        WITH fresh ({keys}, {columns}) AS (
+            SELECT {spec["source_select"]}
+            FROM {source}
+            WHERE created_at >= %(start)s AND created_at < %(end)s
+            GROUP BY {group_by}
+        ), dropped_deltas AS (
+            DELETE FROM {delta} WHERE day >= %(start_day)s AND day < %(end_day)s
+        ), stale AS (
+            DELETE FROM {rollup} r
+            WHERE r.day >= %(start_day)s AND r.day < %(end_day)s
+              AND NOT EXISTS (SELECT 1 FROM fresh f WHERE {key_match})
+        ), written AS (
+            INSERT INTO {rollup} ({keys}, {columns})
+            SELECT {keys}, {columns} FROM fresh
+            ON CONFLICT ({keys}) DO UPDATE SET {updates}
+            RETURNING 1
+        )
+        SELECT COUNT(*) FROM written
+    """
+    params = {
+        "start": datetime.combine(start_day, time.min, tzinfo=dt_timezone.utc),
+        "end": datetime.combine(end_day, time.min, tzinfo=dt_timezone.utc),
+        "start_day": start_day,
+        "end_day": end_day,
+    }
+    with transaction.atomic(), connection.cursor() as cursor:
+        _lock(cursor, spec)
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+
+def source_day_range(spec):
+    """(first day, last day) present in the source table, or None when it is empty."""
+    _, _, source, _ = _tables(spec)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT (MIN(created_at) AT TIME ZONE 'UTC')::date, (MAX(created_at) AT TIME ZONE 'UTC')::date "
+            f"FROM {source}"
+        )
+        first, last = cursor.fetchone()
+    return (first, last) if first else None
+
+
+def backfill(spec, start_day, end_day, chunk_days=BACKFILL_CHUNK_DAYS, progress=None):
+    """
+    Rebuild ``spec``'s rollup for start_day..end_day (inclusive), ``chunk_days``
+    per transaction. Returns the number of buckets written.
+    """
+    written = 0
+    day = start_day
+    while day <= end_day:
+        chunk_end = min(day + timedelta(days=chunk_days), end_day + timedelta(days=1))
+        buckets = _rebuild_days(spec, day, chunk_end)
+        written += buckets
+        if progress:
+            progress(spec["name"], day, chunk_end - timedelta(days=1), buckets)
+        day = chunk_end
+    return written
+
+
+def _totals(spec, group_by, filters):
+    """Sum the rollup and its unfolded deltas, grouped by ``group_by``."""
+    totals = {}
+    for model in (spec["rollup"], spec["delta"]):
+        rows = (
+            model.objects.filter(**filters)
+            .values(*group_by)
+            .annotate(**{f"total_{column}": Sum(column) for column in spec["sums"]})
+        )
+        for row in rows:
+            bucket = totals.setdefault(tuple(row[key] for key in group_by), dict.fromkeys(spec["sums"], 0))
+            for column in spec["sums"]:
+                bucket[column] += row[f"total_{column}"] or 0
+    return totals
+
+
+def _day_filters(start_day, end_day):
+    filters = {}
+    if start_day:
+        filters["day__gte"] = start_day
+    if end_day:
+        filters["day__lte"] = end_day
+    return filters
+
+
+def message_usage(start_day=None, end_day=None, accounts=None):
+    """
+    {(direction, status): {message_count, segments, cost, costed_count}} for the
+    UTC days start_day..end_day (None = unbounded), optionally limited to a
+    GHLAuthCredentials queryset.
+    """
+    filters = _day_filters(start_day, end_day)
+    if accounts is not None:
+        filters["ghl_account_id__in"] = accounts.values("id")
+    return _totals(MESSAGE_ROLLUP, ["direction", "status"], filters)
+
+
+def wallet_usage(start_day=None, end_day=None, wallets=None):
+    """{transaction_type: {transaction_count, amount}}; same conventions as message_usage."""
+    filters = _day_filters(start_day, end_day)
+    if wallets is not None:
+        filters["wallet_id__in"] = wallets.values("id")
+    return {key[0]: values for key, values in _totals(WALLET_ROLLUP, ["transaction_type"], filters).items()}
+
+
+def dashboard_message_stats(start_day, end_day, accounts=None):
+    """The message figures of DashboardAnalyticsView, from the rollup."""
+    usage = message_usage(start_day, end_day, accounts)
+    stats = {
+        "total_messages": 0, "outbound_messages": 0, "inbound_messages": 0,
+        "delivered_messages": 0, "failed_messages": 0, "sent_messages": 0,
+    }
+    cost = Decimal("0")
+    costed = 0
+    for (direction, status), values in usage.items():
+        count = values["message_count"]
+        stats["total_messages"] += count
+        if direction in ("outbound", "inbound"):
+            stats[f"{direction}_messages"] += count
+        if status in ("delivered", "failed"):
+            stats[f"{status}_messages"] += count
+        if status in ("sent", "delivered"):
+            stats["sent_messages"] += count
+        cost += values["cost"]
+        costed += values["costed_count"]
+    # Average over messages that cost something, as the dashboard always showed.
+    stats["avg_message_cost"] = cost / costed if costed else 0
+    return stats
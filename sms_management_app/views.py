@@ -16,7 +16,8 @@ from django.core.exceptions import ValidationError
 from rest_framework.generics import ListAPIView
 from rest_framework import generics, filters
 from django_filters.rest_framework import DjangoFilterBackend
-from .filters import SMSMessageFilter  # import your filter
+from .filters import MessageSearchFilter, SMSMessageFilter
+from .search import search_messages
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from django.db.models import Sum,Avg
 from rest_framework.pagination import PageNumberPagination
@@ -95,8 +96,13 @@ from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.views import View
 import json
-from .services import GHLIntegrationService, TransmitSMSService,update_ghl_message_status
-from .models import WebhookLog, SMSMessage, GHLTransmitSMSMapping
+from .services import CAMPAIGN_REPLY_REF, GHLIntegrationService, TransmitSMSService,update_ghl_message_status
+from .models import WebhookLog, SMSMessage, GHLTransmitSMSMapping, TransmitDLRInbox
+from .ingest import enqueue_ghl_webhook, fast_ack_enabled, validate_ghl_webhook
+from .dlr_batch import dlr_batching_enabled, kick_dlr_apply, parse_dlr, pick_recipient
+from . import campaign_batcher, dashboard_cache, ghl_status_coalescer, number_inventory, usage_rollup
+from core import outbox, tenant_cache
+from django.db import transaction
 from core.models import GHLAuthCredentials
 from django.utils import timezone
 
@@ -109,8 +115,21 @@ def ghl_webhook_handler(request):
 
     try:
         data = json.loads(request.body)
+
+        # Fast-ack: validate, buffer durably, let the ingest worker charge/queue.
+        if fast_ack_enabled() and isinstance(data, dict) and data.get('type') == 'SMS':
+            error = validate_ghl_webhook(data)
+            if error:
+                return JsonResponse({"error": error}, status=400)
+            enqueue_ghl_webhook(data)
+            return JsonResponse({
+                "message": "SMS accepted for processing",
+                "ghl_message_id": data["messageId"],
+                "accepted": True,
+            }, status=202)
+
         print("GHL Webhook Data:", data)
-        
+
         # Log webhook
         WebhookLog.objects.create(
             webhook_type='ghl_inbound',
@@ -147,65 +166,27 @@ def ghl_webhook_handler(request):
 
 def _process_dlr_payload(data):
     """Process DLR payload (SMS or MMS format) and return (sms_message, mapped_status) or (None, None)."""
-    event_type = data.get("event_type")
-
-    # MMS_STATUS format: { event_type: "MMS_STATUS", status: { message_ref, status, ... } }
-    if event_type == "MMS_STATUS":
-        status_obj = data.get("status") or {}
-        message_ref = status_obj.get("message_ref")
-        raw_status = (status_obj.get("status") or "").upper()
-
-        if not message_ref:
-            print("MMS DLR: missing message_ref")
-            return None, None
-
-        try:
-            sms_message = SMSMessage.objects.get(ghl_message_id=message_ref)
-        except SMSMessage.DoesNotExist:
-            print(f"MMS DLR: SMSMessage not found for message_ref={message_ref}")
-            return None, None
-
-        sms_message.delivery_status = json.dumps(data)
-        sms_message.transmit_message_id = sms_message.transmit_message_id or status_obj.get("id", "")
-
-        if raw_status in ("DELIVERED", "SUCCESS"):
-            mapped = "delivered"
-        elif raw_status in ("SENT", "PENDING"):
-            mapped = "sent"
-        elif raw_status in ("FAILED", "ERROR", "HARD-BOUNCE", "SOFT-BOUNCE"):
-            mapped = "failed"
-        elif raw_status == "EXPIRED":
-            mapped = "expired"
-        else:
-            mapped = "sent"
-
-        return sms_message, mapped
-    else:
-        # Legacy SMS DLR format: message_id (transmit_message_id), status
-        message_id = data.get("message_id")
-        raw_status = (data.get("status") or "").lower()
-
-        if not message_id:
-            return None, None
+    dlr = parse_dlr(data)
+    if dlr is None:
+        print("DLR: missing message reference")
+        return None, None
 
-        try:
-            sms_message = SMSMessage.objects.get(transmit_message_id=message_id)
-        except SMSMessage.DoesNotExist:
-            print(f"SMS DLR: SMSMessage not found for transmit_message_id={message_id}")
-            return None, None
-
-        sms_message.delivery_status = json.dumps(data)
-
-        if raw_status in ("delivered", "success"):
-            mapped = "delivered"
-        elif raw_status in ("failed", "error", "hard-bounce", "soft-bounce"):
-            mapped = "failed"
-        elif raw_status == "expired":
-            mapped = "expired"
+    try:
+        # MMS_STATUS receipts reference ghl_message_id; legacy SMS ones transmit_message_id.
+        if dlr["lookup"] == "transmit_message_id":
+            # Campaign sends share one Transmit message_id; the receipt's mobile picks the row.
+            sms_message = pick_recipient(list(SMSMessage.objects.filter(transmit_message_id=dlr["key"])), dlr["mobile"])
+            if sms_message is None:
+                raise SMSMessage.DoesNotExist
         else:
-            mapped = "sent"
+            sms_message = SMSMessage.objects.get(**{dlr["lookup"]: dlr["key"]})
+    except SMSMessage.DoesNotExist:
+        print(f"DLR: SMSMessage not found for {dlr['lookup']}={dlr['key']}")
+        return None, None
 
-        return sms_message, mapped
+    sms_message.delivery_status = json.dumps(data)
+    sms_message.transmit_message_id = sms_message.transmit_message_id or dlr["transmit_id"]
+    return sms_message, dlr["status"]
 
 
 @csrf_exempt
@@ -225,6 +206,12 @@ def transmit_dlr_callback(request):
         else:
             return JsonResponse({"error": "Method not allowed"}, status=405)
 
+        if dlr_batching_enabled() and data.get("event_type") != "MMS_INBOUND":
+            # Buffered: apply_transmit_dlrs applies it (and writes the WebhookLog) in a batch.
+            TransmitDLRInbox.objects.create(payload=data)
+            kick_dlr_apply()
+            return JsonResponse({"message": "DLR accepted"}, status=200)
+
         # Log webhook
         WebhookLog.objects.create(webhook_type='transmit_dlr', raw_data=data)
 
@@ -275,11 +262,11 @@ def transmit_dlr_callback(request):
 
             sms_message.save()
 
-            # Token is resolved inside the task from ghl_account_id — do not pass the
-            # raw access token (it would leak into Celery retry exceptions/logs).
-            update_ghl_message_status_task.delay(
-                message_id=sms_message.ghl_message_id,
-                status=sms_message.status,
+            # Coalesced per ghl_message_id: only the latest status within the window
+            # reaches GHL. The token is resolved from ghl_account_id inside the task.
+            ghl_status_coalescer.submit(
+                sms_message.ghl_message_id,
+                sms_message.status,
                 sms_message_id=str(sms_message.id),
                 ghl_account_id=str(sms_message.ghl_account_id),
             )
@@ -325,7 +312,16 @@ def transmit_reply_callback(request, message_id):
         # # }
 
         # 1. Find the matching outbound SMS record
-        sms_msg = get_object_or_404(SMSMessage, ghl_message_id=message_id)
+        if message_id == CAMPAIGN_REPLY_REF:
+            # Multi-recipient campaign send: Transmit's message_id + the replying mobile.
+            sms_msg = pick_recipient(
+                list(SMSMessage.objects.filter(transmit_message_id=data.get("message_id"), direction="outbound")),
+                data.get("mobile"),
+            )
+            if sms_msg is None:
+                return JsonResponse({"error": "No outbound message for this reply"}, status=404)
+        else:
+            sms_msg = get_object_or_404(SMSMessage, ghl_message_id=message_id)
 
         # 2. Get GHL credentials + conversation info
         ghl_creds = sms_msg.ghl_account
@@ -335,22 +331,23 @@ def transmit_reply_callback(request, message_id):
             return JsonResponse({"error": "Missing GHL IDs"}, status=400)
 
         # 3. Create inbound SMS record (initially queued → processed by Celery)
-        inbound_sms = SMSMessage.objects.create(
-            ghl_account=ghl_creds,
-            transmit_account=sms_msg.transmit_account,
-            message_content=data.get("response"),
-            to_number=data.get("longcode"),   # your business number
-            from_number=data.get("mobile"),   # customer number
-            direction="inbound",
-            ghl_conversation_id=conversation_id,
-            ghl_contact_id=sms_msg.ghl_contact_id,
-            status="queued",  # Celery will update after processing
-            transmit_message_id=data.get("response_id"),
-            sent_at=parse_datetime(data.get("datetime_entry")) if data.get("datetime_entry") else None,
-        )
+        with transaction.atomic():
+            inbound_sms = SMSMessage.objects.create(
+                ghl_account=ghl_creds,
+                transmit_account=sms_msg.transmit_account,
+                message_content=data.get("response"),
+                to_number=data.get("longcode"),   # your business number
+                from_number=data.get("mobile"),   # customer number
+                direction="inbound",
+                ghl_conversation_id=conversation_id,
+                ghl_contact_id=sms_msg.ghl_contact_id,
+                status="queued",  # Celery will update after processing
+                transmit_message_id=data.get("response_id"),
+                sent_at=parse_datetime(data.get("datetime_entry")) if data.get("datetime_entry") else None,
+            )
 
-        # 4. Kick off Celery task (handles wallet + GHL push with rate limits)
-        process_sms_message.delay(str(inbound_sms.id))
+            # 4. Kick off Celery task (handles wallet + GHL push with rate limits)
+            outbox.enqueue(process_sms_message, str(inbound_sms.id))
 
         return JsonResponse({
             "success": True,
@@ -412,7 +409,7 @@ class SMSMessageListView(generics.ListAPIView):
     queryset = SMSMessage.objects.all().order_by('-created_at')
     serializer_class = SMSMessageSerializer
 
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, MessageSearchFilter, filters.OrderingFilter]
     filterset_class = SMSMessageFilter
 
     # Allow searching by phone numbers or message content
@@ -423,8 +420,15 @@ class SMSMessageListView(generics.ListAPIView):
 
 
 import csv
-from django.http import StreamingHttpResponse
+import os
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.db.models import Q
+from django.urls import reverse
+from . import message_export
+from .models import MessageExportJob
+from .serializers import MessageExportJobSerializer
+from .tasks import start_message_export
 
 
 class _CSVEcho:
@@ -440,6 +444,10 @@ class SMSMessageExportCSVView(APIView):
     Honours the same query params as SMSMessageListView (status, direction,
     location_id, created_at__gte/__lte, search, ordering) so "export" always
     matches what the user is currently filtering on.
+
+    Meant for small result sets: above MESSAGE_EXPORT_SYNC_MAX_ROWS matches it
+    answers 413 and the client should use the export job API
+    (MessageExportJobCreateView) with the same params.
     """
     permission_classes = [AllowAny]
 
@@ -453,29 +461,27 @@ class SMSMessageExportCSVView(APIView):
         "direction", "-direction", "from_number", "-from_number",
         "cost", "-cost", "segments", "-segments",
     }
-    HEADER = [
-        "created_at", "direction", "status", "from_number", "to_number",
-        "message_content", "error_category", "error_message", "ghl_sync_error",
-        "location_name", "location_id",
-        "cost", "segments", "sent_at", "delivered_at",
-        "ghl_message_id", "transmit_message_id",
-    ]
+    HEADER = message_export.HEADER
 
     def get(self, request):
-        qs = SMSMessage.objects.select_related("ghl_account", "transmit_account").all()
+        qs = SMSMessage.objects.all()
 
         # Apply the same filters as the list view
         filterset = SMSMessageFilter(request.GET, queryset=qs)
         qs = filterset.qs
 
         # Apply search across the same fields as the list view
-        search = request.GET.get("search")
-        if search:
-            search = search.strip()
-            search_q = Q()
-            for field in self.SEARCH_FIELDS:
-                search_q |= Q(**{f"{field}__icontains": search})
-            qs = qs.filter(search_q)
+        qs = search_messages(qs, request.GET.get("search"), self.SEARCH_FIELDS, request.GET.get("search_mode"))
+
+        max_rows = getattr(settings, "MESSAGE_EXPORT_SYNC_MAX_ROWS", 0)
+        if max_rows and qs.order_by()[: max_rows + 1].count() > max_rows:
+            return Response(
+                {
+                    "error": f"More than {max_rows} messages match; use the export job API for large exports.",
+                    "export_jobs_url": request.build_absolute_uri(reverse("sms-message-export-jobs")),
+                },
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
 
         # Apply ordering (whitelisted), default newest first
         ordering = request.GET.get("ordering")
@@ -484,30 +490,9 @@ class SMSMessageExportCSVView(APIView):
         writer = csv.writer(_CSVEcho())
 
         def row_iter():
-            from sms_management_app.error_sanitize import sanitize_error_text
-
             yield writer.writerow(self.HEADER)
-            for m in qs.iterator():
-                ghl = m.ghl_account
-                yield writer.writerow([
-                    m.created_at.isoformat() if m.created_at else "",
-                    m.direction,
-                    m.status,
-                    m.from_number,
-                    m.to_number,
-                    m.message_content,
-                    m.error_category or "",
-                    sanitize_error_text(m.error_message or "", placeholder_for_polluted=True),
-                    sanitize_error_text(m.ghl_sync_error or ""),
-                    getattr(ghl, "location_name", "") or "",
-                    getattr(ghl, "location_id", "") or "",
-                    m.cost,
-                    m.segments,
-                    m.sent_at.isoformat() if m.sent_at else "",
-                    m.delivered_at.isoformat() if m.delivered_at else "",
-                    m.ghl_message_id or "",
-                    m.transmit_message_id or "",
-                ])
+            for row in message_export.iter_rows(qs):
+                yield writer.writerow(row)
 
         filename = f"sms_messages_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
         response = StreamingHttpResponse(row_iter(), content_type="text/csv")
@@ -515,6 +500,91 @@ class SMSMessageExportCSVView(APIView):
         return response
 
 
+class MessageExportJobCreateView(APIView):
+    """
+    POST /api/sms/sms-messages/export-jobs/?<list filters>
+
+    Queue a background gzip CSV export of the SMS message list. Takes the same
+    query params as SMSMessageExportCSVView; ordering is created_at or
+    -created_at (default). Returns 202 with the job; poll
+    export-jobs/<id>/ for progress and fetch download_url when status is
+    "done" (Range requests are supported, so interrupted downloads resume).
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        ordering = request.query_params.get("ordering")
+        if ordering and ordering not in message_export.JOB_ORDERINGS:
+            return Response(
+                {"error": "Export jobs support ordering=created_at or -created_at only."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        with transaction.atomic():
+            job = message_export.create_job(request.query_params)
+            outbox.enqueue(start_message_export, str(job.pk))
+        return Response(
+            MessageExportJobSerializer(job, context={"request": request}).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class MessageExportJobDetailView(APIView):
+    """GET /api/sms/sms-messages/export-jobs/<id>/ - status and progress of an export job."""
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk):
+        job = get_object_or_404(MessageExportJob, pk=pk)
+        return Response(MessageExportJobSerializer(job, context={"request": request}).data)
+
+
+class MessageExportJobDownloadView(APIView):
+    """
+    GET /api/sms/sms-messages/export-jobs/<id>/download/
+
+    The finished .csv.gz (served as application/gzip, not Content-Encoding, so
+    byte offsets are stable). Honours a single ``Range: bytes=`` range, with
+    If-Range against the ETag, and answers 206/416 accordingly.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk):
+        job = get_object_or_404(MessageExportJob, pk=pk)
+        path = message_export.file_path(job)
+        if path is None:
+            return Response(
+                {"error": f"Export is not available (status: {job.status})."},
+                status=status.HTTP_409_CONFLICT if job.status in ("pending", "running") else status.HTTP_404_NOT_FOUND,
+            )
+
+        size = os.path.getsize(path)
+        etag = f'"{job.pk}-{size}"'
+        byte_range = None
+        if_range = request.headers.get("If-Range")
+        if not if_range or if_range == etag:
+            try:
+                byte_range = message_export.parse_range(request.headers.get("Range"), size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{size}"
+                return response
+
+        if byte_range is None:
+            response = FileResponse(open(path, "rb"), content_type="application/gzip")
+        else:
+            start_at, end_at = byte_range
+            response = StreamingHttpResponse(
+                message_export.iter_file_range(path, start_at, end_at),
+                status=206,
+                content_type="application/gzip",
+            )
+            response["Content-Length"] = str(end_at - start_at + 1)
+            response["Content-Range"] = f"bytes {start_at}-{end_at}/{size}"
+        response["Accept-Ranges"] = "bytes"
+        response["ETag"] = etag
+        response["Content-Disposition"] = f'attachment; filename="{job.file_name}"'
+        return response
+
+
 from decimal import Decimal
 
 
@@ -767,21 +837,28 @@ class DashboardAnalyticsView(APIView):
             transactions_qs = transactions_qs.filter(wallet__account__location_name__icontains=account_name)
 
         
-        # Calculate SMS stats
-        total_messages = messages_qs.count()
-        outbound_messages = messages_qs.filter(direction='outbound').count()
-        inbound_messages = messages_qs.filter(direction='inbound').count()
-        delivered_messages = messages_qs.filter(status='delivered').count()
-        failed_messages = messages_qs.filter(status='failed').count()
+        # SMS and spend stats come from the daily rollups (whole UTC days of the window).
+        filtered = bool(account_id or account_name)
+        start_day, end_day = start_date.date(), end_date.date()
+        message_stats = usage_rollup.dashboard_message_stats(
+            start_day, end_day, accounts_qs if filtered else None
+        )
+        wallet_stats = usage_rollup.wallet_usage(start_day, end_day, wallets_qs if filtered else None)
+
+        total_messages = message_stats['total_messages']
+        outbound_messages = message_stats['outbound_messages']
+        inbound_messages = message_stats['inbound_messages']
+        delivered_messages = message_stats['delivered_messages']
+        failed_messages = message_stats['failed_messages']
         
         # Calculate delivery rate
-        sent_messages = messages_qs.filter(status__in=['sent', 'delivered']).count()
+        sent_messages = message_stats['sent_messages']
         delivery_rate = (delivered_messages / sent_messages * 100) if sent_messages > 0 else 0
         
         # Calculate financial stats
         total_balance = wallets_qs.aggregate(Sum('balance'))['balance__sum'] or 0
-        total_spent = transactions_qs.filter(transaction_type='debit').aggregate(Sum('amount'))['amount__sum'] or 0
-        avg_cost = messages_qs.exclude(cost=0).aggregate(Avg('cost'))['cost__avg'] or 0
+        total_spent = wallet_stats.get('debit', {}).get('amount', 0)
+        avg_cost = message_stats['avg_message_cost']
         
         # Account stats
         total_accounts = accounts_qs.count()
@@ -839,7 +916,14 @@ class LocationMixin:
             return None, Response({"error": "Account not found"}, status=status.HTTP_404_NOT_FOUND)
     
 # ---- 1. Dashboard ----
+LOW_BALANCE_THRESHOLD = 10
+
+
 class GHLAccountDashboardAPIView(APIView):
+    """
+    Sub-account widget. The payload is cached per location (see dashboard_cache)
+    and its counters come from the daily usage rollups, so a load is a cache read.
+    """
     permission_classes = [AllowAny]
 
     def get(self, request):
@@ -847,36 +931,47 @@ class GHLAccountDashboardAPIView(APIView):
         if not location_id:
             return Response({"error": "locationId query parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            account = GHLAuthCredentials.objects.select_related("wallet", "transmit_sms_mapping").get(location_id=location_id)
-        except GHLAuthCredentials.DoesNotExist:
+        account = tenant_cache.get_credentials(location_id)
+        if account is None:
             return Response({"error": "Account not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # --- Wallet ---
-        wallet_serializer = WalletSerializer(account.wallet)
+        data = dashboard_cache.get_cached(account.pk)
+        if data is None:
+            data = self._build(account)
+            dashboard_cache.store(account.pk, data)
+        return Response(data)
+
+    def _build(self, account):
+        wallet = Wallet.objects.filter(account=account).first()
+        mapping = GHLTransmitSMSMapping.objects.select_related("transmit_account").filter(ghl_account=account).first()
 
-        # --- Mapping ---
-        mapping_serializer = MappingSerializer(account.transmit_sms_mapping) if hasattr(account, "transmit_sms_mapping") else None
+        # --- Messages summary (one grouped rollup read instead of a COUNT per figure) ---
+        usage = usage_rollup.message_usage(accounts=GHLAuthCredentials.objects.filter(pk=account.pk))
+        by_direction = {}
+        by_status = {}
+        for (direction, message_status), values in usage.items():
+            by_direction[direction] = by_direction.get(direction, 0) + values["message_count"]
+            by_status[message_status] = by_status.get(message_status, 0) + values["message_count"]
 
-        # --- Messages summary ---
-        messages_qs = account.smsmessage_set.all()
+        recent = account.smsmessage_set.order_by("-created_at")[:5]
         messages_summary = {
-            "recent_messages": SMSMessageSerializer(messages_qs.order_by("-created_at")[:5], many=True).data,
-            "total_sent": messages_qs.filter(direction="outbound").count(),
-            "total_delivered": messages_qs.filter(status="delivered").count(),
-            "total_failed": messages_qs.filter(status="failed").count(),
-            "outbound_count": messages_qs.filter(direction="outbound").count(),
-            "inbound_count": messages_qs.filter(direction="inbound").count(),
+            "recent_messages": SMSMessageSerializer(recent, many=True).data,
+            "total_sent": by_direction.get("outbound", 0),
+            "total_delivered": by_status.get("delivered", 0),
+            "total_failed": by_status.get("failed", 0),
+            "outbound_count": by_direction.get("outbound", 0),
+            "inbound_count": by_direction.get("inbound", 0),
         }
 
         # --- Alerts ---
         alerts = {
-            "low_balance": account.wallet.balance < 10,  # threshold can be customized
-            "pending_messages": messages_qs.filter(status="queued").count(),
-            "failed_messages": messages_qs.filter(status="failed").count()
+            # No wallet yet means nothing to spend.
+            "low_balance": wallet is None or wallet.balance < LOW_BALANCE_THRESHOLD,
+            "pending_messages": by_status.get("queued", 0),
+            "failed_messages": by_status.get("failed", 0),
         }
 
-        data = {
+        return {
             "account": {
                 "id": account.id,
                 "user_id": account.user_id,
@@ -887,21 +982,19 @@ class GHLAccountDashboardAPIView(APIView):
                 "business_phone": account.business_phone,
                 "contact_name": account.contact_name
             },
-            "wallet": wallet_serializer.data,
-            "mapping": mapping_serializer.data if mapping_serializer else None,
+            "wallet": WalletSerializer(wallet).data if wallet else None,
+            "mapping": MappingSerializer(mapping).data if mapping else None,
             "messages_summary": messages_summary,
             "alerts": alerts,
         }
 
-        return Response(data)
-
 
 
 # ---- 2. Paginated Messages ----
 class GHLAccountMessagesAPIView(LocationMixin, ListAPIView):
     permission_classes = [AllowAny]
     serializer_class = SMSMessageSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, MessageSearchFilter, filters.OrderingFilter]
     filterset_class = SMSMessageFilter
     search_fields = ["to_number", "from_number", "message_content"]
     ordering_fields = ["created_at", "cost", "segments", "sent_at", "status"]
@@ -1194,6 +1287,7 @@ class OwnNumber(APIView):
         number_obj.status = "owned"
         number_obj.ghl_account = ghl
         number_obj.save()
+        number_inventory.mark_claimed(number_obj.number)
 
         return Response(
             {"message": f"Number {number_obj.number} marked as owned successfully"},
@@ -1275,15 +1369,18 @@ class OwnNumber(APIView):
 # ============================================
 class GetAvailableNumbers(APIView):
     """
-    Fetch available numbers directly from Transmit SMS API in real-time.
+    Search the available Transmit numbers.
+
+    Served from the local inventory (sms_management_app/number_inventory.py,
+    refreshed every 10 minutes), which covers every page of Transmit's
+    inventory and supports vanity search: "1234" (anywhere), "*1234" (ends
+    with), "6148*" (starts with). Falls back to a live Transmit call until the
+    first refresh has run.
     Supports search, pagination, and filtering by price/label.
     """
     permission_classes = [AllowAny]
 
     def get(self, request):
-
-
-        print("heyyyy")
         # Extract query parameters
         search_query = request.GET.get("search", "").strip()
         price_min = request.GET.get("price_min")
@@ -1294,6 +1391,17 @@ class GetAvailableNumbers(APIView):
         page_size = int(request.GET.get("page_size", 10))
 
         try:
+            result = number_inventory.search(
+                search_query, price_min, price_max, label_filter, sort_by, page, page_size
+            )
+            if result is not None:
+                total_count, paginated_numbers = result
+                return Response(
+                    self._page_payload(total_count, paginated_numbers, page, page_size), status=status.HTTP_200_OK
+                )
+
+            number_inventory.request_refresh()
+
             # Fetch numbers directly from Transmit SMS
             service = TransmitSMSService()
             transmit_response = service.get_dedicated_numbers(filter_type='available')
@@ -1335,24 +1443,26 @@ class GetAvailableNumbers(APIView):
             end_idx = start_idx + page_size
             paginated_numbers = filtered_numbers[start_idx:end_idx]
             
-            # Build response
-            response_data = {
-                "count": total_count,
-                "next": page * page_size < total_count,
-                "previous": page > 1,
-                "page": page,
-                "page_size": page_size,
-                "total_pages": (total_count + page_size - 1) // page_size,
-                "results": paginated_numbers
-            }
-            
-            return Response(response_data, status=status.HTTP_200_OK)
+            return Response(
+                self._page_payload(total_count, paginated_numbers, page, page_size), status=status.HTTP_200_OK
+            )
             
         except Exception as e:
             return Response(
                 {"error": f"Failed to fetch numbers: {str(e)}"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+    def _page_payload(self, total_count, results, page, page_size):
+        return {
+            "count": total_count,
+            "next": page * page_size < total_count,
+            "previous": page > 1,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (total_count + page_size - 1) // page_size,
+            "results": results
+        }
     
     def _apply_filters(self, numbers, search, price_min, price_max, label):
         """Apply search and filter criteria"""
@@ -1517,6 +1627,7 @@ class RegisterNumber(APIView):
                     next_renewal_date=next_renewal_date  # ✅ added here
                 )
                 trigger_inbound_webhook(ghl_account.location_name, ghl_account.location_id, number, str(price), "owned",'standard')
+            number_inventory.mark_claimed(number)
 
             return Response({
                 "message": "Number registered and purchased successfully",
@@ -1589,20 +1700,20 @@ class RequestPremiumNumber(APIView):
         try:
             ghl_account = GHLAuthCredentials.objects.get(location_id=location_id)
 
-            # ✅ Fetch number details from Transmit API
+            # ✅ Price from the number inventory (live Transmit call until it is loaded)
             service = TransmitSMSService()
-            transmit_response = service.get_dedicated_numbers(filter_type='available')
-            numbers_data = transmit_response.get("data", {}).get("numbers", [])
-
-            number_info = next((n for n in numbers_data if str(n["number"]) == number), None)
-            if not number_info:
+            price = number_inventory.price_of(number)
+            if price is None:
+                transmit_response = service.get_dedicated_numbers(filter_type='available')
+                numbers_data = transmit_response.get("data", {}).get("numbers", [])
+                number_info = next((n for n in numbers_data if str(n["number"]) == number), None)
+                price = Decimal(str(number_info.get("price", 0))) if number_info else False
+            if price is False:
                 return Response(
                     {"error": "Number not found or no longer available"},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            price = Decimal(str(number_info.get("price", 0)))
-
             # ✅ Must be a premium number
             if price <= 11:
                 return Response(
@@ -1673,20 +1784,20 @@ class RegisterPremiumNumber(APIView):
             ghl_account = GHLAuthCredentials.objects.get(location_id=location_id)
             wallet = getattr(ghl_account, "wallet", None)
 
-            # ✅ Fetch number details from Transmit API
+            # ✅ Price from the number inventory (live Transmit call until it is loaded)
             service = TransmitSMSService()
-            transmit_response = service.get_dedicated_numbers(filter_type='available')
-            numbers_data = transmit_response.get("data", {}).get("numbers", [])
-
-            number_info = next((n for n in numbers_data if str(n["number"]) == number), None)
-            if not number_info:
+            price = number_inventory.price_of(number)
+            if price is None:
+                transmit_response = service.get_dedicated_numbers(filter_type='available')
+                numbers_data = transmit_response.get("data", {}).get("numbers", [])
+                number_info = next((n for n in numbers_data if str(n["number"]) == number), None)
+                price = Decimal(str(number_info.get("price", 0))) if number_info else False
+            if price is False:
                 return Response(
                     {"error": "Number not found or no longer available"},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            price = Decimal(str(number_info.get("price", 0)))
-
             # ✅ Must be premium (> $11)
             if price <= 11:
                 return Response(
@@ -1775,6 +1886,7 @@ class RegisterPremiumNumber(APIView):
                 )
 
                 trigger_inbound_webhook(ghl_account.location_name, ghl_account.location_id, number, str(price), "owned",'premium')
+            number_inventory.mark_claimed(number)
 
             # ✅ Response payload
             return Response({
@@ -1900,7 +2012,7 @@ class SendQueuedMessagesAPIView(APIView):
                 "skipped": []
             }
 
-            from sms_management_app.tasks import process_sms_message, send_outbound_sms_task
+            from sms_management_app.tasks import process_sms_message
             from sms_management_app.services import GHLIntegrationService
             from django.utils import timezone
 
@@ -1910,21 +2022,23 @@ class SendQueuedMessagesAPIView(APIView):
                     
                     if sms.direction == "outbound":
                         try:
-                            cost, segments = wallet.charge_message(
-                                "outbound", 
-                                sms.message_content, 
-                                reference_id=sms.id
-                            )
-                            sms.cost = cost
-                            sms.segments = segments
-                            sms.status = "pending"
-                            sms.error_message = None
-                            sms.error_category = None
-                            sms.save(update_fields=[
-                                "cost", "segments", "status", "error_message", "error_category"
-                            ])
-
-                            send_outbound_sms_task.delay(str(sms.id))
+                            # Charge, status change and the send publish commit together.
+                            with transaction.atomic():
+                                cost, segments = wallet.charge_message(
+                                    "outbound", 
+                                    sms.message_content, 
+                                    reference_id=sms.id
+                                )
+                                sms.cost = cost
+                                sms.segments = segments
+                                sms.status = "pending"
+                                sms.error_message = None
+                                sms.error_category = None
+                                sms.save(update_fields=[
+                                    "cost", "segments", "status", "error_message", "error_category"
+                                ])
+
+                                campaign_batcher.enqueue_send(sms)
                             results["successful"].append({
                                 "message_id": str(sms.id),
                                 "direction": "outbound",
@@ -1951,7 +2065,7 @@ class SendQueuedMessagesAPIView(APIView):
 
                     elif sms.direction == "inbound":
                         # Handle inbound messages - enqueue Celery task
-                        process_sms_message.delay(str(sms.id))
+                        outbox.enqueue(process_sms_message, str(sms.id))
                         results["successful"].append({
                             "message_id": str(sms.id),
                             "direction": "inbound",
@@ -2247,13 +2361,9 @@ class BulkRetrySMSMessagesAPIView(APIView):
             qs = SMSMessage.objects.filter(status__in=["failed", "pending"])
             qs = SMSMessageFilter(request.query_params, queryset=qs).qs
 
-            search = request.query_params.get("search")
-            if search:
-                search = search.strip()
-                search_q = Q()
-                for field in self.SEARCH_FIELDS:
-                    search_q |= Q(**{f"{field}__icontains": search})
-                qs = qs.filter(search_q)
+            qs = search_messages(
+                qs, request.query_params.get("search"), self.SEARCH_FIELDS, request.query_params.get("search_mode")
+            )
 
             if not include_permanent:
                 from sms_management_app.error_utils import PERMANENT_CATEGORIES
@@ -2280,7 +2390,8 @@ class BulkRetrySMSMessagesAPIView(APIView):
             )
 
         from sms_management_app.tasks import bulk_retry_messages
-        bulk_retry_messages.delay(
+        outbox.enqueue(
+            bulk_retry_messages,
             [str(i) for i in message_ids],
             include_permanent=include_permanent,
             location_id=location_id,